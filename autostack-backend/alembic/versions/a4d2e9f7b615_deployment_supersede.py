@@ -0,0 +1,43 @@
+"""deployment supersede policy
+
+Revision ID: a4d2e9f7b615
+Revises: f2b8d6a4c051
+Create Date: 2025-12-12 09:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "a4d2e9f7b615"
+down_revision: Union[str, None] = "f2b8d6a4c051"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "projects",
+        sa.Column("supersede_policy", sa.String(length=20), server_default="queued", nullable=False),
+    )
+    op.add_column("deployments", sa.Column("superseded_by_id", postgresql.UUID(as_uuid=True), nullable=True))
+    op.add_column("deployments", sa.Column("build_seconds_saved", sa.Integer(), nullable=True))
+    op.create_foreign_key(
+        "deployments_superseded_by_id_fkey",
+        "deployments",
+        "deployments",
+        ["superseded_by_id"],
+        ["id"],
+        ondelete="SET NULL",
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint("deployments_superseded_by_id_fkey", "deployments", type_="foreignkey")
+    op.drop_column("deployments", "build_seconds_saved")
+    op.drop_column("deployments", "superseded_by_id")
+    op.drop_column("projects", "supersede_policy")
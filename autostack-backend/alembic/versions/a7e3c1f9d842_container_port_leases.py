@@ -0,0 +1,40 @@
+"""container port leases
+
+Revision ID: a7e3c1f9d842
+Revises: f4d7a2c9e1b6
+Create Date: 2025-12-19 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "a7e3c1f9d842"
+down_revision: Union[str, None] = "f4d7a2c9e1b6"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Rows whose container died while marked active can share a port with a newer one
+    op.execute(
+        "UPDATE deployment_containers SET status = 'failed' "
+        "WHERE status IN ('starting', 'running', 'hibernated') AND id NOT IN ("
+        "SELECT DISTINCT ON (host, port) id FROM deployment_containers "
+        "WHERE status IN ('starting', 'running', 'hibernated') "
+        "ORDER BY host, port, created_at DESC)"
+    )
+    op.create_index(
+        "uq_deployment_containers_port_lease",
+        "deployment_containers",
+        ["host", "port"],
+        unique=True,
+        postgresql_where=sa.text("status IN ('starting', 'running', 'hibernated')"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("uq_deployment_containers_port_lease", table_name="deployment_containers")
@@ -0,0 +1,31 @@
+"""container log cursor
+
+Revision ID: b3f6d1e8a295
+Revises: a7e3c1f9d842
+Create Date: 2025-12-22 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b3f6d1e8a295"
+down_revision: Union[str, None] = "a7e3c1f9d842"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("deployment_containers", sa.Column("log_cursor", sa.String(length=40), nullable=True))
+    op.add_column(
+        "deployment_containers",
+        sa.Column("log_cursor_lines", sa.Integer(), nullable=False, server_default="0"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("deployment_containers", "log_cursor_lines")
+    op.drop_column("deployment_containers", "log_cursor")
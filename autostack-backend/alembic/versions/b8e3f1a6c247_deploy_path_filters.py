@@ -0,0 +1,30 @@
+"""deploy path filters
+
+Revision ID: b8e3f1a6c247
+Revises: a4d2e9f7b615
+Create Date: 2025-12-13 14:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b8e3f1a6c247"
+down_revision: Union[str, None] = "a4d2e9f7b615"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("projects", sa.Column("deploy_include_paths", sa.JSON(), nullable=True))
+    op.add_column("projects", sa.Column("deploy_exclude_paths", sa.JSON(), nullable=True))
+    op.add_column("webhook_payloads", sa.Column("skip_reason", sa.Text(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("webhook_payloads", "skip_reason")
+    op.drop_column("projects", "deploy_exclude_paths")
+    op.drop_column("projects", "deploy_include_paths")
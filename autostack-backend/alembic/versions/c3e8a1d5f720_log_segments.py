@@ -0,0 +1,49 @@
+"""log segments
+
+Revision ID: c3e8a1d5f720
+Revises: b7c4e2f19a03
+Create Date: 2025-12-04 09:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c3e8a1d5f720"
+down_revision: Union[str, None] = "b7c4e2f19a03"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "log_segments",
+        sa.Column("id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("deployment_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("stream", sa.String(length=20), nullable=False),
+        sa.Column("sequence", sa.Integer(), nullable=False),
+        sa.Column("first_line", sa.Integer(), nullable=False),
+        sa.Column("line_count", sa.Integer(), nullable=False),
+        sa.Column("byte_size", sa.Integer(), nullable=False),
+        sa.Column("stored_bytes", sa.Integer(), nullable=False),
+        sa.Column("codec", sa.String(length=10), nullable=False),
+        sa.Column("path", sa.Text(), nullable=False),
+        sa.Column("is_closed", sa.Boolean(), nullable=False),
+        sa.Column("first_timestamp", sa.DateTime(), nullable=True),
+        sa.Column("last_timestamp", sa.DateTime(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("closed_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["deployment_id"], ["deployments.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("deployment_id", "stream", "sequence", name="uq_log_segments_stream_sequence"),
+    )
+    op.create_index(op.f("ix_log_segments_deployment_id"), "log_segments", ["deployment_id"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_log_segments_deployment_id"), table_name="log_segments")
+    op.drop_table("log_segments")
@@ -0,0 +1,26 @@
+"""project root directory
+
+Revision ID: c5f9a2d8e413
+Revises: b8e3f1a6c247
+Create Date: 2025-12-14 10:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c5f9a2d8e413"
+down_revision: Union[str, None] = "b8e3f1a6c247"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("projects", sa.Column("root_directory", sa.String(length=255), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("projects", "root_directory")
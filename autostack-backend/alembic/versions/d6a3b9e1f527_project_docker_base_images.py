@@ -0,0 +1,26 @@
+"""project docker base images
+
+Revision ID: d6a3b9e1f527
+Revises: c5f9a2d8e413
+Create Date: 2025-12-16 09:15:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "d6a3b9e1f527"
+down_revision: Union[str, None] = "c5f9a2d8e413"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("projects", sa.Column("docker_base_images", sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("projects", "docker_base_images")
@@ -0,0 +1,29 @@
+"""log segment kind
+
+Revision ID: d91f4b6c2e38
+Revises: c3e8a1d5f720
+Create Date: 2025-12-05 14:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "d91f4b6c2e38"
+down_revision: Union[str, None] = "c3e8a1d5f720"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "log_segments",
+        sa.Column("kind", sa.String(length=20), nullable=False, server_default="raw"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("log_segments", "kind")
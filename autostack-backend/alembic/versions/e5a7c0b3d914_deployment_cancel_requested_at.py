@@ -0,0 +1,26 @@
+"""deployment cancel requested at
+
+Revision ID: e5a7c0b3d914
+Revises: d91f4b6c2e38
+Create Date: 2025-12-08 11:05:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e5a7c0b3d914"
+down_revision: Union[str, None] = "d91f4b6c2e38"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("deployments", sa.Column("cancel_requested_at", sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("deployments", "cancel_requested_at")
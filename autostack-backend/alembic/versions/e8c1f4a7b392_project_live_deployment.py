@@ -0,0 +1,27 @@
+"""project live deployment
+
+Revision ID: e8c1f4a7b392
+Revises: d6a3b9e1f527
+Create Date: 2025-12-17 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e8c1f4a7b392"
+down_revision: Union[str, None] = "d6a3b9e1f527"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("projects", sa.Column("live_deployment_id", postgresql.UUID(as_uuid=True), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("projects", "live_deployment_id")
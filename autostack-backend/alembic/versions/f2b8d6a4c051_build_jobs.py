@@ -0,0 +1,50 @@
+"""build jobs
+
+Revision ID: f2b8d6a4c051
+Revises: e5a7c0b3d914
+Create Date: 2025-12-10 16:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "f2b8d6a4c051"
+down_revision: Union[str, None] = "e5a7c0b3d914"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "build_jobs",
+        sa.Column("id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("deployment_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("status", sa.String(length=20), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("max_attempts", sa.Integer(), nullable=False),
+        sa.Column("available_at", sa.DateTime(), nullable=False),
+        sa.Column("lease_owner", sa.String(length=255), nullable=True),
+        sa.Column("lease_token", sa.String(length=36), nullable=True),
+        sa.Column("lease_expires_at", sa.DateTime(), nullable=True),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("started_at", sa.DateTime(), nullable=True),
+        sa.Column("finished_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["deployment_id"], ["deployments.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_build_jobs_deployment_id"), "build_jobs", ["deployment_id"], unique=True)
+    op.create_index(op.f("ix_build_jobs_status"), "build_jobs", ["status"], unique=False)
+    op.create_index(op.f("ix_build_jobs_lease_token"), "build_jobs", ["lease_token"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_build_jobs_lease_token"), table_name="build_jobs")
+    op.drop_index(op.f("ix_build_jobs_status"), table_name="build_jobs")
+    op.drop_index(op.f("ix_build_jobs_deployment_id"), table_name="build_jobs")
+    op.drop_table("build_jobs")
@@ -0,0 +1,26 @@
+"""container last request
+
+Revision ID: f4d7a2c9e1b6
+Revises: e8c1f4a7b392
+Create Date: 2025-12-18 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "f4d7a2c9e1b6"
+down_revision: Union[str, None] = "e8c1f4a7b392"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("deployment_containers", sa.Column("last_request_at", sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("deployment_containers", "last_request_at")
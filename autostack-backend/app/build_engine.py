@@ -1,35 +1,68 @@
 from __future__ import annotations
 
 import asyncio
+import logging
 import os
 import platform
 import shlex
 import shutil
+import signal
 import subprocess
 import uuid
 from asyncio.subprocess import PIPE
 from contextlib import suppress
 from datetime import datetime
 from pathlib import Path
+from typing import Callable
 import time
 import json
 
 import psutil
-from sqlalchemy import select
+from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from .config import settings
 from .db import AsyncSessionLocal
 from .errors import ApiError
-from .models import Deployment, DeploymentLog, Project
-from .services.container_runtime import is_docker_available, record_health_check, start_container, start_dockerfile_runtime
+from .models import Deployment, Project
+from .services.container_runtime import (
+    is_docker_available,
+    prune_project_images,
+    record_health_check,
+    start_container,
+    start_dockerfile_runtime,
+    stop_container,
+)
+from .services.blue_green import active_containers, schedule_retirement
+from .services import npm_proxy
 from .services.docker_builder import build_static_site_image
 from .services.real_k8s_orchestrator import K8sDeploymentConfig, deploy_static_app
 from .services.jenkins_client import trigger_jenkins_build
-from .services.stages import STAGE_LABELS, StageKey, set_stage_status
+from .services.job_queue import enqueue_build_job
+from .services.log_compaction import schedule_log_compaction
+from .services.log_normalizer import LogNormalizer
+from .services.log_store import append_log_lines, close_log_stream
+from .services.pipe_reader import iter_pipe_lines
+from .services.prefetch import mirror_path, parse_base_images, wait_for_git_prefetch
+from .services.static_gateway import publish_container_deployment, publish_static_deployment
+from .services.remote_cache import create_cache_token
+from .services.pipeline_spec import PipelineSpec, PipelineSpecError, PipelineStep, load_pipeline_spec
+from .services.stages import (
+    STAGE_LABELS,
+    StageKey,
+    StageStatus,
+    set_named_stage_status,
+    set_stage_status,
+    step_stage_name,
+)
+from .services.step_cache import compute_step_key, restore_step_outputs, save_step_outputs
+from .services.versions import bump_log_version
 from .websockets import broadcast_deployment_event, ws_manager
 
 
+logger = logging.getLogger(__name__)
+
+
 # Jenkins-style pipeline stages with real timing
 class JenkinsStylePipeline:
     """Simulates Jenkins pipeline with real stages and timing"""
@@ -182,7 +215,15 @@ class JenkinsStylePipeline:
 
 
 _cancel_flags: dict[uuid.UUID, asyncio.Event] = {}
+_log_normalizers: dict[uuid.UUID, LogNormalizer] = {}
+# Builds of this process waiting for a cancellation recorded by another process
+_watched_builds: dict[uuid.UUID, asyncio.Event] = {}
+_cancel_poller: asyncio.Task[None] | None = None
+# Upper bound on log lines stored per commit while draining command output
+LOG_BATCH_SIZE = 200
 DEFAULT_OUTPUT_DIRS = ["dist", "build", "out", "public", "site"]
+# Project variables that choose a registry themselves, so the npm proxy stays out of the way
+NPM_REGISTRY_ENV = ("npm_config_registry", "NPM_CONFIG_REGISTRY", "YARN_REGISTRY", "YARN_NPM_REGISTRY_SERVER")
 
 
 def _parse_env_block(raw: str | None) -> dict[str, str]:
@@ -207,14 +248,84 @@ def get_cancel_flag(deployment_id: uuid.UUID) -> asyncio.Event:
 
 
 async def cancel_deployment_run(deployment_id: uuid.UUID) -> None:
-    flag = get_cancel_flag(deployment_id)
-    flag.set()
+    """Cancel a running build, whichever API or worker process is running it.
+
+    The local flag stops a build in this process immediately; the timestamp in
+    the database is picked up by the cancellation watcher of any other process.
+    """
+    flag = _cancel_flags.get(deployment_id)
+    if flag:
+        flag.set()
+    async with AsyncSessionLocal() as session:
+        await session.execute(
+            update(Deployment)
+            .where(Deployment.id == deployment_id, Deployment.cancel_requested_at.is_(None))
+            .values(cancel_requested_at=datetime.utcnow())
+        )
+        await session.commit()
+
+
+async def _poll_cancellations() -> None:
+    """Check every watched build of this process with one query per interval; stop once none is left."""
+    while _watched_builds:
+        await asyncio.sleep(settings.build_cancel_poll_seconds)
+        watched = dict(_watched_builds)
+        if not watched:
+            return
+        with suppress(Exception):
+            async with AsyncSessionLocal() as session:
+                result = await session.execute(
+                    select(Deployment.id).where(
+                        Deployment.id.in_(list(watched)), Deployment.cancel_requested_at.is_not(None)
+                    )
+                )
+                for deployment_id in result.scalars().all():
+                    watched[deployment_id].set()
+
+
+async def _watch_cancellation(deployment_id: uuid.UUID, cancel_flag: asyncio.Event) -> None:
+    """Set ``cancel_flag`` once a cancellation for this build is recorded in the database."""
+    global _cancel_poller
+    _watched_builds[deployment_id] = cancel_flag
+    running = asyncio.get_running_loop()
+    if _cancel_poller is None or _cancel_poller.done() or _cancel_poller.get_loop() is not running:
+        _cancel_poller = asyncio.create_task(_poll_cancellations())
+    try:
+        await cancel_flag.wait()
+    finally:
+        if _watched_builds.get(deployment_id) is cancel_flag:
+            del _watched_builds[deployment_id]
 
 
 def _clear_cancel_flag(deployment_id: uuid.UUID) -> None:
     _cancel_flags.pop(deployment_id, None)
 
 
+def _get_log_normalizer(deployment_id: uuid.UUID) -> LogNormalizer:
+    normalizer = _log_normalizers.get(deployment_id)
+    if not normalizer:
+        normalizer = LogNormalizer()
+        _log_normalizers[deployment_id] = normalizer
+    return normalizer
+
+
+def _kill_process_group(process: asyncio.subprocess.Process) -> None:
+    """Kill a command started with ``start_new_session`` together with everything it spawned."""
+    if process.returncode is not None:
+        return
+    if hasattr(os, "killpg"):
+        # The shell is the group leader, so its pid is the group id
+        with suppress(ProcessLookupError, PermissionError):
+            os.killpg(process.pid, signal.SIGKILL)
+            return
+    _kill_process_tree(process.pid)
+
+
+async def _kill_on_cancel(process: asyncio.subprocess.Process, cancel_flag: asyncio.Event) -> None:
+    await cancel_flag.wait()
+    _kill_process_group(process)
+
+
 def _kill_process_tree(pid: int | None) -> None:
     if pid is None:
         return
@@ -234,6 +345,35 @@ def _kill_process_tree(pid: int | None) -> None:
         parent.kill()
 
 
+def normalize_root_directory(value: str | None) -> str | None:
+    """Return a repository-relative build directory, or ``None`` for the repository root."""
+    if not value:
+        return None
+    parts = [part for part in value.replace("\\", "/").split("/") if part and part != "."]
+    if ".." in parts:
+        raise ValueError("Root directory must stay inside the repository")
+    return "/".join(parts) or None
+
+
+def _directory_size(path: Path) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            with suppress(OSError):
+                total += os.lstat(os.path.join(root, name)).st_size
+    return total
+
+
+def _install_command(directory: Path) -> str | None:
+    if (directory / "pnpm-lock.yaml").exists():
+        return "pnpm install"
+    if (directory / "yarn.lock").exists():
+        return "yarn install"
+    if (directory / "package-lock.json").exists():
+        return "npm ci"
+    return None
+
+
 def _resolve_output_directory(
     repo_dir: Path,
     configured: str | None,
@@ -296,23 +436,34 @@ async def _record_cancelled(
     stage_key: StageKey,
     reason: str,
 ) -> None:
-    deployment.status = "cancelled"
-    deployment.failed_reason = reason
-    await _append_log(session, deployment.id, "Deployment cancelled by user", "error")
+    superseded_by = await session.scalar(select(Deployment.superseded_by_id).where(Deployment.id == deployment.id))
+    if superseded_by:
+        # Stopped because a newer push to the same branch arrived, not by the user
+        deployment.status = "superseded"
+        deployment.failed_reason = "Superseded by a newer deployment"
+        await _append_log(session, deployment.id, "Deployment superseded by a newer push", "error")
+    else:
+        deployment.status = "cancelled"
+        deployment.failed_reason = reason
+        await _append_log(session, deployment.id, "Deployment cancelled by user", "error")
     await set_stage_status(session, deployment.id, stage_key, "cancelled")
 
 
 async def _append_log(session: AsyncSession | None, deployment_id: uuid.UUID, message: str, level: str = "info") -> None:
+    await _append_logs(session, deployment_id, [(level, message)])
+
+
+async def _append_logs(session: AsyncSession | None, deployment_id: uuid.UUID, items: list[tuple[str, str]]) -> None:
+    await append_log_lines(deployment_id, [(message, level) for level, message in items])
     if session:
-        log = DeploymentLog(deployment_id=deployment_id, message=message, log_level=level)
-        session.add(log)
+        await bump_log_version(session, deployment_id)
         await session.commit()
     else:
         async with AsyncSessionLocal() as log_session:
-            log = DeploymentLog(deployment_id=deployment_id, message=message, log_level=level)
-            log_session.add(log)
+            await bump_log_version(log_session, deployment_id)
             await log_session.commit()
-    await ws_manager.broadcast_log(deployment_id, message)
+    for _, message in items:
+        await ws_manager.broadcast_log(deployment_id, message)
 
 
 async def _update_status(
@@ -344,7 +495,7 @@ async def _finalize_deployment(session: AsyncSession, deployment: Deployment, su
         deployment.status = "success"
         await set_stage_status(session, deployment.id, "success", "completed")
     else:
-        if deployment.status != "cancelled":
+        if deployment.status not in ("cancelled", "superseded"):
             deployment.status = "failed"
             await set_stage_status(session, deployment.id, "failed", "failed")
         else:
@@ -363,50 +514,187 @@ async def _finalize_deployment(session: AsyncSession, deployment: Deployment, su
 
 async def _run_command(
     deployment_id: uuid.UUID,
-    session: AsyncSession,
+    session: AsyncSession | None,
     cmd: str,
     cwd: Path,
     cancel_flag: asyncio.Event,
     env: dict[str, str] | None = None,
+    label: str | None = None,
 ) -> int:
-    await _append_log(session, deployment_id, f"$ {cmd}")
-    process = await asyncio.create_subprocess_shell(cmd, cwd=str(cwd), stdout=PIPE, stderr=PIPE, env=env)
+    """Run ``cmd`` and stream its output to the deployment log.
+
+    Pass ``session=None`` when commands run concurrently (pipeline steps) so each
+    log batch is stored through its own session; ``label`` prefixes every line.
+    """
+    prefix = f"[{label}] " if label else ""
+    await _append_log(session, deployment_id, f"{prefix}$ {cmd}")
+    # Each command gets its own process group so cancellation can kill the
+    # whole tree (npm -> node -> workers) even while it prints nothing
+    process = await asyncio.create_subprocess_shell(
+        cmd,
+        cwd=str(cwd),
+        stdout=PIPE,
+        stderr=PIPE,
+        env=env,
+        start_new_session=os.name == "posix",
+    )
+    killer = asyncio.create_task(_kill_on_cancel(process, cancel_flag))
+    try:
+        # Bounded so that a build producing output faster than we can store it is
+        # paused on its own pipe instead of growing this process's memory
+        log_queue: asyncio.Queue[tuple[str, str] | None] = asyncio.Queue(maxsize=settings.build_log_queue_size)
+        # Concurrent pipeline steps each get their own normalizer, so one step's
+        # repeats, progress and budget never absorb another's output
+        normalizer = LogNormalizer() if label else _get_log_normalizer(deployment_id)
+
+        async def _stream(pipe, level: str) -> None:
+            assert pipe is not None
+            async for line in iter_pipe_lines(pipe):
+                for item_level, message in normalizer.feed(line, level):
+                    await log_queue.put((item_level, prefix + message))
+
+        async def _drain_logs() -> None:
+            done = False
+            while not done:
+                batch = [await log_queue.get()]
+                # Store whatever else is already waiting in one go: one version bump and commit per batch
+                while len(batch) < LOG_BATCH_SIZE and not log_queue.empty():
+                    batch.append(log_queue.get_nowait())
+                if None in batch:
+                    done = True
+                    batch = [item for item in batch if item is not None]
+                if batch:
+                    await _append_logs(session, deployment_id, batch)
+
+        writer = asyncio.create_task(_drain_logs())
+        readers = asyncio.gather(_stream(process.stdout, "info"), _stream(process.stderr, "error"))
+        await asyncio.wait({readers, writer}, return_when=asyncio.FIRST_COMPLETED)
+        if writer.done():
+            # Storing logs failed; stop the build rather than leave it blocked on a full queue
+            readers.cancel()
+            _kill_process_group(process)
+            with suppress(asyncio.CancelledError):
+                await readers
+            await writer
+        for item_level, message in normalizer.end_command():
+            await log_queue.put((item_level, prefix + message))
+        if label:
+            _get_log_normalizer(deployment_id).stats.add(normalizer.stats)
+        await log_queue.put(None)
+        await writer
+        return await process.wait()
+    finally:
+        killer.cancel()
+        # Also reached on timeouts (wait_for cancels us): never leave the command running
+        _kill_process_group(process)
+
+
+async def _set_step_status(deployment_id: uuid.UUID, step: str, status: StageStatus, *, cached: bool = False) -> None:
+    async with AsyncSessionLocal() as step_session:
+        await set_named_stage_status(step_session, deployment_id, step_stage_name(step), status)
+        await step_session.commit()
+    await broadcast_deployment_event(
+        deployment_id,
+        {"type": "step_update", "step": step, "status": status, "cached": cached},
+    )
 
-    log_queue: asyncio.Queue[tuple[str, str] | None] = asyncio.Queue()
 
-    async def _stream(pipe, level: str) -> None:
-        assert pipe is not None
-        while True:
-            if cancel_flag.is_set():
-                _kill_process_tree(process.pid)
-                break
-            line = await pipe.readline()
-            if not line:
-                break
-            text = line.decode(errors="ignore").rstrip()
-            if text:
-                await log_queue.put((level, text))
-
-    async def _drain_logs() -> None:
-        while True:
-            item = await log_queue.get()
-            if item is None:
-                break
-            level, text = item
-            await _append_log(session, deployment_id, text, level)
-
-    writer = asyncio.create_task(_drain_logs())
-    await asyncio.gather(_stream(process.stdout, "info"), _stream(process.stderr, "error"))
-    await log_queue.put(None)
-    await writer
-    if cancel_flag.is_set():
-        _kill_process_tree(process.pid)
-    return await process.wait()
-
-
-async def run_deployment_job(deployment_id: uuid.UUID) -> None:
+async def _run_pipeline_spec(
+    deployment_id: uuid.UUID,
+    project_id: uuid.UUID,
+    spec: PipelineSpec,
+    workdir: Path,
+    cancel_flag: asyncio.Event,
+    env: dict[str, str],
+) -> str | None:
+    """Run the steps of an ``autostack.yml`` pipeline; return a failure reason or ``None``.
+
+    Each step starts as soon as the steps it needs have succeeded, at most
+    ``PIPELINE_MAX_PARALLEL_STEPS`` at a time. The first failure stops the
+    remaining steps.
+    """
+    ordered = spec.order()
+    abort = asyncio.Event()
+    slots = asyncio.Semaphore(max(settings.pipeline_max_parallel_steps, 1))
+    keys: dict[str, str | None] = {}
+    failures: list[str] = []
+    tasks: dict[str, asyncio.Task[bool]] = {}
+
+    for step in ordered:
+        await _set_step_status(deployment_id, step.name, "pending")
+
+    async def _forward_cancel() -> None:
+        await cancel_flag.wait()
+        abort.set()
+
+    async def _run_step(step: PipelineStep) -> bool:
+        needs_ok = [await tasks[name] for name in step.needs]
+        if not all(needs_ok) or abort.is_set():
+            await _set_step_status(deployment_id, step.name, "cancelled")
+            return False
+        async with slots:
+            if abort.is_set():
+                await _set_step_status(deployment_id, step.name, "cancelled")
+                return False
+            await _set_step_status(deployment_id, step.name, "in_progress")
+            step_env = env.copy()
+            step_env.update(step.env)
+            # Build-time variables (e.g. VITE_API_URL) end up in the outputs, so they are part of the key
+            key = await compute_step_key(project_id, step, workdir, [keys[name] for name in step.needs], step_env)
+            keys[step.name] = key
+            if key and await restore_step_outputs(key, workdir, step.outputs):
+                await _append_log(None, deployment_id, f"[{step.name}] Inputs unchanged; restored from step cache")
+                await _set_step_status(deployment_id, step.name, "completed", cached=True)
+                return True
+
+            exit_code = await _run_command(
+                deployment_id, None, step.run, workdir, abort, env=step_env, label=step.name
+            )
+            if exit_code != 0:
+                # Steps killed because another step failed (or the build was cancelled) count as cancelled
+                originated = not abort.is_set()
+                if originated:
+                    failures.append(f"Pipeline step '{step.name}' failed (exit code {exit_code})")
+                    abort.set()
+                await _set_step_status(deployment_id, step.name, "failed" if originated else "cancelled")
+                return False
+            if key:
+                await save_step_outputs(key, workdir, step.outputs)
+            await _set_step_status(deployment_id, step.name, "completed")
+            return True
+
+    forwarder = asyncio.create_task(_forward_cancel())
+    try:
+        for step in ordered:
+            tasks[step.name] = asyncio.create_task(_run_step(step))
+        try:
+            await asyncio.wait_for(asyncio.gather(*tasks.values()), timeout=settings.build_timeout_seconds)
+        except asyncio.TimeoutError:
+            abort.set()
+            return f"Build timed out during {STAGE_LABELS['building']}"
+    finally:
+        forwarder.cancel()
+        for task in tasks.values():
+            task.cancel()
+    if failures:
+        return failures[0]
+    return None
+
+
+async def run_deployment_job(
+    deployment_id: uuid.UUID,
+    attempt: int = 1,
+    owns_build: Callable[[], bool] | None = None,
+) -> None:
+    """Build a deployment.
+
+    ``owns_build`` tells whether this process still holds the build's job
+    lease. Once it is lost the job may already run elsewhere, so the
+    per-deployment state shared with that run (cancel flag, normalizer, log
+    stream) is left alone; the checkout is per attempt and always removed.
+    """
     cancel_flag = get_cancel_flag(deployment_id)
-    repo_dir = Path(".autostack_builds") / str(deployment_id)
+    repo_dir = Path(".autostack_builds") / f"{deployment_id}-{attempt}"
     artifacts_root = Path(settings.autostack_deploy_dir)
     artifacts_dir = artifacts_root / str(deployment_id)
 
@@ -459,6 +747,7 @@ async def run_deployment_job(deployment_id: uuid.UUID) -> None:
             clone_url = repo_identifier
         else:
             clone_url = f"https://github.com/{repo_identifier}.git"
+        cancel_watcher = asyncio.create_task(_watch_cancellation(deployment_id, cancel_flag))
         try:
             repo_identifier = project.repository
             if repo_identifier.startswith(("http://", "https://")) or repo_identifier.endswith(".git"):
@@ -472,6 +761,38 @@ async def run_deployment_job(deployment_id: uuid.UUID) -> None:
             runtime_env["AUTOSTACK_REPOSITORY"] = repo_identifier
             if deployment.branch:
                 runtime_env["AUTOSTACK_BRANCH"] = deployment.branch
+            if settings.remote_cache_enable:
+                # Share Turborepo/Nx task caches across deployments; project settings may override
+                cache_url = (settings.remote_cache_url or str(settings.backend_url)).rstrip("/")
+                cache_token = create_cache_token(project.id)
+                for name, value in (
+                    ("TURBO_API", cache_url),
+                    ("TURBO_TOKEN", cache_token),
+                    ("TURBO_TEAM", f"autostack-{project.id}"),
+                    ("NX_SELF_HOSTED_REMOTE_CACHE_SERVER", cache_url),
+                    ("NX_SELF_HOSTED_REMOTE_CACHE_ACCESS_TOKEN", cache_token),
+                ):
+                    if name not in env_block:
+                        runtime_env[name] = value
+
+            # Objects prefetched into the project's mirror while the deployment was queued
+            # are copied locally instead of downloaded again
+            await wait_for_git_prefetch(project.id, (deployment.branch or project.branch or "main").strip())
+            reference = ""
+            mirror = mirror_path(project.id)
+            if mirror.is_dir():
+                reference = f"--reference-if-able {shlex.quote(str(mirror))} --dissociate "
+
+            root_directory = normalize_root_directory(project.root_directory)
+            if root_directory:
+                # Monorepo: fetch blobs lazily and check out only the project's directory.
+                # Cone mode always includes top-level files (workspace config, lockfiles).
+                clone_cmd = (
+                    f"git clone {reference}--filter=blob:none --no-checkout {shlex.quote(clone_url)} . && "
+                    f"git sparse-checkout set --cone {shlex.quote(root_directory)}"
+                )
+            else:
+                clone_cmd = f"git clone {reference}{shlex.quote(clone_url)} ."
 
             await _update_status(session, deployment, "cloning", "cloning")
             await session.commit()
@@ -480,7 +801,7 @@ async def run_deployment_job(deployment_id: uuid.UUID) -> None:
                     _run_command(
                         deployment_id,
                         session,
-                        f"git clone {shlex.quote(clone_url)} .",
+                        clone_cmd,
                         repo_dir,
                         cancel_flag,
                         env=runtime_env.copy(),
@@ -543,6 +864,31 @@ async def run_deployment_job(deployment_id: uuid.UUID) -> None:
                 return
             await set_stage_status(session, deployment.id, "checkout", "completed")
 
+            build_dir = repo_dir
+            if root_directory:
+                build_dir = repo_dir / root_directory
+                if not build_dir.is_dir():
+                    reason = f"Root directory '{root_directory}' not found in repository"
+                    await _record_failure(session, deployment, "checkout", reason, reason)
+                    await session.commit()
+                    await _finalize_deployment(session, deployment, success=False)
+                    await session.commit()
+                    return
+                checkout_mb = _directory_size(repo_dir) / (1024 * 1024)
+                await _append_log(
+                    session,
+                    deployment_id,
+                    f"Sparse checkout of {root_directory}: {checkout_mb:.1f} MB on disk",
+                )
+
+            if settings.npm_proxy_enable and not any(name in env_block for name in NPM_REGISTRY_ENV):
+                # npm, pnpm and yarn resolve packages through the shared caching proxy unless
+                # the repository (or the project settings) name a registry of their own
+                if npm_proxy.repo_configures_registry(repo_dir, build_dir):
+                    await _append_log(session, deployment_id, "Using the registry configured by the repository")
+                else:
+                    runtime_env.update(npm_proxy.registry_env(deployment.id))
+
             metadata = await _collect_commit_metadata(repo_dir)
             if metadata.get("commit_hash"):
                 deployment.commit_hash = metadata["commit_hash"]
@@ -558,9 +904,17 @@ async def run_deployment_job(deployment_id: uuid.UUID) -> None:
             # Node/static build pipeline. This allows Dockerfile-only repos (for
             # example, Python or Lambda-style apps) to work without requiring the
             # user to manually toggle the runtime in the UI.
-            dockerfile_path = repo_dir / "Dockerfile"
+            dockerfile_path = build_dir / "Dockerfile"
             dockerfile_exists = dockerfile_path.is_file()
-            package_json_exists = (repo_dir / "package.json").is_file()
+            package_json_exists = (build_dir / "package.json").is_file()
+            try:
+                pipeline_spec = load_pipeline_spec(build_dir)
+            except PipelineSpecError as exc:
+                await _record_failure(session, deployment, "checkout", str(exc), f"Invalid pipeline file: {exc}")
+                await session.commit()
+                await _finalize_deployment(session, deployment, success=False)
+                await session.commit()
+                return
             project_runtime = (getattr(project, "runtime", "static") or "static").strip().lower()
 
             # Heuristically detect Lambda-style Docker base images so the
@@ -569,6 +923,10 @@ async def run_deployment_job(deployment_id: uuid.UUID) -> None:
             if dockerfile_exists:
                 try:
                     docker_text = dockerfile_path.read_text(encoding="utf-8", errors="ignore")
+                    base_images = parse_base_images(docker_text)
+                    if base_images != (project.docker_base_images or []):
+                        # Remembered so the next deployment can pull them while it is queued
+                        project.docker_base_images = base_images or None
                     for line in docker_text.splitlines():
                         stripped = line.strip()
                         if stripped.upper().startswith("FROM "):
@@ -621,11 +979,20 @@ async def run_deployment_job(deployment_id: uuid.UUID) -> None:
                     container = await start_dockerfile_runtime(
                         session,
                         deployment,
-                        repo_dir,
+                        build_dir,
                         lambda_mode=lambda_base_image,
                     )
                     url = f"http://{container.host}:{container.port}/"
                     deployment.deployed_url = url
+                    replaced: list = []
+                    if settings.static_gateway_enable and container.status == "running":
+                        # Stable URL through the gateway: the project's site for production, its own for previews.
+                        # The previous live container serves until this switch and is drained afterwards.
+                        previous_live = project.live_deployment_id
+                        url = await publish_container_deployment(session, project, deployment, container)
+                        deployment.deployed_url = url
+                        if deployment.is_production and previous_live and previous_live != deployment.id:
+                            replaced = await active_containers(session, previous_live)
                     
                     # Add Lambda-specific instructions if this is a Lambda container
                     if lambda_base_image:
@@ -663,10 +1030,40 @@ async def run_deployment_job(deployment_id: uuid.UUID) -> None:
                             await _append_log(session, deployment_id, "[CONTAINER] No logs yet")
                     except Exception as log_exc:
                         await _append_log(session, deployment_id, f"Failed to fetch container logs: {log_exc}", "warning")
-                    
+
+                    if container.status != "running":
+                        # Roll back: traffic never moved, so whatever was live keeps serving
+                        await stop_container(session, container)
+                        reason = (
+                            f"Runtime container did not pass {settings.cutover_healthy_probes} consecutive "
+                            "health checks; the previous deployment stays live"
+                        )
+                        await _record_failure(session, deployment, "building", reason, reason)
+                        await session.commit()
+                        await _finalize_deployment(session, deployment, success=False)
+                        await session.commit()
+                        return
+
                     await set_stage_status(session, deployment.id, "building", "completed")
                     await _finalize_deployment(session, deployment, success=True)
                     await session.commit()
+                    if replaced:
+                        schedule_retirement(replaced)
+                        await _append_log(
+                            session,
+                            deployment_id,
+                            f"Previous container(s) stop after a {settings.cutover_drain_seconds:g}s drain period",
+                        )
+                        await session.commit()
+
+                    removed = await prune_project_images(project.id)
+                    if removed:
+                        await _append_log(
+                            session,
+                            deployment_id,
+                            f"Removed {len(removed)} old image(s); keeping the {settings.docker_images_keep_per_project} newest",
+                        )
+                        await session.commit()
                 except ApiError as exc:
                     reason = f"Dockerfile runtime error: {exc.message}"
                     await _record_failure(session, deployment, "building", reason, reason)
@@ -684,24 +1081,49 @@ async def run_deployment_job(deployment_id: uuid.UUID) -> None:
 
                 return
 
-            if package_json_exists:
+            if pipeline_spec is not None:
+                await _append_log(
+                    session,
+                    deployment_id,
+                    f"Running autostack.yml pipeline: {', '.join(step.name for step in pipeline_spec.order())}",
+                )
+                await _update_status(session, deployment, "building", "building")
+                await session.commit()
+                failure = await _run_pipeline_spec(
+                    deployment_id, project.id, pipeline_spec, build_dir, cancel_flag, runtime_env
+                )
+                if cancel_flag.is_set():
+                    await _record_cancelled(session, deployment, "building", "Cancelled by user during build")
+                    await session.commit()
+                    await _finalize_deployment(session, deployment, success=False)
+                    await session.commit()
+                    return
+                if failure:
+                    await _record_failure(session, deployment, "building", failure, failure)
+                    await session.commit()
+                    await _finalize_deployment(session, deployment, success=False)
+                    await session.commit()
+                    return
+                await set_stage_status(session, deployment.id, "building", "completed")
+            elif package_json_exists:
                 await _update_status(session, deployment, "installing", "installing")
                 await session.commit()
 
-                if (repo_dir / "pnpm-lock.yaml").exists():
-                    install_cmd = "pnpm install"
-                elif (repo_dir / "yarn.lock").exists():
-                    install_cmd = "yarn install"
-                elif (repo_dir / "package-lock.json").exists():
-                    install_cmd = "npm ci"
-                else:
+                install_dir = build_dir
+                install_cmd = _install_command(build_dir)
+                if install_cmd is None and build_dir != repo_dir:
+                    # Workspace monorepos keep a single lockfile at the repository root
+                    install_cmd = _install_command(repo_dir)
+                    if install_cmd is not None:
+                        install_dir = repo_dir
+                if install_cmd is None:
                     install_cmd = "npm install"
 
                 await _append_log(session, deployment_id, f"Using package manager command: {install_cmd}")
                 try:
                     exit_code = await asyncio.wait_for(
                         _run_command(
-                            deployment_id, session, install_cmd, repo_dir, cancel_flag, env=runtime_env.copy()
+                            deployment_id, session, install_cmd, install_dir, cancel_flag, env=runtime_env.copy()
                         ),
                         timeout=settings.build_timeout_seconds,
                     )
@@ -736,7 +1158,7 @@ async def run_deployment_job(deployment_id: uuid.UUID) -> None:
                 try:
                     exit_code = await asyncio.wait_for(
                         _run_command(
-                            deployment_id, session, build_cmd, repo_dir, cancel_flag, env=runtime_env.copy()
+                            deployment_id, session, build_cmd, build_dir, cancel_flag, env=runtime_env.copy()
                         ),
                         timeout=settings.build_timeout_seconds,
                     )
@@ -777,9 +1199,9 @@ async def run_deployment_job(deployment_id: uuid.UUID) -> None:
 
             try:
                 output_dir, detected = _resolve_output_directory(
-                    repo_dir,
-                    project.output_dir,
-                    allow_repo_root=not package_json_exists,
+                    build_dir,
+                    (pipeline_spec.output_dir if pipeline_spec else None) or project.output_dir,
+                    allow_repo_root=not package_json_exists and pipeline_spec is None,
                 )
             except FileNotFoundError as exc:
                 await _record_failure(session, deployment, "copying", str(exc), str(exc))
@@ -818,9 +1240,14 @@ async def run_deployment_job(deployment_id: uuid.UUID) -> None:
             deployment.deployed_url = artifact_url
 
             built_image: str | None = None
-            # Optionally start Docker runtime if enabled and project is configured for it
             runtime_url: str | None = None
-            if settings.docker_enable and getattr(project, "runtime", "static") == "docker":
+            if settings.static_gateway_enable:
+                # Static output is served by the shared gateway; containers are only for Dockerfiles
+                if deployment.is_production:
+                    runtime_url = await publish_static_deployment(session, project, deployment)
+                    await _append_log(session, deployment.id, f"Site is live at {runtime_url}")
+            elif settings.docker_enable and getattr(project, "runtime", "static") == "docker":
+                # Legacy mode: a dedicated nginx container per deployment
                 if not is_docker_available():
                     await _append_log(
                         session,
@@ -874,7 +1301,7 @@ async def run_deployment_job(deployment_id: uuid.UUID) -> None:
             ):
                 # Build Docker image for Kubernetes deployment (best effort)
                 try:
-                    built_image = build_static_site_image(artifacts_dir, deployment.id)
+                    built_image = await build_static_site_image(artifacts_dir, deployment.id)
                     await _append_log(
                         session,
                         deployment.id,
@@ -953,11 +1380,28 @@ async def run_deployment_job(deployment_id: uuid.UUID) -> None:
             await _finalize_deployment(session, deployment, success=False)
             await session.commit()
         finally:
+            cancel_watcher.cancel()
             if repo_dir.exists():
                 shutil.rmtree(repo_dir, ignore_errors=True)
-            _clear_cancel_flag(deployment_id)
-
-
-async def enqueue_deployment(deployment_id: uuid.UUID) -> None:
-    # Fire-and-forget background task
-    asyncio.create_task(run_deployment_job(deployment_id))
+            if owns_build is None or owns_build():
+                _clear_cancel_flag(deployment_id)
+                normalizer = _log_normalizers.pop(deployment_id, None)
+                if normalizer is not None and normalizer.stats.raw_lines:
+                    logger.info("Build output of deployment %s normalized: %s", deployment_id, normalizer.stats.summary())
+                with suppress(Exception):
+                    await close_log_stream(deployment_id)
+                schedule_log_compaction(deployment_id)
+
+
+async def enqueue_deployment(deployment_id: uuid.UUID, session: AsyncSession | None = None) -> None:
+    """Queue a build job; a worker process (or the embedded worker) picks it up.
+
+    When ``session`` is given the job is committed together with the caller's
+    transaction, so a deployment row never exists without its job.
+    """
+    if session is not None:
+        await enqueue_build_job(session, deployment_id)
+        return
+    async with AsyncSessionLocal() as own_session:
+        await enqueue_build_job(own_session, deployment_id)
+        await own_session.commit()
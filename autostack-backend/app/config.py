@@ -27,6 +27,52 @@ class Settings(BaseSettings):
     autostack_deploy_dir: str = Field("./deployments", alias="AUTOSTACK_DEPLOY_DIR")
     oauth_state_ttl_seconds: int = Field(300, alias="OAUTH_STATE_TTL_SECONDS")
     build_timeout_seconds: int = Field(1200, alias="BUILD_TIMEOUT_SECONDS")
+    build_log_chunk_bytes: int = Field(64 * 1024, alias="BUILD_LOG_CHUNK_BYTES")
+    build_log_max_line_bytes: int = Field(16 * 1024, alias="BUILD_LOG_MAX_LINE_BYTES")
+    build_log_queue_size: int = Field(1000, alias="BUILD_LOG_QUEUE_SIZE")
+    # How often a process checks the database for cancellations of its builds made by another
+    # process (one query for all of them); cancelling in the building process is immediate
+    build_cancel_poll_seconds: float = Field(0.1, alias="BUILD_CANCEL_POLL_SECONDS")
+    build_workers_embedded: bool = Field(True, alias="BUILD_WORKERS_EMBEDDED")
+    build_worker_concurrency: int = Field(2, alias="BUILD_WORKER_CONCURRENCY")
+    build_worker_poll_seconds: float = Field(2.0, alias="BUILD_WORKER_POLL_SECONDS")
+    build_job_lease_seconds: int = Field(60, alias="BUILD_JOB_LEASE_SECONDS")
+    build_job_max_attempts: int = Field(3, alias="BUILD_JOB_MAX_ATTEMPTS")
+    pipeline_max_parallel_steps: int = Field(4, alias="PIPELINE_MAX_PARALLEL_STEPS")
+    step_cache_dir: str = Field("./.autostack_cache/steps", alias="STEP_CACHE_DIR")
+    step_cache_max_bytes: int = Field(5 * 1024 * 1024 * 1024, alias="STEP_CACHE_MAX_BYTES")
+    remote_cache_enable: bool = Field(True, alias="REMOTE_CACHE_ENABLE")
+    # Base URL builds use to reach the cache endpoints (defaults to BACKEND_URL)
+    remote_cache_url: str | None = Field(None, alias="REMOTE_CACHE_URL")
+    remote_cache_dir: str = Field("./.autostack_cache/remote", alias="REMOTE_CACHE_DIR")
+    remote_cache_max_bytes: int = Field(10 * 1024 * 1024 * 1024, alias="REMOTE_CACHE_MAX_BYTES")
+    remote_cache_max_artifact_bytes: int = Field(512 * 1024 * 1024, alias="REMOTE_CACHE_MAX_ARTIFACT_BYTES")
+    # Fetch git objects and pull base images while a deployment waits in the queue
+    prefetch_enable: bool = Field(True, alias="PREFETCH_ENABLE")
+    git_mirror_dir: str = Field("./.autostack_cache/git", alias="GIT_MIRROR_DIR")
+    npm_proxy_enable: bool = Field(True, alias="NPM_PROXY_ENABLE")
+    # Registry URL builds use to reach the proxy (defaults to BACKEND_URL/npm)
+    npm_proxy_url: str | None = Field(None, alias="NPM_PROXY_URL")
+    npm_proxy_upstream: str = Field("https://registry.npmjs.org", alias="NPM_PROXY_UPSTREAM")
+    npm_proxy_cache_dir: str = Field("./.autostack_cache/npm", alias="NPM_PROXY_CACHE_DIR")
+    npm_proxy_max_bytes: int = Field(5 * 1024 * 1024 * 1024, alias="NPM_PROXY_MAX_BYTES")
+    npm_proxy_metadata_ttl_seconds: int = Field(300, alias="NPM_PROXY_METADATA_TTL_SECONDS")
+    npm_proxy_offline: bool = Field(False, alias="NPM_PROXY_OFFLINE")
+    log_tail_lines: int = Field(200, alias="LOG_TAIL_LINES")
+    log_range_max_lines: int = Field(1000, alias="LOG_RANGE_MAX_LINES")
+    log_range_max_bytes: int = Field(512 * 1024, alias="LOG_RANGE_MAX_BYTES")
+    log_search_max_scan_lines: int = Field(20000, alias="LOG_SEARCH_MAX_SCAN_LINES")
+    log_store_dir: str = Field("./logs", alias="AUTOSTACK_LOG_DIR")
+    log_segment_max_bytes: int = Field(4 * 1024 * 1024, alias="LOG_SEGMENT_MAX_BYTES")
+    log_index_interval: int = Field(256, alias="LOG_INDEX_INTERVAL")
+    log_compression: str = Field("auto", alias="LOG_COMPRESSION")  # auto, zstd, gzip, none
+    log_compaction_enable: bool = Field(True, alias="LOG_COMPACTION_ENABLE")
+    log_retention_full_deployments: int = Field(20, alias="LOG_RETENTION_FULL_DEPLOYMENTS")
+    log_summary_head_lines: int = Field(50, alias="LOG_SUMMARY_HEAD_LINES")
+    log_summary_tail_lines: int = Field(200, alias="LOG_SUMMARY_TAIL_LINES")
+    log_max_bytes_per_deployment: int = Field(8 * 1024 * 1024, alias="LOG_MAX_BYTES_PER_DEPLOYMENT")
+    log_tail_bytes: int = Field(256 * 1024, alias="LOG_TAIL_BYTES")
+    log_strip_ansi: bool = Field(True, alias="LOG_STRIP_ANSI")
 
     jenkins_url: str | AnyUrl | None = Field(None, alias="JENKINS_URL")
     jenkins_user: str | None = Field(None, alias="JENKINS_USER")
@@ -35,9 +81,38 @@ class Settings(BaseSettings):
     jenkins_enable: bool = Field(False, alias="JENKINS_ENABLE")
 
     docker_enable: bool = Field(False, alias="DOCKER_ENABLE")
+    # Docker Engine API endpoint: unix:///path/to/docker.sock or tcp://host:port
+    docker_host: str = Field("unix:///var/run/docker.sock", alias="DOCKER_HOST")
+    # Runtime container logs are followed and appended in batches of up to this many lines
+    runtime_log_batch_lines: int = Field(500, alias="RUNTIME_LOG_BATCH_LINES")
+    runtime_log_flush_seconds: float = Field(1.0, alias="RUNTIME_LOG_FLUSH_SECONDS")
+    runtime_log_rescan_seconds: float = Field(10.0, alias="RUNTIME_LOG_RESCAN_SECONDS")
     runtime_port_range_start: int = Field(30000, alias="RUNTIME_PORT_RANGE_START")
     runtime_port_range_end: int = Field(39999, alias="RUNTIME_PORT_RANGE_END")
     container_start_timeout: int = Field(600, alias="CONTAINER_START_TIMEOUT")
+    # Serve static sites from the API process instead of one nginx container per deployment
+    static_gateway_enable: bool = Field(True, alias="STATIC_GATEWAY_ENABLE")
+    # Sites are served at <site>.<domain> when set (wildcard DNS), otherwise at /sites/<site>/
+    static_gateway_domain: str | None = Field(None, alias="STATIC_GATEWAY_DOMAIN")
+    static_gateway_reload_seconds: float = Field(5.0, alias="STATIC_GATEWAY_RELOAD_SECONDS")
+    proxy_max_connections_per_upstream: int = Field(100, alias="PROXY_MAX_CONNECTIONS_PER_UPSTREAM")
+    proxy_keepalive_per_upstream: int = Field(20, alias="PROXY_KEEPALIVE_PER_UPSTREAM")
+    proxy_keepalive_expiry_seconds: float = Field(30.0, alias="PROXY_KEEPALIVE_EXPIRY_SECONDS")
+    proxy_timeout_seconds: float = Field(60.0, alias="PROXY_TIMEOUT_SECONDS")
+    # Runtime containers without a proxied request for this long are stopped until the next one (0 disables)
+    hibernate_idle_minutes: int = Field(30, alias="HIBERNATE_IDLE_MINUTES")
+    hibernate_check_seconds: int = Field(60, alias="HIBERNATE_CHECK_SECONDS")
+    hibernate_wake_timeout_seconds: float = Field(60.0, alias="HIBERNATE_WAKE_TIMEOUT_SECONDS")
+    # A replacement container takes traffic after this many consecutive healthy probes
+    cutover_healthy_probes: int = Field(3, alias="CUTOVER_HEALTHY_PROBES")
+    cutover_probe_interval_seconds: float = Field(1.0, alias="CUTOVER_PROBE_INTERVAL_SECONDS")
+    cutover_timeout_seconds: float = Field(120.0, alias="CUTOVER_TIMEOUT_SECONDS")
+    # How long the replaced container keeps running so in-flight requests finish
+    cutover_drain_seconds: float = Field(30.0, alias="CUTOVER_DRAIN_SECONDS")
+    # BuildKit builder for Dockerfile builds; local cache export needs a docker-container builder
+    docker_buildx_builder: str | None = Field(None, alias="DOCKER_BUILDX_BUILDER")
+    docker_build_cache_dir: str | None = Field("./.autostack_cache/docker", alias="DOCKER_BUILD_CACHE_DIR")
+    docker_images_keep_per_project: int = Field(3, alias="DOCKER_IMAGES_KEEP_PER_PROJECT")
 
     kubernetes_enable: bool = Field(False, alias="KUBERNETES_ENABLE")
 
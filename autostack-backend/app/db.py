@@ -65,3 +65,106 @@ async def init_db() -> None:
                     "ADD COLUMN IF NOT EXISTS jenkins_job_name VARCHAR(255);"
                 )
             )
+            await conn.execute(
+                text(
+                    "ALTER TABLE deployments "
+                    "ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 0;"
+                )
+            )
+            await conn.execute(
+                text(
+                    "ALTER TABLE users "
+                    "ADD COLUMN IF NOT EXISTS deployments_version INTEGER NOT NULL DEFAULT 0;"
+                )
+            )
+            await conn.execute(
+                text(
+                    "ALTER TABLE deployments "
+                    "ADD COLUMN IF NOT EXISTS cancel_requested_at TIMESTAMP;"
+                )
+            )
+            await conn.execute(
+                text(
+                    "ALTER TABLE log_segments "
+                    "ADD COLUMN IF NOT EXISTS kind VARCHAR(20) NOT NULL DEFAULT 'raw';"
+                )
+            )
+            await conn.execute(
+                text(
+                    "ALTER TABLE projects "
+                    "ADD COLUMN IF NOT EXISTS supersede_policy VARCHAR(20) NOT NULL DEFAULT 'queued';"
+                )
+            )
+            await conn.execute(
+                text(
+                    "ALTER TABLE deployments "
+                    "ADD COLUMN IF NOT EXISTS superseded_by_id UUID REFERENCES deployments(id) ON DELETE SET NULL;"
+                )
+            )
+            await conn.execute(
+                text(
+                    "ALTER TABLE deployments "
+                    "ADD COLUMN IF NOT EXISTS build_seconds_saved INTEGER;"
+                )
+            )
+            await conn.execute(
+                text(
+                    "ALTER TABLE projects "
+                    "ADD COLUMN IF NOT EXISTS deploy_include_paths JSON, "
+                    "ADD COLUMN IF NOT EXISTS deploy_exclude_paths JSON;"
+                )
+            )
+            await conn.execute(
+                text(
+                    "ALTER TABLE webhook_payloads "
+                    "ADD COLUMN IF NOT EXISTS skip_reason TEXT;"
+                )
+            )
+            await conn.execute(
+                text(
+                    "ALTER TABLE projects "
+                    "ADD COLUMN IF NOT EXISTS root_directory VARCHAR(255);"
+                )
+            )
+            await conn.execute(
+                text(
+                    "ALTER TABLE projects "
+                    "ADD COLUMN IF NOT EXISTS docker_base_images JSON;"
+                )
+            )
+            await conn.execute(
+                text(
+                    "ALTER TABLE projects "
+                    "ADD COLUMN IF NOT EXISTS live_deployment_id UUID;"
+                )
+            )
+            await conn.execute(
+                text(
+                    "ALTER TABLE deployment_containers "
+                    "ADD COLUMN IF NOT EXISTS last_request_at TIMESTAMP;"
+                )
+            )
+            await conn.execute(
+                text(
+                    "ALTER TABLE deployment_containers "
+                    "ADD COLUMN IF NOT EXISTS log_cursor VARCHAR(40), "
+                    "ADD COLUMN IF NOT EXISTS log_cursor_lines INTEGER NOT NULL DEFAULT 0;"
+                )
+            )
+            # Older rows may share a port with a newer container; only the newest keeps its lease
+            await conn.execute(
+                text(
+                    "UPDATE deployment_containers SET status = 'failed' "
+                    "WHERE status IN ('starting', 'running', 'hibernated') AND id NOT IN ("
+                    "SELECT DISTINCT ON (host, port) id FROM deployment_containers "
+                    "WHERE status IN ('starting', 'running', 'hibernated') "
+                    "ORDER BY host, port, created_at DESC);"
+                )
+            )
+            await conn.execute(
+                text(
+                    "CREATE UNIQUE INDEX IF NOT EXISTS uq_deployment_containers_port_lease "
+                    "ON deployment_containers (host, port) "
+                    "WHERE status IN ('starting', 'running', 'hibernated');"
+                )
+            )
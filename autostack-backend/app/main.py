@@ -27,9 +27,18 @@ from .routers import (
     monitoring_router,
     billing_router,
     projects_router,
+    build_cache_router,
+    npm_registry_router,
+    static_sites_router,
 )
 from .routers import auth as auth_module
 from .services.monitoring import monitoring_service
+from .services.container_runtime import reconcile_port_leases
+from .services.docker_api import client as docker_client
+from .services.hibernation import start_hibernation_loop
+from .services.npm_proxy import close_npm_proxy
+from .services.reverse_proxy import pools as proxy_pools
+from .services.static_gateway import StaticGatewayMiddleware
 
 
 logger = logging.getLogger(__name__)
@@ -45,6 +54,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Outermost: requests for <site>.<STATIC_GATEWAY_DOMAIN> never reach the API
+app.add_middleware(StaticGatewayMiddleware)
 
 
 app.add_exception_handler(ApiError, api_error_handler)
@@ -60,6 +71,12 @@ async def on_startup() -> None:
     except Exception as exc:  # pragma: no cover - defensive startup on Render
         logger.exception("Database initialization failed during startup; continuing without DB: %s", exc)
 
+    if settings.docker_enable:
+        try:
+            await reconcile_port_leases()
+        except Exception:  # pragma: no cover - the allocator loads lazily instead
+            logger.exception("Reconciling container port leases failed")
+
     # Start background monitoring and health-check loop
     asyncio.create_task(monitoring_service.start_monitoring(interval=60))
 
@@ -68,6 +85,24 @@ async def on_startup() -> None:
         from .services.container_log_streamer import start_log_streamer
         start_log_streamer()
 
+    # Stop runtime containers nobody has requested for a while
+    start_hibernation_loop()
+
+    # Run queued builds in this process unless dedicated workers are deployed
+    if settings.build_workers_embedded:
+        from .worker import start_embedded_worker
+        start_embedded_worker()
+
+
+@app.on_event("shutdown")
+async def on_shutdown() -> None:
+    if settings.build_workers_embedded:
+        from .worker import stop_embedded_worker
+        await stop_embedded_worker()
+    await close_npm_proxy()
+    await proxy_pools.aclose()
+    await docker_client.aclose()
+
 
 # Ensure artifacts directory exists at import time for StaticFiles
 os.makedirs(settings.autostack_deploy_dir, exist_ok=True)
@@ -92,6 +127,9 @@ app.include_router(webhook_router)
 app.include_router(monitoring_router)
 app.include_router(billing_router)
 app.include_router(projects_router)
+app.include_router(build_cache_router)
+app.include_router(npm_registry_router)
+app.include_router(static_sites_router)
 
 
 @app.get("/")
@@ -8,10 +8,13 @@ from sqlalchemy import (
     Boolean,
     DateTime,
     ForeignKey,
+    Index,
     Integer,
     JSON,
     String,
     Text,
+    UniqueConstraint,
+    text,
 )
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
@@ -30,6 +33,8 @@ class User(Base):
     github_id: Mapped[str | None] = mapped_column(String(255), unique=True, nullable=True)
     google_id: Mapped[str | None] = mapped_column(String(255), unique=True, nullable=True)
     email_verified: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+    # Bumped whenever any of the user's deployments changes; backs list/dashboard ETags
+    deployments_version: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -52,6 +57,8 @@ class Project(Base):
     branch: Mapped[str] = mapped_column(String(100), default="main", nullable=False)
     build_command: Mapped[str] = mapped_column(Text, default="npm run build", nullable=False)
     output_dir: Mapped[str] = mapped_column(String(255), default="dist", nullable=False)
+    # Subdirectory of a monorepo to build from; only it is checked out (sparse, cone mode)
+    root_directory: Mapped[str | None] = mapped_column(String(255), nullable=True)
     env_vars: Mapped[str | None] = mapped_column(Text, nullable=True)
     github_repo_id: Mapped[str | None] = mapped_column(String(255), nullable=True)
     runtime: Mapped[str] = mapped_column(String(50), default="static", nullable=False)
@@ -59,6 +66,15 @@ class Project(Base):
     auto_deploy_enabled: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
     auto_deploy_branch: Mapped[str | None] = mapped_column(String(100), nullable=True)
     jenkins_job_name: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    # off | queued (newer pushes supersede queued builds) | running (also stop in-progress production builds)
+    supersede_policy: Mapped[str] = mapped_column(String(20), default="queued", server_default="queued", nullable=False)
+    # Glob lists matched against a push's changed files; pushes touching nothing relevant are not deployed
+    deploy_include_paths: Mapped[list[str] | None] = mapped_column(JSON, nullable=True)
+    deploy_exclude_paths: Mapped[list[str] | None] = mapped_column(JSON, nullable=True)
+    # FROM images of the last built Dockerfile; pulled ahead of the next build while it is queued
+    docker_base_images: Mapped[list[str] | None] = mapped_column(JSON, nullable=True)
+    # Production deployment the project's stable URL currently serves
+    live_deployment_id: Mapped[uuid.UUID | None] = mapped_column(UUID(as_uuid=True), nullable=True)
 
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -76,7 +92,7 @@ class Deployment(Base):
 
     status: Mapped[str] = mapped_column(
         String(50), default="queued"
-    )  # queued, cloning, checkout, installing, building, copying, success, failed, cancelled
+    )  # queued, cloning, checkout, installing, building, copying, success, failed, cancelled, superseded
     branch: Mapped[str | None] = mapped_column(String(100), nullable=True)
     commit_hash: Mapped[str | None] = mapped_column(String(40), nullable=True)
     commit_message: Mapped[str | None] = mapped_column(Text, nullable=True)
@@ -88,6 +104,15 @@ class Deployment(Base):
     build_duration_seconds: Mapped[int | None] = mapped_column(Integer, nullable=True)
     failed_reason: Mapped[str | None] = mapped_column(Text, nullable=True)
     deployed_url: Mapped[str | None] = mapped_column(Text, nullable=True)
+    # Bumped on every status, stage or log change; backs ETags and long-polling
+    version: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    # Set by /cancel in any process; build workers poll it to stop the running command
+    cancel_requested_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    # Newer deployment of the same branch that made this one unnecessary, and the build time it saved
+    superseded_by_id: Mapped[uuid.UUID | None] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("deployments.id", ondelete="SET NULL"), nullable=True
+    )
+    build_seconds_saved: Mapped[int | None] = mapped_column(Integer, nullable=True)
 
     started_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
     completed_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
@@ -137,8 +162,24 @@ class DeploymentStage(Base):
     deployment: Mapped[Deployment] = relationship(back_populates="stages")
 
 
+# Containers in these states hold a lease on their host port
+PORT_LEASE_STATES = ("starting", "running", "hibernated")
+_ACTIVE_LEASE = text("status IN ('starting', 'running', 'hibernated')")
+
+
 class DeploymentContainer(Base):
     __tablename__ = "deployment_containers"
+    # At most one live lease per host port, whichever process allocated it
+    __table_args__ = (
+        Index(
+            "uq_deployment_containers_port_lease",
+            "host",
+            "port",
+            unique=True,
+            postgresql_where=_ACTIVE_LEASE,
+            sqlite_where=_ACTIVE_LEASE,
+        ),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     deployment_id: Mapped[uuid.UUID] = mapped_column(
@@ -153,6 +194,12 @@ class DeploymentContainer(Base):
 
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     stopped_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    # Latest request proxied to the container by the gateway, flushed periodically
+    last_request_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    # Docker timestamp (RFC 3339, nanoseconds) of the newest ingested log line, and how many
+    # ingested lines carry exactly that timestamp; log following resumes from here
+    log_cursor: Mapped[str | None] = mapped_column(String(40), nullable=True)
+    log_cursor_lines: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
 
     deployment: Mapped[Deployment] = relationship(back_populates="containers")
 
@@ -223,6 +270,59 @@ class DeploymentRuntimeLog(Base):
     deployment: Mapped[Deployment] = relationship(back_populates="runtime_logs")
 
 
+class LogSegment(Base):
+    """Metadata of one on-disk log segment; the lines themselves live in the file."""
+
+    __tablename__ = "log_segments"
+    __table_args__ = (UniqueConstraint("deployment_id", "stream", "sequence", name="uq_log_segments_stream_sequence"),)
+
+    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    deployment_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("deployments.id", ondelete="CASCADE"), index=True
+    )
+    stream: Mapped[str] = mapped_column(String(20), nullable=False, default="build")  # build, runtime
+    sequence: Mapped[int] = mapped_column(Integer, nullable=False)
+    first_line: Mapped[int] = mapped_column(Integer, nullable=False)
+    # Only authoritative once the segment is closed; active segments are counted from the file
+    line_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    byte_size: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    stored_bytes: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    codec: Mapped[str] = mapped_column(String(10), default="none", nullable=False)  # none, gzip, zstd
+    kind: Mapped[str] = mapped_column(
+        String(20), default="raw", server_default="raw", nullable=False
+    )  # raw, compacted, summary
+    path: Mapped[str] = mapped_column(Text, nullable=False)  # relative to AUTOSTACK_LOG_DIR
+    is_closed: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+    first_timestamp: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    last_timestamp: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    closed_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+
+class BuildJob(Base):
+    """Durable queue entry for a deployment build, claimed by workers under a lease."""
+
+    __tablename__ = "build_jobs"
+
+    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    deployment_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("deployments.id", ondelete="CASCADE"), unique=True, index=True
+    )
+    status: Mapped[str] = mapped_column(
+        String(20), default="queued", nullable=False, index=True
+    )  # queued, running, completed, failed, cancelled
+    attempts: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    max_attempts: Mapped[int] = mapped_column(Integer, default=3, nullable=False)
+    available_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+    lease_owner: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    lease_token: Mapped[str | None] = mapped_column(String(36), nullable=True, index=True)
+    lease_expires_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    started_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+
 class Session(Base):
     __tablename__ = "sessions"
 
@@ -258,6 +358,8 @@ class WebhookPayload(Base):
     provider: Mapped[str] = mapped_column(String(50), nullable=False)
     payload_json: Mapped[dict[str, Any]] = mapped_column(JSON, nullable=False)
     headers: Mapped[dict[str, Any]] = mapped_column(JSON, nullable=False)
+    # Why the push did not create a deployment (auto deploy disabled, branch or path filters)
+    skip_reason: Mapped[str | None] = mapped_column(Text, nullable=True)
     received_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
 
     deployment: Mapped[Deployment | None] = relationship(back_populates="webhook_payloads")
@@ -8,6 +8,9 @@ from .deployments_runtime import router as deployments_runtime_router
 from .monitoring import router as monitoring_router
 from .billing import router as billing_router
 from .projects import router as projects_router
+from .build_cache import router as build_cache_router
+from .npm_registry import router as npm_registry_router
+from .static_sites import router as static_sites_router
 
 __all__ = [
     "auth_router",
@@ -20,4 +23,7 @@ __all__ = [
     "monitoring_router",
     "billing_router",
     "projects_router",
+    "build_cache_router",
+    "npm_registry_router",
+    "static_sites_router",
 ]
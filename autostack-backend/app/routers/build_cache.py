@@ -0,0 +1,161 @@
+"""Remote task cache endpoints for Turborepo (``/v8/artifacts``) and Nx (``/v1/cache``).
+
+Both tools authenticate with ``Authorization: Bearer <token>``; the token is
+created per project by the build engine, see
+:func:`app.services.remote_cache.create_cache_token`.
+"""
+
+from __future__ import annotations
+
+import uuid
+from typing import Any
+
+from fastapi import APIRouter, Body, Header, Request, Response
+from fastapi.responses import FileResponse
+
+from ..config import settings
+from ..errors import ApiError
+from ..services.remote_cache import (
+    ARTIFACT_HASH_RE,
+    ArtifactTooLarge,
+    artifact_path,
+    read_artifact_metadata,
+    store_artifact,
+    touch_artifact,
+    verify_cache_token,
+)
+
+
+router = APIRouter(tags=["build-cache"])
+
+
+def _project_for(authorization: str | None) -> uuid.UUID:
+    if not settings.remote_cache_enable:
+        raise ApiError("NOT_FOUND", "Remote build cache is disabled", 404)
+    if not authorization or not authorization.lower().startswith("bearer "):
+        raise ApiError("UNAUTHORIZED", "Missing remote cache token", 401)
+    project_id = verify_cache_token(authorization[7:].strip())
+    if project_id is None:
+        raise ApiError("FORBIDDEN", "Invalid remote cache token", 403)
+    return project_id
+
+
+def _check_hash(artifact_hash: str) -> None:
+    if not ARTIFACT_HASH_RE.fullmatch(artifact_hash):
+        raise ApiError("VALIDATION_ERROR", "Invalid artifact hash", 400)
+
+
+async def _upload(request: Request, project_id: uuid.UUID, artifact_hash: str, metadata: dict[str, str]) -> int:
+    try:
+        return await store_artifact(project_id, artifact_hash, request.stream(), metadata)
+    except ArtifactTooLarge:
+        raise ApiError("PAYLOAD_TOO_LARGE", "Artifact exceeds REMOTE_CACHE_MAX_ARTIFACT_BYTES", 413)
+
+
+def _download(project_id: uuid.UUID, artifact_hash: str) -> FileResponse:
+    path = artifact_path(project_id, artifact_hash)
+    if not path.is_file():
+        raise ApiError("NOT_FOUND", "Artifact not found", 404)
+    touch_artifact(path)
+    headers = {}
+    metadata = read_artifact_metadata(path)
+    if metadata.get("duration"):
+        headers["x-artifact-duration"] = metadata["duration"]
+    if metadata.get("tag"):
+        headers["x-artifact-tag"] = metadata["tag"]
+    return FileResponse(path, media_type="application/octet-stream", headers=headers)
+
+
+# -- Turborepo -------------------------------------------------------------
+
+
+@router.get("/v8/artifacts/status")
+async def turbo_status(authorization: str | None = Header(None)) -> dict[str, str]:
+    _project_for(authorization)
+    return {"status": "enabled"}
+
+
+@router.put("/v8/artifacts/{artifact_hash}", status_code=202)
+async def turbo_put_artifact(
+    artifact_hash: str,
+    request: Request,
+    authorization: str | None = Header(None),
+    x_artifact_duration: str | None = Header(None),
+    x_artifact_tag: str | None = Header(None),
+) -> dict[str, list[str]]:
+    project_id = _project_for(authorization)
+    _check_hash(artifact_hash)
+    if x_artifact_duration and not x_artifact_duration.isdigit():
+        raise ApiError("VALIDATION_ERROR", "x-artifact-duration must be a whole number of milliseconds", 400)
+    metadata = {key: value for key, value in (("duration", x_artifact_duration), ("tag", x_artifact_tag)) if value}
+    await _upload(request, project_id, artifact_hash, metadata)
+    return {"urls": [f"{str(settings.backend_url).rstrip('/')}/v8/artifacts/{artifact_hash}"]}
+
+
+@router.get("/v8/artifacts/{artifact_hash}")
+async def turbo_get_artifact(artifact_hash: str, authorization: str | None = Header(None)) -> FileResponse:
+    project_id = _project_for(authorization)
+    _check_hash(artifact_hash)
+    return _download(project_id, artifact_hash)
+
+
+@router.head("/v8/artifacts/{artifact_hash}")
+async def turbo_artifact_exists(artifact_hash: str, authorization: str | None = Header(None)) -> Response:
+    project_id = _project_for(authorization)
+    _check_hash(artifact_hash)
+    if not artifact_path(project_id, artifact_hash).is_file():
+        return Response(status_code=404)
+    return Response(status_code=200)
+
+
+@router.post("/v8/artifacts")
+async def turbo_query_artifacts(
+    payload: dict[str, Any] = Body(...),
+    authorization: str | None = Header(None),
+) -> dict[str, Any]:
+    project_id = _project_for(authorization)
+    found: dict[str, Any] = {}
+    for artifact_hash in payload.get("hashes") or []:
+        if not isinstance(artifact_hash, str) or not ARTIFACT_HASH_RE.fullmatch(artifact_hash):
+            continue
+        path = artifact_path(project_id, artifact_hash)
+        if not path.is_file():
+            found[artifact_hash] = None
+            continue
+        metadata = read_artifact_metadata(path)
+        duration = str(metadata.get("duration") or "")
+        found[artifact_hash] = {
+            "size": path.stat().st_size,
+            # Sidecars written before durations were validated may hold anything
+            "taskDurationMs": int(duration) if duration.isdigit() else 0,
+            "tag": metadata.get("tag"),
+        }
+    return found
+
+
+@router.post("/v8/artifacts/events")
+async def turbo_usage_events(authorization: str | None = Header(None)) -> Response:
+    # Cache hit/miss analytics are not recorded; accept them so turbo does not retry
+    _project_for(authorization)
+    return Response(status_code=200)
+
+
+# -- Nx ----------------------------------------------------------------------
+
+
+@router.put("/v1/cache/{artifact_hash}")
+async def nx_put_artifact(artifact_hash: str, request: Request, authorization: str | None = Header(None)) -> Response:
+    project_id = _project_for(authorization)
+    _check_hash(artifact_hash)
+    # Nx treats cache entries as immutable and expects a conflict for existing ones
+    if artifact_path(project_id, artifact_hash).is_file():
+        return Response(status_code=409)
+    await _upload(request, project_id, artifact_hash, {})
+    return Response(status_code=200)
+
+
+@router.get("/v1/cache/{artifact_hash}")
+async def nx_get_artifact(artifact_hash: str, authorization: str | None = Header(None)) -> FileResponse:
+    project_id = _project_for(authorization)
+    _check_hash(artifact_hash)
+    return _download(project_id, artifact_hash)
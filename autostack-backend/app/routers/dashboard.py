@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from datetime import datetime
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Header, Query, Response
 from sqlalchemy import func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -10,6 +10,14 @@ from ..db import get_db
 from ..models import Deployment, Project, User
 from ..schemas import DashboardStats, DashboardStatsResponse, RecentDeploymentItem
 from ..security import get_current_user
+from ..services.versions import (
+    LONG_POLL_MAX_SECONDS,
+    conditional_get,
+    fetch_user_version,
+    make_etag,
+    set_etag_headers,
+    user_key,
+)
 
 
 router = APIRouter(prefix="/api/dashboard", tags=["dashboard"])
@@ -32,9 +40,27 @@ def _format_time(dt: datetime | None) -> str:
 
 @router.get("/stats", response_model=DashboardStatsResponse)
 async def dashboard_stats(
+    response: Response,
+    wait: int | None = Query(None, ge=0, le=LONG_POLL_MAX_SECONDS),
+    if_none_match: str | None = Header(None, alias="If-None-Match"),
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ) -> DashboardStatsResponse:
+    # "Today" counts roll over at midnight without any deployment changing
+    today = datetime.utcnow().date().isoformat()
+    not_modified, etag = await conditional_get(
+        db,
+        key=user_key(current_user.id),
+        version=current_user.deployments_version,
+        etag_for=lambda version: make_etag("dash", version, today),
+        fetch_version=lambda: fetch_user_version(current_user.id),
+        if_none_match=if_none_match,
+        wait=wait,
+    )
+    if not_modified is not None:
+        return not_modified
+    set_etag_headers(response, etag)
+
     # Total deployments for user (excluding soft-deleted)
     total_q = select(func.count()).select_from(Deployment).where(
         Deployment.user_id == current_user.id, Deployment.is_deleted.is_(False)
@@ -1,16 +1,19 @@
 from __future__ import annotations
 
+import asyncio
 import uuid
+from contextlib import suppress
 from datetime import datetime, timedelta
 
-from fastapi import APIRouter, Depends, Query, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, Depends, Header, Query, Response, WebSocket, WebSocketDisconnect
 from sqlalchemy import func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..build_engine import cancel_deployment_run, enqueue_deployment
+from ..build_engine import cancel_deployment_run, enqueue_deployment, normalize_root_directory
+from ..config import settings
 from ..db import AsyncSessionLocal, get_db
 from ..errors import ApiError
-from ..models import Deployment, DeploymentLog, DeploymentStage, Project, User
+from ..models import Deployment, DeploymentStage, Project, User
 from ..schemas import (
     DashboardStats,
     DashboardStatsResponse,
@@ -19,6 +22,8 @@ from ..schemas import (
     DeploymentDetailResponse,
     DeploymentItem,
     DeploymentListResponse,
+    DeploymentLogLine,
+    DeploymentLogRangeResponse,
     DeploymentLogsResponse,
     DeploymentStageModel,
     Pagination,
@@ -26,12 +31,29 @@ from ..schemas import (
     RecentDeploymentsResponse,
 )
 from ..security import decode_token, get_current_user
+from ..services.job_queue import cancel_queued_job
+from ..services.log_store import read_log_range, tail_log
+from ..services.prefetch import schedule_prefetch
 from ..services.stages import order_stages, set_stage_status
+from ..services.versions import (
+    LONG_POLL_MAX_SECONDS,
+    bump_user_version,
+    conditional_get,
+    deployment_key,
+    fetch_deployment_version,
+    fetch_user_version,
+    make_etag,
+    set_etag_headers,
+    user_key,
+)
 from ..websockets import broadcast_deployment_event, ws_manager
 
 
 router = APIRouter(prefix="/api/deployments", tags=["deployments"])
 
+# How often a log stream re-reads the store when builds run in worker processes
+LOG_FOLLOW_INTERVAL_SECONDS = 1.0
+
 
 def _format_duration(seconds: int | None) -> str | None:
     if seconds is None:
@@ -56,6 +78,25 @@ def _is_production_branch(project: Project, branch: str | None) -> bool:
     return target.lower() == source.lower()
 
 
+async def _user_list_etag(
+    db: AsyncSession,
+    user: User,
+    if_none_match: str | None,
+    wait: int | None,
+    *view: object,
+) -> tuple[Response | None, str]:
+    """Conditional-GET handling shared by views derived from a user's deployments."""
+    return await conditional_get(
+        db,
+        key=user_key(user.id),
+        version=user.deployments_version,
+        etag_for=lambda version: make_etag("u", version, *view),
+        fetch_version=lambda: fetch_user_version(user.id),
+        if_none_match=if_none_match,
+        wait=wait,
+    )
+
+
 def _deployment_item(dep: Deployment, project: Project) -> DeploymentItem:
     return DeploymentItem(
         id=str(dep.id),
@@ -91,6 +132,10 @@ async def create_deployment(
         )
     )
     project = result.scalar_one_or_none()
+    try:
+        root_directory = normalize_root_directory(payload.root_directory)
+    except ValueError as exc:
+        raise ApiError("VALIDATION_ERROR", str(exc), 400)
     if not project:
         project = Project(
             user_id=current_user.id,
@@ -103,6 +148,7 @@ async def create_deployment(
             runtime=(payload.runtime or "static"),
             auto_deploy_enabled=payload.auto_deploy_enabled or False,
             auto_deploy_branch=payload.auto_deploy_branch or payload.branch,
+            root_directory=root_directory,
         )
         db.add(project)
         await db.flush()
@@ -113,6 +159,8 @@ async def create_deployment(
         project.env_vars = payload.env_vars
         if payload.runtime is not None:
             project.runtime = payload.runtime
+        if payload.root_directory is not None:
+            project.root_directory = root_directory
         if payload.auto_deploy_enabled is not None:
             project.auto_deploy_enabled = payload.auto_deploy_enabled
         if payload.auto_deploy_branch:
@@ -133,9 +181,10 @@ async def create_deployment(
     db.add(deployment)
     await db.flush()
     await set_stage_status(db, deployment.id, "queued", "in_progress")
+    await enqueue_deployment(deployment.id, db)
     await db.commit()
 
-    await enqueue_deployment(deployment.id)
+    schedule_prefetch(project, payload.branch)
 
     return DeploymentDetailResponse(
         id=str(deployment.id),
@@ -164,10 +213,13 @@ async def create_deployment(
 
 @router.get("", response_model=DeploymentListResponse)
 async def list_deployments(
+    response: Response,
     search: str | None = None,
     status: str | None = Query(None, description="all, success, failed, building, queued, copying"),
     page: int = 1,
     limit: int = 10,
+    wait: int | None = Query(None, ge=0, le=LONG_POLL_MAX_SECONDS),
+    if_none_match: str | None = Header(None, alias="If-None-Match"),
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ) -> DeploymentListResponse:
@@ -176,6 +228,11 @@ async def list_deployments(
     if limit < 1:
         limit = 10
 
+    not_modified, etag = await _user_list_etag(db, current_user, if_none_match, wait, "list", search, status, page, limit)
+    if not_modified is not None:
+        return not_modified
+    set_etag_headers(response, etag)
+
     query = (
         select(Deployment, Project)
         .join(Project, Deployment.project_id == Project.id)
@@ -208,10 +265,18 @@ async def list_deployments(
 
 @router.get("/recent", response_model=RecentDeploymentsResponse)
 async def recent_deployments(
+    response: Response,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
     limit: int = 5,
+    wait: int | None = Query(None, ge=0, le=LONG_POLL_MAX_SECONDS),
+    if_none_match: str | None = Header(None, alias="If-None-Match"),
 ) -> RecentDeploymentsResponse:
+    not_modified, etag = await _user_list_etag(db, current_user, if_none_match, wait, "recent", limit)
+    if not_modified is not None:
+        return not_modified
+    set_etag_headers(response, etag)
+
     query = (
         select(Deployment, Project)
         .join(Project, Deployment.project_id == Project.id)
@@ -232,6 +297,14 @@ async def recent_deployments(
 @router.get("/{deployment_id}", response_model=DeploymentDetailResponse)
 async def get_deployment(
     deployment_id: str,
+    response: Response,
+    wait: int | None = Query(
+        None,
+        ge=0,
+        le=LONG_POLL_MAX_SECONDS,
+        description="With If-None-Match, hold the request up to this many seconds until the deployment changes",
+    ),
+    if_none_match: str | None = Header(None, alias="If-None-Match"),
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ) -> DeploymentDetailResponse:
@@ -240,6 +313,32 @@ async def get_deployment(
     except ValueError:
         raise ApiError("NOT_FOUND", "Deployment not found", 404)
 
+    # Cheap version check first so unchanged deployments cost a single indexed lookup
+    version = (
+        await db.execute(
+            select(Deployment.version).where(
+                Deployment.id == dep_uuid,
+                Deployment.user_id == current_user.id,
+                Deployment.is_deleted.is_(False),
+            )
+        )
+    ).scalar_one_or_none()
+    if version is None:
+        raise ApiError("NOT_FOUND", "Deployment not found", 404)
+
+    not_modified, etag = await conditional_get(
+        db,
+        key=deployment_key(dep_uuid),
+        version=version,
+        etag_for=lambda v: make_etag("d", v, settings.log_tail_lines),
+        fetch_version=lambda: fetch_deployment_version(dep_uuid),
+        if_none_match=if_none_match,
+        wait=wait,
+    )
+    if not_modified is not None:
+        return not_modified
+    set_etag_headers(response, etag)
+
     result = await db.execute(
         select(Deployment, Project)
         .join(Project, Deployment.project_id == Project.id)
@@ -255,10 +354,7 @@ async def get_deployment(
 
     dep, project = row
 
-    logs_result = await db.execute(
-        select(DeploymentLog).where(DeploymentLog.deployment_id == dep.id).order_by(DeploymentLog.timestamp.asc())
-    )
-    logs = [log.message for log in logs_result.scalars().all()]
+    tail = await tail_log(db, dep.id, settings.log_tail_lines)
 
     stages_result = await db.execute(
         select(DeploymentStage).where(DeploymentStage.deployment_id == dep.id).order_by(DeploymentStage.created_at.asc())
@@ -295,31 +391,70 @@ async def get_deployment(
         is_production=dep.is_production,
         env_vars=dep.env_vars,
         stages=stage_models,
-        logs=logs,
+        logs=[line.message for line in tail.lines],
+        logs_cursor=tail.next_cursor,
+        logs_total=tail.total_lines,
+        logs_truncated=tail.has_more,
         failed_reason=dep.failed_reason,
     )
 
 
-@router.get("/{deployment_id}/logs", response_model=DeploymentLogsResponse)
-async def get_deployment_logs(
-    deployment_id: str,
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
-) -> DeploymentLogsResponse:
+async def _get_owned_deployment(db: AsyncSession, user: User, deployment_id: str) -> Deployment:
     try:
         dep_uuid = uuid.UUID(deployment_id)
     except ValueError:
         raise ApiError("NOT_FOUND", "Deployment not found", 404)
 
     dep = await db.get(Deployment, dep_uuid)
-    if not dep or dep.user_id != current_user.id or dep.is_deleted:
+    if not dep or dep.user_id != user.id or dep.is_deleted:
         raise ApiError("NOT_FOUND", "Deployment not found", 404)
+    return dep
+
+
+@router.get("/{deployment_id}/logs", response_model=DeploymentLogsResponse)
+async def get_deployment_logs(
+    deployment_id: str,
+    tail: int = Query(1000, ge=1, description="Number of most recent lines to return"),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+) -> DeploymentLogsResponse:
+    dep = await _get_owned_deployment(db, current_user, deployment_id)
 
-    logs_result = await db.execute(
-        select(DeploymentLog).where(DeploymentLog.deployment_id == dep.id).order_by(DeploymentLog.timestamp.asc())
+    window = await tail_log(db, dep.id, min(tail, settings.log_range_max_lines))
+    return DeploymentLogsResponse(logs=[line.message for line in window.lines])
+
+
+@router.get("/{deployment_id}/logs/range", response_model=DeploymentLogRangeResponse)
+async def get_deployment_log_range(
+    deployment_id: str,
+    after: int | None = Query(None, ge=0, description="Return lines after this line number"),
+    before: int | None = Query(None, ge=1, description="Return lines before this line number"),
+    limit: int = Query(500, ge=1),
+    max_bytes: int | None = Query(None, ge=1),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+) -> DeploymentLogRangeResponse:
+    dep = await _get_owned_deployment(db, current_user, deployment_id)
+
+    window = await read_log_range(
+        db,
+        dep.id,
+        after=after,
+        before=before,
+        limit=min(limit, settings.log_range_max_lines),
+        max_bytes=min(max_bytes or settings.log_range_max_bytes, settings.log_range_max_bytes),
+    )
+    return DeploymentLogRangeResponse(
+        lines=[
+            DeploymentLogLine(line=item.line, message=item.message, level=item.level, timestamp=item.timestamp)
+            for item in window.lines
+        ],
+        first_line=window.first_line,
+        last_line=window.last_line,
+        next_cursor=window.next_cursor,
+        total_lines=window.total_lines,
+        has_more=window.has_more,
     )
-    logs = [log.message for log in logs_result.scalars().all()]
-    return DeploymentLogsResponse(logs=logs)
 
 
 @router.post("/{deployment_id}/cancel")
@@ -338,6 +473,7 @@ async def cancel_deployment(
         raise ApiError("NOT_FOUND", "Deployment not found", 404)
 
     await cancel_deployment_run(dep.id)
+    await cancel_queued_job(db, dep.id)
     dep.status = "cancelled"
     dep.failed_reason = "Cancelled by user"
     await db.flush()
@@ -381,6 +517,7 @@ async def delete_deployment(
 
     dep.is_deleted = True  # type: ignore[attr-defined]
     await db.flush()
+    await bump_user_version(db, dep.user_id)
     await db.commit()
 
     return {"success": True}
@@ -417,11 +554,31 @@ async def deployment_logs_stream(websocket: WebSocket, deployment_id: str, token
 
     await ws_manager.register(dep_uuid, websocket)
 
+    follower: asyncio.Task | None = None
     try:
-        await ws_manager.send_history(dep_uuid, websocket)
+        cursor = await ws_manager.send_history(dep_uuid, websocket)
+        if not settings.build_workers_embedded:
+            # Builds run in worker processes, so lines never reach this process's broadcasts
+            follower = asyncio.create_task(_follow_log_store(dep_uuid, websocket, cursor))
         while True:
             await websocket.receive_text()
     except WebSocketDisconnect:
         pass
     finally:
+        if follower is not None:
+            follower.cancel()
         await ws_manager.unregister(dep_uuid, websocket)
+
+
+async def _follow_log_store(deployment_id: uuid.UUID, websocket: WebSocket, cursor: int) -> None:
+    with suppress(Exception):
+        while True:
+            async with AsyncSessionLocal() as session:
+                window = await read_log_range(
+                    session, deployment_id, after=cursor, limit=settings.log_range_max_lines
+                )
+            for line in window.lines:
+                await websocket.send_json({"type": "log", "line": line.message})
+            cursor = window.next_cursor
+            if not window.has_more:
+                await asyncio.sleep(LOG_FOLLOW_INTERVAL_SECONDS)
@@ -1,31 +1,40 @@
 from __future__ import annotations
 
+import asyncio
 import uuid
+from contextlib import suppress
 from datetime import datetime
 from pathlib import Path
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query, WebSocket, WebSocketDisconnect
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..config import settings
-from ..db import get_db
+from ..db import AsyncSessionLocal, get_db
 from ..errors import ApiError
-from ..models import Deployment, DeploymentContainer
-from ..security import get_current_user
+from ..models import Deployment, DeploymentContainer, Project
+from ..security import decode_token, get_current_user
 from ..services.container_runtime import (
-    get_container_logs,
     is_docker_available,
     latest_container,
     record_health_check,
     start_container,
     stop_container,
+    wait_until_healthy,
 )
-from ..schemas import DeploymentLogsResponse, MessageResponse
+from ..schemas import DeploymentLogLine, DeploymentLogRangeResponse, MessageResponse
+from ..services.blue_green import active_containers, schedule_retirement
+from ..services.hibernation import wake_container
+from ..services.log_store import LogLevel, LogLine, LogRange, count_log_lines, search_log_range
+from ..services.reverse_proxy import metrics as proxy_metrics
+from ..services.static_gateway import container_site_url, routing_table
 
 
 router = APIRouter(prefix="/api/deployments", tags=["deployments-runtime"])
 
+LOG_FOLLOW_INTERVAL_SECONDS = 1.0
+
 
 async def _get_owned_deployment(
     db: AsyncSession,
@@ -46,6 +55,14 @@ async def _get_owned_deployment(
     return deployment
 
 
+async def _runtime_url(db: AsyncSession, deployment: Deployment, container: DeploymentContainer) -> str:
+    if settings.static_gateway_enable:
+        # Through the gateway, which can wake the container once it hibernates
+        project = await db.get(Project, deployment.project_id)
+        return container_site_url(project, deployment)
+    return f"http://{container.host}:{container.port}/"
+
+
 @router.post("/{deployment_id}/runtime/start")
 async def start_runtime(
     deployment_id: str,
@@ -66,6 +83,17 @@ async def start_runtime(
     existing = await latest_container(db, deployment.id)
     if existing and existing.status in {"starting", "running"}:
         raise ApiError("CONFLICT", "Runtime container already running for this deployment", 409)
+    if existing and existing.status == "hibernated":
+        if not await wake_container(existing.id):
+            raise ApiError("RUNTIME_ERROR", "Failed to wake the hibernated runtime container", 500)
+        await db.refresh(existing)
+        return {
+            "containerId": existing.container_id,
+            "host": existing.host,
+            "port": existing.port,
+            "url": deployment.deployed_url,
+            "status": existing.status,
+        }
 
     artifacts_dir = settings.autostack_deploy_dir.rstrip("/\\") + f"/{deployment.id}"
 
@@ -76,9 +104,10 @@ async def start_runtime(
     hc = await record_health_check(db, deployment, url)
     container.status = "running" if hc.is_live else "failed"
     if hc.is_live:
-        deployment.deployed_url = url
+        deployment.deployed_url = await _runtime_url(db, deployment, container)
     await db.flush()
     await db.commit()
+    routing_table.invalidate()
 
     return {
         "containerId": container.container_id,
@@ -103,6 +132,7 @@ async def stop_runtime(
 
     await stop_container(db, container)
     await db.commit()
+    routing_table.invalidate()
 
     return MessageResponse()
 
@@ -115,24 +145,33 @@ async def redeploy_runtime(
 ) -> MessageResponse:
     deployment = await _get_owned_deployment(db, current_user.id, deployment_id)
 
-    container = await latest_container(db, deployment.id)
-    if container:
-        await stop_container(db, container)
-
     # For now, redeploy means restart runtime container using existing artifacts.
     # The build pipeline has already produced artifacts; we reuse them.
     if not settings.docker_enable or not is_docker_available():
         raise ApiError("RUNTIME_UNAVAILABLE", "Docker runtime is disabled or not installed", 400)
 
+    # Blue-green: the current container keeps serving until the new one is healthy
     artifacts_dir = settings.autostack_deploy_dir.rstrip("/\\") + f"/{deployment.id}"
     container = await start_container(db, deployment, Path(artifacts_dir))
+    await db.commit()
     url = f"http://{container.host}:{container.port}/"
+    healthy = await wait_until_healthy(url)
     hc = await record_health_check(db, deployment, url)
-    container.status = "running" if hc.is_live else "failed"
-    if hc.is_live:
-        deployment.deployed_url = url
-    await db.flush()
+    if not (healthy and hc.is_live):
+        await stop_container(db, container)
+        await db.commit()
+        raise ApiError(
+            "RUNTIME_UNHEALTHY",
+            "New runtime container did not become healthy; the previous one keeps serving",
+            502,
+        )
+
+    container.status = "running"
+    deployment.deployed_url = await _runtime_url(db, deployment, container)
+    replaced = await active_containers(db, deployment.id, exclude=container.id)
     await db.commit()
+    routing_table.invalidate()
+    schedule_retirement(replaced)
 
     return MessageResponse()
 
@@ -147,7 +186,23 @@ async def deployment_status_page(
     if not deployment.deployed_url:
         raise ApiError("INVALID_STATE", "Deployment has no deployed URL", 400)
 
-    hc = await record_health_check(db, deployment, deployment.deployed_url)
+    url = deployment.deployed_url
+    container = await latest_container(db, deployment.id)
+    if container is not None and container.status == "hibernated":
+        # Probing would wake it; the gateway starts it again on its next real request
+        return {
+            "url": url,
+            "http_status": None,
+            "latency_ms": None,
+            "is_live": True,
+            "hibernated": True,
+            "checked_at": datetime.utcnow().isoformat() + "Z",
+        }
+    if container is not None and container.status == "running":
+        # Probe the container itself: going through the gateway would count as traffic
+        url = f"http://{container.host}:{container.port}/"
+
+    hc = await record_health_check(db, deployment, url)
     await db.commit()
 
     return {
@@ -155,26 +210,126 @@ async def deployment_status_page(
         "http_status": hc.http_status,
         "latency_ms": hc.latency_ms,
         "is_live": hc.is_live,
+        "hibernated": False,
         "checked_at": hc.checked_at.isoformat() + "Z",
     }
 
 
-@router.get("/{deployment_id}/logs/runtime", response_model=DeploymentLogsResponse)
+async def _runtime_log_window(
+    session: AsyncSession,
+    deployment_id: uuid.UUID,
+    *,
+    after: int | None,
+    before: int | None,
+    limit: int,
+    level: LogLevel | None,
+    q: str | None,
+) -> LogRange:
+    if after is None and before is None:
+        # The newest lines by default, like ``docker logs --tail``
+        before = await count_log_lines(session, deployment_id, "runtime") + 1
+    return await search_log_range(
+        session,
+        deployment_id,
+        after=after,
+        before=before,
+        limit=min(limit, settings.log_range_max_lines),
+        level=level,
+        contains=q or None,
+        stream="runtime",
+    )
+
+
+def _log_line(line: LogLine) -> DeploymentLogLine:
+    return DeploymentLogLine(line=line.line, message=line.message, level=line.level, timestamp=line.timestamp)
+
+
+@router.get("/{deployment_id}/logs/runtime", response_model=DeploymentLogRangeResponse)
 async def deployment_runtime_logs(
     deployment_id: str,
+    after: int | None = Query(None, ge=0, description="Return lines after this line number"),
+    before: int | None = Query(None, ge=1, description="Return lines before this line number"),
+    limit: int = Query(200, ge=1),
+    level: LogLevel | None = Query(None, description="Only lines at or above this level"),
+    q: str | None = Query(None, max_length=200, description="Only lines containing this text"),
     current_user=Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
-) -> DeploymentLogsResponse:
+) -> DeploymentLogRangeResponse:
+    # Served from the runtime log store, which the log streamer fills; reading never writes
     deployment = await _get_owned_deployment(db, current_user.id, deployment_id)
 
-    container = await latest_container(db, deployment.id)
-    if not container:
-        raise ApiError("NOT_FOUND", "No runtime container for this deployment", 404)
+    window = await _runtime_log_window(db, deployment.id, after=after, before=before, limit=limit, level=level, q=q)
+    return DeploymentLogRangeResponse(
+        lines=[_log_line(item) for item in window.lines],
+        first_line=window.first_line,
+        last_line=window.last_line,
+        next_cursor=window.next_cursor,
+        prev_cursor=window.prev_cursor,
+        total_lines=window.total_lines,
+        has_more=window.has_more,
+    )
 
-    lines = await get_container_logs(db, deployment, container)
-    await db.commit()
 
-    return DeploymentLogsResponse(logs=lines)
+@router.websocket("/{deployment_id}/logs/runtime/stream")
+async def deployment_runtime_logs_stream(
+    websocket: WebSocket,
+    deployment_id: str,
+    token: str = Query(""),
+    after: int | None = Query(None, ge=0),
+    level: LogLevel | None = Query(None),
+    q: str | None = Query(None, max_length=200),
+) -> None:
+    """Send the newest runtime log lines, or those after ``after``, then new lines as they are ingested."""
+    try:
+        user_id = decode_token(token).get("userId") if token else None
+    except ApiError:
+        user_id = None
+    if not isinstance(user_id, str):
+        await websocket.close(code=4401)
+        return
+
+    try:
+        dep_uuid = uuid.UUID(deployment_id)
+    except ValueError:
+        await websocket.close(code=4404)
+        return
+
+    async with AsyncSessionLocal() as session:
+        deployment = await session.get(Deployment, dep_uuid)
+        if not deployment or deployment.is_deleted or str(deployment.user_id) != user_id:
+            await websocket.close(code=4403)
+            return
+
+    await websocket.accept()
+    follower = asyncio.create_task(_follow_runtime_logs(dep_uuid, websocket, after, level, q))
+    try:
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        follower.cancel()
+
+
+async def _follow_runtime_logs(
+    deployment_id: uuid.UUID,
+    websocket: WebSocket,
+    after: int | None,
+    level: LogLevel | None,
+    q: str | None,
+) -> None:
+    limit = settings.log_tail_lines if after is None else settings.log_range_max_lines
+    with suppress(Exception):
+        while True:
+            async with AsyncSessionLocal() as session:
+                window = await _runtime_log_window(
+                    session, deployment_id, after=after, before=None, limit=limit, level=level, q=q
+                )
+            for line in window.lines:
+                await websocket.send_json({"type": "log", **_log_line(line).model_dump(mode="json")})
+            after, limit = window.next_cursor, settings.log_range_max_lines
+            if not window.has_more:
+                await asyncio.sleep(LOG_FOLLOW_INTERVAL_SECONDS)
 
 
 @router.get("/{deployment_id}/metrics")
@@ -218,4 +373,6 @@ async def deployment_metrics(
         "uptime_seconds": uptime_seconds,
         "container_status": container_status,
         "last_health": last_health,
+        # Traffic seen by this API process's gateway; None until the first proxied request
+        "proxy": proxy_metrics.snapshot(deployment.id),
     }
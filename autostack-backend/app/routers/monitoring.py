@@ -17,7 +17,7 @@ from ..errors import ApiError
 from ..models import Deployment, DeploymentStage
 from ..security import get_current_user
 from ..services.real_k8s_orchestrator import get_cluster_snapshot
-from ..services.monitoring import monitoring_service
+from ..services.monitoring import metrics_broadcaster, monitoring_service
 
 router = APIRouter(prefix="/api/monitoring", tags=["monitoring"])
 
@@ -72,6 +72,15 @@ async def get_application_metrics(
     return metrics
 
 
+@router.get("/hibernation")
+async def get_hibernation_metrics(
+    current_user = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get idle container hibernation counts, cold-start latency and memory reclaimed"""
+    return await monitoring_service.collect_hibernation_metrics()
+
+
 @router.get("/cluster")
 async def get_cluster_status(
     current_user = Depends(get_current_user),
@@ -201,35 +210,21 @@ async def get_alerts(
 
 @router.websocket("/live")
 async def websocket_monitoring(websocket: WebSocket):
-    """WebSocket for real-time monitoring updates"""
+    """WebSocket for real-time monitoring updates.
+
+    Sends a full ``metrics_update`` snapshot on connect, then ``metrics_delta``
+    messages containing only the summary sections that changed. Collection is
+    shared by all connected clients via ``metrics_broadcaster``.
+    """
     await websocket.accept()
-    
+
+    queue = None
     try:
-        # Send initial metrics
-        initial_metrics = await monitoring_service.get_metrics_summary()
-        await websocket.send_text(json.dumps({
-            "type": "metrics_update",
-            "data": initial_metrics
-        }))
-        
-        # Send updates every 10 seconds
-        import asyncio
+        queue = await metrics_broadcaster.subscribe()
         while True:
-            await asyncio.sleep(10)
-            
-            try:
-                metrics = await monitoring_service.get_metrics_summary()
-                await websocket.send_text(json.dumps({
-                    "type": "metrics_update",
-                    "data": metrics,
-                    "timestamp": datetime.utcnow().isoformat()
-                }))
-            except Exception as e:
-                await websocket.send_text(json.dumps({
-                    "type": "error",
-                    "message": str(e)
-                }))
-                
+            message = await queue.get()
+            await websocket.send_text(json.dumps(message))
+
     except WebSocketDisconnect:
         pass
     except Exception as e:
@@ -240,6 +235,9 @@ async def websocket_monitoring(websocket: WebSocket):
             }))
         except:
             pass
+    finally:
+        if queue is not None:
+            await metrics_broadcaster.unsubscribe(queue)
 
 
 @router.get("/pipeline/{deployment_id}")
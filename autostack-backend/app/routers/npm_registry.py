@@ -0,0 +1,80 @@
+"""npm registry protocol endpoints backed by :mod:`app.services.npm_proxy`.
+
+Only what installs need is implemented: package metadata, tarball downloads
+and ``npm audit`` pass-through. Publishing is not supported. Installs
+authenticate with ``Authorization: Bearer <token>``; the token is created per
+build, see :func:`app.services.npm_proxy.create_registry_token`.
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Any
+
+from fastapi import APIRouter, Header, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
+
+from ..config import settings
+from ..errors import ApiError
+from ..services import npm_proxy
+
+
+router = APIRouter(prefix="/npm", tags=["npm-registry"])
+
+PACKAGE_NAME_RE = re.compile(r"(@[A-Za-z0-9._~-]+/)?[A-Za-z0-9._~-]+")
+TARBALL_NAME_RE = re.compile(r"[A-Za-z0-9._~-]+\.tgz")
+
+
+def _ensure_enabled() -> None:
+    if not settings.npm_proxy_enable:
+        raise ApiError("NOT_FOUND", "npm registry proxy is disabled", 404)
+
+
+def _authorize(authorization: str | None) -> None:
+    _ensure_enabled()
+    if not authorization or not authorization.lower().startswith("bearer "):
+        raise ApiError("UNAUTHORIZED", "Missing npm registry token", 401)
+    if npm_proxy.verify_registry_token(authorization[7:].strip()) is None:
+        raise ApiError("FORBIDDEN", "Invalid npm registry token", 403)
+
+
+def _check_package_name(name: str) -> None:
+    if not PACKAGE_NAME_RE.fullmatch(name) or name.startswith(".") or "/." in name:
+        raise ApiError("VALIDATION_ERROR", "Invalid package name", 400)
+
+
+@router.get("/-/autostack/stats")
+async def npm_proxy_stats() -> dict[str, Any]:
+    _ensure_enabled()
+    return npm_proxy.stats.snapshot()
+
+
+@router.post("/-/npm/v1/security/{audit_path:path}")
+async def npm_audit(audit_path: str, request: Request, authorization: str | None = Header(None)) -> Response:
+    _authorize(authorization)
+    status_code, content = await npm_proxy.forward_audit(await request.body(), f"-/npm/v1/security/{audit_path}")
+    return Response(content=content, status_code=status_code, media_type="application/json")
+
+
+@router.get("/{package_path:path}")
+async def npm_package(package_path: str, request: Request, authorization: str | None = Header(None)) -> Response:
+    _authorize(authorization)
+    name, separator, filename = package_path.partition("/-/")
+    _check_package_name(name)
+    try:
+        if separator:
+            if not TARBALL_NAME_RE.fullmatch(filename):
+                raise ApiError("VALIDATION_ERROR", "Invalid tarball name", 400)
+            cached = npm_proxy.cached_tarball(name, filename)
+            if cached is not None:
+                return FileResponse(cached, media_type="application/octet-stream")
+            chunks = await npm_proxy.fetch_tarball(name, filename)
+            return StreamingResponse(chunks, media_type="application/octet-stream")
+
+        abbreviated = npm_proxy.ABBREVIATED_METADATA in request.headers.get("accept", "")
+        proxy_base = f"{str(request.base_url).rstrip('/')}/npm"
+        body = await npm_proxy.get_metadata(name, abbreviated, proxy_base)
+    except npm_proxy.NpmProxyError as exc:
+        raise ApiError("NOT_FOUND" if exc.status_code == 404 else "UPSTREAM_ERROR", exc.message, exc.status_code)
+    media_type = npm_proxy.ABBREVIATED_METADATA if abbreviated else "application/json"
+    return Response(content=body, media_type=media_type)
@@ -7,6 +7,7 @@ from fastapi import APIRouter, Depends
 from sqlalchemy import func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from ..build_engine import normalize_root_directory
 from ..db import get_db
 from ..errors import ApiError
 from ..models import Deployment, DeploymentHealthCheck, Project, User
@@ -22,6 +23,11 @@ from ..security import get_current_user
 router = APIRouter(prefix="/api/projects", tags=["projects"])
 
 
+def _clean_patterns(patterns: list[str]) -> list[str] | None:
+    cleaned = [pattern.strip() for pattern in patterns if pattern.strip()]
+    return cleaned or None
+
+
 @router.get("/by-repo", response_model=ProjectSummary)
 async def get_project_by_repo(
     repository: str,
@@ -43,6 +49,10 @@ async def get_project_by_repo(
         runtime=project.runtime,
         auto_deploy_enabled=project.auto_deploy_enabled,
         auto_deploy_branch=project.auto_deploy_branch,
+        supersede_policy=project.supersede_policy,
+        deploy_include_paths=project.deploy_include_paths or [],
+        deploy_exclude_paths=project.deploy_exclude_paths or [],
+        root_directory=project.root_directory,
     )
 
 
@@ -66,6 +76,19 @@ async def update_project_settings(
         project.auto_deploy_enabled = payload.auto_deploy_enabled
     if payload.auto_deploy_branch is not None and payload.auto_deploy_branch.strip():
         project.auto_deploy_branch = payload.auto_deploy_branch.strip()
+    if payload.supersede_policy is not None:
+        project.supersede_policy = payload.supersede_policy
+    # An empty list clears the filter
+    if payload.deploy_include_paths is not None:
+        project.deploy_include_paths = _clean_patterns(payload.deploy_include_paths)
+    if payload.deploy_exclude_paths is not None:
+        project.deploy_exclude_paths = _clean_patterns(payload.deploy_exclude_paths)
+    if payload.root_directory is not None:
+        # An empty string builds from the repository root again
+        try:
+            project.root_directory = normalize_root_directory(payload.root_directory)
+        except ValueError as exc:
+            raise ApiError("VALIDATION_ERROR", str(exc), 400)
 
     await db.flush()
     await db.commit()
@@ -78,6 +101,10 @@ async def update_project_settings(
         runtime=project.runtime,
         auto_deploy_enabled=project.auto_deploy_enabled,
         auto_deploy_branch=project.auto_deploy_branch,
+        supersede_policy=project.supersede_policy,
+        deploy_include_paths=project.deploy_include_paths or [],
+        deploy_exclude_paths=project.deploy_exclude_paths or [],
+        root_directory=project.root_directory,
     )
 
 
@@ -122,6 +149,10 @@ async def get_project_analytics(
     )
     last_5_durations = [float(d.build_duration_seconds or 0) for d in recent_sorted[:5]]
 
+    # Builds skipped or stopped because a newer push to the same branch arrived
+    superseded = [d for d in deployments if d.status == "superseded"]
+    build_minutes_saved = round(sum(d.build_seconds_saved or 0 for d in superseded) / 60.0, 1)
+
     # Uptime over the last 24 hours based on health checks
     now = datetime.utcnow()
     day_ago = now - timedelta(hours=24)
@@ -150,6 +181,8 @@ async def get_project_analytics(
         last_5_durations=last_5_durations,
         avg_build_time=avg_build_time,
         uptime_last_24h=uptime_last_24h,
+        superseded_count=len(superseded),
+        build_minutes_saved=build_minutes_saved,
     )
 
     return ProjectAnalyticsResponse(analytics=analytics)
@@ -0,0 +1,34 @@
+"""Path-based access to project sites served by the shared gateway."""
+
+from __future__ import annotations
+
+from fastapi import APIRouter, Request, Response
+from fastapi.responses import RedirectResponse
+
+from ..errors import ApiError
+from ..services.static_gateway import SITE_NAME_RE, serve_site
+
+
+router = APIRouter(prefix="/sites", tags=["static-sites"])
+
+
+def _check_site(site: str) -> None:
+    if not SITE_NAME_RE.fullmatch(site):
+        raise ApiError("NOT_FOUND", "Site not found", 404)
+
+
+@router.api_route("/{site}", methods=["GET", "HEAD"], include_in_schema=False)
+async def site_root(site: str) -> Response:
+    # Relative asset URLs only resolve below the trailing slash
+    _check_site(site)
+    return RedirectResponse(f"/sites/{site}/", status_code=308)
+
+
+@router.api_route(
+    "/{site}/{path:path}",
+    methods=["GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
+    include_in_schema=False,
+)
+async def site_file(site: str, path: str, request: Request) -> Response:
+    _check_site(site)
+    return await serve_site(request, site, path)
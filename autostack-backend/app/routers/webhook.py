@@ -9,12 +9,16 @@ from typing import Any
 from fastapi import APIRouter, Header, Request, Response
 from sqlalchemy import func, select
 
-from ..build_engine import enqueue_deployment
+from ..build_engine import cancel_deployment_run, enqueue_deployment
 from ..config import settings
 from ..db import AsyncSessionLocal
 from ..errors import ApiError
 from ..models import Deployment, Project, User, WebhookPayload
+from ..services.path_filters import path_filter_skip_reason
+from ..services.prefetch import schedule_prefetch
 from ..services.stages import set_stage_status
+from ..services.supersede import supersede_older_deployments
+from ..websockets import broadcast_deployment_event
 
 
 logger = logging.getLogger(__name__)
@@ -77,14 +81,22 @@ async def github_webhook(
             raise ApiError("NOT_FOUND", "No project configured for this repository", 404)
 
         if not project.auto_deploy_enabled:
+            payload_entry.skip_reason = "auto_deploy_disabled"
             await db.commit()
             return {"status": "ignored", "reason": "auto_deploy_disabled"}
 
         target_branch = project.auto_deploy_branch or project.branch
         if target_branch and target_branch != branch:
+            payload_entry.skip_reason = "branch_mismatch"
             await db.commit()
             return {"status": "ignored", "reason": "branch_mismatch"}
 
+        skip_reason = path_filter_skip_reason(payload, project.deploy_include_paths, project.deploy_exclude_paths)
+        if skip_reason:
+            payload_entry.skip_reason = f"paths_filtered: {skip_reason}"
+            await db.commit()
+            return {"status": "ignored", "reason": "paths_filtered", "detail": skip_reason}
+
         user = await db.get(User, project.user_id)
         if not user:
             await db.commit()
@@ -107,7 +119,29 @@ async def github_webhook(
         payload_entry.deployment_id = deployment.id
         await set_stage_status(db, deployment.id, "queued", "in_progress")
 
-        await enqueue_deployment(deployment.id)
+        supersede = await supersede_older_deployments(db, project, deployment)
+        await enqueue_deployment(deployment.id, db)
         await db.commit()
+        schedule_prefetch(project, branch)
+
+    for running_id in supersede.running:
+        await cancel_deployment_run(running_id)
+    for superseded_id in supersede.superseded:
+        await broadcast_deployment_event(
+            superseded_id, {"type": "status_update", "status": "superseded", "stage": "Cancelled"}
+        )
+    if supersede.superseded or supersede.running:
+        logger.info(
+            "Push to %s@%s superseded %d queued and %d running deployments (~%ds of build time saved)",
+            full_name,
+            branch,
+            len(supersede.superseded),
+            len(supersede.running),
+            supersede.seconds_saved,
+        )
 
-    return {"status": "queued", "deploymentId": str(deployment.id)}
+    return {
+        "status": "queued",
+        "deploymentId": str(deployment.id),
+        "superseded": [str(dep_id) for dep_id in supersede.superseded + supersede.running],
+    }
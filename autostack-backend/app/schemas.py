@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import Any, List, Optional
+from typing import Any, List, Literal, Optional
 
 from pydantic import BaseModel, ConfigDict, EmailStr, Field
 
@@ -127,6 +127,7 @@ class DeploymentCreateRequest(APIModel):
     auto_deploy_enabled: Optional[bool] = None
     auto_deploy_branch: Optional[str] = None
     runtime: Optional[str] = None
+    root_directory: Optional[str] = None
 
 
 class DeploymentItem(APIModel):
@@ -197,7 +198,11 @@ class DeploymentDetailResponse(APIModel):
     is_production: bool
     env_vars: Optional[str] = None
     stages: List[DeploymentStageModel]
+    # Only the last LOG_TAIL_LINES lines; use /logs/range?after=<logs_cursor> for more
     logs: List[str]
+    logs_cursor: int = 0
+    logs_total: int = 0
+    logs_truncated: bool = False
     failed_reason: Optional[str] = None
 
 
@@ -205,6 +210,23 @@ class DeploymentLogsResponse(APIModel):
     logs: List[str]
 
 
+class DeploymentLogLine(APIModel):
+    line: int
+    message: str
+    level: Optional[str] = None
+    timestamp: Optional[datetime] = None
+
+
+class DeploymentLogRangeResponse(APIModel):
+    lines: List[DeploymentLogLine]
+    first_line: Optional[int] = None
+    last_line: Optional[int] = None
+    next_cursor: int
+    prev_cursor: Optional[int] = None
+    total_lines: int
+    has_more: bool
+
+
 class DashboardStats(APIModel):
     total_deployments: int
     weekly_change: str
@@ -258,6 +280,10 @@ class MessageResponse(APIModel):
 class ProjectSettingsUpdate(APIModel):
     auto_deploy_enabled: Optional[bool] = None
     auto_deploy_branch: Optional[str] = None
+    supersede_policy: Optional[Literal["off", "queued", "running"]] = None
+    deploy_include_paths: Optional[list[str]] = None
+    deploy_exclude_paths: Optional[list[str]] = None
+    root_directory: Optional[str] = None
 
 
 class ProjectSummary(APIModel):
@@ -268,6 +294,10 @@ class ProjectSummary(APIModel):
     runtime: str
     auto_deploy_enabled: bool
     auto_deploy_branch: Optional[str] = None
+    supersede_policy: str = "queued"
+    deploy_include_paths: list[str] = Field(default_factory=list)
+    deploy_exclude_paths: list[str] = Field(default_factory=list)
+    root_directory: Optional[str] = None
 
 
 class ProjectAnalytics(APIModel):
@@ -277,6 +307,8 @@ class ProjectAnalytics(APIModel):
     last_5_durations: list[float]
     avg_build_time: Optional[float] = None
     uptime_last_24h: Optional[float] = None
+    superseded_count: int = 0
+    build_minutes_saved: float = 0.0
 
 
 class ProjectAnalyticsResponse(APIModel):
@@ -0,0 +1,79 @@
+"""Blue-green cutover for runtime containers.
+
+A replacement container is started next to the one serving traffic and only
+takes over once it has answered ``CUTOVER_HEALTHY_PROBES`` health probes in a
+row (:func:`app.services.container_runtime.wait_until_healthy`). The switch
+is a single commit: the gateway routes a deployment to its newest running
+container and a project to its live deployment. The replaced container keeps
+running for ``CUTOVER_DRAIN_SECONDS`` so in-flight requests finish, then it
+is stopped. A replacement that never becomes healthy is removed instead and
+the old container keeps serving.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import uuid
+from typing import Iterable
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import settings
+from ..db import AsyncSessionLocal
+from ..models import DeploymentContainer
+from .container_runtime import stop_container
+from .static_gateway import routing_table
+
+
+logger = logging.getLogger(__name__)
+
+# Containers that may still be serving, or be woken to serve, a deployment
+ACTIVE_CONTAINER_STATES = ("starting", "running", "hibernated")
+
+_retiring: set[asyncio.Task[None]] = set()
+
+
+async def active_containers(
+    session: AsyncSession, deployment_id: uuid.UUID, exclude: uuid.UUID | None = None
+) -> list[uuid.UUID]:
+    query = select(DeploymentContainer.id).where(
+        DeploymentContainer.deployment_id == deployment_id,
+        DeploymentContainer.status.in_(ACTIVE_CONTAINER_STATES),
+    )
+    if exclude is not None:
+        query = query.where(DeploymentContainer.id != exclude)
+    return list((await session.execute(query)).scalars().all())
+
+
+async def retire_containers(container_ids: Iterable[uuid.UUID], delay: float) -> None:
+    """Stop the given containers after ``delay`` seconds, unless something else already did."""
+    await asyncio.sleep(delay)
+    async with AsyncSessionLocal() as session:
+        for container_id in container_ids:
+            container = await session.get(DeploymentContainer, container_id)
+            if container is None or container.status not in ACTIVE_CONTAINER_STATES:
+                continue
+            await stop_container(session, container)
+        await session.commit()
+    # Gateways drop the stopped containers and their connection pools on their next reload
+    routing_table.invalidate()
+
+
+def schedule_retirement(container_ids: Iterable[uuid.UUID], delay: float | None = None) -> None:
+    """Drain and stop replaced containers in the background."""
+    container_ids = list(container_ids)
+    if not container_ids:
+        return
+    delay = settings.cutover_drain_seconds if delay is None else delay
+
+    async def runner() -> None:
+        try:
+            await retire_containers(container_ids, delay)
+        except Exception:  # pragma: no cover - hibernation stops leftovers eventually
+            logger.warning("Stopping replaced containers %s failed", container_ids, exc_info=True)
+
+    task = asyncio.create_task(runner())
+    _retiring.add(task)
+    task.add_done_callback(_retiring.discard)
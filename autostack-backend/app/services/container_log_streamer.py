@@ -1,84 +1,234 @@
-"""Background task to stream container logs to deployment logs in real-time."""
+"""Follow-mode ingestion of runtime container logs into the log store.
+
+One task per running container follows its Docker log stream (``follow``
+with ``timestamps``) and appends the lines to the deployment's ``runtime``
+log stream in batches of up to ``RUNTIME_LOG_BATCH_LINES``, written at least
+every ``RUNTIME_LOG_FLUSH_SECONDS``. Ingestion costs work per new line rather
+than per poll, and no line is lost to a fixed tail window.
+
+Where to resume is kept on the container row: ``log_cursor`` is the Docker
+timestamp of the newest ingested line and ``log_cursor_lines`` how many
+ingested lines carry exactly that timestamp (``since`` is inclusive). A batch
+is claimed by advancing the cursor with a compare-and-set before it is
+written, and handed back if writing fails, so when two API processes follow
+the same container only one of them ingests each line. A crash between the
+claim and the write loses at most that batch.
+
+Every ``RUNTIME_LOG_RESCAN_SECONDS`` followers are started for containers that
+came up (including woken ones) and stopped for those no longer running.
+"""
+
+from __future__ import annotations
+
 import asyncio
+import logging
+import re
 import uuid
-from datetime import datetime, timedelta
+from dataclasses import dataclass
+from datetime import datetime
 
-from sqlalchemy import select
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update
 
+from ..config import settings
 from ..db import AsyncSessionLocal
-from ..models import Deployment, DeploymentContainer, DeploymentLog
-from .container_runtime import get_container_logs, is_docker_available
+from ..models import Deployment, DeploymentContainer
+from .container_runtime import is_docker_available
+from .docker_api import DockerApiError, client as docker_client, unix_timestamp
+from .log_normalizer import strip_ansi
+from .log_store import LogEntry, append_log_lines
+from .versions import bump_log_version
 
 
+logger = logging.getLogger(__name__)
+
+MAX_LINE_CHARS = 2000
+# Level words near the start of a line; lines without one get the level of their stream
+LEVEL_RE = re.compile(r"\b(FATAL|CRITICAL|ERROR|WARN(?:ING)?|INFO|DEBUG)\b", re.IGNORECASE)
+LEVELS = {
+    "fatal": "error",
+    "critical": "error",
+    "error": "error",
+    "warn": "warning",
+    "warning": "warning",
+    "info": "info",
+    "debug": "debug",
+}
+
 _log_streamer_task: asyncio.Task | None = None
-_last_log_fetch: dict[uuid.UUID, datetime] = {}
+_followers: dict[uuid.UUID, asyncio.Task[None]] = {}
+
+
+@dataclass
+class LogCursor:
+    timestamp: str | None = None
+    lines: int = 0
+
+    def advance(self, timestamp: str) -> None:
+        if timestamp == self.timestamp:
+            self.lines += 1
+        else:
+            self.timestamp, self.lines = timestamp, 1
+
+
+def log_level(message: str, stream: str) -> str:
+    match = LEVEL_RE.search(message[:120])
+    if match:
+        return LEVELS[match.group(1).lower()]
+    return "error" if stream == "stderr" else "info"
+
+
+def parse_log_timestamp(timestamp: str) -> datetime:
+    stamp, _, fraction = timestamp.rstrip("Z").partition(".")
+    return datetime.strptime(stamp, "%Y-%m-%dT%H:%M:%S").replace(microsecond=int(fraction[:6].ljust(6, "0")))
+
+
+def to_log_entry(stream: str, line: str) -> tuple[str, LogEntry] | None:
+    """``(docker timestamp, store entry)`` for a line read with ``timestamps``."""
+    timestamp, _, message = line.partition(" ")
+    try:
+        at = parse_log_timestamp(timestamp)
+    except ValueError:
+        return None
+    if settings.log_strip_ansi:
+        message = strip_ansi(message)
+    return timestamp, (message[:MAX_LINE_CHARS], log_level(message, stream), at)
+
+
+async def _move_cursor(container_pk: uuid.UUID, current: LogCursor, target: LogCursor) -> bool:
+    """Compare-and-set the container's cursor from ``current`` to ``target``."""
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            update(DeploymentContainer)
+            .where(
+                DeploymentContainer.id == container_pk,
+                DeploymentContainer.log_cursor.is_(None)
+                if current.timestamp is None
+                else DeploymentContainer.log_cursor == current.timestamp,
+                DeploymentContainer.log_cursor_lines == current.lines,
+            )
+            .values(log_cursor=target.timestamp, log_cursor_lines=target.lines)
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+    return result.rowcount == 1
+
+
+async def _ingest(
+    container_pk: uuid.UUID,
+    deployment_id: uuid.UUID,
+    cursor: LogCursor,
+    batch: list[tuple[str, LogEntry]],
+) -> bool:
+    """Append ``batch`` and move the cursor past it; ``False`` if another process moved it first."""
+    advanced = LogCursor(cursor.timestamp, cursor.lines)
+    for timestamp, _entry in batch:
+        advanced.advance(timestamp)
+    if not await _move_cursor(container_pk, cursor, advanced):
+        return False
+    try:
+        await append_log_lines(deployment_id, [entry for _timestamp, entry in batch], stream="runtime")
+    except Exception:
+        await _move_cursor(container_pk, advanced, cursor)
+        raise
+    cursor.timestamp, cursor.lines = advanced.timestamp, advanced.lines
+    async with AsyncSessionLocal() as session:
+        await bump_log_version(session, deployment_id)
+        await session.commit()
+    return True
+
+
+async def follow_container_logs(container_pk: uuid.UUID) -> None:
+    """Ingest a running container's logs from its cursor until the container stops."""
+    async with AsyncSessionLocal() as session:
+        container = await session.get(DeploymentContainer, container_pk)
+        if container is None or container.status != "running":
+            return
+        deployment_id, docker_id = container.deployment_id, container.container_id
+        cursor = LogCursor(container.log_cursor, container.log_cursor_lines)
+
+    queue: asyncio.Queue[tuple[str, LogEntry] | None] = asyncio.Queue(maxsize=settings.runtime_log_batch_lines * 4)
+    resume = LogCursor(cursor.timestamp, cursor.lines)
+
+    async def read() -> None:
+        # Lines at the cursor timestamp come again, because ``since`` is inclusive
+        replayed = resume.lines
+        try:
+            since = unix_timestamp(resume.timestamp) if resume.timestamp else None
+            async for stream, line in docker_client.log_lines(docker_id, since=since, timestamps=True, follow=True):
+                item = to_log_entry(stream, line)
+                if item is None:
+                    continue
+                if resume.timestamp is not None:
+                    if item[0] < resume.timestamp:
+                        continue
+                    if item[0] == resume.timestamp and replayed:
+                        replayed -= 1
+                        continue
+                await queue.put(item)
+        except DockerApiError as exc:
+            logger.info("Following logs of container %s stopped: %s", docker_id, exc.message)
+        except Exception:
+            logger.warning("Reading logs of container %s failed", docker_id, exc_info=True)
+        # Not reached when cancelled, in which case nobody is waiting for the end
+        await queue.put(None)
+
+    loop = asyncio.get_running_loop()
+    reader = asyncio.create_task(read())
+    try:
+        finished = False
+        while not finished:
+            item = await queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = loop.time() + settings.runtime_log_flush_seconds
+            while len(batch) < settings.runtime_log_batch_lines:
+                try:
+                    item = await asyncio.wait_for(queue.get(), max(deadline - loop.time(), 0))
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    finished = True
+                    break
+                batch.append(item)
+            if not await _ingest(container_pk, deployment_id, cursor, batch):
+                logger.info("Logs of container %s are ingested by another process", docker_id)
+                return
+    except Exception:
+        # The next rescan resumes from the cursor, which only moved past written batches
+        logger.warning("Ingesting logs of container %s failed", docker_id, exc_info=True)
+    finally:
+        reader.cancel()
+
+
+async def sync_followers() -> None:
+    """Follow the logs of every running container, and only those."""
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(DeploymentContainer.id)
+            .join(Deployment, Deployment.id == DeploymentContainer.deployment_id)
+            .where(DeploymentContainer.status == "running", Deployment.is_deleted.is_(False))
+        )
+        running = set(result.scalars().all())
+    for container_pk, task in list(_followers.items()):
+        if container_pk not in running or task.done():
+            task.cancel()
+            _followers.pop(container_pk, None)
+    for container_pk in running - _followers.keys():
+        _followers[container_pk] = asyncio.create_task(follow_container_logs(container_pk))
 
 
 async def stream_container_logs_task() -> None:
-    """Background task that periodically fetches container logs for running deployments."""
+    """Background task that keeps one log follower per running container."""
     if not is_docker_available():
         return
-    
+
     while True:
         try:
-            await asyncio.sleep(10)  # Check every 10 seconds
-            
-            async with AsyncSessionLocal() as session:
-                # Find all running deployments with containers
-                result = await session.execute(
-                    select(Deployment, DeploymentContainer)
-                    .join(DeploymentContainer, Deployment.id == DeploymentContainer.deployment_id)
-                    .where(
-                        Deployment.status == "success",
-                        DeploymentContainer.status == "running",
-                    )
-                )
-                rows = result.all()
-                
-                for deployment, container in rows:
-                    # Skip if we fetched logs recently (within last 30 seconds)
-                    last_fetch = _last_log_fetch.get(deployment.id)
-                    if last_fetch and (datetime.utcnow() - last_fetch).total_seconds() < 30:
-                        continue
-                    
-                    try:
-                        # Fetch recent logs (last 20 lines)
-                        logs = await get_container_logs(session, deployment, container, tail=20)
-                        
-                        # Only append if there are new logs
-                        if logs:
-                            # Check if these logs are already in the database
-                            existing_logs_result = await session.execute(
-                                select(DeploymentLog)
-                                .where(DeploymentLog.deployment_id == deployment.id)
-                                .order_by(DeploymentLog.timestamp.desc())
-                                .limit(20)
-                            )
-                            existing_log_messages = {log.message for log in existing_logs_result.scalars().all()}
-                            
-                            # Add only new logs
-                            new_logs = [log for log in logs if f"[CONTAINER] {log}" not in existing_log_messages]
-                            if new_logs:
-                                for log_line in new_logs:
-                                    log_entry = DeploymentLog(
-                                        deployment_id=deployment.id,
-                                        message=f"[CONTAINER] {log_line}",
-                                        log_level="info",
-                                        timestamp=datetime.utcnow(),
-                                    )
-                                    session.add(log_entry)
-                                await session.commit()
-                        
-                        _last_log_fetch[deployment.id] = datetime.utcnow()
-                    
-                    except Exception:
-                        # Silently ignore errors for individual containers
-                        pass
-        
-        except Exception:
-            # Continue running even if there's an error
-            await asyncio.sleep(10)
+            await sync_followers()
+        except Exception:  # pragma: no cover - keep the loop alive
+            logger.warning("Updating container log followers failed", exc_info=True)
+        await asyncio.sleep(settings.runtime_log_rescan_seconds)
 
 
 def start_log_streamer() -> None:
@@ -94,3 +244,6 @@ def stop_log_streamer() -> None:
     if _log_streamer_task and not _log_streamer_task.done():
         _log_streamer_task.cancel()
         _log_streamer_task = None
+    for task in _followers.values():
+        task.cancel()
+    _followers.clear()
@@ -1,8 +1,11 @@
 from __future__ import annotations
 
 import asyncio
+import logging
+import os
+import re
+import secrets
 import shutil
-import socket
 from asyncio.subprocess import PIPE
 from datetime import datetime
 from pathlib import Path
@@ -13,38 +16,47 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..config import settings
+from ..db import AsyncSessionLocal
 from ..errors import ApiError
 from ..models import (
+    PORT_LEASE_STATES,
     Deployment,
     DeploymentContainer,
     DeploymentHealthCheck,
-    DeploymentRuntimeLog,
 )
+from .docker_api import DockerApiError, client as docker_client, daemon_reachable
+from .port_allocator import allocator as port_allocator, end_lease, lease_port, release_port
 
 
+logger = logging.getLogger(__name__)
+
 DOCKER_IMAGE = "nginx:alpine"
+# Moves with every successful Dockerfile build; the next build of the project uses it as cache
+LATEST_TAG = "latest"
+# Starting a container failed because something outside AutoStack holds the host port
+PORT_IN_USE_RE = re.compile(r"port is already allocated|address already in use", re.IGNORECASE)
+PORT_ATTEMPTS = 3
 
 
 def is_docker_available() -> bool:
     if not settings.docker_enable:
         return False
-    return shutil.which("docker") is not None
+    return daemon_reachable()
 
 
-def find_free_port(start: int, end: int) -> int:
-    for port in range(start, end + 1):
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            try:
-                sock.bind(("127.0.0.1", port))
-            except OSError:
-                continue
-            return port
-    raise RuntimeError(f"No free port found in range {start}-{end}")
+def _container_name(deployment: Deployment) -> str:
+    # Unique per container, so a replacement can start next to the one still serving
+    return f"autostack-{deployment.id}-{secrets.token_hex(3)}"
 
 
-async def _run_docker(args: Iterable[str], timeout: int = 60) -> Tuple[int, str, str]:
-    proc = await asyncio.create_subprocess_exec("docker", *args, stdout=PIPE, stderr=PIPE)
+async def _run_docker(
+    args: Iterable[str], timeout: int = 60, env: dict[str, str] | None = None
+) -> Tuple[int, str, str]:
+    """Run the docker CLI; only BuildKit builds need it, everything else uses :mod:`.docker_api`."""
+    try:
+        proc = await asyncio.create_subprocess_exec("docker", *args, stdout=PIPE, stderr=PIPE, env=env)
+    except FileNotFoundError:
+        return 127, "", "Docker CLI not available on host"
     try:
         stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=timeout)
     except asyncio.TimeoutError:
@@ -54,6 +66,48 @@ async def _run_docker(args: Iterable[str], timeout: int = 60) -> Tuple[int, str,
     return proc.returncode, stdout.decode(errors="ignore"), stderr.decode(errors="ignore")
 
 
+async def _run_on_leased_port(
+    session: AsyncSession,
+    container: DeploymentContainer,
+    name: str,
+    internal_port: int,
+    binds: list[str] | None = None,
+) -> None:
+    """Run ``container`` with ``internal_port`` published on a leased host port.
+
+    The lease is dropped again if that fails, and the :class:`DockerApiError` re-raised.
+    """
+    attempt = 0
+    while True:
+        attempt += 1
+        port = await lease_port(session, container)
+        try:
+            container.container_id = await docker_client.run_container(
+                name,
+                container.image,
+                ports={internal_port: port},
+                binds=binds,
+                timeout=settings.container_start_timeout,
+            )
+        except DockerApiError as exc:
+            # The container exists once created, even if binding the port failed
+            try:
+                await docker_client.remove_container(name)
+            except DockerApiError:
+                logger.debug("Could not remove container %s after a failed start", name)
+            port_in_use = bool(PORT_IN_USE_RE.search(exc.message))
+            if not port_in_use:
+                release_port(container)
+            await end_lease(session, container)
+            if not port_in_use or attempt == PORT_ATTEMPTS:
+                raise
+            # Held by something outside AutoStack; the port stays out of the free list
+            logger.info("Host port %s is already in use, trying another", port)
+            continue
+        await session.flush()
+        return
+
+
 async def start_container(
     session: AsyncSession,
     deployment: Deployment,
@@ -62,42 +116,135 @@ async def start_container(
     if not is_docker_available():
         raise ApiError("RUNTIME_UNAVAILABLE", "Docker runtime is disabled or not installed", 400)
 
-    port = find_free_port(settings.runtime_port_range_start, settings.runtime_port_range_end)
-    name = f"autostack-{deployment.id}"
-
-    cmd = [
-        "run",
-        "-d",
-        "--name",
-        name,
-        "-p",
-        f"{port}:80",
-        "-v",
-        f"{str(artifacts_dir)}:/usr/share/nginx/html:ro",
-        DOCKER_IMAGE,
-    ]
-
-    code, out, err = await _run_docker(cmd, timeout=settings.container_start_timeout)
-    if code != 0 or not out.strip():
-        message = (err or out or "unknown docker error").strip().splitlines()[0][:500]
-        raise ApiError("RUNTIME_ERROR", f"Failed to start Docker container: {message}", 500)
-
-    container_id = out.strip().splitlines()[0]
-
+    name = _container_name(deployment)
     container = DeploymentContainer(
         deployment_id=deployment.id,
-        container_id=container_id,
+        container_id="",
         image=DOCKER_IMAGE,
         host="localhost",
-        port=port,
         status="starting",
     )
-    session.add(container)
-    await session.flush()
+    # The daemon resolves bind mount sources itself, so they must be absolute
+    binds = [f"{artifacts_dir.resolve()}:/usr/share/nginx/html:ro"]
+    try:
+        await _run_on_leased_port(session, container, name, 80, binds)
+    except DockerApiError as exc:
+        message = (exc.message or "unknown docker error").strip().splitlines()[0][:500]
+        raise ApiError("RUNTIME_ERROR", f"Failed to start Docker container: {message}", 500)
 
     return container
 
 
+def project_image_repository(project_id) -> str:
+    """Image repository shared by all deployments of a project; each deployment is a tag."""
+    return f"autostack/{project_id}".lower()
+
+
+def _layer_cache_dir(project_id) -> Path | None:
+    if not settings.docker_build_cache_dir:
+        return None
+    # The docker CLI resolves relative paths against its own working directory
+    return Path(settings.docker_build_cache_dir).resolve() / str(project_id)
+
+
+_local_cache_supported = True
+
+
+def _docker_build_args(repository: str, tag: str, repo_dir: Path, cache_dir: Path | None) -> list[str]:
+    args = [
+        "build",
+        "-t",
+        f"{repository}:{tag}",
+        "-t",
+        f"{repository}:{LATEST_TAG}",
+        # Embed cache metadata in the image so the next build can use it with --cache-from
+        "--build-arg",
+        "BUILDKIT_INLINE_CACHE=1",
+        "--cache-from",
+        f"{repository}:{LATEST_TAG}",
+    ]
+    if settings.docker_buildx_builder:
+        args += ["--builder", settings.docker_buildx_builder, "--load"]
+    if cache_dir is not None:
+        if cache_dir.is_dir():
+            args += ["--cache-from", f"type=local,src={cache_dir}"]
+        # The local exporter never prunes, so write a fresh directory and swap it in afterwards
+        args += ["--cache-to", f"type=local,dest={cache_dir}.next,mode=max"]
+    args.append(str(repo_dir))
+    return args
+
+
+def _swap_layer_cache(cache_dir: Path) -> None:
+    fresh = cache_dir.with_name(f"{cache_dir.name}.next")
+    if not fresh.is_dir():
+        return
+    if cache_dir.exists():
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    os.replace(fresh, cache_dir)
+
+
+async def build_project_image(deployment: Deployment, repo_dir: Path) -> str:
+    """Build the repository Dockerfile with BuildKit, reusing layers of the project's previous image.
+
+    Returns the image reference ``autostack/<project>:<deployment>``.
+    """
+    global _local_cache_supported
+
+    repository = project_image_repository(deployment.project_id)
+    tag = str(deployment.id).lower()
+    cache_dir = _layer_cache_dir(deployment.project_id) if _local_cache_supported else None
+    env = {**os.environ, "DOCKER_BUILDKIT": "1"}
+
+    args = _docker_build_args(repository, tag, repo_dir, cache_dir)
+    code, out, err = await _run_docker(args, timeout=settings.container_start_timeout, env=env)
+    if code != 0 and cache_dir is not None and "cache export" in (err or out).lower():
+        # The default "docker" driver cannot export caches; keep the inline image cache only
+        logger.warning(
+            "Docker builder does not support local cache export; set DOCKER_BUILDX_BUILDER to a "
+            "docker-container builder to enable DOCKER_BUILD_CACHE_DIR"
+        )
+        _local_cache_supported = False
+        cache_dir = None
+        args = _docker_build_args(repository, tag, repo_dir, None)
+        code, out, err = await _run_docker(args, timeout=settings.container_start_timeout, env=env)
+    if code != 0:
+        message = (err or out or "docker build failed").strip()
+        raise ApiError("RUNTIME_ERROR", f"Failed to build Docker image from Dockerfile: {message}", 500)
+    if cache_dir is not None:
+        await asyncio.to_thread(_swap_layer_cache, cache_dir)
+    return f"{repository}:{tag}"
+
+
+async def prune_project_images(project_id, keep: int | None = None) -> list[str]:
+    """Remove all but the ``keep`` newest deployment images of a project; returns the removed tags.
+
+    Images are untagged without ``--force``, so one still used by a container stays on disk.
+    """
+    if not is_docker_available():
+        return []
+    keep = settings.docker_images_keep_per_project if keep is None else keep
+    repository = project_image_repository(project_id)
+    try:
+        images = await docker_client.list_images(repository)
+    except DockerApiError:
+        return []
+    tags: list[str] = []
+    for image in sorted(images, key=lambda image: image.get("Created", 0), reverse=True):
+        for ref in image.get("RepoTags") or []:
+            image_repository, _, tag = ref.rpartition(":")
+            if image_repository == repository and tag != LATEST_TAG:
+                tags.append(tag)
+    removed: list[str] = []
+    for tag in tags[keep:]:
+        try:
+            await docker_client.remove_image(f"{repository}:{tag}")
+        except DockerApiError as exc:
+            logger.debug("Could not remove image %s:%s: %s", repository, tag, exc.message)
+            continue
+        removed.append(tag)
+    return removed
+
+
 async def start_dockerfile_runtime(
     session: AsyncSession,
     deployment: Deployment,
@@ -115,57 +262,30 @@ async def start_dockerfile_runtime(
     if not is_docker_available():
         raise ApiError("RUNTIME_UNAVAILABLE", "Docker runtime is disabled or not installed", 400)
 
-    port = find_free_port(settings.runtime_port_range_start, settings.runtime_port_range_end)
-    name = f"autostack-{deployment.id}"
-    image = f"autostack-{deployment.id}".lower()
-
-    # Build image from the repository Dockerfile
-    build_args = [
-        "build",
-        "-t",
-        image,
-        str(repo_dir),
-    ]
-    code, out, err = await _run_docker(build_args, timeout=settings.container_start_timeout)
-    if code != 0:
-        message = (err or out or "docker build failed").strip()
-        raise ApiError("RUNTIME_ERROR", f"Failed to build Docker image from Dockerfile: {message}", 500)
+    name = _container_name(deployment)
+    image = await build_project_image(deployment, repo_dir)
 
     # Run container from the built image. Lambda-style base images expose
     # their runtime interface on port 8080 by default, while typical web
     # containers listen on port 80. lambda_mode controls which mapping we use.
     internal_port = 8080 if lambda_mode else 80
-    run_args = [
-        "run",
-        "-d",
-        "--name",
-        name,
-        "-p",
-        f"{port}:{internal_port}",
-        image,
-    ]
-
-    code, out, err = await _run_docker(run_args, timeout=settings.container_start_timeout)
-    if code != 0 or not out.strip():
-        message = (err or out or "unknown docker error").strip()
-        raise ApiError("RUNTIME_ERROR", f"Failed to start Dockerfile container: {message}", 500)
-
-    container_id = out.strip().splitlines()[0]
 
     container = DeploymentContainer(
         deployment_id=deployment.id,
-        container_id=container_id,
+        container_id="",
         image=image,
         host="localhost",
-        port=port,
         status="starting",
     )
-    session.add(container)
-    await session.flush()
+    try:
+        await _run_on_leased_port(session, container, name, internal_port)
+    except DockerApiError as exc:
+        message = (exc.message or "unknown docker error").strip()
+        raise ApiError("RUNTIME_ERROR", f"Failed to start Dockerfile container: {message}", 500)
 
     # For generic web containers, perform an HTTP health check on the root
     # URL. For Lambda-style images, we cannot rely on an HTTP 2xx status at
-    # "/", so we skip the check and treat a successful docker run as
+    # "/", so we skip the check and treat a successful container start as
     # "running".
     if lambda_mode:
         container.status = "running"
@@ -173,8 +293,9 @@ async def start_dockerfile_runtime(
         return container
 
     url = f"http://{container.host}:{container.port}/"
+    healthy = await wait_until_healthy(url)
     hc = await record_health_check(session, deployment, url)
-    container.status = "running" if hc.is_live else "failed"
+    container.status = "running" if healthy and hc.is_live else "failed"
     await session.flush()
 
     return container
@@ -185,13 +306,93 @@ async def stop_container(session: AsyncSession, container: DeploymentContainer)
         container.status = "stopped"
         container.stopped_at = datetime.utcnow()
         await session.flush()
+        release_port(container)
         return
 
-    code, _out, _err = await _run_docker(["rm", "-f", container.container_id], timeout=30)
-    now = datetime.utcnow()
-    container.stopped_at = now
-    container.status = "stopped" if code == 0 else "failed"
+    try:
+        await docker_client.remove_container(container.container_id)
+        status = "stopped"
+    except DockerApiError as exc:
+        logger.warning("Could not remove container %s: %s", container.container_id, exc.message)
+        status = "failed"
+    container.stopped_at = datetime.utcnow()
+    container.status = status
+    await session.flush()
+    release_port(container)
+
+
+async def suspend_container(session: AsyncSession, container: DeploymentContainer) -> bool:
+    """Stop ``container`` but keep it, so :func:`resume_container` can start it again."""
+    try:
+        await docker_client.stop_container(container.container_id)
+    except DockerApiError as exc:
+        logger.warning("Could not stop container %s: %s", container.container_id, exc.message)
+        return False
+    container.status = "hibernated"
+    container.stopped_at = datetime.utcnow()
     await session.flush()
+    return True
+
+
+async def resume_container(container: DeploymentContainer) -> bool:
+    try:
+        await docker_client.start_container(container.container_id, timeout=settings.container_start_timeout)
+    except DockerApiError as exc:
+        logger.warning("Could not start container %s: %s", container.container_id, exc.message)
+        return False
+    return True
+
+
+def memory_usage_bytes(stats: dict) -> int | None:
+    """Memory in use according to a stats sample, without the page cache, as ``docker stats`` shows it."""
+    memory = stats.get("memory_stats") or {}
+    usage = memory.get("usage")
+    if usage is None:
+        return None
+    details = memory.get("stats") or {}
+    # cgroup v2 reports inactive_file, v1 total_inactive_file
+    cache = details.get("inactive_file", details.get("total_inactive_file", 0))
+    return max(usage - cache, 0)
+
+
+async def container_memory_bytes(container_id: str) -> int | None:
+    try:
+        stats = await docker_client.stats(container_id)
+    except DockerApiError:
+        return None
+    return memory_usage_bytes(stats)
+
+
+async def reconcile_port_leases() -> None:
+    """Match port leases with the containers Docker actually has, then load the port allocator.
+
+    Runs at startup. Leases whose container no longer exists end (it was
+    removed while the API was down, or the process died between leasing and
+    starting the container), and ports published by containers AutoStack does not
+    track stay out of the free list.
+    """
+    published: list[int] = []
+    if is_docker_available():
+        try:
+            listed = await docker_client.list_containers(all=True)
+        except DockerApiError as exc:
+            logger.warning("Could not list Docker containers to reconcile port leases: %s", exc.message)
+        else:
+            existing = {entry["Id"] for entry in listed}
+            for entry in listed:
+                published.extend(port["PublicPort"] for port in entry.get("Ports") or [] if port.get("PublicPort"))
+            async with AsyncSessionLocal() as session:
+                result = await session.execute(
+                    select(DeploymentContainer).where(DeploymentContainer.status.in_(PORT_LEASE_STATES))
+                )
+                stale = [c for c in result.scalars().all() if c.container_id not in existing]
+                for container in stale:
+                    container.status = "stopped"
+                    container.stopped_at = datetime.utcnow()
+                await session.commit()
+            if stale:
+                logger.info("Released %d port lease(s) of containers that no longer exist", len(stale))
+    await port_allocator.load(published)
 
 
 async def get_container_logs(
@@ -203,24 +404,13 @@ async def get_container_logs(
     if not is_docker_available():
         raise ApiError("RUNTIME_UNAVAILABLE", "Docker runtime is disabled or not installed", 400)
 
-    code, out, err = await _run_docker(["logs", f"--tail={tail}", container.container_id], timeout=30)
-    if code != 0:
-        message = (err or out or "failed to read docker logs").strip().splitlines()[0][:500]
+    try:
+        lines = [line for line in await docker_client.logs(container.container_id, tail=tail) if line]
+    except DockerApiError as exc:
+        message = (exc.message or "failed to read docker logs").strip().splitlines()[0][:500]
         raise ApiError("RUNTIME_ERROR", f"Failed to read Docker logs: {message}", 500)
 
-    lines = [line for line in out.splitlines() if line]
-    now = datetime.utcnow()
-    for line in lines:
-        session.add(
-            DeploymentRuntimeLog(
-                deployment_id=deployment.id,
-                source="docker",
-                log_level=None,
-                message=line[:2000],
-                timestamp=now,
-            )
-        )
-    await session.flush()
+    # Read only: the log streamer is what ingests runtime logs into the store
     return lines
 
 
@@ -229,10 +419,38 @@ async def latest_container(session: AsyncSession, deployment_id) -> DeploymentCo
         select(DeploymentContainer)
         .where(DeploymentContainer.deployment_id == deployment_id)
         .order_by(DeploymentContainer.created_at.desc())
+        .limit(1)
     )
     return result.scalar_one_or_none()
 
 
+async def wait_until_healthy(
+    url: str,
+    probes: int | None = None,
+    timeout: float | None = None,
+    interval: float | None = None,
+) -> bool:
+    """Probe ``url`` until it answers 2xx/3xx ``probes`` times in a row, or give up after ``timeout``."""
+    probes = settings.cutover_healthy_probes if probes is None else probes
+    timeout = settings.cutover_timeout_seconds if timeout is None else timeout
+    interval = settings.cutover_probe_interval_seconds if interval is None else interval
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    consecutive = 0
+    async with httpx.AsyncClient(timeout=max(interval, 2.0)) as client:
+        while True:
+            try:
+                resp = await client.get(url)
+                consecutive = consecutive + 1 if 200 <= resp.status_code < 400 else 0
+            except httpx.HTTPError:
+                consecutive = 0
+            if consecutive >= probes:
+                return True
+            if loop.time() + interval > deadline:
+                return False
+            await asyncio.sleep(interval)
+
+
 async def record_health_check(
     session: AsyncSession,
     deployment: Deployment,
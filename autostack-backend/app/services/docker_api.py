@@ -0,0 +1,371 @@
+"""Async client for the Docker Engine API.
+
+Containers, logs, stats and images are managed by talking HTTP to the daemon
+at ``DOCKER_HOST`` (the ``/var/run/docker.sock`` Unix socket by default)
+through one pool of keep-alive connections per process, instead of spawning a
+``docker`` CLI process for every call. Only the endpoints AutoStack uses are
+covered; a failed call raises :class:`DockerApiError` with the daemon's
+message.
+
+Dockerfile deployments are still built with the CLI
+(:func:`app.services.container_runtime.build_project_image`): BuildKit's
+builder selection and local cache export are not part of the Engine API.
+"""
+
+from __future__ import annotations
+
+import calendar
+import json
+import os
+import struct
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Iterable
+
+import httpx
+
+from ..config import settings
+
+
+# Idle connections kept open to the daemon; follow-mode log streams hold one each on top
+KEEPALIVE_CONNECTIONS = 10
+DEFAULT_TIMEOUT = 60.0
+MULTIPLEXED_STREAM = "application/vnd.docker.multiplexed-stream"
+# Header of each frame of a multiplexed stream: stream id, 3 padding bytes, big-endian payload size
+STREAM_HEADER = struct.Struct(">BxxxL")
+STREAM_NAMES = {0: "stdin", 1: "stdout", 2: "stderr"}
+
+
+class DockerApiError(Exception):
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def parse_docker_host(value: str) -> tuple[str | None, str]:
+    """Unix socket path (or ``None``) and base URL for a ``DOCKER_HOST`` value."""
+    if value.startswith("unix://"):
+        return value[len("unix://"):], "http://docker"
+    if value.startswith("tcp://"):
+        return None, "http://" + value[len("tcp://"):]
+    if value.startswith(("http://", "https://")):
+        return None, value
+    raise ValueError(f"Unsupported DOCKER_HOST: {value}")
+
+
+def daemon_reachable() -> bool:
+    """Whether the daemon's socket exists; TCP endpoints are assumed to be up."""
+    try:
+        uds, _ = parse_docker_host(settings.docker_host)
+    except ValueError:
+        return False
+    return uds is None or os.path.exists(uds)
+
+
+def split_image_reference(reference: str) -> tuple[str, str | None]:
+    """``("nginx", "alpine")`` for ``nginx:alpine``; registry ports and digests are left alone."""
+    if "@" in reference:
+        return reference, None
+    repository, _, tag = reference.rpartition(":")
+    if not repository or "/" in tag:
+        return reference, "latest"
+    return repository, tag
+
+
+def unix_timestamp(timestamp: str) -> str:
+    """``<seconds>.<nanoseconds>``, as ``since`` expects, for a log timestamp such as
+    ``2024-01-02T03:04:05.123456789Z``."""
+    stamp, _, fraction = timestamp.rstrip("Z").partition(".")
+    seconds = calendar.timegm(time.strptime(stamp, "%Y-%m-%dT%H:%M:%S"))
+    return f"{seconds}.{fraction.ljust(9, '0')[:9]}"
+
+
+def _error_message(response: httpx.Response) -> str:
+    try:
+        return str(response.json().get("message") or response.text)
+    except ValueError:
+        return response.text or f"HTTP {response.status_code}"
+
+
+async def _demux(response: httpx.Response) -> AsyncIterator[tuple[str, bytes]]:
+    """Split a log stream into ``(stream, data)`` frames.
+
+    Containers without a TTY send multiplexed frames; older daemons do not say
+    so in the content type, so the first header is sniffed instead.
+    """
+    multiplexed: bool | None = True if response.headers.get("content-type") == MULTIPLEXED_STREAM else None
+    buffer = b""
+    async for chunk in response.aiter_bytes():
+        if multiplexed is False:
+            yield "stdout", chunk
+            continue
+        buffer += chunk
+        if multiplexed is None:
+            if len(buffer) < STREAM_HEADER.size:
+                continue
+            multiplexed = buffer[0] in STREAM_NAMES and buffer[1:4] == b"\0\0\0"
+            if not multiplexed:
+                yield "stdout", buffer
+                buffer = b""
+                continue
+        offset = 0
+        while len(buffer) - offset >= STREAM_HEADER.size:
+            stream, size = STREAM_HEADER.unpack_from(buffer, offset)
+            end = offset + STREAM_HEADER.size + size
+            if len(buffer) < end:
+                break
+            yield STREAM_NAMES.get(stream, "stdout"), buffer[offset + STREAM_HEADER.size : end]
+            offset = end
+        buffer = buffer[offset:]
+    if buffer and not multiplexed:
+        yield "stdout", buffer
+
+
+async def _json_messages(response: httpx.Response) -> AsyncIterator[dict[str, Any]]:
+    """Progress messages of a pull or build; an error message raises :class:`DockerApiError`."""
+    async for line in response.aiter_lines():
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            message = json.loads(line)
+        except ValueError:
+            continue
+        if message.get("error") or message.get("errorDetail"):
+            detail = (message.get("errorDetail") or {}).get("message") or message.get("error")
+            raise DockerApiError(500, str(detail))
+        yield message
+
+
+class DockerClient:
+    def __init__(self, host: str | None = None) -> None:
+        self.host = host
+        self._http: httpx.AsyncClient | None = None
+
+    def _client(self) -> httpx.AsyncClient:
+        if self._http is None:
+            uds, base_url = parse_docker_host(self.host or settings.docker_host)
+            transport = httpx.AsyncHTTPTransport(
+                uds=uds,
+                limits=httpx.Limits(max_connections=None, max_keepalive_connections=KEEPALIVE_CONNECTIONS),
+            )
+            self._http = httpx.AsyncClient(transport=transport, base_url=base_url, timeout=DEFAULT_TIMEOUT)
+        return self._http
+
+    async def aclose(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    async def _request(
+        self,
+        method: str,
+        path: str,
+        *,
+        allow: Iterable[int] = (),
+        timeout: float | None = DEFAULT_TIMEOUT,
+        **kwargs: Any,
+    ) -> httpx.Response:
+        try:
+            response = await self._client().request(method, path, timeout=timeout, **kwargs)
+        except httpx.HTTPError as exc:
+            raise DockerApiError(0, f"Docker daemon is not reachable: {exc}") from exc
+        if response.status_code >= 400 and response.status_code not in allow:
+            raise DockerApiError(response.status_code, _error_message(response))
+        return response
+
+    @asynccontextmanager
+    async def _stream(
+        self, method: str, path: str, *, timeout: float | None = DEFAULT_TIMEOUT, **kwargs: Any
+    ) -> AsyncIterator[httpx.Response]:
+        client = self._client()
+        try:
+            response = await client.send(client.build_request(method, path, timeout=timeout, **kwargs), stream=True)
+        except httpx.HTTPError as exc:
+            raise DockerApiError(0, f"Docker daemon is not reachable: {exc}") from exc
+        try:
+            if response.status_code >= 400:
+                await response.aread()
+                raise DockerApiError(response.status_code, _error_message(response))
+            yield response
+        except httpx.HTTPError as exc:
+            raise DockerApiError(0, f"Docker stream broke off: {exc}") from exc
+        finally:
+            await response.aclose()
+
+    async def ping(self) -> bool:
+        try:
+            await self._request("GET", "/_ping", timeout=5.0)
+        except DockerApiError:
+            return False
+        return True
+
+    # Containers
+
+    async def create_container(
+        self,
+        name: str,
+        image: str,
+        *,
+        ports: dict[int, int] | None = None,
+        binds: list[str] | None = None,
+    ) -> str:
+        """Create a container publishing container port -> host port ``ports``; returns its id."""
+        ports = ports or {}
+        body = {
+            "Image": image,
+            "ExposedPorts": {f"{private}/tcp": {} for private in ports},
+            "HostConfig": {
+                "PortBindings": {f"{private}/tcp": [{"HostPort": str(public)}] for private, public in ports.items()},
+                "Binds": binds or None,
+            },
+        }
+        response = await self._request("POST", "/containers/create", params={"name": name}, json=body)
+        return response.json()["Id"]
+
+    async def run_container(
+        self,
+        name: str,
+        image: str,
+        *,
+        ports: dict[int, int] | None = None,
+        binds: list[str] | None = None,
+        timeout: float | None = None,
+    ) -> str:
+        """Create and start a container like ``docker run -d``, pulling ``image`` if it is missing."""
+        try:
+            container_id = await self.create_container(name, image, ports=ports, binds=binds)
+        except DockerApiError as exc:
+            if exc.status != 404:
+                raise
+            await self.pull_image(image, timeout=timeout)
+            container_id = await self.create_container(name, image, ports=ports, binds=binds)
+        await self.start_container(container_id, timeout=timeout)
+        return container_id
+
+    async def start_container(self, container_id: str, *, timeout: float | None = None) -> None:
+        # 304: already running
+        await self._request("POST", f"/containers/{container_id}/start", timeout=timeout or DEFAULT_TIMEOUT)
+
+    async def stop_container(self, container_id: str, *, grace_seconds: int = 10) -> None:
+        await self._request(
+            "POST",
+            f"/containers/{container_id}/stop",
+            params={"t": str(grace_seconds)},
+            timeout=grace_seconds + DEFAULT_TIMEOUT,
+        )
+
+    async def remove_container(self, container_id: str, *, force: bool = True) -> bool:
+        """Remove a container like ``docker rm -f``; ``False`` if it did not exist."""
+        response = await self._request(
+            "DELETE", f"/containers/{container_id}", params={"force": "1" if force else "0"}, allow=(404,)
+        )
+        return response.status_code != 404
+
+    async def list_containers(self, *, all: bool = True) -> list[dict[str, Any]]:
+        response = await self._request("GET", "/containers/json", params={"all": "1" if all else "0"})
+        return response.json()
+
+    async def inspect_container(self, container_id: str) -> dict[str, Any]:
+        response = await self._request("GET", f"/containers/{container_id}/json")
+        return response.json()
+
+    async def stats(self, container_id: str) -> dict[str, Any]:
+        """One stats sample, as ``docker stats --no-stream`` shows it."""
+        response = await self._request("GET", f"/containers/{container_id}/stats", params={"stream": "0"})
+        return response.json()
+
+    async def log_lines(
+        self,
+        container_id: str,
+        *,
+        tail: int | None = None,
+        since: float | str | None = None,
+        timestamps: bool = False,
+        follow: bool = False,
+    ) -> AsyncIterator[tuple[str, str]]:
+        """``(stream, line)`` for each stdout/stderr line of a container.
+
+        ``since`` is a Unix timestamp, as a float or as Docker's
+        ``<seconds>.<nanoseconds>`` string. With ``follow`` the iterator keeps
+        yielding until the container stops or the caller stops iterating.
+        """
+        params = {
+            "stdout": "1",
+            "stderr": "1",
+            "timestamps": "1" if timestamps else "0",
+            "follow": "1" if follow else "0",
+        }
+        if tail is not None:
+            params["tail"] = str(tail)
+        if since is not None:
+            params["since"] = since if isinstance(since, str) else f"{since:.9f}"
+        async with self._stream(
+            "GET", f"/containers/{container_id}/logs", params=params, timeout=None if follow else DEFAULT_TIMEOUT
+        ) as response:
+            pending: dict[str, bytes] = {}
+            async for stream, data in _demux(response):
+                *lines, pending[stream] = (pending.get(stream, b"") + data).split(b"\n")
+                for line in lines:
+                    yield stream, line.decode(errors="replace").rstrip("\r")
+            for stream, rest in pending.items():
+                if rest:
+                    yield stream, rest.decode(errors="replace").rstrip("\r")
+
+    async def logs(self, container_id: str, *, tail: int | None = None) -> list[str]:
+        return [line async for _stream, line in self.log_lines(container_id, tail=tail)]
+
+    # Images
+
+    async def image_exists(self, reference: str) -> bool:
+        response = await self._request("GET", f"/images/{reference}/json", allow=(404,))
+        return response.status_code != 404
+
+    async def pull_image(self, reference: str, *, timeout: float | None = None) -> None:
+        repository, tag = split_image_reference(reference)
+        params = {"fromImage": repository}
+        if tag:
+            params["tag"] = tag
+        async with self._stream("POST", "/images/create", params=params, timeout=timeout) as response:
+            async for _message in _json_messages(response):
+                pass
+
+    async def list_images(self, reference: str | None = None) -> list[dict[str, Any]]:
+        params = {"filters": json.dumps({"reference": [reference]})} if reference else None
+        response = await self._request("GET", "/images/json", params=params)
+        return response.json()
+
+    async def remove_image(self, reference: str) -> None:
+        """Untag or remove an image without ``force``; one still used by a container conflicts (409)."""
+        await self._request("DELETE", f"/images/{reference}")
+
+    async def build(
+        self,
+        context: bytes,
+        tag: str,
+        *,
+        dockerfile: str | None = None,
+        timeout: float | None = None,
+    ) -> AsyncIterator[str]:
+        """Build an image from a tar ``context`` with the classic builder, yielding its output lines."""
+        params = {"t": tag, "rm": "1"}
+        if dockerfile:
+            params["dockerfile"] = dockerfile
+        async with self._stream(
+            "POST",
+            "/build",
+            params=params,
+            content=context,
+            headers={"Content-Type": "application/x-tar"},
+            timeout=timeout,
+        ) as response:
+            async for message in _json_messages(response):
+                text = message.get("stream") or message.get("status")
+                if text:
+                    for line in str(text).splitlines():
+                        if line.strip():
+                            yield line
+
+
+client = DockerClient()
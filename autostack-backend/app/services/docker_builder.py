@@ -1,39 +1,43 @@
 from __future__ import annotations
 
-import shutil
-import subprocess
+import asyncio
+import io
+import tarfile
 import uuid
 from pathlib import Path
 
+from .docker_api import DockerApiError, client as docker_client
 
-def build_static_site_image(artifacts_dir: Path, deployment_id: uuid.UUID) -> str:
-    """Build a simple nginx-based Docker image serving the deployment artifacts."""
-    if shutil.which("docker") is None:
-        raise RuntimeError("Docker CLI not available on host")
 
-    image_tag = f"autostack-deployment-{deployment_id}".lower()
-    dockerfile_path = artifacts_dir / ".autostack.Dockerfile"
-    dockerfile_path.write_text(
-        "\n".join(
-            [
-                "FROM nginx:alpine",
-                "COPY . /usr/share/nginx/html",
-            ]
-        )
-    )
+DOCKERFILE_NAME = ".autostack.Dockerfile"
+DOCKERFILE = "\n".join(
+    [
+        "FROM nginx:alpine",
+        "COPY . /usr/share/nginx/html",
+    ]
+)
+
+
+def _build_context(artifacts_dir: Path) -> bytes:
+    """Tar the artifacts with the generated Dockerfile, without writing it into the artifacts."""
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as tar:
+        tar.add(artifacts_dir, arcname=".")
+        dockerfile = DOCKERFILE.encode()
+        info = tarfile.TarInfo(DOCKERFILE_NAME)
+        info.size = len(dockerfile)
+        tar.addfile(info, io.BytesIO(dockerfile))
+    return buffer.getvalue()
 
+
+async def build_static_site_image(artifacts_dir: Path, deployment_id: uuid.UUID) -> str:
+    """Build a simple nginx-based Docker image serving the deployment artifacts."""
+    image_tag = f"autostack-deployment-{deployment_id}".lower()
+    context = await asyncio.to_thread(_build_context, artifacts_dir)
     try:
-        subprocess.run(
-            ["docker", "build", "-t", image_tag, "-f", str(dockerfile_path), str(artifacts_dir)],
-            check=True,
-            capture_output=True,
-        )
-    except subprocess.CalledProcessError as exc:  # pragma: no cover - runtime dependent
-        stdout = exc.stdout.decode(errors="ignore") if exc.stdout else ""
-        stderr = exc.stderr.decode(errors="ignore") if exc.stderr else ""
-        raise RuntimeError(stderr or stdout or "docker build failed") from exc
-    finally:
-        if dockerfile_path.exists():
-            dockerfile_path.unlink()
+        async for _line in docker_client.build(context, image_tag, dockerfile=DOCKERFILE_NAME):
+            pass
+    except DockerApiError as exc:  # pragma: no cover - runtime dependent
+        raise RuntimeError(exc.message or "docker build failed") from exc
 
     return image_tag
@@ -0,0 +1,225 @@
+"""Scale-to-zero for idle runtime containers.
+
+Every ``HIBERNATE_CHECK_SECONDS`` the API process records when the gateway
+last proxied a request to each deployment (``DeploymentContainer.last_request_at``)
+and stops, with ``docker stop``, running containers that have not served a
+request for ``HIBERNATE_IDLE_MINUTES``. The container is kept, so waking it is
+a ``docker start`` rather than a new build or pull: the gateway holds the
+first request for a hibernated container until it answers HTTP again, then
+proxies it as usual.
+
+Only containers reached through the gateway are hibernated; anything else
+would have no way of being woken.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any
+
+import httpx
+from sqlalchemy import func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import settings
+from ..db import AsyncSessionLocal
+from ..models import Deployment, DeploymentContainer
+from .container_runtime import (
+    container_memory_bytes,
+    is_docker_available,
+    resume_container,
+    suspend_container,
+)
+from .reverse_proxy import metrics as proxy_metrics
+from .static_gateway import routing_table
+
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the cold-start histogram, in milliseconds
+COLD_START_BUCKETS_MS = (250, 500, 1000, 2000, 5000, 10000, 30000, float("inf"))
+
+
+@dataclass
+class HibernationStats:
+    hibernated: int = 0
+    woken: int = 0
+    wake_failures: int = 0
+    memory_reclaimed_bytes: int = 0
+    cold_start_total_ms: float = 0.0
+    cold_start_buckets: list[int] = field(default_factory=lambda: [0] * len(COLD_START_BUCKETS_MS))
+
+    def observe_cold_start(self, latency_ms: float) -> None:
+        self.woken += 1
+        self.cold_start_total_ms += latency_ms
+        for index, bound in enumerate(COLD_START_BUCKETS_MS):
+            if latency_ms <= bound:
+                self.cold_start_buckets[index] += 1
+                break
+
+    def percentile(self, fraction: float) -> float | None:
+        if not self.woken:
+            return None
+        seen = 0
+        for bound, count in zip(COLD_START_BUCKETS_MS, self.cold_start_buckets):
+            seen += count
+            if seen >= fraction * self.woken:
+                return bound
+        return None
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "hibernated": self.hibernated,
+            "woken": self.woken,
+            "wake_failures": self.wake_failures,
+            "memory_reclaimed_bytes": self.memory_reclaimed_bytes,
+            "cold_start_avg_ms": round(self.cold_start_total_ms / self.woken, 1) if self.woken else None,
+            "cold_start_p50_ms": self.percentile(0.5),
+            "cold_start_p95_ms": self.percentile(0.95),
+            "cold_start_histogram": [
+                {"le_ms": None if bound == float("inf") else bound, "count": count}
+                for bound, count in zip(COLD_START_BUCKETS_MS, self.cold_start_buckets)
+            ],
+        }
+
+
+stats = HibernationStats()
+_waking: dict[uuid.UUID, asyncio.Task[bool]] = {}
+# Requests proxied before this time are already in the database
+_activity_flushed_at = 0.0
+
+
+def hibernation_enabled() -> bool:
+    return settings.hibernate_idle_minutes > 0 and settings.static_gateway_enable and is_docker_available()
+
+
+async def record_request_activity(session: AsyncSession) -> None:
+    """Persist when this process last proxied a request to each deployment.
+
+    Only deployments that served a request since the previous flush are written.
+    """
+    global _activity_flushed_at
+    flushed_at, started = _activity_flushed_at, time.time()
+    for deployment_id, timestamp in proxy_metrics.last_requests().items():
+        if timestamp < flushed_at:
+            continue
+        seen_at = datetime.utcfromtimestamp(timestamp)
+        await session.execute(
+            update(DeploymentContainer)
+            .where(
+                DeploymentContainer.deployment_id == deployment_id,
+                DeploymentContainer.status == "running",
+                or_(DeploymentContainer.last_request_at.is_(None), DeploymentContainer.last_request_at < seen_at),
+            )
+            .values(last_request_at=seen_at)
+        )
+    _activity_flushed_at = started
+
+
+async def hibernate_container(session: AsyncSession, container: DeploymentContainer) -> bool:
+    memory = await container_memory_bytes(container.container_id)
+    if not await suspend_container(session, container):
+        return False
+    stats.hibernated += 1
+    stats.memory_reclaimed_bytes += memory or 0
+    logger.info("Hibernated idle container %s of deployment %s", container.container_id, container.deployment_id)
+    return True
+
+
+async def hibernate_idle_containers() -> int:
+    """Stop running containers that have been idle for ``HIBERNATE_IDLE_MINUTES``; returns how many."""
+    cutoff = datetime.utcnow() - timedelta(minutes=settings.hibernate_idle_minutes)
+    hibernated = 0
+    async with AsyncSessionLocal() as session:
+        await record_request_activity(session)
+        result = await session.execute(
+            select(DeploymentContainer)
+            .join(Deployment, DeploymentContainer.deployment_id == Deployment.id)
+            .where(
+                DeploymentContainer.status == "running",
+                Deployment.is_deleted.is_(False),
+                func.coalesce(DeploymentContainer.last_request_at, DeploymentContainer.created_at) < cutoff,
+            )
+        )
+        for container in result.scalars().all():
+            if await hibernate_container(session, container):
+                hibernated += 1
+        await session.commit()
+    if hibernated:
+        routing_table.invalidate()
+    return hibernated
+
+
+async def wait_until_ready(url: str, timeout: float) -> bool:
+    """Poll ``url`` until the container answers; any response below 500 counts as up."""
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(timeout=2.0) as client:
+        while time.monotonic() < deadline:
+            try:
+                response = await client.get(url)
+                if response.status_code < 500:
+                    return True
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    return False
+
+
+async def _wake(container_id: uuid.UUID) -> bool:
+    started = time.perf_counter()
+    async with AsyncSessionLocal() as session:
+        container = await session.get(DeploymentContainer, container_id)
+        if container is None:
+            return False
+        if container.status == "running":
+            # Woken by another process in the meantime
+            routing_table.invalidate()
+            return True
+        if container.status != "hibernated":
+            return False
+        url = f"http://{container.host}:{container.port}/"
+        if not await resume_container(container) or not await wait_until_ready(
+            url, settings.hibernate_wake_timeout_seconds
+        ):
+            stats.wake_failures += 1
+            logger.warning("Waking container %s failed", container.container_id)
+            return False
+        container.status = "running"
+        container.stopped_at = None
+        container.last_request_at = datetime.utcnow()
+        await session.commit()
+    stats.observe_cold_start((time.perf_counter() - started) * 1000)
+    routing_table.invalidate()
+    return True
+
+
+async def wake_container(container_id: uuid.UUID) -> bool:
+    """Start a hibernated container and wait until it serves requests.
+
+    Concurrent requests for the same container share a single wake-up.
+    """
+    task = _waking.get(container_id)
+    if task is None:
+        task = _waking[container_id] = asyncio.create_task(_wake(container_id))
+        task.add_done_callback(lambda _task: _waking.pop(container_id, None))
+    # A client giving up must not cancel the wake-up other requests wait on
+    return await asyncio.shield(task)
+
+
+async def run_hibernation_loop() -> None:
+    while True:
+        await asyncio.sleep(settings.hibernate_check_seconds)
+        try:
+            await hibernate_idle_containers()
+        except Exception:  # pragma: no cover - keep the loop alive
+            logger.warning("Hibernating idle containers failed", exc_info=True)
+
+
+def start_hibernation_loop() -> None:
+    if hibernation_enabled():
+        asyncio.create_task(run_hibernation_loop())
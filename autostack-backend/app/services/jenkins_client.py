@@ -7,15 +7,12 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
 from ..config import settings
-from ..db import AsyncSessionLocal
-from ..models import DeploymentLog, Deployment, Project
+from ..models import Deployment, Project
+from .log_store import append_log_lines
 
 
 async def _log(deployment_id: uuid.UUID, message: str, level: str = "info") -> None:
-    async with AsyncSessionLocal() as session:
-        log = DeploymentLog(deployment_id=deployment_id, message=message, log_level=level)
-        session.add(log)
-        await session.commit()
+    await append_log_lines(deployment_id, [(message, level)])
 
 
 async def trigger_jenkins_build(deployment: Deployment, project: Project | None) -> None:
@@ -0,0 +1,254 @@
+"""Durable build queue backed by the ``build_jobs`` table.
+
+The API only inserts jobs; build workers (embedded in the API process or
+started with ``python -m app.worker``) claim them under a lease that they keep
+renewing while the build runs. A worker that dies stops renewing, its lease
+expires and :func:`requeue_expired_jobs` hands the job to another worker, so a
+restart no longer strands deployments in ``queued``.
+
+Claiming is a single ``UPDATE ... WHERE id = (SELECT ...)``. On Postgres the
+sub-select uses ``FOR UPDATE SKIP LOCKED`` so concurrent workers never wait on
+each other; SQLite serializes writers, which makes the same statement atomic.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, event, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session as OrmSession
+
+from ..config import settings
+from ..db import AsyncSessionLocal
+from ..models import BuildJob, Deployment
+from .versions import bump_deployment_version
+
+
+# Wakes workers in this process as soon as a job is enqueued instead of at the next poll
+job_available = asyncio.Event()
+
+_PENDING_JOBS = "autostack_jobs_enqueued"
+
+
+@event.listens_for(OrmSession, "after_commit")
+def _wake_workers_after_commit(session: OrmSession) -> None:
+    # A worker woken before the commit would find nothing and sleep for a whole poll interval
+    if session.info.pop(_PENDING_JOBS, False):
+        job_available.set()
+
+
+@event.listens_for(OrmSession, "after_rollback")
+def _discard_after_rollback(session: OrmSession) -> None:
+    session.info.pop(_PENDING_JOBS, None)
+
+
+def _is_postgres() -> bool:
+    return settings.database_url.startswith("postgresql")
+
+
+async def clear_cancel_request(session: AsyncSession, deployment_id: uuid.UUID) -> None:
+    """Forget a recorded cancellation, so it cannot stop a later build of the deployment."""
+    await session.execute(
+        update(Deployment)
+        .where(Deployment.id == deployment_id, Deployment.cancel_requested_at.is_not(None))
+        .values(cancel_requested_at=None)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def enqueue_build_job(session: AsyncSession, deployment_id: uuid.UUID) -> None:
+    """Add a job for ``deployment_id`` to ``session``; it is visible once the caller commits."""
+    existing = await session.scalar(select(BuildJob).where(BuildJob.deployment_id == deployment_id))
+    if existing is None:
+        session.add(
+            BuildJob(
+                deployment_id=deployment_id,
+                max_attempts=settings.build_job_max_attempts,
+                available_at=datetime.utcnow(),
+            )
+        )
+    else:
+        # Redeploying the same deployment row starts a fresh job
+        existing.status = "queued"
+        existing.attempts = 0
+        existing.available_at = datetime.utcnow()
+        existing.lease_owner = None
+        existing.lease_token = None
+        existing.lease_expires_at = None
+        existing.finished_at = None
+        # A cancellation of the previous build must not stop this one
+        await clear_cancel_request(session, deployment_id)
+    session.sync_session.info[_PENDING_JOBS] = True
+
+
+async def claim_next_job(worker_id: str) -> BuildJob | None:
+    token = str(uuid.uuid4())
+    now = datetime.utcnow()
+    candidate = (
+        select(BuildJob.id)
+        .where(BuildJob.status == "queued", BuildJob.available_at <= now)
+        .order_by(BuildJob.available_at.asc(), BuildJob.created_at.asc())
+        .limit(1)
+    )
+    if _is_postgres():
+        candidate = candidate.with_for_update(skip_locked=True)
+
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            update(BuildJob)
+            .where(BuildJob.id == candidate.scalar_subquery(), BuildJob.status == "queued")
+            .values(
+                status="running",
+                attempts=BuildJob.attempts + 1,
+                lease_owner=worker_id,
+                lease_token=token,
+                lease_expires_at=now + timedelta(seconds=settings.build_job_lease_seconds),
+                started_at=now,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+        if not result.rowcount:
+            return None
+        return await session.scalar(select(BuildJob).where(BuildJob.lease_token == token))
+
+
+async def renew_lease(job: BuildJob) -> bool:
+    """Extend the lease; ``False`` means the job was taken away from this worker."""
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            update(BuildJob)
+            .where(BuildJob.id == job.id, BuildJob.lease_token == job.lease_token, BuildJob.status == "running")
+            .values(lease_expires_at=datetime.utcnow() + timedelta(seconds=settings.build_job_lease_seconds))
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+        return bool(result.rowcount)
+
+
+async def finish_job(job: BuildJob, status: str, error: str | None = None) -> None:
+    async with AsyncSessionLocal() as session:
+        await session.execute(
+            update(BuildJob)
+            .where(BuildJob.id == job.id, BuildJob.lease_token == job.lease_token)
+            .values(
+                status=status,
+                last_error=error,
+                lease_token=None,
+                lease_expires_at=None,
+                finished_at=datetime.utcnow(),
+            )
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+
+
+async def release_job(job: BuildJob) -> None:
+    """Give a job back to the queue (worker shutting down) without counting the attempt."""
+    async with AsyncSessionLocal() as session:
+        await session.execute(
+            update(BuildJob)
+            .where(BuildJob.id == job.id, BuildJob.lease_token == job.lease_token)
+            .values(
+                status="queued",
+                attempts=BuildJob.attempts - 1,
+                lease_owner=None,
+                lease_token=None,
+                lease_expires_at=None,
+                available_at=datetime.utcnow(),
+            )
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+
+
+async def cancel_queued_job(session: AsyncSession, deployment_id: uuid.UUID) -> bool:
+    """Cancel the deployment's job if no worker claimed it yet; ``False`` if one did.
+
+    A claimed job keeps running: stop it with ``cancel_deployment_run``.
+    """
+    await session.execute(
+        update(BuildJob)
+        .where(BuildJob.deployment_id == deployment_id, BuildJob.status == "queued")
+        .values(status="cancelled", finished_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    claimed = await session.scalar(
+        select(BuildJob.id).where(BuildJob.deployment_id == deployment_id, BuildJob.status == "running")
+    )
+    return claimed is None
+
+
+async def requeue_expired_jobs() -> tuple[int, int]:
+    """Requeue running jobs whose lease expired; fail those out of attempts.
+
+    Returns ``(requeued, failed)``.
+    """
+    now = datetime.utcnow()
+    expired = and_(BuildJob.status == "running", BuildJob.lease_expires_at < now)
+    async with AsyncSessionLocal() as session:
+        exhausted = list(
+            (
+                await session.execute(
+                    select(BuildJob.deployment_id).where(expired, BuildJob.attempts >= BuildJob.max_attempts)
+                )
+            ).scalars()
+        )
+        failed = await session.execute(
+            update(BuildJob)
+            .where(expired, BuildJob.attempts >= BuildJob.max_attempts)
+            .values(
+                status="failed",
+                last_error="Build worker stopped responding",
+                lease_token=None,
+                lease_expires_at=None,
+                finished_at=now,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        requeued = await session.execute(
+            update(BuildJob)
+            .where(expired)
+            .values(
+                status="queued",
+                lease_owner=None,
+                lease_token=None,
+                lease_expires_at=None,
+                available_at=now,
+                last_error="Lease expired; requeued",
+            )
+            .execution_options(synchronize_session=False)
+        )
+        if exhausted:
+            await session.execute(
+                update(Deployment)
+                .where(Deployment.id.in_(exhausted), Deployment.status.notin_(("success", "failed", "cancelled", "superseded")))
+                .values(status="failed", failed_reason="Build worker stopped responding", completed_at=now)
+                .execution_options(synchronize_session=False)
+            )
+            for deployment_id in exhausted:
+                await bump_deployment_version(session, deployment_id)
+        await session.commit()
+    if requeued.rowcount:
+        job_available.set()
+    return requeued.rowcount or 0, failed.rowcount or 0
+
+
+async def enqueue_orphaned_deployments() -> int:
+    """Create jobs for deployments left ``queued`` without one (e.g. queued before upgrading)."""
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(Deployment.id).where(
+                Deployment.status == "queued",
+                Deployment.is_deleted.is_(False),
+                ~select(BuildJob.id).where(BuildJob.deployment_id == Deployment.id).exists(),
+            )
+        )
+        orphaned = list(result.scalars())
+        for deployment_id in orphaned:
+            await enqueue_build_job(session, deployment_id)
+        await session.commit()
+    return len(orphaned)
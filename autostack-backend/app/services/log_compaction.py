@@ -0,0 +1,206 @@
+"""Compaction and retention of build logs for finished deployments.
+
+Once a deployment has finished, its build log only changes again if the
+container log streamer appends runtime output. Compaction rewrites whatever the
+log is made of (legacy ``deployment_logs`` rows plus any number of segments)
+as a single compressed segment. Retention then keeps full logs for the most
+recent ``LOG_RETENTION_FULL_DEPLOYMENTS`` deployments of each project and
+replaces older ones by a summary: the first lines, error lines and the tail.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import uuid
+from dataclasses import dataclass
+from typing import AsyncIterator
+
+from sqlalchemy import func, or_, select
+
+from ..config import settings
+from ..db import AsyncSessionLocal
+from ..models import Deployment, DeploymentLog, LogSegment
+from .log_store import LogLine, close_log_stream, iter_log_lines, log_store
+
+
+logger = logging.getLogger(__name__)
+
+FINISHED_STATUSES = ("success", "failed", "cancelled", "superseded")
+# Rough per-row cost of a deployment_logs row (UUID key, timestamps, index entries)
+LEGACY_ROW_OVERHEAD_BYTES = 200
+SUMMARY_MAX_ERROR_LINES = 100
+
+_compaction_tasks: set[asyncio.Task] = set()
+
+
+@dataclass
+class CompactionReport:
+    deployment_id: uuid.UUID
+    mode: str  # compacted, summarized, skipped
+    rows_deleted: int = 0
+    lines_before: int = 0
+    lines_after: int = 0
+    bytes_before: int = 0
+    bytes_after: int = 0
+
+    @property
+    def bytes_reclaimed(self) -> int:
+        return max(self.bytes_before - self.bytes_after, 0)
+
+
+async def _storage_snapshot(deployment_id: uuid.UUID) -> tuple[int, int, list[LogSegment]]:
+    """Return (legacy row count, estimated bytes used, build segments)."""
+    async with AsyncSessionLocal() as session:
+        rows, text_bytes = (
+            await session.execute(
+                select(func.count(), func.coalesce(func.sum(func.length(DeploymentLog.message)), 0)).where(
+                    DeploymentLog.deployment_id == deployment_id
+                )
+            )
+        ).one()
+        segments = list(
+            (
+                await session.execute(
+                    select(LogSegment)
+                    .where(LogSegment.deployment_id == deployment_id, LogSegment.stream == "build")
+                    .order_by(LogSegment.sequence.asc())
+                )
+            )
+            .scalars()
+            .all()
+        )
+    used = int(text_bytes) + int(rows) * LEGACY_ROW_OVERHEAD_BYTES + sum(segment.stored_bytes for segment in segments)
+    return int(rows), used, segments
+
+
+async def _summarize(lines: AsyncIterator[LogLine], total: int) -> AsyncIterator[LogLine]:
+    """Keep the head, the error lines and the tail of a log, marking what was dropped."""
+    head = settings.log_summary_head_lines
+    tail_start = max(total - settings.log_summary_tail_lines, head)
+    errors = 0
+    omitted = 0
+
+    async for line in lines:
+        keep = line.line <= head or line.line > tail_start
+        if not keep and line.level == "error" and errors < SUMMARY_MAX_ERROR_LINES:
+            keep = True
+            errors += 1
+        if not keep:
+            omitted += 1
+            continue
+        if omitted:
+            yield LogLine(line=0, message=f"... {omitted} lines omitted by log retention ...", level="info", timestamp=line.timestamp)
+            omitted = 0
+        yield line
+
+
+async def compact_deployment_logs(deployment_id: uuid.UUID, *, summarize: bool = False) -> CompactionReport:
+    """Rewrite a finished deployment's build log as one compressed segment.
+
+    With ``summarize`` the rewritten log only keeps a summary of the original.
+    Logs that are already in the requested shape are left alone.
+    """
+    target = "summary" if summarize else "compacted"
+    await close_log_stream(deployment_id)
+    rows, bytes_before, segments = await _storage_snapshot(deployment_id)
+
+    already_done = rows == 0 and (
+        not segments
+        or (len(segments) == 1 and segments[0].kind in (target, "summary"))
+    )
+    if already_done:
+        return CompactionReport(deployment_id, "skipped", bytes_before=bytes_before, bytes_after=bytes_before)
+
+    async with AsyncSessionLocal() as session:
+        lines_before = 0
+        if segments:
+            lines_before = segments[-1].first_line - 1 + segments[-1].line_count
+        lines_before += rows
+        source = iter_log_lines(session, deployment_id)
+        if summarize:
+            source = _summarize(source, lines_before)
+        segment = await log_store.replace(deployment_id, source, kind=target)
+
+    return CompactionReport(
+        deployment_id,
+        "summarized" if summarize else "compacted",
+        rows_deleted=rows,
+        lines_before=lines_before,
+        lines_after=segment.line_count,
+        bytes_before=bytes_before,
+        bytes_after=segment.stored_bytes,
+    )
+
+
+async def enforce_log_retention(project_id: uuid.UUID) -> list[CompactionReport]:
+    """Summarize the build logs of all but the newest finished deployments of a project.
+
+    Only deployments whose log is not a summary yet are visited, so the cost
+    does not grow with the project's history.
+    """
+    async with AsyncSessionLocal() as session:
+        older = (
+            select(Deployment.id)
+            .where(Deployment.project_id == project_id, Deployment.status.in_(FINISHED_STATUSES))
+            .order_by(Deployment.created_at.desc())
+            .offset(settings.log_retention_full_deployments)
+            .subquery()
+        )
+        has_rows = select(DeploymentLog.id).where(DeploymentLog.deployment_id == older.c.id).exists()
+        has_full_segments = (
+            select(LogSegment.id)
+            .where(
+                LogSegment.deployment_id == older.c.id,
+                LogSegment.stream == "build",
+                LogSegment.kind != "summary",
+            )
+            .exists()
+        )
+        result = await session.execute(select(older.c.id).where(or_(has_rows, has_full_segments)))
+        pending = [row[0] for row in result.all()]
+
+    reports = []
+    for deployment_id in pending:
+        report = await compact_deployment_logs(deployment_id, summarize=True)
+        if report.mode != "skipped":
+            reports.append(report)
+    return reports
+
+
+async def run_log_compaction(deployment_id: uuid.UUID) -> list[CompactionReport]:
+    """Compact a just-finished deployment and apply its project's retention policy."""
+    async with AsyncSessionLocal() as session:
+        deployment = await session.get(Deployment, deployment_id)
+        if deployment is None or deployment.status not in FINISHED_STATUSES:
+            return []
+        project_id = deployment.project_id
+
+    reports = [await compact_deployment_logs(deployment_id)]
+    reports.extend(await enforce_log_retention(project_id))
+    reports = [report for report in reports if report.mode != "skipped"]
+    if reports:
+        logger.info(
+            "Log compaction for deployment %s: %d logs rewritten, %d rows deleted, %d bytes reclaimed",
+            deployment_id,
+            len(reports),
+            sum(report.rows_deleted for report in reports),
+            sum(report.bytes_reclaimed for report in reports),
+        )
+    return reports
+
+
+async def _run_safely(deployment_id: uuid.UUID) -> None:
+    try:
+        await run_log_compaction(deployment_id)
+    except Exception:
+        logger.exception("Log compaction failed for deployment %s", deployment_id)
+
+
+def schedule_log_compaction(deployment_id: uuid.UUID) -> None:
+    if not settings.log_compaction_enable:
+        return
+    task = asyncio.create_task(_run_safely(deployment_id))
+    # Keep a reference so the task is not garbage collected before it finishes
+    _compaction_tasks.add(task)
+    task.add_done_callback(_compaction_tasks.discard)
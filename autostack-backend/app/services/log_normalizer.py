@@ -0,0 +1,265 @@
+"""Streaming normalization of build output before it reaches the log store.
+
+Package managers and bundlers redraw progress bars with carriage returns and
+print long runs of near-identical lines. Every line the build engine appends
+costs a log record and a WebSocket frame, so :class:`LogNormalizer` sits
+between the subprocess pipes and :func:`app.build_engine._append_log`:
+
+* ``\\r`` rewrites inside a line collapse to the final state of the line;
+* successive updates of one progress indicator (a bar or spinner, or a
+  counter redrawn with ``\r``) are coalesced, keeping the latest; lines
+  that differ in anything but the progress values are all kept;
+* runs of identical lines are folded into one line plus a repeat count;
+* ANSI escapes are stripped, or reduced to plain colour codes;
+* output past the per-deployment byte budget is dropped, keeping the tail
+  of each command so the end of a failing step is always visible.
+"""
+
+from __future__ import annotations
+
+import re
+import time
+from collections import deque
+from dataclasses import dataclass, fields
+from typing import Literal
+
+from ..config import settings
+
+
+AnsiMode = Literal["strip", "keep"]
+NormalizedLine = tuple[str, str]  # (level, text)
+
+# CSI sequences, OSC sequences (terminated by BEL or ST) and two-byte escapes
+_ANSI_RE = re.compile(r"\x1b\[[0-?]*[ -/]*[@-~]|\x1b\][^\x07\x1b]*(?:\x07|\x1b\\)|\x1b[@-Z\\-_]")
+_SGR_RE = re.compile(r"\x1b\[([0-9;]*)m")
+_CONTROL_RE = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]")
+# Progress bars and spinners; a line showing one is a progress indicator however it was written
+_PROGRESS_BAR_RE = re.compile(r"[█▓▒░■□]{3,}|\[\s*[=#>\-]{2,}[=#>\-\s]*\]|[⠁-⣿]")
+# Counters that only mark progress on a line redrawn with ``\r``
+_PROGRESS_VALUE_RE = re.compile(r"\d+(?:\.\d+)?\s?%|\d+(?:\.\d+)?\s?[kKMG]?i?B\s*/\s*\d+")
+# What changes between updates of one indicator; anything else tells indicators apart
+_PROGRESS_VOLATILE_RE = re.compile(
+    r"\d+(?:\.\d+)?\s?(?:%|[kKMG]?i?B\b|[smh]\b)|\d+\s*/\s*\d+|[█▓▒░■□]+|\[[=#>\-\s]*\]|[⠁-⣿]"
+)
+
+# Emit a coalesced progress line at least this often so live views keep moving
+PROGRESS_EMIT_INTERVAL_SECONDS = 2.0
+
+
+def strip_ansi(text: str) -> str:
+    return _ANSI_RE.sub("", text)
+
+
+def compact_ansi(text: str) -> str:
+    """Keep colour/style codes only, merging adjacent ones into a single sequence."""
+    kept: list[str] = []
+    pending: list[str] = []
+    position = 0
+    for match in _ANSI_RE.finditer(text):
+        if match.start() > position:
+            if pending:
+                kept.append(f"\x1b[{';'.join(pending)}m")
+                pending = []
+            kept.append(text[position : match.start()])
+        sgr = _SGR_RE.fullmatch(match.group())
+        if sgr:
+            pending.append(sgr.group(1) or "0")
+        position = match.end()
+    if position < len(text):
+        if pending:
+            kept.append(f"\x1b[{';'.join(pending)}m")
+            pending = []
+        kept.append(text[position:])
+    if pending:
+        kept.append(f"\x1b[{';'.join(pending)}m")
+    return "".join(kept)
+
+
+def collapse_carriage_returns(text: str) -> str:
+    """Return what a terminal would show after ``\\r`` rewrites of a single line."""
+    if "\r" not in text:
+        return text
+    screen = ""
+    for part in text.split("\r"):
+        # A rewrite overwrites from column 0; shorter rewrites leave the rest visible,
+        # but progress output pads or erases, so the latest non-empty part is the state
+        if part:
+            screen = part if len(part) >= len(screen) else part + screen[len(part) :]
+    return screen
+
+
+def _is_progress(text: str, rewritten: bool) -> bool:
+    if _PROGRESS_BAR_RE.search(text):
+        return True
+    return rewritten and _PROGRESS_VALUE_RE.search(text) is not None
+
+
+def _progress_key(text: str) -> str:
+    return _PROGRESS_VOLATILE_RE.sub("#", text)
+
+
+@dataclass
+class NormalizerStats:
+    raw_lines: int = 0
+    raw_bytes: int = 0
+    emitted_lines: int = 0
+    emitted_bytes: int = 0
+    rewrites_collapsed: int = 0
+    progress_coalesced: int = 0
+    repeats_folded: int = 0
+    budget_dropped_lines: int = 0
+    budget_dropped_bytes: int = 0
+
+    @property
+    def byte_reduction(self) -> float:
+        return 1 - self.emitted_bytes / self.raw_bytes if self.raw_bytes else 0.0
+
+    @property
+    def frame_reduction(self) -> float:
+        return 1 - self.emitted_lines / self.raw_lines if self.raw_lines else 0.0
+
+    def add(self, other: NormalizerStats) -> None:
+        for item in fields(self):
+            setattr(self, item.name, getattr(self, item.name) + getattr(other, item.name))
+
+    def summary(self) -> str:
+        return (
+            f"{self.raw_lines} lines / {self.raw_bytes} bytes in, "
+            f"{self.emitted_lines} lines / {self.emitted_bytes} bytes out "
+            f"({self.frame_reduction:.0%} fewer frames, {self.byte_reduction:.0%} fewer bytes)"
+        )
+
+
+class LogNormalizer:
+    """Normalizes the output of all commands of one deployment.
+
+    :meth:`feed` takes one raw line (split on ``\\n``) and returns the lines to
+    store, possibly none. :meth:`end_command` must be called when a command's
+    pipes are closed to release anything held back.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_bytes: int | None = None,
+        tail_bytes: int | None = None,
+        ansi: AnsiMode | None = None,
+        clock=time.monotonic,
+    ) -> None:
+        self.max_bytes = settings.log_max_bytes_per_deployment if max_bytes is None else max_bytes
+        self.tail_bytes = settings.log_tail_bytes if tail_bytes is None else tail_bytes
+        self.ansi: AnsiMode = ansi or ("strip" if settings.log_strip_ansi else "keep")
+        self.stats = NormalizerStats()
+        self._clock = clock
+
+        self._last: NormalizedLine | None = None
+        self._repeats = 0
+        self._progress: NormalizedLine | None = None
+        self._progress_emitted_at = 0.0
+
+        self._head_used = 0
+        self._tail: deque[NormalizedLine] = deque()
+        self._tail_used = 0
+        self._dropped_lines = 0
+        self._dropped_bytes = 0
+
+    @property
+    def _head_budget(self) -> int:
+        return max(self.max_bytes - self.tail_bytes, 0)
+
+    def feed(self, raw: str, level: str = "info") -> list[NormalizedLine]:
+        self.stats.raw_lines += 1
+        self.stats.raw_bytes += len(raw.encode("utf-8", errors="ignore"))
+
+        rewrites = raw.rstrip("\r\n").count("\r")
+        self.stats.rewrites_collapsed += rewrites
+        text = collapse_carriage_returns(raw.rstrip("\r\n"))
+        text = strip_ansi(text) if self.ansi == "strip" else compact_ansi(text)
+        text = _CONTROL_RE.sub("", text).rstrip()
+        if not text:
+            return []
+
+        out: list[NormalizedLine] = []
+        item = (level, text)
+
+        if _is_progress(strip_ansi(text), rewritten=rewrites > 0):
+            if self._progress is not None and _progress_key(self._progress[1]) != _progress_key(text):
+                # A different progress bar started; keep the final state of the previous one
+                out.extend(self._release_progress())
+            elif self._progress is not None:
+                self.stats.progress_coalesced += 1
+            self._progress = item
+            now = self._clock()
+            if now - self._progress_emitted_at >= PROGRESS_EMIT_INTERVAL_SECONDS:
+                self._progress_emitted_at = now
+                out.extend(self._release_progress())
+            return self._budget(out)
+
+        out.extend(self._release_progress())
+        if item == self._last:
+            self._repeats += 1
+            self.stats.repeats_folded += 1
+            return self._budget(out)
+        out.extend(self._release_repeats())
+        self._last = item
+        out.append(item)
+        return self._budget(out)
+
+    def end_command(self) -> list[NormalizedLine]:
+        """Flush held-back progress, pending repeat counts and the retained tail."""
+        out = self._budget(self._release_progress() + self._release_repeats())
+        self._last = None
+        if self._tail:
+            if self._dropped_lines:
+                marker = (
+                    f"... {self._dropped_lines} lines ({self._dropped_bytes} bytes) omitted: "
+                    "log size limit reached, showing the last lines of this step ..."
+                )
+                out.append(("info", marker))
+                self.stats.emitted_lines += 1
+                self.stats.emitted_bytes += len(marker) + 1
+            out.extend(self._tail)
+            self.stats.emitted_lines += len(self._tail)
+            self.stats.emitted_bytes += self._tail_used
+            self._tail.clear()
+            self._tail_used = 0
+            self._dropped_lines = 0
+            self._dropped_bytes = 0
+        return out
+
+    def _release_progress(self) -> list[NormalizedLine]:
+        if self._progress is None:
+            return []
+        item, self._progress = self._progress, None
+        self._last = item
+        self._repeats = 0
+        return [item]
+
+    def _release_repeats(self) -> list[NormalizedLine]:
+        if not self._repeats or self._last is None:
+            return []
+        count, self._repeats = self._repeats, 0
+        return [(self._last[0], f"(repeated {count} more times)")]
+
+    def _budget(self, lines: list[NormalizedLine]) -> list[NormalizedLine]:
+        """Pass lines through while the head budget lasts, then keep only a bounded tail."""
+        out: list[NormalizedLine] = []
+        for item in lines:
+            size = len(item[1].encode("utf-8", errors="ignore")) + 1
+            if self._head_used + size <= self._head_budget and not self._tail:
+                self._head_used += size
+                self.stats.emitted_lines += 1
+                self.stats.emitted_bytes += size
+                out.append(item)
+                continue
+            self._tail.append(item)
+            self._tail_used += size
+            while self._tail and self._tail_used > self.tail_bytes:
+                dropped = self._tail.popleft()
+                dropped_size = len(dropped[1].encode("utf-8", errors="ignore")) + 1
+                self._tail_used -= dropped_size
+                self._dropped_lines += 1
+                self._dropped_bytes += dropped_size
+                self.stats.budget_dropped_lines += 1
+                self.stats.budget_dropped_bytes += dropped_size
+        return out
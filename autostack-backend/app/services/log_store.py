@@ -0,0 +1,918 @@
+"""Append-only, segmented log store for deployment build and runtime logs.
+
+Each deployment/stream pair is written to a sequence of segment files under
+``AUTOSTACK_LOG_DIR/<deployment_id>/<stream>/``. The active segment is plain
+text; once it is closed (rotation or end of build) it is rewritten as a series
+of independently compressed blocks, so any block can be decompressed on its own.
+A sidecar ``.idx`` file records the byte offset of every block, which gives
+random access by line number without scanning the whole segment.
+
+Only segment metadata (:class:`~app.models.LogSegment`) lives in the database.
+Lines written before the store existed remain readable: rows in
+``deployment_logs``/``deployment_runtime_logs`` are served first, followed by
+the store's lines, until :func:`migrate_legacy_logs` moves them over.
+
+Record format (one per line, before compression)::
+
+    <unix_ms>\\t<level>\\t<message with \\\\, \\n and \\r escaped>\\n
+"""
+
+from __future__ import annotations
+
+import asyncio
+import bisect
+import gzip
+import os
+import uuid
+import zlib
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import AsyncIterable, AsyncIterator, Iterable, Iterator, Literal, Sequence
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import settings
+from ..db import AsyncSessionLocal
+from ..models import DeploymentLog, DeploymentRuntimeLog, LogSegment
+
+try:
+    import zstandard
+
+    ZSTD_AVAILABLE = True
+except ImportError:  # pragma: no cover - optional dependency
+    ZSTD_AVAILABLE = False
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows: writers are only serialized within one process
+    fcntl = None
+
+
+LogStream = Literal["build", "runtime"]
+LogEntry = tuple  # (message, level) or (message, level, timestamp)
+LogLevel = Literal["debug", "info", "warning", "error"]
+
+# Severity order for level filters; lines without a known level count as info
+LEVEL_RANK = {"debug": 0, "info": 1, "warning": 2, "error": 3}
+SEARCH_CHUNK_LINES = 1000
+
+_LEGACY_MODELS = {"build": DeploymentLog, "runtime": DeploymentRuntimeLog}
+_EPOCH = datetime(1970, 1, 1)
+
+
+@dataclass
+class LogLine:
+    line: int  # 1-based position of the line within the deployment's log stream
+    message: str
+    level: str | None = None
+    timestamp: datetime | None = None
+
+
+@dataclass
+class LogRange:
+    lines: list[LogLine] = field(default_factory=list)
+    total_lines: int = 0
+    has_more: bool = False
+    # Lines examined by a filtered read, which reach past the matching lines
+    scanned_first: int | None = None
+    scanned_last: int | None = None
+
+    @property
+    def first_line(self) -> int | None:
+        return self.lines[0].line if self.lines else None
+
+    @property
+    def last_line(self) -> int | None:
+        return self.lines[-1].line if self.lines else None
+
+    @property
+    def next_cursor(self) -> int:
+        """Value to pass as ``after`` to continue reading forward."""
+        if self.scanned_last is not None:
+            return self.scanned_last
+        if self.lines:
+            return self.lines[-1].line
+        return self.total_lines
+
+    @property
+    def prev_cursor(self) -> int | None:
+        """Value to pass as ``before`` to continue reading backward."""
+        if self.scanned_first is not None:
+            return self.scanned_first
+        return self.first_line
+
+
+# ---------------------------------------------------------------------------
+# Record encoding and block compression
+# ---------------------------------------------------------------------------
+
+
+def _escape(message: str) -> str:
+    return message.replace("\\", "\\\\").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def _unescape(value: str) -> str:
+    if "\\" not in value:
+        return value
+    out: list[str] = []
+    chars = iter(value)
+    for ch in chars:
+        if ch != "\\":
+            out.append(ch)
+            continue
+        nxt = next(chars, "")
+        out.append({"n": "\n", "r": "\r", "\\": "\\"}.get(nxt, nxt))
+    return "".join(out)
+
+
+def encode_record(message: str, level: str | None, timestamp: datetime) -> bytes:
+    millis = int((timestamp - _EPOCH).total_seconds() * 1000)
+    return f"{millis}\t{level or ''}\t{_escape(message)}\n".encode("utf-8", errors="replace")
+
+
+def decode_record(raw: bytes, line: int) -> LogLine:
+    text = raw.decode("utf-8", errors="replace").rstrip("\n")
+    millis, level, message = (text.split("\t", 2) + ["", ""])[:3]
+    try:
+        timestamp: datetime | None = datetime.utcfromtimestamp(int(millis) / 1000)
+    except ValueError:
+        timestamp = None
+    return LogLine(line=line, message=_unescape(message), level=level or None, timestamp=timestamp)
+
+
+def _default_codec() -> str:
+    configured = (settings.log_compression or "auto").lower()
+    if configured == "auto":
+        return "zstd" if ZSTD_AVAILABLE else "gzip"
+    if configured == "zstd" and not ZSTD_AVAILABLE:
+        return "gzip"
+    return configured
+
+
+_CODEC_SUFFIX = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+
+
+def _compress_block(data: bytes, codec: str) -> bytes:
+    if codec == "gzip":
+        return gzip.compress(data, compresslevel=6, mtime=0)
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=6).compress(data)
+    return data
+
+
+def _decompress_block(data: bytes, codec: str) -> bytes:
+    if codec == "gzip":
+        return zlib.decompressobj(wbits=31).decompress(data)
+    if codec == "zstd":
+        return zstandard.ZstdDecompressor().decompress(data)
+    return data
+
+
+# ---------------------------------------------------------------------------
+# Segment files
+# ---------------------------------------------------------------------------
+
+
+def _root() -> Path:
+    return Path(settings.log_store_dir)
+
+
+def _stream_dir(deployment_id: uuid.UUID, stream: str) -> Path:
+    return _root() / str(deployment_id) / stream
+
+
+def _read_index(index_path: Path) -> tuple[list[int], list[int]]:
+    """Return parallel lists of (first line in block, byte offset of block)."""
+    lines: list[int] = []
+    offsets: list[int] = []
+    try:
+        with open(index_path, "r", encoding="ascii") as fh:
+            for raw in fh:
+                parts = raw.split()
+                if len(parts) == 2:
+                    lines.append(int(parts[0]))
+                    offsets.append(int(parts[1]))
+    except FileNotFoundError:
+        pass
+    return lines, offsets
+
+
+def _count_active_lines(path: Path) -> tuple[int, int]:
+    """Count complete lines in an active (plain) segment using its sparse index.
+
+    Only the bytes after the last indexed block are scanned. A trailing partial
+    record (a write in progress in another process) is not counted.
+    """
+    index_lines, index_offsets = _read_index(Path(f"{path}.idx"))
+    base_line = index_lines[-1] if index_lines else 0
+    base_offset = index_offsets[-1] if index_offsets else 0
+    try:
+        with open(path, "rb") as fh:
+            fh.seek(base_offset)
+            tail = fh.read()
+    except FileNotFoundError:
+        return 0, 0
+    complete = tail.rfind(b"\n") + 1
+    return base_line + tail.count(b"\n", 0, complete), base_offset + complete
+
+
+def _iter_segment_lines(segment: LogSegment, start: int) -> Iterator[bytes]:
+    """Yield raw records of ``segment`` starting at 0-based in-segment line ``start``."""
+    path = _root() / segment.path
+    index_lines, index_offsets = _read_index(Path(f"{path}.idx"))
+    block = max(bisect.bisect_right(index_lines, start) - 1, 0)
+    block_line = index_lines[block] if index_lines else 0
+
+    if segment.codec == "none":
+        with open(path, "rb") as fh:
+            fh.seek(index_offsets[block] if index_offsets else 0)
+            line = block_line
+            for raw in fh:
+                if not raw.endswith(b"\n"):
+                    return  # partial record still being written
+                if line >= start:
+                    yield raw
+                line += 1
+        return
+
+    with open(path, "rb") as fh:
+        for idx in range(block, len(index_offsets)):
+            fh.seek(index_offsets[idx])
+            end = index_offsets[idx + 1] if idx + 1 < len(index_offsets) else None
+            payload = fh.read() if end is None else fh.read(end - index_offsets[idx])
+            line = index_lines[idx]
+            for raw in _decompress_block(payload, segment.codec).splitlines(keepends=True):
+                if line >= start:
+                    yield raw
+                line += 1
+
+
+def _seal_segment_file(plain_path: Path, codec: str) -> tuple[Path, int]:
+    """Compress an active segment block by block; returns (new path, stored bytes)."""
+    index_lines, index_offsets = _read_index(Path(f"{plain_path}.idx"))
+    if not index_offsets:
+        index_lines, index_offsets = [0], [0]
+    sealed_path = Path(f"{plain_path}{_CODEC_SUFFIX[codec]}")
+    sealed_index: list[str] = []
+    stored = 0
+    with open(plain_path, "rb") as src, open(sealed_path, "wb") as dst:
+        size = src.seek(0, os.SEEK_END)
+        for idx, offset in enumerate(index_offsets):
+            if offset >= size:
+                break
+            end = index_offsets[idx + 1] if idx + 1 < len(index_offsets) else size
+            src.seek(offset)
+            data = src.read(end - offset)
+            # Drop a trailing partial record; only possible in the last block
+            data = data[: data.rfind(b"\n") + 1]
+            if not data:
+                break
+            payload = _compress_block(data, codec)
+            sealed_index.append(f"{index_lines[idx]} {stored}\n")
+            dst.write(payload)
+            stored += len(payload)
+    Path(f"{sealed_path}.idx").write_text("".join(sealed_index), encoding="ascii")
+    return sealed_path, stored
+
+
+def _unlink_segment_files(path: Path) -> None:
+    for leftover in (path, Path(f"{path}.idx")):
+        try:
+            leftover.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class SegmentWriter:
+    """Appends records to the active segment of one deployment/stream."""
+
+    def __init__(self, segment: LogSegment, line_count: int, byte_size: int) -> None:
+        self.segment_id = segment.id
+        self.deployment_id = segment.deployment_id
+        self.stream = segment.stream
+        self.sequence = segment.sequence
+        self.first_line = segment.first_line
+        self.path = _root() / segment.path
+        self.line_count = line_count
+        self.byte_size = byte_size
+        self.first_timestamp = segment.first_timestamp
+        self.last_timestamp = segment.last_timestamp
+        self._fh = open(self.path, "ab")
+        self._index = open(f"{self.path}.idx", "a", encoding="ascii")
+
+    def write(self, records: Sequence[tuple[bytes, datetime]]) -> None:
+        interval = max(settings.log_index_interval, 1)
+        chunks: list[bytes] = []
+        for record, timestamp in records:
+            if self.line_count % interval == 0:
+                self._index.write(f"{self.line_count} {self.byte_size + sum(map(len, chunks))}\n")
+            chunks.append(record)
+            self.line_count += 1
+            if self.first_timestamp is None:
+                self.first_timestamp = timestamp
+            self.last_timestamp = timestamp
+        # Index entries must be durable before the data they point into
+        self._index.flush()
+        payload = b"".join(chunks)
+        self._fh.write(payload)
+        self._fh.flush()
+        self.byte_size += len(payload)
+
+    def is_current(self) -> bool:
+        """Whether the file on disk is still exactly what this writer last wrote."""
+        try:
+            on_disk = os.stat(self.path)
+        except FileNotFoundError:
+            return False  # sealed and removed by another process
+        return on_disk.st_ino == os.fstat(self._fh.fileno()).st_ino and on_disk.st_size == self.byte_size
+
+    def close_files(self) -> None:
+        self._fh.close()
+        self._index.close()
+
+
+class LogStore:
+    """Registry of active segment writers, one per deployment/stream.
+
+    All mutations of a stream (appends, sealing, rewrites) are serialized so
+    that segment sequence numbers and line numbers stay contiguous: by a
+    per-stream lock within the process and by an exclusive ``flock`` on the
+    stream directory's ``.lock`` file across processes (API and workers share
+    the log directory). A cached writer is only reused while its segment file
+    is unchanged since its last write; otherwise the segment is reopened.
+    """
+
+    def __init__(self) -> None:
+        self._writers: dict[tuple[uuid.UUID, str], SegmentWriter] = {}
+        self._locks: dict[tuple[uuid.UUID, str], asyncio.Lock] = {}
+
+    def _lock(self, deployment_id: uuid.UUID, stream: str) -> asyncio.Lock:
+        return self._locks.setdefault((deployment_id, stream), asyncio.Lock())
+
+    @asynccontextmanager
+    async def _locked(self, deployment_id: uuid.UUID, stream: str) -> AsyncIterator[None]:
+        async with self._lock(deployment_id, stream):
+            if fcntl is None:
+                yield
+                return
+            directory = _stream_dir(deployment_id, stream)
+            directory.mkdir(parents=True, exist_ok=True)
+            fd = os.open(directory / ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                await asyncio.to_thread(fcntl.flock, fd, fcntl.LOCK_EX)
+                yield
+            finally:
+                os.close(fd)  # also releases the lock
+
+    async def _adopt(self, segment: LogSegment) -> SegmentWriter:
+        # Resume a segment left open by a previous writer (e.g. after a restart),
+        # dropping any partially written trailing record
+        path = _root() / segment.path
+        lines, size = await asyncio.to_thread(_count_active_lines, path)
+        with open(path, "r+b") as fh:
+            fh.truncate(size)
+        return SegmentWriter(segment, lines, size)
+
+    async def _open_writer(self, deployment_id: uuid.UUID, stream: str) -> SegmentWriter:
+        async with AsyncSessionLocal() as session:
+            last = (
+                await session.execute(
+                    select(LogSegment)
+                    .where(LogSegment.deployment_id == deployment_id, LogSegment.stream == stream)
+                    .order_by(LogSegment.sequence.desc())
+                    .limit(1)
+                )
+            ).scalar_one_or_none()
+
+            if last is not None and not last.is_closed and (_root() / last.path).exists():
+                return await self._adopt(last)
+
+            if last is None:
+                sequence, first_line = 1, 1
+            else:
+                sequence = last.sequence + 1
+                first_line = last.first_line + last.line_count
+
+            segment = _new_segment(deployment_id, stream, sequence, first_line)
+            session.add(segment)
+            await session.commit()
+            return SegmentWriter(segment, 0, 0)
+
+    async def _writer(self, deployment_id: uuid.UUID, stream: str) -> SegmentWriter:
+        key = (deployment_id, stream)
+        writer = self._writers.get(key)
+        if writer is not None and not await self._still_active(writer):
+            # Another process appended to or sealed the segment since our last write
+            self._writers.pop(key, None)
+            writer.close_files()
+            writer = None
+        if writer is None:
+            writer = await self._open_writer(deployment_id, stream)
+            self._writers[key] = writer
+        return writer
+
+    async def _still_active(self, writer: SegmentWriter) -> bool:
+        if not writer.is_current():
+            return False
+        if _default_codec() != "none":
+            return True
+        # Uncompressed segments are sealed in place, which leaves the file as it was
+        async with AsyncSessionLocal() as session:
+            closed = await session.scalar(select(LogSegment.is_closed).where(LogSegment.id == writer.segment_id))
+        return closed is False
+
+    async def append(
+        self,
+        deployment_id: uuid.UUID,
+        entries: Iterable[LogEntry],
+        stream: LogStream = "build",
+    ) -> int:
+        """Append ``(message, level[, timestamp])`` entries; returns lines written."""
+        records = _encode_entries(entries)
+        if not records:
+            return 0
+
+        async with self._locked(deployment_id, stream):
+            writer = await self._writer(deployment_id, stream)
+            writer.write(records)
+            if writer.byte_size >= settings.log_segment_max_bytes:
+                await self._seal(writer)
+        return len(records)
+
+    async def close(self, deployment_id: uuid.UUID, stream: LogStream = "build") -> None:
+        """Seal the active segment of a stream (compress it and record final metadata)."""
+        async with self._locked(deployment_id, stream):
+            await self._close_unlocked(deployment_id, stream)
+
+    async def _close_unlocked(self, deployment_id: uuid.UUID, stream: str) -> None:
+        writer = self._writers.get((deployment_id, stream))
+        if writer is not None and not await self._still_active(writer):
+            self._writers.pop((deployment_id, stream), None)
+            writer.close_files()
+            writer = None
+        if writer is None:
+            # The open segment may have been written by another process
+            async with AsyncSessionLocal() as session:
+                result = await session.execute(
+                    select(LogSegment).where(
+                        LogSegment.deployment_id == deployment_id,
+                        LogSegment.stream == stream,
+                        LogSegment.is_closed.is_(False),
+                    )
+                )
+                orphan = result.scalars().first()
+            if orphan is None or not (_root() / orphan.path).exists():
+                return
+            writer = await self._adopt(orphan)
+        await self._seal(writer)
+
+    async def replace(
+        self,
+        deployment_id: uuid.UUID,
+        entries: AsyncIterable[LogEntry | LogLine],
+        stream: LogStream = "build",
+        kind: str = "compacted",
+        batch_size: int = 1000,
+    ) -> LogSegment:
+        """Rewrite a whole stream (legacy rows and segments) as one closed segment.
+
+        ``entries`` is typically produced by :func:`iter_log_lines` over the
+        same stream; nothing is deleted until the new segment is complete, so
+        readers see either the old or the new content, never a mix.
+        """
+        async with self._locked(deployment_id, stream):
+            await self._close_unlocked(deployment_id, stream)
+            async with AsyncSessionLocal() as session:
+                old = await _segments(session, deployment_id, stream)
+                sequence = (old[-1].sequence if old else 0) + 1
+                segment = _new_segment(deployment_id, stream, sequence, 1)
+                writer = SegmentWriter(segment, 0, 0)
+                batch: list[LogEntry | LogLine] = []
+                try:
+                    async for entry in entries:
+                        batch.append(entry)
+                        if len(batch) >= batch_size:
+                            writer.write(_encode_entries(batch))
+                            batch = []
+                    writer.write(_encode_entries(batch))
+                finally:
+                    writer.close_files()
+
+                codec = _default_codec()
+                stored_path, stored = writer.path, writer.byte_size
+                if codec != "none":
+                    stored_path, stored = await asyncio.to_thread(_seal_segment_file, writer.path, codec)
+                    _unlink_segment_files(writer.path)
+
+                segment.kind = kind
+                _mark_closed(segment, writer, codec, stored_path, stored)
+                for previous in old:
+                    await session.delete(previous)
+                model = _LEGACY_MODELS[stream]
+                await session.execute(delete(model).where(model.deployment_id == deployment_id))
+                await session.flush()
+                session.add(segment)
+                await session.commit()
+
+            for previous in old:
+                _unlink_segment_files(_root() / previous.path)
+            return segment
+
+    async def _seal(self, writer: SegmentWriter) -> None:
+        self._writers.pop((writer.deployment_id, writer.stream), None)
+        writer.close_files()
+        codec = _default_codec()
+        if codec == "none":
+            stored_path, stored = writer.path, writer.byte_size
+        else:
+            stored_path, stored = await asyncio.to_thread(_seal_segment_file, writer.path, codec)
+
+        async with AsyncSessionLocal() as session:
+            segment = await session.get(LogSegment, writer.segment_id)
+            if segment is not None:
+                _mark_closed(segment, writer, codec, stored_path, stored)
+                await session.commit()
+
+        if stored_path != writer.path:
+            _unlink_segment_files(writer.path)
+
+
+def _new_segment(deployment_id: uuid.UUID, stream: str, sequence: int, first_line: int) -> LogSegment:
+    directory = _stream_dir(deployment_id, stream)
+    directory.mkdir(parents=True, exist_ok=True)
+    return LogSegment(
+        id=uuid.uuid4(),
+        deployment_id=deployment_id,
+        stream=stream,
+        sequence=sequence,
+        first_line=first_line,
+        codec="none",
+        path=(directory / f"{sequence:06d}.log").relative_to(_root()).as_posix(),
+    )
+
+
+def _mark_closed(segment: LogSegment, writer: SegmentWriter, codec: str, stored_path: Path, stored: int) -> None:
+    segment.codec = codec
+    segment.path = stored_path.relative_to(_root()).as_posix()
+    segment.line_count = writer.line_count
+    segment.byte_size = writer.byte_size
+    segment.stored_bytes = stored
+    segment.first_timestamp = writer.first_timestamp
+    segment.last_timestamp = writer.last_timestamp
+    segment.is_closed = True
+    segment.closed_at = datetime.utcnow()
+
+
+def _encode_entries(entries: Iterable[LogEntry | LogLine]) -> list[tuple[bytes, datetime]]:
+    now = datetime.utcnow()
+    records = []
+    for entry in entries:
+        if isinstance(entry, LogLine):
+            entry = (entry.message, entry.level, entry.timestamp)
+        message, level = entry[0], entry[1]
+        timestamp = entry[2] if len(entry) > 2 and entry[2] is not None else now
+        records.append((encode_record(message, level, timestamp), timestamp))
+    return records
+
+
+log_store = LogStore()
+
+
+async def append_log_lines(
+    deployment_id: uuid.UUID,
+    entries: Iterable[LogEntry],
+    stream: LogStream = "build",
+) -> int:
+    return await log_store.append(deployment_id, entries, stream)
+
+
+async def close_log_stream(deployment_id: uuid.UUID, stream: LogStream = "build") -> None:
+    await log_store.close(deployment_id, stream)
+
+
+# ---------------------------------------------------------------------------
+# Reads
+# ---------------------------------------------------------------------------
+
+
+async def _segments(session: AsyncSession, deployment_id: uuid.UUID, stream: str) -> list[LogSegment]:
+    result = await session.execute(
+        select(LogSegment)
+        .where(LogSegment.deployment_id == deployment_id, LogSegment.stream == stream)
+        .order_by(LogSegment.sequence.asc())
+        # Segments are sealed by other sessions; never trust stale identity-map copies
+        .execution_options(populate_existing=True)
+    )
+    return list(result.scalars().all())
+
+
+def _segment_line_count(segment: LogSegment) -> int:
+    if segment.is_closed:
+        return segment.line_count
+    return _count_active_lines(_root() / segment.path)[0]
+
+
+async def _legacy_count(session: AsyncSession, deployment_id: uuid.UUID, stream: str) -> int:
+    model = _LEGACY_MODELS[stream]
+    result = await session.execute(
+        select(func.count()).select_from(model).where(model.deployment_id == deployment_id)
+    )
+    return int(result.scalar_one() or 0)
+
+
+async def _stream_legacy(
+    session: AsyncSession,
+    deployment_id: uuid.UUID,
+    stream: str,
+    offset: int,
+    limit: int,
+) -> list[LogLine]:
+    """Read legacy rows through a server-side cursor so memory is bounded by ``limit``."""
+    if limit <= 0:
+        return []
+    model = _LEGACY_MODELS[stream]
+    rows = await session.stream(
+        select(model.timestamp, model.log_level, model.message)
+        .where(model.deployment_id == deployment_id)
+        .order_by(model.timestamp.asc())
+        .offset(offset)
+        .limit(limit)
+    )
+    lines: list[LogLine] = []
+    try:
+        async for timestamp, level, message in rows:
+            lines.append(LogLine(line=offset + len(lines) + 1, message=message, level=level, timestamp=timestamp))
+    finally:
+        await rows.close()
+    return lines
+
+
+def _read_store(segments: list[LogSegment], counts: list[int], start: int, limit: int, base: int) -> list[LogLine]:
+    """Read ``limit`` store lines from 0-based store offset ``start``."""
+    lines: list[LogLine] = []
+    for segment, count in zip(segments, counts):
+        seg_start = segment.first_line - 1
+        if seg_start + count <= start:
+            continue
+        if len(lines) >= limit:
+            break
+        offset_in_segment = max(start - seg_start, 0)
+        line_no = seg_start + offset_in_segment
+        for raw in _iter_segment_lines(segment, offset_in_segment):
+            if len(lines) >= limit or line_no >= seg_start + count:
+                break
+            line_no += 1
+            lines.append(decode_record(raw, base + line_no))
+    return lines
+
+
+class _StreamView:
+    """Snapshot of where a stream's lines live: legacy rows first, then segments."""
+
+    def __init__(self, legacy: int, segments: list[LogSegment], counts: list[int]) -> None:
+        self.legacy = legacy
+        self.segments = segments
+        self.counts = counts
+
+    @property
+    def total(self) -> int:
+        if not self.segments:
+            return self.legacy
+        return self.legacy + self.segments[-1].first_line - 1 + self.counts[-1]
+
+
+async def _view(session: AsyncSession, deployment_id: uuid.UUID, stream: str) -> _StreamView:
+    legacy = await _legacy_count(session, deployment_id, stream)
+    segments = await _segments(session, deployment_id, stream)
+    counts = [_segment_line_count(segment) for segment in segments]
+    return _StreamView(legacy, segments, counts)
+
+
+async def _read(
+    session: AsyncSession,
+    deployment_id: uuid.UUID,
+    stream: str,
+    view: _StreamView,
+    start: int,
+    limit: int,
+) -> list[LogLine]:
+    lines: list[LogLine] = []
+    if start < view.legacy:
+        lines.extend(await _stream_legacy(session, deployment_id, stream, start, min(limit, view.legacy - start)))
+    remaining = limit - len(lines)
+    if remaining > 0 and view.segments:
+        store_start = max(start - view.legacy, 0)
+        for attempt in range(2):
+            try:
+                lines.extend(
+                    await asyncio.to_thread(
+                        _read_store, view.segments, view.counts, store_start, remaining, view.legacy
+                    )
+                )
+                break
+            except FileNotFoundError:
+                # The active segment was sealed while we were reading it; reload metadata once
+                if attempt:
+                    raise
+                view = await _view(session, deployment_id, stream)
+    return lines
+
+
+def _apply_byte_budget(lines: list[LogLine], max_bytes: int | None, keep_tail: bool) -> tuple[list[LogLine], bool]:
+    if max_bytes is None or not lines:
+        return lines, False
+    ordered = reversed(lines) if keep_tail else iter(lines)
+    used = 0
+    kept = 0
+    for item in ordered:
+        used += len(item.message.encode("utf-8", errors="ignore")) + 1
+        if used > max_bytes and kept:
+            break
+        kept += 1
+    if kept == len(lines):
+        return lines, False
+    return (lines[-kept:] if keep_tail else lines[:kept]), True
+
+
+async def count_log_lines(session: AsyncSession, deployment_id: uuid.UUID, stream: LogStream = "build") -> int:
+    return (await _view(session, deployment_id, stream)).total
+
+
+async def read_log_range(
+    session: AsyncSession,
+    deployment_id: uuid.UUID,
+    *,
+    after: int | None = None,
+    before: int | None = None,
+    limit: int = 500,
+    max_bytes: int | None = None,
+    stream: LogStream = "build",
+) -> LogRange:
+    """Return a window of log lines.
+
+    ``after`` and ``before`` are exclusive 1-based line numbers. With only
+    ``before`` the window ends right before that line (used to scroll back);
+    otherwise it starts right after ``after`` (default: the first line).
+    """
+    view = await _view(session, deployment_id, stream)
+    total = view.total
+    upper = total if before is None else max(min(before - 1, total), 0)
+
+    if before is not None and after is None:
+        start = max(upper - limit, 0)
+        lines = await _read(session, deployment_id, stream, view, start, upper - start)
+        # Keep the lines closest to ``before`` when the byte budget is exceeded
+        lines, trimmed = _apply_byte_budget(lines, max_bytes, keep_tail=True)
+        return LogRange(lines=lines, total_lines=total, has_more=trimmed or start > 0)
+
+    start = min(max(after or 0, 0), upper)
+    lines = await _read(session, deployment_id, stream, view, start, min(limit, upper - start))
+    lines, truncated = _apply_byte_budget(lines, max_bytes, keep_tail=False)
+    last = lines[-1].line if lines else start
+    return LogRange(lines=lines, total_lines=total, has_more=truncated or last < upper)
+
+
+def _matcher(level: str | None, contains: str | None):
+    min_rank = LEVEL_RANK[level] if level else None
+    needle = contains.casefold() if contains else None
+
+    def match(line: LogLine) -> bool:
+        if min_rank is not None and LEVEL_RANK.get(line.level or "info", 1) < min_rank:
+            return False
+        return needle is None or needle in line.message.casefold()
+
+    return match
+
+
+async def search_log_range(
+    session: AsyncSession,
+    deployment_id: uuid.UUID,
+    *,
+    after: int | None = None,
+    before: int | None = None,
+    limit: int = 500,
+    level: LogLevel | None = None,
+    contains: str | None = None,
+    max_scan: int | None = None,
+    stream: LogStream = "build",
+) -> LogRange:
+    """Like :func:`read_log_range`, keeping only lines at or above ``level``
+    that contain ``contains`` (case-insensitive).
+
+    At most ``max_scan`` lines are examined per call, so a rare match cannot
+    turn one request into a scan of the whole stream. ``next_cursor`` and
+    ``prev_cursor`` point at the edges of what was examined, and ``has_more``
+    says whether lines remain in the direction of the read.
+    """
+    match = _matcher(level, contains)
+    max_scan = max_scan or settings.log_search_max_scan_lines
+    view = await _view(session, deployment_id, stream)
+    total = view.total
+    upper = total if before is None else max(min(before - 1, total), 0)
+    matched: list[LogLine] = []
+    examined = 0
+
+    if before is not None and after is None:
+        # ``position`` lines before the examined ones remain
+        position = upper
+        while position > 0 and len(matched) < limit and examined < max_scan:
+            size = min(SEARCH_CHUNK_LINES, position, max_scan - examined)
+            chunk = await _read(session, deployment_id, stream, view, position - size, size)
+            position -= size
+            examined += size
+            matched[:0] = [line for line in chunk if match(line)]
+        if len(matched) > limit:
+            matched = matched[-limit:]
+            position = matched[0].line - 1
+        return LogRange(
+            lines=matched,
+            total_lines=total,
+            has_more=position > 0,
+            scanned_first=position + 1,
+            scanned_last=upper,
+        )
+
+    start = min(max(after or 0, 0), upper)
+    position = start
+    while position < upper and len(matched) < limit and examined < max_scan:
+        chunk = await _read(
+            session, deployment_id, stream, view, position, min(SEARCH_CHUNK_LINES, upper - position, max_scan - examined)
+        )
+        if not chunk:
+            break
+        position += len(chunk)
+        examined += len(chunk)
+        matched.extend(line for line in chunk if match(line))
+    if len(matched) > limit:
+        matched = matched[:limit]
+        position = matched[-1].line
+    return LogRange(
+        lines=matched,
+        total_lines=total,
+        has_more=position < upper,
+        scanned_first=start + 1,
+        scanned_last=position,
+    )
+
+
+async def tail_log(
+    session: AsyncSession,
+    deployment_id: uuid.UUID,
+    lines: int,
+    stream: LogStream = "build",
+) -> LogRange:
+    """Return the last ``lines`` lines of a deployment's log stream."""
+    view = await _view(session, deployment_id, stream)
+    total = view.total
+    start = max(total - lines, 0)
+    tail = await _read(session, deployment_id, stream, view, start, total - start)
+    return LogRange(lines=tail, total_lines=total, has_more=start > 0)
+
+
+# ---------------------------------------------------------------------------
+# Migration of legacy rows
+# ---------------------------------------------------------------------------
+
+
+async def iter_log_lines(
+    session: AsyncSession,
+    deployment_id: uuid.UUID,
+    stream: LogStream = "build",
+    batch_size: int = 1000,
+) -> AsyncIterator[LogLine]:
+    """Yield every line of a stream in order, reading ``batch_size`` lines at a time."""
+    view = await _view(session, deployment_id, stream)
+    position = 0
+    while position < view.total:
+        chunk = await _read(session, deployment_id, stream, view, position, min(batch_size, view.total - position))
+        if not chunk:
+            break
+        for line in chunk:
+            yield line
+        position += len(chunk)
+
+
+async def migrate_legacy_logs(deployment_id: uuid.UUID, stream: LogStream = "build") -> int:
+    """Move a deployment's legacy log rows into the store and delete the rows.
+
+    Legacy rows always precede store lines, so the whole stream is rewritten
+    as a single segment. Returns the number of legacy rows migrated.
+    """
+    async with AsyncSessionLocal() as session:
+        legacy = await _legacy_count(session, deployment_id, stream)
+        if legacy == 0:
+            return 0
+        await log_store.replace(deployment_id, iter_log_lines(session, deployment_id, stream), stream)
+    return legacy
+
+
+def segment_storage_bytes(deployment_id: uuid.UUID) -> int:
+    """Bytes on disk used by all of a deployment's segment files."""
+    directory = _root() / str(deployment_id)
+    if not directory.exists():
+        return 0
+    return sum(entry.stat().st_size for entry in directory.rglob("*") if entry.is_file())
+
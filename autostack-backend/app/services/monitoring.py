@@ -6,23 +6,21 @@ Replaces mock monitoring with actual system metrics
 import asyncio
 import time
 import json
+from contextlib import suppress
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
 import psutil
 from pathlib import Path
 
 from sqlalchemy import select, func
 
-try:
-    import docker
-    DOCKER_AVAILABLE = True
-except ImportError:
-    DOCKER_AVAILABLE = False
-
 from ..db import AsyncSessionLocal
 from ..models import Deployment, DeploymentContainer
-from .container_runtime import record_health_check
+from .container_runtime import is_docker_available, record_health_check
+from .docker_api import DockerApiError, client as docker_client
+from .hibernation import stats as hibernation_stats
 from .real_k8s_orchestrator import get_cluster_snapshot
+from .versions import bump_deployment_version
 
 
 class RealMonitoringService:
@@ -108,7 +106,7 @@ class RealMonitoringService:
     
     async def collect_docker_metrics(self) -> Dict:
         """Collect Docker container metrics"""
-        if not DOCKER_AVAILABLE:
+        if not is_docker_available():
             return {
                 "timestamp": datetime.utcnow().isoformat(),
                 "error": "Docker not available",
@@ -116,48 +114,51 @@ class RealMonitoringService:
             }
         
         try:
-            docker_client = docker.from_env()
-            containers = docker_client.containers.list(all=True)
+            containers = await docker_client.list_containers(all=True)
             
-            container_metrics = []
-            for container in containers:
+            async def describe(container: Dict) -> Dict:
+                name = (container.get("Names") or ["/"])[0].lstrip("/")
                 try:
-                    stats = container.stats(stream=False)
+                    stats, details = await asyncio.gather(
+                        docker_client.stats(container["Id"]),
+                        docker_client.inspect_container(container["Id"]),
+                    )
                     
                     # Parse container stats
                     cpu_usage = self._calculate_container_cpu(stats)
-                    memory_usage = stats["memory_stats"]["usage"]
-                    memory_limit = stats["memory_stats"]["limit"]
+                    memory_usage = stats["memory_stats"].get("usage", 0)
+                    memory_limit = stats["memory_stats"].get("limit", 0)
                     
-                    container_info = {
-                        "id": container.id[:12],
-                        "name": container.name,
-                        "status": container.status,
-                        "image": container.image.tags[0] if container.image.tags else container.image.id,
+                    return {
+                        "id": container["Id"][:12],
+                        "name": name,
+                        "status": container.get("State"),
+                        "image": container.get("Image"),
                         "cpu_percent": cpu_usage,
                         "memory_usage": memory_usage,
                         "memory_limit": memory_limit,
                         "memory_percent": (memory_usage / memory_limit) * 100 if memory_limit > 0 else 0,
-                        "network_rx": stats.get("networks", {}).get("eth0", {}).get("rx_bytes", 0),
-                        "network_tx": stats.get("networks", {}).get("eth0", {}).get("tx_bytes", 0),
-                        "created": container.attrs["Created"],
-                        "started": container.attrs.get("State", {}).get("StartedAt")
+                        "network_rx": (stats.get("networks") or {}).get("eth0", {}).get("rx_bytes", 0),
+                        "network_tx": (stats.get("networks") or {}).get("eth0", {}).get("tx_bytes", 0),
+                        "created": details.get("Created"),
+                        "started": details.get("State", {}).get("StartedAt")
                     }
                     
-                    container_metrics.append(container_info)
-                    
-                except Exception as e:
-                    container_metrics.append({
-                        "id": container.id[:12],
-                        "name": container.name,
+                except (DockerApiError, KeyError) as e:
+                    return {
+                        "id": container["Id"][:12],
+                        "name": name,
                         "error": str(e)
-                    })
+                    }
+            
+            # One pooled connection per container instead of sequential round trips
+            container_metrics = list(await asyncio.gather(*(describe(c) for c in containers)))
             
             metrics = {
                 "timestamp": datetime.utcnow().isoformat(),
                 "containers": container_metrics,
                 "total_containers": len(containers),
-                "running_containers": len([c for c in containers if c.status == "running"])
+                "running_containers": len([c for c in containers if c.get("State") == "running"])
             }
             
             self._store_metric("docker", metrics)
@@ -317,6 +318,21 @@ class RealMonitoringService:
                 "application": {}
             }
     
+    async def collect_hibernation_metrics(self) -> Dict:
+        """Scale-to-zero activity of this process plus containers hibernated right now"""
+        currently_hibernated = None
+        try:
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(
+                    select(func.count())
+                    .select_from(DeploymentContainer)
+                    .where(DeploymentContainer.status == "hibernated")
+                )
+                currently_hibernated = result.scalar() or 0
+        except Exception:
+            pass
+        return {**hibernation_stats.snapshot(), "currently_hibernated": currently_hibernated}
+
     def _calculate_container_cpu(self, stats: Dict) -> float:
         """Calculate CPU usage percentage for container"""
         try:
@@ -363,6 +379,7 @@ class RealMonitoringService:
             "docker": docker_metrics,
             "deployments": deployment_metrics,
             "application": application_metrics.get("application", {}),
+            "hibernation": await self.collect_hibernation_metrics(),
             "alerts": self._check_alerts(system_metrics, docker_metrics, deployment_metrics)
         }
     
@@ -452,7 +469,8 @@ class RealMonitoringService:
             rows = result.all()
 
             for container, deployment in rows:
-                url = deployment.deployed_url or f"http://{container.host}:{container.port}/"
+                # Probe the container itself: going through the gateway would count as traffic
+                url = f"http://{container.host}:{container.port}/"
                 try:
                     hc = await record_health_check(db, deployment, url)
                     healthy = hc.is_live
@@ -470,6 +488,7 @@ class RealMonitoringService:
                             deployment.failed_reason = (existing + "\n" if existing else "") + reason
                         if deployment.status != "failed":
                             deployment.status = "failed"
+                            await bump_deployment_version(db, deployment.id)
                         self.alerts.append(
                             {
                                 "type": "critical",
@@ -498,5 +517,110 @@ class RealMonitoringService:
                 await asyncio.sleep(interval)
 
 
+# Keys that change on every collection without carrying new information; they
+# are ignored when deciding whether a summary section changed between ticks.
+_VOLATILE_KEYS = {"timestamp", "last_check"}
+
+
+def _strip_volatile(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {k: _strip_volatile(v) for k, v in value.items() if k not in _VOLATILE_KEYS}
+    if isinstance(value, list):
+        return [_strip_volatile(item) for item in value]
+    return value
+
+
+def diff_summary_sections(previous: Dict | None, current: Dict) -> Dict:
+    """Return the top-level sections of ``current`` that differ from ``previous``.
+
+    ``timestamp`` and ``uptime_seconds`` are always included so that every delta
+    is self-describing and doubles as a liveness signal for clients.
+    """
+    delta: Dict[str, Any] = {
+        "timestamp": current.get("timestamp"),
+        "uptime_seconds": current.get("uptime_seconds"),
+    }
+    for key, value in current.items():
+        if key in delta:
+            continue
+        if previous is None or key not in previous or _strip_volatile(previous[key]) != _strip_volatile(value):
+            delta[key] = value
+    return delta
+
+
+class MetricsBroadcaster:
+    """Single producer for /api/monitoring/live.
+
+    One summary is collected per tick no matter how many clients are connected.
+    New subscribers receive the latest full snapshot, after which only the
+    sections that changed since the previous tick are pushed as deltas.
+    """
+
+    def __init__(
+        self,
+        collect: Callable[[], Awaitable[Dict]],
+        interval: float = 10,
+        queue_size: int = 8,
+    ) -> None:
+        self._collect = collect
+        self._interval = interval
+        self._queue_size = queue_size
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._latest: Dict | None = None
+        self._task: asyncio.Task | None = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    async def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self._queue_size)
+        async with self._lock:
+            if self._latest is None:
+                self._latest = await self._collect()
+            queue.put_nowait({"type": "metrics_update", "data": self._latest})
+            self._subscribers.add(queue)
+            if self._task is None or self._task.done():
+                self._task = asyncio.create_task(self._run())
+        return queue
+
+    async def unsubscribe(self, queue: asyncio.Queue) -> None:
+        task: asyncio.Task | None = None
+        async with self._lock:
+            self._subscribers.discard(queue)
+            if not self._subscribers and self._task is not None:
+                task, self._task = self._task, None
+                # Drop the cached snapshot so the next subscriber gets fresh data
+                self._latest = None
+        if task is not None and task is not asyncio.current_task():
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+
+    def _publish(self, message: Dict) -> None:
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # A slow client missed deltas; resynchronise it with a full snapshot
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"type": "metrics_update", "data": self._latest})
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self._interval)
+            try:
+                summary = await self._collect()
+            except Exception as e:
+                self._publish({"type": "error", "message": str(e)})
+                continue
+            delta = diff_summary_sections(self._latest, summary)
+            self._latest = summary
+            self._publish({"type": "metrics_delta", "data": delta, "timestamp": summary.get("timestamp")})
+
+
 # Global monitoring instance
 monitoring_service = RealMonitoringService()
+metrics_broadcaster = MetricsBroadcaster(monitoring_service.get_metrics_summary)
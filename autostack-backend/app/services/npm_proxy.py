@@ -0,0 +1,395 @@
+"""Pull-through cache for the npm registry shared by every build.
+
+Builds point ``npm_config_registry`` (and the yarn equivalents) at
+``/npm/`` on this server, authenticated with a token scoped to the build,
+unless the repository configures its own registry or credentials. Package metadata is cached for
+``NPM_PROXY_METADATA_TTL_SECONDS`` and revalidated with its ETag; tarballs are
+immutable once published, so they are stored once and never fetched again.
+Least recently used entries are evicted once the cache exceeds
+``NPM_PROXY_MAX_BYTES``. When the upstream registry fails, stale metadata is served instead, and with
+``NPM_PROXY_OFFLINE=true`` the proxy answers purely from its cache.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import os
+import re
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, AsyncIterator
+from urllib.parse import quote, urlsplit
+
+import httpx
+
+from ..config import settings
+
+
+logger = logging.getLogger(__name__)
+
+ABBREVIATED_METADATA = "application/vnd.npm.install-v1+json"
+STREAM_CHUNK_BYTES = 64 * 1024
+# Eviction scans the whole cache, so run it at most this often
+EVICTION_INTERVAL_SECONDS = 60.0
+# Keys in a repository's .npmrc/.yarnrc that mean it talks to a registry of its own
+_REGISTRY_CONFIG_RE = re.compile(
+    r"^\s*(registry|[^=\s]*_auth|[^=\s]*_authToken|[^=\s]*_password|npmRegistryServer|npmAuthToken|npmAuthIdent)\s*[=:\s]",
+    re.MULTILINE,
+)
+
+_last_eviction = 0.0
+
+
+class NpmProxyError(Exception):
+    def __init__(self, status_code: int, message: str) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+
+
+@dataclass
+class ProxyStats:
+    metadata_hits: int = 0
+    metadata_revalidated: int = 0
+    metadata_misses: int = 0
+    metadata_stale: int = 0
+    tarball_hits: int = 0
+    tarball_misses: int = 0
+    upstream_errors: int = 0
+
+    def snapshot(self) -> dict[str, Any]:
+        data: dict[str, Any] = asdict(self)
+        metadata_total = self.metadata_hits + self.metadata_revalidated + self.metadata_misses + self.metadata_stale
+        tarball_total = self.tarball_hits + self.tarball_misses
+        served_from_cache = self.metadata_hits + self.metadata_revalidated + self.metadata_stale
+        data["metadata_hit_ratio"] = round(served_from_cache / metadata_total, 4) if metadata_total else None
+        data["tarball_hit_ratio"] = round(self.tarball_hits / tarball_total, 4) if tarball_total else None
+        data["offline"] = settings.npm_proxy_offline
+        return data
+
+
+stats = ProxyStats()
+_http_client: httpx.AsyncClient | None = None
+
+
+def _client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(timeout=httpx.Timeout(30.0, connect=10.0), follow_redirects=True)
+    return _http_client
+
+
+async def close_npm_proxy() -> None:
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+def _cache_root() -> Path:
+    return Path(settings.npm_proxy_cache_dir)
+
+
+def _digest(value: str) -> str:
+    return hashlib.sha256(value.encode()).hexdigest()
+
+
+def _upstream_url(path: str) -> str:
+    return f"{settings.npm_proxy_upstream.rstrip('/')}/{path}"
+
+
+def _encode_name(name: str) -> str:
+    # Scoped packages are requested as @scope%2fname
+    return quote(name, safe="@")
+
+
+def _touch(path: Path) -> None:
+    # Eviction goes by modification time, so a cache hit refreshes it
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+# ---------------------------------------------------------------------------
+# Build access
+# ---------------------------------------------------------------------------
+
+
+def _token_signature(deployment_id: uuid.UUID, expires: int) -> str:
+    message = f"npm-proxy:{deployment_id}:{expires}".encode()
+    return hmac.new(settings.secret_key.encode(), message, hashlib.sha256).hexdigest()
+
+
+def create_registry_token(deployment_id: uuid.UUID) -> str:
+    """Token handed to the build of ``deployment_id``; it expires once the build could no longer be running."""
+    expires = int(time.time()) + settings.build_timeout_seconds + 600
+    return f"{deployment_id}.{expires}.{_token_signature(deployment_id, expires)}"
+
+
+def verify_registry_token(token: str) -> uuid.UUID | None:
+    deployment_part, _, rest = token.partition(".")
+    expires_part, _, signature = rest.partition(".")
+    try:
+        deployment_id = uuid.UUID(deployment_part)
+        expires = int(expires_part)
+    except ValueError:
+        return None
+    if expires < time.time() or not hmac.compare_digest(_token_signature(deployment_id, expires), signature):
+        return None
+    return deployment_id
+
+
+def repo_configures_registry(*directories: Path) -> bool:
+    """Whether the checkout brings its own registry or credentials, which the proxy must not override."""
+    for directory in directories:
+        for name in (".npmrc", ".yarnrc", ".yarnrc.yml"):
+            try:
+                content = (directory / name).read_text(errors="replace")
+            except OSError:
+                continue
+            if _REGISTRY_CONFIG_RE.search(content):
+                return True
+    return False
+
+
+def registry_env(deployment_id: uuid.UUID) -> dict[str, str]:
+    """Environment pointing npm, pnpm and yarn at the proxy with a build-scoped token."""
+    registry_url = (settings.npm_proxy_url or f"{str(settings.backend_url).rstrip('/')}/npm").rstrip("/") + "/"
+    token = create_registry_token(deployment_id)
+    parts = urlsplit(registry_url)
+    return {
+        "npm_config_registry": registry_url,
+        # npm-style credentials are keyed by the registry URL without its scheme
+        f"npm_config_//{parts.netloc}{parts.path}:_authToken": token,
+        "YARN_REGISTRY": registry_url,
+        "YARN_NPM_REGISTRY_SERVER": registry_url,
+        "YARN_NPM_AUTH_TOKEN": token,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Metadata
+# ---------------------------------------------------------------------------
+
+
+def _metadata_paths(name: str, abbreviated: bool) -> tuple[Path, Path]:
+    key = _digest(f"{name}|{'abbreviated' if abbreviated else 'full'}")
+    base = _cache_root() / "metadata" / key[:2] / key
+    return base.with_suffix(".json"), base.with_suffix(".meta")
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+    temp.write_bytes(data)
+    os.replace(temp, path)
+
+
+def _read_cached_metadata(name: str, abbreviated: bool) -> tuple[bytes, dict[str, Any]] | None:
+    body_path, meta_path = _metadata_paths(name, abbreviated)
+    try:
+        return body_path.read_bytes(), json.loads(meta_path.read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def _store_metadata(name: str, abbreviated: bool, body: bytes, etag: str | None) -> None:
+    body_path, meta_path = _metadata_paths(name, abbreviated)
+    _write_atomic(body_path, body)
+    _write_atomic(meta_path, json.dumps({"fetched_at": time.time(), "etag": etag}).encode())
+
+
+def _rewrite_tarball_urls(body: bytes, proxy_base: str) -> bytes:
+    """Point ``dist.tarball`` of every version at this proxy instead of the upstream registry."""
+    document = json.loads(body)
+    upstream = settings.npm_proxy_upstream.rstrip("/")
+    for version in (document.get("versions") or {}).values():
+        dist = version.get("dist") if isinstance(version, dict) else None
+        tarball = dist.get("tarball") if isinstance(dist, dict) else None
+        if isinstance(tarball, str) and tarball.startswith(upstream):
+            dist["tarball"] = proxy_base.rstrip("/") + tarball[len(upstream):]
+    return json.dumps(document, separators=(",", ":")).encode()
+
+
+async def get_metadata(name: str, abbreviated: bool, proxy_base: str) -> bytes:
+    cached = _read_cached_metadata(name, abbreviated)
+    if cached is not None:
+        body, meta = cached
+        fresh = time.time() - meta.get("fetched_at", 0) < settings.npm_proxy_metadata_ttl_seconds
+        if fresh or settings.npm_proxy_offline:
+            stats.metadata_hits += 1
+            _touch(_metadata_paths(name, abbreviated)[0])
+            return _rewrite_tarball_urls(body, proxy_base)
+    elif settings.npm_proxy_offline:
+        stats.metadata_misses += 1
+        raise NpmProxyError(404, f"{name} is not in the offline npm cache")
+
+    headers = {"Accept": ABBREVIATED_METADATA if abbreviated else "application/json"}
+    if cached is not None and cached[1].get("etag"):
+        headers["If-None-Match"] = cached[1]["etag"]
+    try:
+        response = await _client().get(_upstream_url(_encode_name(name)), headers=headers)
+    except httpx.HTTPError as exc:
+        response = None
+        logger.warning("npm registry request for %s failed: %s", name, exc)
+
+    if response is not None and response.status_code == 304 and cached is not None:
+        stats.metadata_revalidated += 1
+        _store_metadata(name, abbreviated, cached[0], cached[1].get("etag"))
+        return _rewrite_tarball_urls(cached[0], proxy_base)
+    if response is not None and response.status_code == 200:
+        stats.metadata_misses += 1
+        _store_metadata(name, abbreviated, response.content, response.headers.get("etag"))
+        _schedule_eviction()
+        return _rewrite_tarball_urls(response.content, proxy_base)
+    if response is not None and response.status_code == 404:
+        stats.metadata_misses += 1
+        raise NpmProxyError(404, f"{name} not found")
+
+    stats.upstream_errors += 1
+    if cached is not None:
+        # Registry hiccup: an outdated package list beats a failed install
+        stats.metadata_stale += 1
+        return _rewrite_tarball_urls(cached[0], proxy_base)
+    raise NpmProxyError(502, f"npm registry unavailable for {name}")
+
+
+# ---------------------------------------------------------------------------
+# Tarballs
+# ---------------------------------------------------------------------------
+
+
+def _blob_path(content_digest: str) -> Path:
+    return _cache_root() / "blobs" / content_digest[:2] / f"{content_digest}.tgz"
+
+
+def _index_path(name: str, filename: str) -> Path:
+    key = _digest(f"{name}/-/{filename}")
+    return _cache_root() / "tarballs" / key[:2] / key
+
+
+def cached_tarball(name: str, filename: str) -> Path | None:
+    """Path of the stored tarball; published versions never change, so a hit is never revalidated."""
+    try:
+        content_digest = _index_path(name, filename).read_text().strip()
+    except OSError:
+        return None
+    path = _blob_path(content_digest)
+    if not path.is_file():
+        return None
+    stats.tarball_hits += 1
+    _touch(path)
+    return path
+
+
+async def fetch_tarball(name: str, filename: str) -> AsyncIterator[bytes]:
+    """Stream a tarball from upstream to the client while storing it in the cache."""
+    if settings.npm_proxy_offline:
+        raise NpmProxyError(404, f"{name}/{filename} is not in the offline npm cache")
+    request = _client().build_request("GET", _upstream_url(f"{_encode_name(name)}/-/{quote(filename)}"))
+    try:
+        response = await _client().send(request, stream=True)
+    except httpx.HTTPError as exc:
+        stats.upstream_errors += 1
+        raise NpmProxyError(502, f"npm registry unavailable: {exc}") from exc
+    if response.status_code != 200:
+        await response.aclose()
+        if response.status_code == 404:
+            raise NpmProxyError(404, f"{name}/{filename} not found")
+        stats.upstream_errors += 1
+        raise NpmProxyError(502, f"npm registry returned {response.status_code}")
+    stats.tarball_misses += 1
+    return _stream_and_store(response, name, filename)
+
+
+async def _stream_and_store(response: httpx.Response, name: str, filename: str) -> AsyncIterator[bytes]:
+    blobs = _cache_root() / "blobs"
+    blobs.mkdir(parents=True, exist_ok=True)
+    temp = blobs / f"{uuid.uuid4().hex}.tmp"
+    digest = hashlib.sha256()
+    complete = False
+    try:
+        with open(temp, "wb") as handle:
+            async for chunk in response.aiter_bytes(STREAM_CHUNK_BYTES):
+                digest.update(chunk)
+                handle.write(chunk)
+                yield chunk
+        complete = True
+    finally:
+        await response.aclose()
+        if complete:
+            # Blobs are named by their content, so identical tarballs are stored once
+            content_digest = digest.hexdigest()
+            blob = _blob_path(content_digest)
+            blob.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(temp, blob)
+            _write_atomic(_index_path(name, filename), content_digest.encode())
+            _schedule_eviction()
+        elif temp.exists():
+            temp.unlink()
+
+
+def _schedule_eviction() -> None:
+    global _last_eviction
+    now = time.monotonic()
+    if now - _last_eviction < EVICTION_INTERVAL_SECONDS:
+        return
+    _last_eviction = now
+    asyncio.get_running_loop().run_in_executor(None, evict_cache, settings.npm_proxy_max_bytes)
+
+
+def evict_cache(max_bytes: int) -> int:
+    """Delete least recently used tarballs and metadata until the cache fits ``max_bytes``; returns bytes freed.
+
+    Index entries of evicted tarballs are left behind; they read as a miss and
+    are rewritten when the tarball is fetched again.
+    """
+    entries: list[tuple[float, int, Path]] = []
+    for subdirectory, suffix in (("blobs", ".tgz"), ("metadata", ".json")):
+        for root, _, files in os.walk(_cache_root() / subdirectory):
+            for name in files:
+                if not name.endswith(suffix):
+                    continue
+                path = Path(root) / name
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    freed = 0
+    for _, size, path in sorted(entries):
+        if total - freed <= max_bytes:
+            break
+        victims = [path, path.with_suffix(".meta")] if path.suffix == ".json" else [path]
+        for victim in victims:
+            try:
+                victim.unlink()
+            except OSError:
+                pass
+        freed += size
+    if freed:
+        logger.info("npm proxy cache evicted %d bytes", freed)
+    return freed
+
+
+async def forward_audit(body: bytes, path: str) -> tuple[int, bytes]:
+    """Pass ``npm audit`` requests through uncached; offline they report no advisories."""
+    if settings.npm_proxy_offline:
+        return 200, b"{}"
+    try:
+        response = await _client().post(
+            _upstream_url(path), content=body, headers={"Content-Type": "application/json"}
+        )
+    except httpx.HTTPError:
+        stats.upstream_errors += 1
+        return 200, b"{}"
+    return response.status_code, response.content
@@ -0,0 +1,90 @@
+"""Path filters that decide whether a push touches anything worth deploying.
+
+Patterns are glob-like and relative to the repository root:
+
+* ``*`` and ``?`` match within a single path segment, ``**`` across segments;
+* a pattern without ``/`` matches at any depth (``*.md``);
+* a pattern also matches everything below a matching directory (``docs``,
+  ``docs/`` and ``docs/**`` are equivalent).
+
+A push is deployed when at least one changed file is matched by an include
+pattern (every file when there are none) and by no exclude pattern.
+"""
+
+from __future__ import annotations
+
+import re
+from functools import lru_cache
+from typing import Any, Iterable
+
+# GitHub lists at most this many commits in a push payload; larger pushes are truncated
+GITHUB_PUSH_COMMIT_LIMIT = 20
+
+
+@lru_cache(maxsize=512)
+def compile_glob(pattern: str) -> re.Pattern[str]:
+    pattern = pattern.strip().lstrip("/")
+    if pattern.endswith("/"):
+        pattern = pattern.rstrip("/")
+    if "/" not in pattern:
+        pattern = "**/" + pattern
+
+    parts: list[str] = []
+    index = 0
+    while index < len(pattern):
+        if pattern.startswith("**/", index):
+            parts.append("(?:.*/)?")
+            index += 3
+        elif pattern.startswith("**", index):
+            parts.append(".*")
+            index += 2
+        elif pattern[index] == "*":
+            parts.append("[^/]*")
+            index += 1
+        elif pattern[index] == "?":
+            parts.append("[^/]")
+            index += 1
+        else:
+            parts.append(re.escape(pattern[index]))
+            index += 1
+    return re.compile("".join(parts) + r"(?:/.*)?\Z")
+
+
+def matches_any(path: str, patterns: Iterable[str]) -> bool:
+    return any(compile_glob(pattern).match(path) for pattern in patterns if pattern.strip())
+
+
+def changed_files(payload: dict[str, Any]) -> set[str] | None:
+    """Union of files added, modified or removed by a push; ``None`` when the list is incomplete."""
+    commits = payload.get("commits")
+    if not commits or len(commits) >= GITHUB_PUSH_COMMIT_LIMIT:
+        return None
+    files: set[str] = set()
+    for commit in commits:
+        for key in ("added", "modified", "removed"):
+            entries = commit.get(key)
+            if entries is None:
+                return None
+            files.update(entries)
+    return files
+
+
+def path_filter_skip_reason(
+    payload: dict[str, Any],
+    include: list[str] | None,
+    exclude: list[str] | None,
+) -> str | None:
+    """Return why a push should not be deployed, or ``None`` to deploy it."""
+    if not include and not exclude:
+        return None
+    files = changed_files(payload)
+    if not files:
+        # Truncated or unusual payloads (new branch, huge or empty push): building is the safe choice
+        return None
+
+    relevant = [path for path in files if not include or matches_any(path, include)]
+    if exclude:
+        relevant = [path for path in relevant if not matches_any(path, exclude)]
+    if relevant:
+        return None
+    return f"None of the {len(files)} changed files match the project's deploy paths"
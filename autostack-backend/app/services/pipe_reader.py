@@ -0,0 +1,86 @@
+"""Chunked line reader for subprocess pipes.
+
+``StreamReader.readline`` costs one await per line and fails outright on lines
+longer than the stream limit (minified bundles, base64 blobs). :func:`iter_pipe_lines`
+reads large blocks instead, splits them into lines incrementally and cuts lines
+that exceed ``max_line_bytes``. Consumers apply backpressure simply by not
+asking for the next line: nothing is read from the pipe in the meantime, so a
+chatty build blocks on its own stdout instead of growing our memory.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from typing import AsyncIterator
+
+from ..config import settings
+
+
+TRUNCATION_MARKER = " … [line truncated, {skipped} more bytes]"
+
+
+async def iter_pipe_lines(
+    pipe: asyncio.StreamReader,
+    *,
+    chunk_size: int | None = None,
+    max_line_bytes: int | None = None,
+) -> AsyncIterator[str]:
+    """Yield decoded lines (without the trailing ``\\n``) until the pipe is closed."""
+    chunk_size = chunk_size or settings.build_log_chunk_bytes
+    max_line_bytes = max_line_bytes or settings.build_log_max_line_bytes
+    # Bytes are only decoded once a full line is assembled, so multi-byte
+    # characters that straddle two chunks are never split
+    buffer = bytearray()
+    skipped = 0  # bytes discarded from the current over-long line
+
+    while True:
+        chunk = await pipe.read(chunk_size)
+        if not chunk:
+            break
+        start = 0
+        while True:
+            newline = chunk.find(b"\n", start)
+            if newline == -1:
+                break
+            piece = chunk[start:newline]
+            start = newline + 1
+            if skipped:
+                yield _truncated(buffer, skipped + len(piece))
+                buffer.clear()
+                skipped = 0
+                continue
+            if len(buffer) + len(piece) > max_line_bytes:
+                room = max_line_bytes - len(buffer)
+                buffer += piece[:room]
+                yield _truncated(buffer, len(piece) - room)
+                buffer.clear()
+                continue
+            if buffer:
+                buffer += piece
+                yield _decode(buffer)
+                buffer.clear()
+            else:
+                yield _decode(piece)
+
+        rest = chunk[start:]
+        if skipped:
+            skipped += len(rest)
+        elif len(buffer) + len(rest) > max_line_bytes:
+            room = max_line_bytes - len(buffer)
+            buffer += rest[:room]
+            skipped = len(rest) - room
+        else:
+            buffer += rest
+
+    if skipped:
+        yield _truncated(buffer, skipped)
+    elif buffer:
+        yield _decode(buffer)
+
+
+def _decode(data: bytes | bytearray) -> str:
+    return bytes(data).decode("utf-8", errors="replace")
+
+
+def _truncated(kept: bytearray, skipped: int) -> str:
+    return _decode(kept) + TRUNCATION_MARKER.format(skipped=skipped)
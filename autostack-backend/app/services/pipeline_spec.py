@@ -0,0 +1,145 @@
+"""Declarative build pipelines read from ``autostack.yml``.
+
+A repository (or the project's root directory) may describe its build as a
+graph of steps instead of relying on the install/build auto-detection::
+
+    output: dist
+    steps:
+      install:
+        run: npm ci
+        inputs: [package.json, package-lock.json]
+        outputs: [node_modules]
+      lint:
+        run: npm run lint
+        needs: [install]
+      test:
+        run: npm test
+        needs: [install]
+      build:
+        run: npm run build
+        needs: [install]
+        inputs: ["src/**", package.json]
+        outputs: [dist]
+
+Steps whose dependencies are satisfied run concurrently. ``inputs`` are globs
+(see :mod:`app.services.path_filters`) hashed to decide whether a step can be
+restored from the step cache; steps without inputs always run.
+"""
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+import yaml
+
+PIPELINE_FILE_NAMES = ("autostack.yml", "autostack.yaml")
+# Short enough to fit the deployment_stages.stage_name column with its "Step: " prefix
+STEP_NAME_RE = re.compile(r"[A-Za-z0-9][A-Za-z0-9_.-]{0,43}")
+
+
+class PipelineSpecError(ValueError):
+    """``autostack.yml`` is not valid; the message is shown in the build log."""
+
+
+@dataclass(frozen=True)
+class PipelineStep:
+    name: str
+    run: str
+    needs: tuple[str, ...] = ()
+    inputs: tuple[str, ...] = ()
+    outputs: tuple[str, ...] = ()
+    env: dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class PipelineSpec:
+    steps: dict[str, PipelineStep]
+    output_dir: str | None = None
+
+    def order(self) -> list[PipelineStep]:
+        """Steps in dependency order (every step after the steps it needs)."""
+        ordered: list[PipelineStep] = []
+        state: dict[str, str] = {}
+
+        def visit(name: str, path: tuple[str, ...]) -> None:
+            if state.get(name) == "done":
+                return
+            if state.get(name) == "visiting":
+                cycle = " -> ".join(path[path.index(name):] + (name,))
+                raise PipelineSpecError(f"Pipeline steps form a cycle: {cycle}")
+            state[name] = "visiting"
+            for dependency in self.steps[name].needs:
+                visit(dependency, path + (name,))
+            state[name] = "done"
+            ordered.append(self.steps[name])
+
+        for name in self.steps:
+            visit(name, ())
+        return ordered
+
+
+def _string_list(value: Any, step: str, key: str) -> tuple[str, ...]:
+    if value is None:
+        return ()
+    if isinstance(value, str):
+        value = [value]
+    if not isinstance(value, list) or not all(isinstance(item, str) and item.strip() for item in value):
+        raise PipelineSpecError(f"Step '{step}': '{key}' must be a list of strings")
+    return tuple(item.strip() for item in value)
+
+
+def parse_pipeline_spec(text: str) -> PipelineSpec:
+    try:
+        document = yaml.safe_load(text)
+    except yaml.YAMLError as exc:
+        raise PipelineSpecError(f"autostack.yml is not valid YAML: {exc}") from exc
+    if not isinstance(document, dict) or not isinstance(document.get("steps"), dict) or not document["steps"]:
+        raise PipelineSpecError("autostack.yml must define a non-empty 'steps' mapping")
+
+    steps: dict[str, PipelineStep] = {}
+    for name, body in document["steps"].items():
+        name = str(name)
+        if not STEP_NAME_RE.fullmatch(name):
+            raise PipelineSpecError(f"Invalid step name '{name}' (letters, digits, '-', '_' and '.')")
+        if isinstance(body, str):
+            body = {"run": body}
+        if not isinstance(body, dict) or not isinstance(body.get("run"), str) or not body["run"].strip():
+            raise PipelineSpecError(f"Step '{name}' needs a 'run' command")
+        env = body.get("env") or {}
+        if not isinstance(env, dict):
+            raise PipelineSpecError(f"Step '{name}': 'env' must be a mapping")
+        steps[name] = PipelineStep(
+            name=name,
+            run=body["run"].strip(),
+            needs=_string_list(body.get("needs"), name, "needs"),
+            inputs=_string_list(body.get("inputs"), name, "inputs"),
+            outputs=_string_list(body.get("outputs"), name, "outputs"),
+            env={str(key): str(value) for key, value in env.items()},
+        )
+
+    for step in steps.values():
+        for dependency in step.needs:
+            if dependency not in steps:
+                raise PipelineSpecError(f"Step '{step.name}' needs unknown step '{dependency}'")
+        for output in step.outputs:
+            if Path(output).is_absolute() or ".." in Path(output).parts:
+                raise PipelineSpecError(f"Step '{step.name}': outputs must stay inside the build directory")
+
+    output_dir = document.get("output")
+    if output_dir is not None and not isinstance(output_dir, str):
+        raise PipelineSpecError("'output' must be a directory name")
+    spec = PipelineSpec(steps=steps, output_dir=output_dir)
+    spec.order()  # reject cycles up front
+    return spec
+
+
+def load_pipeline_spec(directory: Path) -> PipelineSpec | None:
+    """Parse the pipeline file in ``directory``; ``None`` when the repository has none."""
+    for file_name in PIPELINE_FILE_NAMES:
+        path = directory / file_name
+        if path.is_file():
+            return parse_pipeline_spec(path.read_text(encoding="utf-8", errors="replace"))
+    return None
@@ -0,0 +1,159 @@
+"""Host port allocation for runtime containers.
+
+Ports in ``RUNTIME_PORT_RANGE_START``..``RUNTIME_PORT_RANGE_END`` are handed
+out from an in-memory free list, so an allocation costs the same however full
+the range is. The lease itself is the ``DeploymentContainer`` row: it is
+inserted with its port before the container is created, and a partial unique
+index over the ports of containers in ``PORT_LEASE_STATES`` rejects a second
+lease on the same port, including one taken by another process. A lease ends
+when its container is stopped or fails.
+
+The free list is built from the active leases in the database (plus the
+ports published by Docker containers, when reconciled at startup) and is
+rebuilt whenever it runs dry, which picks up ports released by other
+processes. Each process walks the range from its own random offset, so
+concurrent starts in separate processes rarely pick the same port.
+
+On Postgres a lease is committed in a short transaction of its own before the
+container is started, so a process trying the same port gets an
+``IntegrityError`` at once instead of waiting on the unique index until the
+other start (``docker run`` plus the health gate) commits. SQLite serializes
+writers anyway, so there the lease is flushed in a savepoint of the caller's
+transaction.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+from collections import deque
+from typing import Iterable
+
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient
+
+from ..config import settings
+from ..db import AsyncSessionLocal
+from ..errors import ApiError
+from ..models import PORT_LEASE_STATES, DeploymentContainer
+
+
+logger = logging.getLogger(__name__)
+
+
+class PortAllocator:
+    def __init__(self, start: int, end: int, offset: int = 0) -> None:
+        self.start = start
+        self.end = end
+        self.offset = offset % max(1, end - start + 1)
+        self._free: deque[int] = deque()
+        self._free_set: set[int] = set()
+        self.loaded = False
+        self._lock = asyncio.Lock()
+
+    def reset(self, used: Iterable[int]) -> None:
+        used = set(used)
+        first = self.start + self.offset
+        ports = [*range(first, self.end + 1), *range(self.start, first)]
+        self._free = deque(port for port in ports if port not in used)
+        self._free_set = set(self._free)
+        self.loaded = True
+
+    @property
+    def free_count(self) -> int:
+        return len(self._free)
+
+    def allocate(self) -> int | None:
+        if not self._free:
+            return None
+        port = self._free.popleft()
+        self._free_set.discard(port)
+        return port
+
+    def release(self, port: int) -> None:
+        # Released ports go to the back, so a port is not reused while connections to it linger
+        if self.start <= port <= self.end and port not in self._free_set:
+            self._free.append(port)
+            self._free_set.add(port)
+
+    async def load(self, published_ports: Iterable[int] = ()) -> None:
+        """Rebuild the free list from the leases in the database and ``published_ports``."""
+        async with self._lock:
+            async with AsyncSessionLocal() as session:
+                result = await session.execute(
+                    select(DeploymentContainer.port).where(DeploymentContainer.status.in_(PORT_LEASE_STATES))
+                )
+                self.reset([*result.scalars().all(), *published_ports])
+
+
+allocator = PortAllocator(
+    settings.runtime_port_range_start,
+    settings.runtime_port_range_end,
+    offset=random.randrange(settings.runtime_port_range_end - settings.runtime_port_range_start + 1),
+)
+
+
+def _commits_leases_separately() -> bool:
+    # A second SQLite transaction would wait for the caller's to finish
+    return not settings.database_url.startswith("sqlite")
+
+
+async def _record_lease(session: AsyncSession, container: DeploymentContainer) -> None:
+    if not _commits_leases_separately():
+        async with session.begin_nested():
+            session.add(container)
+            await session.flush()
+        return
+    async with AsyncSessionLocal() as lease_session:
+        lease_session.add(container)
+        await lease_session.commit()
+        lease_session.expunge(container)
+    session.add(container)
+
+
+async def lease_port(session: AsyncSession, container: DeploymentContainer) -> int:
+    """Give ``container`` a free host port and record the lease; ``container`` joins ``session``."""
+    if not allocator.loaded:
+        await allocator.load()
+    reloaded = False
+    while True:
+        port = allocator.allocate()
+        if port is None:
+            if reloaded:
+                raise ApiError(
+                    "NO_FREE_PORT",
+                    f"No free port left in range {allocator.start}-{allocator.end}",
+                    503,
+                )
+            await allocator.load()
+            reloaded = True
+            continue
+        container.port = port
+        try:
+            await _record_lease(session, container)
+        except IntegrityError:
+            # Leased by another process since the free list was built; it stays out of the list
+            logger.debug("Port %s is already leased, trying another", port)
+            continue
+        return port
+
+
+async def end_lease(session: AsyncSession, container: DeploymentContainer) -> None:
+    """Drop the lease of a container that failed to start; ``container`` can be leased again."""
+    if _commits_leases_separately():
+        session.expunge(container)
+        async with AsyncSessionLocal() as lease_session:
+            await lease_session.execute(delete(DeploymentContainer).where(DeploymentContainer.id == container.id))
+            await lease_session.commit()
+    else:
+        await session.delete(container)
+        await session.flush()
+        session.expunge(container)
+    make_transient(container)
+
+
+def release_port(container: DeploymentContainer) -> None:
+    allocator.release(container.port)
@@ -0,0 +1,190 @@
+"""Speculative work started as soon as a deployment is queued.
+
+A queued build can wait for a worker, and once it starts its first steps are
+network-bound: cloning the repository and, for Dockerfile projects, pulling
+the ``FROM`` images. Both are started in the background when the deployment is
+created, so that network I/O overlaps the queue wait:
+
+* the pushed branch is fetched into a bare per-project mirror under
+  ``GIT_MIRROR_DIR``, which the build clone then uses as a reference. The
+  directory is shared with separate worker processes, which wait for a fetch
+  still holding the mirror's lock file before they clone;
+* the base images of the project's last built Dockerfile are pulled.
+
+Prefetching is best effort: failures are logged and the build simply does the
+work itself.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import re
+import uuid
+from asyncio.subprocess import PIPE
+from pathlib import Path
+from typing import Awaitable, Callable
+
+from ..config import settings
+from .container_runtime import is_docker_available
+from .docker_api import DockerApiError, client as docker_client
+
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows: only fetches in this process are waited for
+    fcntl = None
+
+
+logger = logging.getLogger(__name__)
+
+FETCH_WAIT_POLL_SECONDS = 0.5
+
+# `FROM [--platform=...] image [AS name]`
+FROM_RE = re.compile(r"^\s*FROM\s+(?:--\S+\s+)*(?P<image>\S+)(?:\s+AS\s+(?P<stage>\S+))?", re.IGNORECASE)
+
+_inflight: dict[str, asyncio.Task[None]] = {}
+
+
+def clone_url_for(repository: str) -> str:
+    if repository.startswith(("http://", "https://")) or repository.endswith(".git"):
+        return repository
+    return f"https://github.com/{repository}.git"
+
+
+def mirror_path(project_id: uuid.UUID) -> Path:
+    return Path(settings.git_mirror_dir).resolve() / f"{project_id}.git"
+
+
+def _fetch_lock_path(project_id: uuid.UUID) -> Path:
+    return mirror_path(project_id).with_name(f"{project_id}.fetch.lock")
+
+
+def parse_base_images(dockerfile_text: str) -> list[str]:
+    """External images a Dockerfile builds from, in order.
+
+    References to earlier build stages, ``scratch`` and images parameterised
+    with ``ARG`` values are skipped because they cannot be pulled up front.
+    """
+    images: list[str] = []
+    stages: set[str] = set()
+    for line in dockerfile_text.splitlines():
+        match = FROM_RE.match(line)
+        if not match:
+            continue
+        image = match.group("image")
+        if image.lower() not in stages and image.lower() != "scratch" and "$" not in image and image not in images:
+            images.append(image)
+        if match.group("stage"):
+            stages.add(match.group("stage").lower())
+    return images
+
+
+async def _run(args: list[str], timeout: float) -> tuple[int, str]:
+    env = {**os.environ, "GIT_TERMINAL_PROMPT": "0"}
+    proc = await asyncio.create_subprocess_exec(*args, stdout=PIPE, stderr=PIPE, env=env)
+    try:
+        _stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=timeout)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        return -1, "timed out"
+    return proc.returncode or 0, stderr.decode(errors="ignore").strip()
+
+
+async def update_git_mirror(project_id: uuid.UUID, repository: str, branch: str) -> bool:
+    """Fetch ``branch`` into the project's bare mirror, creating the mirror on first use."""
+    path = mirror_path(project_id)
+    if not path.is_dir():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        code, error = await _run(["git", "init", "--bare", "--quiet", str(path)], timeout=30)
+        if code == 0:
+            code, error = await _run(["git", "-C", str(path), "remote", "add", "origin", clone_url_for(repository)], 30)
+        if code != 0:
+            logger.warning("Could not create git mirror for project %s: %s", project_id, error)
+            return False
+    refspec = f"+refs/heads/{branch}:refs/heads/{branch}"
+    lock_fd = os.open(_fetch_lock_path(project_id), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if fcntl is not None:
+            # Held for the whole fetch so that builds in other processes can wait for it
+            await asyncio.to_thread(fcntl.flock, lock_fd, fcntl.LOCK_EX)
+        code, error = await _run(
+            ["git", "-C", str(path), "fetch", "--quiet", "--prune", "origin", refspec],
+            timeout=settings.build_timeout_seconds,
+        )
+    finally:
+        os.close(lock_fd)
+    if code != 0:
+        logger.info("Prefetching %s@%s into the git mirror failed: %s", repository, branch, error)
+        return False
+    return True
+
+
+async def pull_base_image(image: str) -> bool:
+    try:
+        if await docker_client.image_exists(image):
+            return True
+        await docker_client.pull_image(image, timeout=settings.container_start_timeout)
+    except DockerApiError as exc:
+        logger.info("Prefetching base image %s failed: %s", image, exc.message)
+        return False
+    return True
+
+
+def _start(key: str, factory: Callable[[], Awaitable[object]]) -> None:
+    # Several pushes in a row share the fetch or pull already under way
+    if key in _inflight:
+        return
+
+    async def runner() -> None:
+        try:
+            await factory()
+        except Exception:  # pragma: no cover - best effort
+            logger.warning("Prefetch %s failed", key, exc_info=True)
+        finally:
+            _inflight.pop(key, None)
+
+    _inflight[key] = asyncio.create_task(runner())
+
+
+async def wait_for_git_prefetch(project_id: uuid.UUID, branch: str) -> None:
+    """Let a fetch already under way finish instead of downloading the same objects twice.
+
+    Fetches started by this process are awaited directly; those of other
+    processes sharing ``GIT_MIRROR_DIR`` (the API, when builds run in workers)
+    are waited for through the mirror's lock file.
+    """
+    task = _inflight.get(f"git:{project_id}:{branch}")
+    if task is not None:
+        await asyncio.wait({task}, timeout=settings.build_timeout_seconds)
+        return
+    lock_path = _fetch_lock_path(project_id)
+    if fcntl is None or not lock_path.exists():
+        return
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.build_timeout_seconds
+    lock_fd = os.open(lock_path, os.O_RDONLY)
+    try:
+        while loop.time() < deadline:
+            try:
+                fcntl.flock(lock_fd, fcntl.LOCK_SH | fcntl.LOCK_NB)
+                return
+            except BlockingIOError:
+                await asyncio.sleep(FETCH_WAIT_POLL_SECONDS)
+    finally:
+        os.close(lock_fd)
+
+
+def schedule_prefetch(project, branch: str | None = None) -> None:
+    """Start background prefetches for a deployment of ``project`` that was just queued."""
+    if not settings.prefetch_enable:
+        return
+    project_id = project.id
+    repository = project.repository
+    branch = (branch or project.branch or "main").strip()
+    _start(f"git:{project_id}:{branch}", lambda: update_git_mirror(project_id, repository, branch))
+    if project.docker_base_images and is_docker_available():
+        for image in project.docker_base_images:
+            _start(f"image:{image}", lambda image=image: pull_base_image(image))
@@ -0,0 +1,155 @@
+"""Storage for the built-in Turborepo / Nx remote task cache.
+
+Builds run in a fresh directory every time, so the local task caches of
+Turborepo and Nx never hit. The build engine points both tools at this
+server instead (``TURBO_API`` / ``NX_SELF_HOSTED_REMOTE_CACHE_SERVER``) with a
+token scoped to the project, and task outputs are shared across deployments.
+
+Artifacts are opaque, content-addressed blobs stored as files under
+``REMOTE_CACHE_DIR/<project>/<hash[:2]>/<hash>``. They are streamed in and out
+without being held in memory and evicted least recently used first once the
+cache exceeds ``REMOTE_CACHE_MAX_BYTES``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import os
+import re
+import time
+import uuid
+from pathlib import Path
+from typing import AsyncIterator
+
+from ..config import settings
+
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_HASH_RE = re.compile(r"[A-Za-z0-9_-]{1,128}")
+# Eviction scans the whole cache, so run it at most this often
+EVICTION_INTERVAL_SECONDS = 60.0
+
+_last_eviction = 0.0
+
+
+class ArtifactTooLarge(Exception):
+    pass
+
+
+def create_cache_token(project_id: uuid.UUID) -> str:
+    """Token handed to builds of ``project_id``; it grants access to that project's cache only."""
+    signature = hmac.new(settings.secret_key.encode(), f"remote-cache:{project_id}".encode(), hashlib.sha256)
+    return f"{project_id}.{signature.hexdigest()}"
+
+
+def verify_cache_token(token: str) -> uuid.UUID | None:
+    project_part, _, _ = token.partition(".")
+    try:
+        project_id = uuid.UUID(project_part)
+    except ValueError:
+        return None
+    if not hmac.compare_digest(create_cache_token(project_id), token):
+        return None
+    return project_id
+
+
+def artifact_path(project_id: uuid.UUID, artifact_hash: str) -> Path:
+    return Path(settings.remote_cache_dir) / str(project_id) / artifact_hash[:2] / artifact_hash
+
+
+def _metadata_path(path: Path) -> Path:
+    return path.with_name(f"{path.name}.json")
+
+
+def read_artifact_metadata(path: Path) -> dict[str, str]:
+    try:
+        return json.loads(_metadata_path(path).read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def touch_artifact(path: Path) -> None:
+    # The modification time doubles as "last used" for eviction
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+async def store_artifact(
+    project_id: uuid.UUID,
+    artifact_hash: str,
+    chunks: AsyncIterator[bytes],
+    metadata: dict[str, str] | None = None,
+) -> int:
+    """Stream ``chunks`` into the cache; returns the stored size.
+
+    The artifact becomes visible atomically once fully written, so a reader
+    never sees a partial upload.
+    """
+    path = artifact_path(project_id, artifact_hash)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+    size = 0
+    try:
+        with open(temp, "wb") as handle:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > settings.remote_cache_max_artifact_bytes:
+                    raise ArtifactTooLarge(artifact_hash)
+                handle.write(chunk)
+        if metadata:
+            _metadata_path(path).write_text(json.dumps(metadata))
+        else:
+            # A re-upload without metadata must not inherit the previous upload's
+            _metadata_path(path).unlink(missing_ok=True)
+        os.replace(temp, path)
+    finally:
+        if temp.exists():
+            temp.unlink()
+    _schedule_eviction()
+    return size
+
+
+def _schedule_eviction() -> None:
+    global _last_eviction
+    now = time.monotonic()
+    if now - _last_eviction < EVICTION_INTERVAL_SECONDS:
+        return
+    _last_eviction = now
+    asyncio.get_running_loop().run_in_executor(None, evict_artifacts, settings.remote_cache_max_bytes)
+
+
+def evict_artifacts(max_bytes: int) -> int:
+    """Delete least recently used artifacts until the cache fits ``max_bytes``; returns bytes freed."""
+    entries: list[tuple[float, int, Path]] = []
+    for root, _, files in os.walk(settings.remote_cache_dir):
+        for name in files:
+            if name.endswith((".json", ".tmp")):
+                continue
+            path = Path(root) / name
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    freed = 0
+    for _, size, path in sorted(entries):
+        if total - freed <= max_bytes:
+            break
+        for victim in (path, _metadata_path(path)):
+            try:
+                victim.unlink()
+            except OSError:
+                pass
+        freed += size
+    if freed:
+        logger.info("Remote build cache evicted %d bytes", freed)
+    return freed
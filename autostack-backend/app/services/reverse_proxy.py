@@ -0,0 +1,275 @@
+"""Async reverse proxy in front of runtime containers.
+
+Requests for a project's site are forwarded to the container of its live
+deployment over keep-alive connections pooled per upstream, so a busy site
+reuses a handful of TCP connections instead of opening one per request.
+Request and response bodies are streamed through as raw chunks without being
+buffered, decoded or re-encoded.
+
+Per-deployment request counts, errors, bytes and latency are kept in memory
+and exposed through ``GET /api/deployments/{id}/metrics``.
+"""
+
+from __future__ import annotations
+
+import bisect
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator
+
+import httpx
+from starlette.background import BackgroundTask
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse, Response, StreamingResponse
+
+from ..config import settings
+
+
+# Headers that describe a single connection and must not be forwarded (RFC 9110 7.6.1)
+HOP_BY_HOP_HEADERS = frozenset(
+    {
+        "connection",
+        "keep-alive",
+        "proxy-authenticate",
+        "proxy-authorization",
+        "proxy-connection",
+        "te",
+        "trailer",
+        "transfer-encoding",
+        "upgrade",
+    }
+)
+# Upper bounds of the latency histogram, in milliseconds
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float("inf"))
+# Connection pools each upstream's connections are split across
+POOL_SHARDS = 8
+
+
+@dataclass
+class DeploymentTraffic:
+    requests: int = 0
+    errors: int = 0
+    bytes_in: int = 0
+    bytes_out: int = 0
+    latency_total_ms: float = 0.0
+    latency_buckets: list[int] = field(default_factory=lambda: [0] * len(LATENCY_BUCKETS_MS))
+    # Wall-clock time of the latest request; feeds idle detection for hibernation
+    last_request_at: float | None = None
+
+    def observe(self, latency_ms: float, status_code: int) -> None:
+        self.requests += 1
+        if status_code >= 500:
+            self.errors += 1
+        self.latency_total_ms += latency_ms
+        self.latency_buckets[bisect.bisect_left(LATENCY_BUCKETS_MS, latency_ms)] += 1
+
+    def percentile(self, fraction: float) -> float | None:
+        if not self.requests:
+            return None
+        threshold = fraction * self.requests
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS_MS, self.latency_buckets):
+            seen += count
+            if seen >= threshold:
+                return bound
+        return None
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "latency_avg_ms": round(self.latency_total_ms / self.requests, 2) if self.requests else None,
+            # Upper bound of the histogram bucket the percentile falls in
+            "latency_p50_ms": self.percentile(0.5),
+            "latency_p95_ms": self.percentile(0.95),
+            "latency_p99_ms": self.percentile(0.99),
+        }
+
+
+class ProxyMetrics:
+    def __init__(self) -> None:
+        self._traffic: dict[uuid.UUID, DeploymentTraffic] = {}
+
+    def for_deployment(self, deployment_id: uuid.UUID) -> DeploymentTraffic:
+        traffic = self._traffic.get(deployment_id)
+        if traffic is None:
+            traffic = self._traffic[deployment_id] = DeploymentTraffic()
+        return traffic
+
+    def snapshot(self, deployment_id: uuid.UUID) -> dict[str, Any] | None:
+        traffic = self._traffic.get(deployment_id)
+        return traffic.snapshot() if traffic else None
+
+    def last_requests(self) -> dict[uuid.UUID, float]:
+        return {
+            deployment_id: traffic.last_request_at
+            for deployment_id, traffic in self._traffic.items()
+            if traffic.last_request_at is not None
+        }
+
+
+@dataclass
+class PoolShard:
+    client: httpx.AsyncClient
+    in_flight: int = 0
+
+
+class UpstreamPools:
+    """Keep-alive connection pools per upstream origin.
+
+    Each upstream's connections are split across ``POOL_SHARDS`` HTTP clients
+    and a request goes to the least busy one. httpcore checks every idle
+    connection of a pool on each request, so a few small pools stay cheap
+    under concurrency where a single large one becomes the bottleneck.
+    """
+
+    def __init__(self, max_keepalive: int | None = None) -> None:
+        self._max_keepalive = max_keepalive
+        self._shards: dict[str, list[PoolShard]] = {}
+
+    def _new_client(self) -> httpx.AsyncClient:
+        keepalive = settings.proxy_keepalive_per_upstream if self._max_keepalive is None else self._max_keepalive
+        return httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=max(1, -(-settings.proxy_max_connections_per_upstream // POOL_SHARDS)),
+                max_keepalive_connections=-(-keepalive // POOL_SHARDS),
+                keepalive_expiry=settings.proxy_keepalive_expiry_seconds,
+            ),
+            timeout=httpx.Timeout(settings.proxy_timeout_seconds, connect=5.0),
+        )
+
+    def acquire(self, upstream: str) -> PoolShard:
+        shards = self._shards.get(upstream)
+        if shards is None:
+            shards = self._shards[upstream] = [PoolShard(self._new_client()) for _ in range(POOL_SHARDS)]
+        shard = min(shards, key=lambda candidate: candidate.in_flight)
+        shard.in_flight += 1
+        return shard
+
+    @staticmethod
+    def release(shard: PoolShard) -> None:
+        shard.in_flight -= 1
+
+    async def discard(self, upstream: str) -> None:
+        for shard in self._shards.pop(upstream, []):
+            await shard.client.aclose()
+
+    async def prune(self, keep: set[str]) -> None:
+        """Close the pools of upstreams outside ``keep`` that have no request in flight."""
+        for upstream in [upstream for upstream in self._shards if upstream not in keep]:
+            if not any(shard.in_flight for shard in self._shards[upstream]):
+                await self.discard(upstream)
+
+    async def aclose(self) -> None:
+        shards, self._shards = self._shards, {}
+        for upstream_shards in shards.values():
+            for shard in upstream_shards:
+                await shard.client.aclose()
+
+
+pools = UpstreamPools()
+metrics = ProxyMetrics()
+
+
+def _forward_headers(request: Request) -> list[tuple[str, str]]:
+    connection_tokens = {
+        token.strip().lower() for token in request.headers.get("connection", "").split(",") if token.strip()
+    }
+    headers = [
+        (name, value)
+        for name, value in request.headers.items()
+        if name not in HOP_BY_HOP_HEADERS and name not in connection_tokens and name != "host"
+    ]
+    client_host = request.client.host if request.client else ""
+    prior = request.headers.get("x-forwarded-for")
+    headers = [(name, value) for name, value in headers if not name.startswith("x-forwarded-")]
+    headers.append(("x-forwarded-for", f"{prior}, {client_host}" if prior else client_host))
+    headers.append(("x-forwarded-proto", request.url.scheme))
+    headers.append(("x-forwarded-host", request.headers.get("host", "")))
+    return headers
+
+
+async def proxy_request(
+    request: Request,
+    deployment_id: uuid.UUID,
+    upstream: str,
+    path: str,
+    upstream_pools: UpstreamPools | None = None,
+) -> Response:
+    """Forward ``request`` to ``upstream`` (``http://host:port``) and stream the response back."""
+    upstream_pools = upstream_pools or pools
+    traffic = metrics.for_deployment(deployment_id)
+    traffic.last_request_at = time.time()
+    started = time.perf_counter()
+
+    async def request_body() -> AsyncIterator[bytes]:
+        async for chunk in request.stream():
+            traffic.bytes_in += len(chunk)
+            yield chunk
+
+    has_body = request.method not in ("GET", "HEAD", "OPTIONS") or "content-length" in request.headers
+    url = f"{upstream}/{path.lstrip('/')}"
+    if request.url.query:
+        url = f"{url}?{request.url.query}"
+    shard = upstream_pools.acquire(upstream)
+    try:
+        upstream_request = shard.client.build_request(
+            request.method,
+            url,
+            headers=_forward_headers(request),
+            content=request_body() if has_body else None,
+        )
+        upstream_response = await shard.client.send(upstream_request, stream=True)
+    except httpx.HTTPError as exc:
+        upstream_pools.release(shard)
+        traffic.observe((time.perf_counter() - started) * 1000, 502)
+        return PlainTextResponse(f"Bad Gateway: {type(exc).__name__}", status_code=502)
+    except BaseException:
+        upstream_pools.release(shard)
+        raise
+
+    finished = False
+
+    async def finish() -> None:
+        # Runs once, after the body is sent or when the client goes away mid-stream
+        nonlocal finished
+        if finished:
+            return
+        finished = True
+        try:
+            await upstream_response.aclose()
+        finally:
+            upstream_pools.release(shard)
+            traffic.observe((time.perf_counter() - started) * 1000, upstream_response.status_code)
+
+    async def response_body() -> AsyncIterator[bytes]:
+        try:
+            # Raw chunks: compressed bodies stay compressed and Content-Length stays valid
+            async for chunk in upstream_response.aiter_raw():
+                traffic.bytes_out += len(chunk)
+                yield chunk
+        finally:
+            await finish()
+
+    connection_tokens = {
+        token.strip().lower()
+        for token in upstream_response.headers.get("connection", "").split(",")
+        if token.strip()
+    }
+    headers = [
+        (name.decode("latin-1"), value.decode("latin-1"))
+        for name, value in upstream_response.headers.raw
+        if name.lower().decode("latin-1") not in HOP_BY_HOP_HEADERS
+        and name.lower().decode("latin-1") not in connection_tokens
+    ]
+    response = StreamingResponse(
+        response_body(),
+        status_code=upstream_response.status_code,
+        background=BackgroundTask(finish),
+    )
+    # Keep repeated headers such as Set-Cookie intact
+    response.raw_headers = [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers]
+    return response
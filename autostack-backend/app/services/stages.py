@@ -8,6 +8,7 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..models import DeploymentStage
+from .versions import bump_deployment_version
 
 StageKey = Literal[
     "queued",
@@ -49,13 +50,29 @@ STAGE_ORDER = [
 STAGE_ORDER_INDEX = {name: idx for idx, name in enumerate(STAGE_ORDER)}
 
 
+# Steps of an autostack.yml pipeline are recorded as stages named "Step: <name>"
+STEP_STAGE_PREFIX = "Step: "
+
+
+def step_stage_name(step_name: str) -> str:
+    return f"{STEP_STAGE_PREFIX}{step_name}"
+
+
 async def set_stage_status(
     session: AsyncSession,
     deployment_id: uuid.UUID,
     stage_key: StageKey,
     status: StageStatus,
 ) -> None:
-    stage_name = STAGE_LABELS[stage_key]
+    await set_named_stage_status(session, deployment_id, STAGE_LABELS[stage_key], status)
+
+
+async def set_named_stage_status(
+    session: AsyncSession,
+    deployment_id: uuid.UUID,
+    stage_name: str,
+    status: StageStatus,
+) -> None:
     result = await session.execute(
         select(DeploymentStage).where(
             DeploymentStage.deployment_id == deployment_id,
@@ -83,13 +100,21 @@ async def set_stage_status(
         stage.completed_at = now
 
     await session.flush()
+    await bump_deployment_version(session, deployment_id)
+
+
+def _stage_index(stage_name: str) -> int:
+    if stage_name.startswith(STEP_STAGE_PREFIX):
+        # Pipeline steps take the place of the build stage, ordered by start time
+        return STAGE_ORDER_INDEX["Building"]
+    return STAGE_ORDER_INDEX.get(stage_name, len(STAGE_ORDER))
 
 
 def order_stages(stages: list[DeploymentStage]) -> list[DeploymentStage]:
     return sorted(
         stages,
         key=lambda s: (
-            STAGE_ORDER_INDEX.get(s.stage_name, len(STAGE_ORDER)),
+            _stage_index(s.stage_name),
             s.started_at or s.created_at,
         ),
     )
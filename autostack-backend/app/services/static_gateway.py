@@ -0,0 +1,259 @@
+"""Shared gateway serving every project's site from the API process.
+
+Instead of one nginx container per deployment, each project gets a stable
+site name (``<slug>-<id prefix>``), reachable at ``/sites/<site>/`` or, when
+``STATIC_GATEWAY_DOMAIN`` is set, at ``<site>.<domain>``. The gateway maps it
+to the project's live production deployment: static output is served from its
+artifacts directory, and Dockerfile runtimes are reverse proxied to their
+running container (see :mod:`app.services.reverse_proxy`). Every runtime
+container, previews included, is also reachable at ``<site>--<deployment id
+prefix>``; a hibernated container is started again by its first request (see
+:mod:`app.services.hibernation`).
+
+The routing table lives in memory. It is updated immediately when a
+deployment goes live in this process and is reloaded from the database every
+``STATIC_GATEWAY_RELOAD_SECONDS``, so deployments finished by separate worker
+processes are picked up without a restart.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import re
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.requests import Request
+from starlette.responses import FileResponse, PlainTextResponse, Response
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from ..config import settings
+from ..db import AsyncSessionLocal
+from ..models import Deployment, DeploymentContainer, Project
+from .reverse_proxy import pools, proxy_request
+
+
+logger = logging.getLogger(__name__)
+
+SITE_NAME_RE = re.compile(r"[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?")
+# Container states the gateway routes to; hibernated containers are woken first
+ROUTABLE_CONTAINER_STATES = ("running", "hibernated")
+# Hashed build assets never change under the same name
+IMMUTABLE_ASSET_RE = re.compile(r"(^|/)(assets|static|_next/static)/")
+
+
+def site_name(project_id: uuid.UUID, name: str) -> str:
+    """Stable DNS-label-safe name of a project's site."""
+    slug = re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-")[:40].strip("-")
+    prefix = project_id.hex[:8]
+    return f"{slug}-{prefix}" if slug else prefix
+
+
+def deployment_site_name(project_id: uuid.UUID, name: str, deployment_id: uuid.UUID) -> str:
+    """Site name of one deployment's runtime container, live or not."""
+    return f"{site_name(project_id, name)}--{deployment_id.hex[:8]}"
+
+
+@dataclass(frozen=True)
+class Route:
+    deployment_id: uuid.UUID
+    # http://host:port of the deployment's container; None for static output
+    upstream: str | None = None
+    # DeploymentContainer row behind ``upstream``
+    container_id: uuid.UUID | None = None
+    hibernated: bool = False
+
+
+def site_url(site: str) -> str:
+    backend = str(settings.backend_url).rstrip("/")
+    if settings.static_gateway_domain:
+        scheme = urlsplit(backend).scheme or "http"
+        return f"{scheme}://{site}.{settings.static_gateway_domain}/"
+    return f"{backend}/sites/{site}/"
+
+
+class RoutingTable:
+    def __init__(self) -> None:
+        self._routes: dict[str, Route] = {}
+        self._loaded_at: float | None = None
+        self._lock = asyncio.Lock()
+
+    def set_route(self, site: str, route: Route) -> None:
+        self._routes[site] = route
+
+    def invalidate(self) -> None:
+        """Reload from the database on the next lookup, e.g. after a container moved to another port."""
+        self._loaded_at = None
+
+    def clear(self) -> None:
+        self._routes = {}
+        self._loaded_at = None
+
+    async def reload(self) -> None:
+        async with AsyncSessionLocal() as session:
+            containers = await session.execute(
+                select(
+                    Project.id,
+                    Project.name,
+                    Project.live_deployment_id,
+                    DeploymentContainer.deployment_id,
+                    DeploymentContainer.id,
+                    DeploymentContainer.host,
+                    DeploymentContainer.port,
+                    DeploymentContainer.status,
+                )
+                .join(Deployment, DeploymentContainer.deployment_id == Deployment.id)
+                .join(Project, Deployment.project_id == Project.id)
+                .where(
+                    DeploymentContainer.status.in_(ROUTABLE_CONTAINER_STATES),
+                    Deployment.is_deleted.is_(False),
+                )
+                .order_by(DeploymentContainer.created_at)
+            )
+            routes: dict[str, Route] = {}
+            # Ordered oldest first, so the newest container of a deployment wins
+            for project_id, name, live_id, deployment_id, container_id, host, port, status in containers.all():
+                route = Route(deployment_id, f"http://{host}:{port}", container_id, status == "hibernated")
+                routes[deployment_site_name(project_id, name, deployment_id)] = route
+                if deployment_id == live_id:
+                    routes[site_name(project_id, name)] = route
+            live = await session.execute(
+                select(Project.id, Project.name, Project.live_deployment_id).where(
+                    Project.live_deployment_id.is_not(None)
+                )
+            )
+            for project_id, name, live_id in live.all():
+                routes.setdefault(site_name(project_id, name), Route(live_id))
+            self._routes = routes
+        self._loaded_at = time.monotonic()
+        # Containers stopped by any process (cutover, hibernation) drop out of the
+        # table here, and so do the connection pools this process kept for them
+        await pools.prune({route.upstream for route in routes.values() if route.upstream})
+
+    async def resolve(self, site: str) -> Route | None:
+        stale = (
+            self._loaded_at is None
+            or time.monotonic() - self._loaded_at >= settings.static_gateway_reload_seconds
+        )
+        if stale:
+            async with self._lock:
+                if self._loaded_at is None or time.monotonic() - self._loaded_at >= settings.static_gateway_reload_seconds:
+                    try:
+                        await self.reload()
+                    except Exception:  # pragma: no cover - keep serving the last known table
+                        logger.warning("Reloading the static gateway routing table failed", exc_info=True)
+                        self._loaded_at = time.monotonic()
+        return self._routes.get(site)
+
+
+routing_table = RoutingTable()
+
+
+async def publish_static_deployment(session: AsyncSession, project: Project, deployment: Deployment) -> str:
+    """Make ``deployment`` the one served at the project's site; returns the site URL."""
+    project.live_deployment_id = deployment.id
+    await session.flush()
+    site = site_name(project.id, project.name)
+    routing_table.set_route(site, Route(deployment.id))
+    return site_url(site)
+
+
+def container_site_url(project: Project, deployment: Deployment) -> str:
+    """Gateway URL of ``deployment``'s runtime container: the project site if it is live."""
+    if project.live_deployment_id == deployment.id:
+        return site_url(site_name(project.id, project.name))
+    return site_url(deployment_site_name(project.id, project.name, deployment.id))
+
+
+async def publish_container_deployment(
+    session: AsyncSession, project: Project, deployment: Deployment, container: DeploymentContainer
+) -> str:
+    """Route to ``container`` of ``deployment``, making it live if it is a production deployment.
+
+    Returns the URL the deployment is reachable at.
+    """
+    route = Route(deployment.id, f"http://{container.host}:{container.port}", container.id)
+    routing_table.set_route(deployment_site_name(project.id, project.name, deployment.id), route)
+    if deployment.is_production:
+        project.live_deployment_id = deployment.id
+        await session.flush()
+        routing_table.set_route(site_name(project.id, project.name), route)
+    return container_site_url(project, deployment)
+
+
+def resolve_file(deployment_id: uuid.UUID, path: str) -> Path | None:
+    """File to serve for ``path``; unknown extension-less paths fall back to ``index.html`` (SPA routing)."""
+    root = (Path(settings.autostack_deploy_dir) / str(deployment_id)).resolve()
+    candidate = (root / path.lstrip("/")).resolve()
+    if candidate != root and root not in candidate.parents:
+        return None
+    if candidate.is_dir():
+        candidate = candidate / "index.html"
+    if candidate.is_file():
+        return candidate
+    if "." not in candidate.name:
+        index = root / "index.html"
+        if index.is_file():
+            return index
+    return None
+
+
+async def serve_site(request: Request, site: str, path: str) -> Response:
+    route = await routing_table.resolve(site)
+    if route is not None and route.hibernated:
+        from .hibernation import wake_container  # hibernation depends on the routing table
+
+        if not await wake_container(route.container_id):
+            return PlainTextResponse("Service Unavailable", status_code=503, headers={"Retry-After": "10"})
+        route = await routing_table.resolve(site)
+    if route is not None and route.upstream:
+        return await proxy_request(request, route.deployment_id, route.upstream, path)
+    if request.method not in ("GET", "HEAD"):
+        return PlainTextResponse("Method Not Allowed", status_code=405, headers={"Allow": "GET, HEAD"})
+    deployment_id = route.deployment_id if route else None
+    file_path = resolve_file(deployment_id, path) if deployment_id else None
+    if file_path is None:
+        return PlainTextResponse("Not Found", status_code=404)
+
+    stat = await asyncio.to_thread(os.stat, file_path)
+    response = FileResponse(file_path, stat_result=stat)
+    relative = file_path.relative_to(Path(settings.autostack_deploy_dir).resolve() / str(deployment_id)).as_posix()
+    if IMMUTABLE_ASSET_RE.search(relative):
+        response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    else:
+        response.headers["Cache-Control"] = "public, max-age=0, must-revalidate"
+    etag = response.headers.get("etag")
+    if etag and request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": response.headers["Cache-Control"]})
+    return response
+
+
+class StaticGatewayMiddleware:
+    """Serve ``<site>.<STATIC_GATEWAY_DOMAIN>`` requests before they reach the API routes."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        domain = settings.static_gateway_domain
+        if scope["type"] == "http" and domain:
+            host = ""
+            for key, value in scope["headers"]:
+                if key == b"host":
+                    host = value.decode("latin-1").split(":", 1)[0].lower()
+                    break
+            suffix = f".{domain.lower()}"
+            if host.endswith(suffix):
+                site = host[: -len(suffix)]
+                if SITE_NAME_RE.fullmatch(site):
+                    response = await serve_site(Request(scope, receive), site, scope["path"])
+                    await response(scope, receive, send)
+                    return
+        await self.app(scope, receive, send)
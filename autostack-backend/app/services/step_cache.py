@@ -0,0 +1,188 @@
+"""Content-addressed cache of pipeline step outputs.
+
+A step's key hashes its command, the environment it runs with (project
+variables included), declared outputs, the keys of the steps it needs and the
+contents of every file matched by its ``inputs`` globs. When a later build of the same project computes the same key, the
+step's outputs are restored from a tar archive instead of running it again.
+
+Archives live under ``STEP_CACHE_DIR`` and are evicted least recently used
+first once they exceed ``STEP_CACHE_MAX_BYTES``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import os
+import shutil
+import tarfile
+import uuid
+from pathlib import Path
+
+from ..config import settings
+from .path_filters import matches_any
+from .pipeline_spec import PipelineStep
+
+
+logger = logging.getLogger(__name__)
+
+# Never hashed as inputs: version control metadata and installed dependencies
+IGNORED_INPUT_DIRS = {".git", "node_modules"}
+HASH_CHUNK_BYTES = 1024 * 1024
+# Environment values that differ between builds or processes without changing what a step produces
+VOLATILE_ENV_NAMES = {
+    "AUTOSTACK_DEPLOYMENT_ID",
+    "TURBO_TOKEN",
+    "NX_SELF_HOSTED_REMOTE_CACHE_ACCESS_TOKEN",
+    "YARN_NPM_AUTH_TOKEN",
+    "HOSTNAME",
+    "PWD",
+    "OLDPWD",
+    "SHLVL",
+    "_",
+}
+
+
+def _cache_root() -> Path:
+    return Path(settings.step_cache_dir)
+
+
+def _archive_path(key: str) -> Path:
+    return _cache_root() / key[:2] / f"{key}.tar"
+
+
+def _input_files(workdir: Path, patterns: tuple[str, ...]) -> list[str]:
+    matched: list[str] = []
+    for root, dirs, files in os.walk(workdir):
+        dirs[:] = sorted(name for name in dirs if name not in IGNORED_INPUT_DIRS)
+        relative_root = Path(root).relative_to(workdir)
+        for name in files:
+            relative = (relative_root / name).as_posix()
+            if matches_any(relative, patterns):
+                matched.append(relative)
+    return sorted(matched)
+
+
+def _compute_key(
+    project_id: uuid.UUID,
+    step: PipelineStep,
+    workdir: Path,
+    dependency_keys: list[str | None],
+    env: dict[str, str],
+) -> str:
+    digest = hashlib.sha256()
+    for part in (str(project_id), step.name, step.run, *step.outputs):
+        digest.update(part.encode())
+        digest.update(b"\0")
+    for name in sorted(env):
+        # Registry credentials are keyed by URL, e.g. npm_config_//host/npm/:_authToken
+        if name in VOLATILE_ENV_NAMES or name.endswith(":_authToken"):
+            continue
+        digest.update(f"{name}={env[name]}\0".encode())
+    for key in dependency_keys:
+        digest.update((key or "-").encode())
+        digest.update(b"\0")
+    for relative in _input_files(workdir, step.inputs):
+        digest.update(relative.encode())
+        digest.update(b"\0")
+        with open(workdir / relative, "rb") as handle:
+            while chunk := handle.read(HASH_CHUNK_BYTES):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+async def compute_step_key(
+    project_id: uuid.UUID,
+    step: PipelineStep,
+    workdir: Path,
+    dependency_keys: list[str | None],
+    env: dict[str, str] | None = None,
+) -> str | None:
+    """Cache key for ``step`` run with ``env`` (defaults to the step's own variables).
+
+    ``None`` when the step declares no inputs and must always run.
+    """
+    if not step.inputs:
+        return None
+    env = dict(step.env) if env is None else env
+    return await asyncio.to_thread(_compute_key, project_id, step, workdir, dependency_keys, env)
+
+
+def _unlink_quietly(path: Path) -> None:
+    try:
+        path.unlink()
+    except OSError:
+        pass
+
+
+def _restore(key: str, workdir: Path, outputs: tuple[str, ...]) -> bool:
+    archive = _archive_path(key)
+    if not archive.is_file():
+        return False
+    for output in outputs:
+        target = workdir / output
+        if target.is_dir() and not target.is_symlink():
+            shutil.rmtree(target)
+        elif target.exists() or target.is_symlink():
+            target.unlink()
+    with tarfile.open(archive) as tar:
+        if hasattr(tarfile, "data_filter"):
+            tar.extractall(workdir, filter="data")
+        else:  # pragma: no cover - Python without extraction filters
+            tar.extractall(workdir)
+    # Touch so eviction treats the archive as recently used
+    os.utime(archive)
+    return True
+
+
+async def restore_step_outputs(key: str, workdir: Path, outputs: tuple[str, ...]) -> bool:
+    try:
+        return await asyncio.to_thread(_restore, key, workdir, outputs)
+    except (OSError, tarfile.TarError):
+        logger.warning("Discarding unreadable step cache entry %s", key, exc_info=True)
+        _unlink_quietly(_archive_path(key))
+        return False
+
+
+def _save(key: str, workdir: Path, outputs: tuple[str, ...]) -> bool:
+    present = [output for output in outputs if (workdir / output).exists()]
+    if outputs and not present:
+        return False
+    # Steps without outputs (lint, tests) store an empty archive that records their success
+    archive = _archive_path(key)
+    archive.parent.mkdir(parents=True, exist_ok=True)
+    temp = archive.with_name(f"{archive.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        with tarfile.open(temp, "w") as tar:
+            for output in present:
+                tar.add(workdir / output, arcname=output)
+        os.replace(temp, archive)
+    finally:
+        _unlink_quietly(temp)
+    _evict(settings.step_cache_max_bytes)
+    return True
+
+
+async def save_step_outputs(key: str, workdir: Path, outputs: tuple[str, ...]) -> bool:
+    try:
+        return await asyncio.to_thread(_save, key, workdir, outputs)
+    except (OSError, tarfile.TarError):
+        logger.warning("Could not store step cache entry %s", key, exc_info=True)
+        return False
+
+
+def _evict(max_bytes: int) -> None:
+    entries: list[tuple[float, int, Path]] = []
+    for archive in _cache_root().glob("*/*.tar"):
+        try:
+            stat = archive.stat()
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, archive))
+    total = sum(size for _, size, _ in entries)
+    for _, size, archive in sorted(entries):
+        if total <= max_bytes:
+            break
+        _unlink_quietly(archive)
+        total -= size
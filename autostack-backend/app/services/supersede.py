@@ -0,0 +1,114 @@
+"""Coalescing of deployments pushed in quick succession to the same branch.
+
+Only the newest commit of a branch is worth building: when a push arrives,
+older deployments of the same project and branch that are still queued are
+marked ``superseded`` without running. With the ``running`` policy an
+in-progress production build is stopped as well, as is a queued one whose
+job a worker already claimed; it turns ``superseded`` once the build engine
+notices the cancellation.
+"""
+
+from __future__ import annotations
+
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models import Deployment, Project
+from .job_queue import cancel_queued_job
+from .stages import set_stage_status
+from .versions import bump_deployment_version
+
+
+SUPERSEDE_POLICIES = ("off", "queued", "running")
+IN_PROGRESS_STATUSES = ("cloning", "checkout", "installing", "building", "copying")
+# Successful builds averaged to estimate what a superseded build would have cost
+ESTIMATE_SAMPLE_SIZE = 10
+
+
+@dataclass
+class SupersedeResult:
+    superseded: list[uuid.UUID] = field(default_factory=list)
+    # In-progress builds the caller must stop with ``cancel_deployment_run`` after committing
+    running: list[uuid.UUID] = field(default_factory=list)
+    seconds_saved: int = 0
+
+
+async def estimate_build_seconds(session: AsyncSession, project_id: uuid.UUID) -> int | None:
+    result = await session.execute(
+        select(Deployment.build_duration_seconds)
+        .where(
+            Deployment.project_id == project_id,
+            Deployment.status == "success",
+            Deployment.build_duration_seconds.is_not(None),
+        )
+        .order_by(Deployment.created_at.desc())
+        .limit(ESTIMATE_SAMPLE_SIZE)
+    )
+    durations = list(result.scalars())
+    if not durations:
+        return None
+    return int(sum(durations) / len(durations))
+
+
+async def supersede_older_deployments(
+    session: AsyncSession,
+    project: Project,
+    deployment: Deployment,
+) -> SupersedeResult:
+    """Supersede older deployments of ``deployment``'s branch according to the project policy.
+
+    Changes are added to ``session``; the caller commits them together with the
+    new deployment.
+    """
+    outcome = SupersedeResult()
+    policy = project.supersede_policy or "queued"
+    if policy == "off":
+        return outcome
+
+    statuses = ["queued"]
+    if policy == "running" and deployment.is_production:
+        statuses.extend(IN_PROGRESS_STATUSES)
+
+    result = await session.execute(
+        select(Deployment).where(
+            Deployment.project_id == project.id,
+            Deployment.branch == deployment.branch,
+            Deployment.id != deployment.id,
+            Deployment.is_deleted.is_(False),
+            Deployment.status.in_(statuses),
+        )
+    )
+    older = list(result.scalars())
+    if not older:
+        return outcome
+
+    estimate = await estimate_build_seconds(session, project.id)
+    now = datetime.utcnow()
+    for previous in older:
+        previous.superseded_by_id = deployment.id
+        # A queued deployment whose job a worker already claimed is stopped like a running build
+        if previous.status == "queued" and await cancel_queued_job(session, previous.id):
+            saved = estimate or 0
+            previous.status = "superseded"
+            previous.failed_reason = _reason(deployment)
+            previous.completed_at = now
+            await set_stage_status(session, previous.id, "cancelled", "completed")
+            outcome.superseded.append(previous.id)
+        else:
+            elapsed = (now - previous.started_at).total_seconds() if previous.started_at else 0
+            saved = max(int(estimate - elapsed), 0) if estimate else 0
+            outcome.running.append(previous.id)
+        previous.build_seconds_saved = saved
+        outcome.seconds_saved += saved
+        await bump_deployment_version(session, previous.id)
+    return outcome
+
+
+def _reason(deployment: Deployment) -> str:
+    if deployment.commit_hash:
+        return f"Superseded by commit {deployment.commit_hash[:7]}"
+    return "Superseded by a newer deployment"
@@ -0,0 +1,252 @@
+"""Change counters backing conditional GETs and long-polling.
+
+Every status, stage or log change of a deployment bumps ``Deployment.version``;
+changes that affect list/dashboard views also bump ``User.deployments_version``.
+Log appends arrive in many small batches, so they bump the counter at most
+once per ``LOG_VERSION_INTERVAL_SECONDS`` (see :func:`bump_log_version`).
+Because the counters live in the database, a bump made by any process is seen
+by every API process. Waiters in the same process are additionally woken up
+immediately through :data:`version_notifier`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import uuid
+from collections.abc import Awaitable, Callable
+from typing import Dict, Set
+
+from fastapi import Response
+from sqlalchemy import event, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session as OrmSession
+
+from ..db import AsyncSessionLocal
+from ..models import Deployment, User
+
+
+logger = logging.getLogger(__name__)
+
+LONG_POLL_MAX_SECONDS = 60
+# How often a long-poll re-reads the counter to catch bumps made by other processes
+LONG_POLL_RECHECK_SECONDS = 1.0
+# Log appends within this long of the previous bump are folded into one trailing bump
+LOG_VERSION_INTERVAL_SECONDS = 1.0
+
+
+class VersionNotifier:
+    def __init__(self) -> None:
+        self._waiters: Dict[str, Set[asyncio.Event]] = {}
+
+    def notify(self, *keys: str) -> None:
+        for key in keys:
+            for waiter in self._waiters.get(key, ()):
+                waiter.set()
+
+    async def wait(self, key: str, timeout: float) -> None:
+        waiter = asyncio.Event()
+        waiters = self._waiters.setdefault(key, set())
+        waiters.add(waiter)
+        try:
+            await asyncio.wait_for(waiter.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            waiters.discard(waiter)
+            if not waiters:
+                self._waiters.pop(key, None)
+
+
+version_notifier = VersionNotifier()
+_log_bumped_at: Dict[uuid.UUID, float] = {}
+_log_bumps_pending: Dict[uuid.UUID, asyncio.Task[None]] = {}
+
+_PENDING_KEYS = "autostack_version_keys"
+
+
+def _queue_notify(session: AsyncSession, *keys: str) -> None:
+    # Waiters re-read the counter when woken, so only wake them once the bump is visible
+    session.sync_session.info.setdefault(_PENDING_KEYS, set()).update(keys)
+
+
+@event.listens_for(OrmSession, "after_commit")
+def _notify_after_commit(session: OrmSession) -> None:
+    keys = session.info.pop(_PENDING_KEYS, None)
+    if keys:
+        version_notifier.notify(*keys)
+
+
+@event.listens_for(OrmSession, "after_rollback")
+def _discard_after_rollback(session: OrmSession) -> None:
+    session.info.pop(_PENDING_KEYS, None)
+
+
+def deployment_key(deployment_id: uuid.UUID) -> str:
+    return f"deployment:{deployment_id}"
+
+
+def user_key(user_id: uuid.UUID) -> str:
+    return f"user:{user_id}"
+
+
+async def bump_deployment_version(
+    session: AsyncSession,
+    deployment_id: uuid.UUID,
+    *,
+    affects_user: bool = True,
+) -> None:
+    """Increment the deployment's change counter (and its owner's, if requested).
+
+    Log appends pass ``affects_user=False``: they change the detail view but not
+    the list or dashboard, so there is no reason to invalidate those.
+    """
+    await session.execute(
+        update(Deployment)
+        .where(Deployment.id == deployment_id)
+        .values(version=Deployment.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    _queue_notify(session, deployment_key(deployment_id))
+    if affects_user:
+        user_id = (
+            await session.execute(select(Deployment.user_id).where(Deployment.id == deployment_id))
+        ).scalar_one_or_none()
+        if user_id is not None:
+            await bump_user_version(session, user_id)
+
+
+async def bump_log_version(session: AsyncSession, deployment_id: uuid.UUID) -> None:
+    """Record a log append in the deployment's change counter, at most once per interval.
+
+    Appends within ``LOG_VERSION_INTERVAL_SECONDS`` of the last bump are folded
+    into a single bump at the end of the interval, made in a session of its own,
+    so the last lines of a burst are never left out of the version.
+    """
+    now = asyncio.get_running_loop().time()
+    last = _log_bumped_at.get(deployment_id)
+    if last is None or now - last >= LOG_VERSION_INTERVAL_SECONDS:
+        if len(_log_bumped_at) > 1024:
+            for key, bumped_at in list(_log_bumped_at.items()):
+                if now - bumped_at >= LOG_VERSION_INTERVAL_SECONDS:
+                    del _log_bumped_at[key]
+        _log_bumped_at[deployment_id] = now
+        await bump_deployment_version(session, deployment_id, affects_user=False)
+        return
+    if deployment_id not in _log_bumps_pending:
+        task = asyncio.create_task(_trailing_log_bump(deployment_id, last + LOG_VERSION_INTERVAL_SECONDS - now))
+        _log_bumps_pending[deployment_id] = task
+        task.add_done_callback(lambda _task: _log_bumps_pending.pop(deployment_id, None))
+
+
+async def _trailing_log_bump(deployment_id: uuid.UUID, delay: float) -> None:
+    await asyncio.sleep(delay)
+    _log_bumped_at[deployment_id] = asyncio.get_running_loop().time()
+    try:
+        async with AsyncSessionLocal() as session:
+            await bump_deployment_version(session, deployment_id, affects_user=False)
+            await session.commit()
+    except Exception:  # pragma: no cover - the next append or status change bumps again
+        logger.warning("Bumping the log version of deployment %s failed", deployment_id, exc_info=True)
+
+
+async def bump_user_version(session: AsyncSession, user_id: uuid.UUID) -> None:
+    await session.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(deployments_version=User.deployments_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    _queue_notify(session, user_key(user_id))
+
+
+async def wait_for_version_change(
+    key: str,
+    fetch_version: Callable[[], Awaitable[int | None]],
+    current: int | None,
+    timeout: float,
+) -> int | None:
+    """Hold until ``fetch_version()`` differs from ``current`` or ``timeout`` elapses.
+
+    ``fetch_version`` must open its own short-lived session so that no database
+    connection is held for the duration of the poll.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + min(timeout, LONG_POLL_MAX_SECONDS)
+    version = current
+    while True:
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            return version
+        await version_notifier.wait(key, min(remaining, LONG_POLL_RECHECK_SECONDS))
+        version = await fetch_version()
+        if version != current:
+            return version
+
+
+def make_etag(*parts: object) -> str:
+    return '"' + "-".join(str(part) for part in parts) + '"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [item.strip() for item in if_none_match.split(",")]
+    # Browsers may send back weak validators; compare on the opaque value
+    return any(candidate == "*" or candidate.removeprefix("W/") == etag for candidate in candidates)
+
+
+def set_etag_headers(response: Response, etag: str) -> None:
+    response.headers["ETag"] = etag
+    # Let browsers store the response but always revalidate it with If-None-Match
+    response.headers["Cache-Control"] = "private, no-cache"
+
+
+async def fetch_deployment_version(deployment_id: uuid.UUID) -> int | None:
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(Deployment.version).where(Deployment.id == deployment_id, Deployment.is_deleted.is_(False))
+        )
+        return result.scalar_one_or_none()
+
+
+async def fetch_user_version(user_id: uuid.UUID) -> int | None:
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(select(User.deployments_version).where(User.id == user_id))
+        return result.scalar_one_or_none()
+
+
+async def conditional_get(
+    db: AsyncSession,
+    *,
+    key: str,
+    version: int,
+    etag_for: Callable[[int], str],
+    fetch_version: Callable[[], Awaitable[int | None]],
+    if_none_match: str | None,
+    wait: int | None,
+) -> tuple[Response | None, str]:
+    """Resolve ``If-None-Match`` (and optional long-poll) for a versioned view.
+
+    Returns a ready 304 response when the client's copy is still current, or
+    ``None`` plus the ETag to attach when the handler should build a full
+    response. The request session is closed before waiting so a long-poll
+    never pins a pooled database connection.
+    """
+    etag = etag_for(version)
+    if not etag_matches(if_none_match, etag):
+        return None, etag
+
+    if wait:
+        await db.close()
+        new_version = await wait_for_version_change(key, fetch_version, version, wait)
+        if new_version is None:
+            # Resource vanished while waiting; let the handler produce its 404
+            return None, etag
+        etag = etag_for(new_version)
+        if not etag_matches(if_none_match, etag):
+            return None, etag
+
+    not_modified = Response(status_code=304)
+    set_etag_headers(not_modified, etag)
+    return not_modified, etag
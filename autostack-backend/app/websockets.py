@@ -6,10 +6,10 @@ from contextlib import suppress
 from typing import Dict, Set, Tuple
 
 from fastapi import WebSocket
-from sqlalchemy import select
 
+from .config import settings
 from .db import AsyncSessionLocal
-from .models import DeploymentLog
+from .services.log_store import tail_log
 
 
 class WebSocketManager:
@@ -56,15 +56,13 @@ class WebSocketManager:
             return
         await event.wait()
 
-    async def send_history(self, deployment_id: uuid.UUID, websocket: WebSocket) -> None:
+    async def send_history(self, deployment_id: uuid.UUID, websocket: WebSocket) -> int:
+        """Send the log tail and return the cursor to follow the log from."""
         async with AsyncSessionLocal() as session:
-            result = await session.execute(
-                select(DeploymentLog)
-                .where(DeploymentLog.deployment_id == deployment_id)
-                .order_by(DeploymentLog.timestamp.asc())
-            )
-            logs = [log.message for log in result.scalars().all()]
+            tail = await tail_log(session, deployment_id, settings.log_range_max_lines)
+            logs = [line.message for line in tail.lines]
         await websocket.send_json({"type": "history", "logs": logs})
+        return tail.next_cursor
 
     async def broadcast_log(self, deployment_id: uuid.UUID, line: str) -> None:
         await self._broadcast(deployment_id, {"type": "log", "line": line})
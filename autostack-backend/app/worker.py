@@ -0,0 +1,199 @@
+"""Build worker: runs queued deployments from the ``build_jobs`` table.
+
+Run standalone next to the API (any number of processes, on any host that
+shares the database, artifacts and log directories)::
+
+    python -m app.worker --concurrency 4
+
+or embedded in the API process with ``BUILD_WORKERS_EMBEDDED=true`` (the
+default, convenient for single-process development setups).
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import socket
+import uuid
+from contextlib import suppress
+
+from sqlalchemy import select
+
+from .build_engine import run_deployment_job
+from .config import settings
+from .db import AsyncSessionLocal, init_db
+from .models import BuildJob, Deployment
+from .services.job_queue import (
+    claim_next_job,
+    clear_cancel_request,
+    enqueue_orphaned_deployments,
+    finish_job,
+    job_available,
+    release_job,
+    renew_lease,
+    requeue_expired_jobs,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+class BuildWorker:
+    def __init__(self, concurrency: int | None = None, name: str | None = None) -> None:
+        self.concurrency = max(concurrency or settings.build_worker_concurrency, 1)
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._tasks: list[asyncio.Task] = []
+        self._stopping = asyncio.Event()
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._stopping.clear()
+        self._tasks = [asyncio.create_task(self._slot(index)) for index in range(self.concurrency)]
+        self._tasks.append(asyncio.create_task(self._reaper()))
+        logger.info("Build worker %s started with %d slots", self.name, self.concurrency)
+
+    async def stop(self) -> None:
+        """Stop claiming jobs; builds still running are handed back to the queue."""
+        self._stopping.set()
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            with suppress(asyncio.CancelledError):
+                await task
+        self._tasks = []
+
+    async def run_forever(self) -> None:
+        self.start()
+        await self._stopping.wait()
+        await self.stop()
+
+    async def _slot(self, index: int) -> None:
+        while not self._stopping.is_set():
+            try:
+                job = await claim_next_job(self.name)
+            except Exception:
+                logger.exception("Build worker %s failed to claim a job", self.name)
+                job = None
+            if job is None:
+                job_available.clear()
+                with suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(job_available.wait(), timeout=settings.build_worker_poll_seconds)
+                continue
+            await self._run(job)
+
+    async def _run(self, job: BuildJob) -> None:
+        async with AsyncSessionLocal() as session:
+            deployment = await session.scalar(select(Deployment).where(Deployment.id == job.deployment_id))
+        if (
+            deployment is None
+            or deployment.is_deleted
+            or deployment.status in ("cancelled", "superseded")
+            or deployment.cancel_requested_at
+        ):
+            await finish_job(job, "cancelled")
+            if deployment is not None and deployment.cancel_requested_at:
+                # The cancellation is consumed; a later redeploy starts clean
+                async with AsyncSessionLocal() as session:
+                    await clear_cancel_request(session, deployment.id)
+                    await session.commit()
+            return
+
+        logger.info("Worker %s building deployment %s (attempt %d)", self.name, job.deployment_id, job.attempts)
+        lease_lost = asyncio.Event()
+        build = asyncio.create_task(
+            run_deployment_job(job.deployment_id, job.attempts, owns_build=lambda: not lease_lost.is_set())
+        )
+        heartbeat = asyncio.create_task(self._heartbeat(job, build, lease_lost))
+        try:
+            await build
+        except asyncio.CancelledError:
+            if lease_lost.is_set():
+                # Lease lost: the job is back in the queue and no longer ours to finish
+                return
+            # Worker shutdown: let another worker pick the build up again
+            with suppress(Exception):
+                await release_job(job)
+            raise
+        except Exception as exc:
+            logger.exception("Build of deployment %s crashed", job.deployment_id)
+            await finish_job(job, "failed", str(exc)[:2000])
+        else:
+            await finish_job(job, "completed")
+        finally:
+            heartbeat.cancel()
+
+    async def _heartbeat(self, job: BuildJob, build: asyncio.Task, lease_lost: asyncio.Event) -> None:
+        interval = max(settings.build_job_lease_seconds / 3, 1)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                still_ours = await renew_lease(job)
+            except Exception:
+                logger.exception("Lease renewal failed for job %s", job.id)
+                continue
+            if not still_ours:
+                # The lease expired and the job was requeued; stop so two workers never build it
+                logger.warning("Lost lease on deployment %s; stopping local build", job.deployment_id)
+                lease_lost.set()
+                build.cancel()
+                return
+
+    async def _reaper(self) -> None:
+        with suppress(Exception):
+            recovered = await enqueue_orphaned_deployments()
+            if recovered:
+                logger.info("Queued %d deployments that had no build job", recovered)
+        while True:
+            try:
+                requeued, failed = await requeue_expired_jobs()
+                if requeued or failed:
+                    logger.info("Expired build leases: %d requeued, %d failed", requeued, failed)
+            except Exception:
+                logger.exception("Requeueing expired build jobs failed")
+            await asyncio.sleep(max(settings.build_job_lease_seconds / 2, 1))
+
+
+embedded_worker: BuildWorker | None = None
+
+
+def start_embedded_worker() -> None:
+    global embedded_worker
+    if embedded_worker is None:
+        embedded_worker = BuildWorker()
+    embedded_worker.start()
+
+
+async def stop_embedded_worker() -> None:
+    if embedded_worker is not None:
+        await embedded_worker.stop()
+
+
+async def _main(concurrency: int | None) -> None:
+    await init_db()
+    worker = BuildWorker(concurrency)
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        with suppress(NotImplementedError):
+            loop.add_signal_handler(signum, worker._stopping.set)
+    await worker.run_forever()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="AutoStack build worker")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=None,
+        help="builds to run in parallel (default: BUILD_WORKER_CONCURRENCY)",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    asyncio.run(_main(args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""Move build and runtime log rows into the segmented log store.
+
+Usage: python migrate_logs_to_store.py [deployment-id ...]
+
+Without arguments every deployment that still has rows in deployment_logs or
+deployment_runtime_logs is migrated. Deployments that are still running are
+skipped so their live log is not rewritten underneath the build worker.
+"""
+
+import asyncio
+import sys
+import uuid
+
+from sqlalchemy import select, union
+
+from app.db import AsyncSessionLocal
+from app.models import Deployment, DeploymentLog, DeploymentRuntimeLog
+from app.services.log_store import migrate_legacy_logs
+
+FINISHED_STATUSES = {"success", "failed", "cancelled"}
+
+
+async def migrate(deployment_ids: list[uuid.UUID]) -> None:
+    async with AsyncSessionLocal() as session:
+        if not deployment_ids:
+            result = await session.execute(
+                union(select(DeploymentLog.deployment_id), select(DeploymentRuntimeLog.deployment_id))
+            )
+            deployment_ids = [row[0] for row in result.all()]
+        result = await session.execute(
+            select(Deployment.id, Deployment.status).where(Deployment.id.in_(deployment_ids))
+        )
+        statuses = dict(result.all())
+
+    total = 0
+    for deployment_id in deployment_ids:
+        status = statuses.get(deployment_id)
+        if status is not None and status not in FINISHED_STATUSES:
+            print(f"⏭️  Skipping {deployment_id} (status: {status})")
+            continue
+        build = await migrate_legacy_logs(deployment_id, "build")
+        runtime = await migrate_legacy_logs(deployment_id, "runtime")
+        total += build + runtime
+        print(f"✅ {deployment_id}: {build} build lines, {runtime} runtime lines")
+    print(f"Migrated {total} log lines from {len(deployment_ids)} deployments")
+
+
+if __name__ == "__main__":
+    asyncio.run(migrate([uuid.UUID(value) for value in sys.argv[1:]]))
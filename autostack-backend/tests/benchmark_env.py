@@ -0,0 +1,24 @@
+"""Make the app importable from the standalone benchmark scripts in this directory.
+
+``app.config`` refuses to load without the required settings, so placeholders
+are filled in for any that are not already set in the environment.
+"""
+
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+for _name, _value in {
+    "DATABASE_URL": "sqlite+aiosqlite:///./benchmark.db",
+    "SECRET_KEY": "benchmark",
+    "FRONTEND_URL": "http://localhost:3000",
+    "GITHUB_CLIENT_ID": "x",
+    "GITHUB_CLIENT_SECRET": "x",
+    "GITHUB_CALLBACK_URL": "http://localhost:8000/auth/github/callback",
+    "GITHUB_WEBHOOK_SECRET": "x",
+    "GOOGLE_CLIENT_ID": "x",
+    "GOOGLE_CLIENT_SECRET": "x",
+    "GOOGLE_CALLBACK_URL": "http://localhost:8000/auth/google/callback",
+}.items():
+    os.environ.setdefault(_name, _value)
@@ -1,5 +1,8 @@
 import asyncio
+import atexit
 import os
+import shutil
+import tempfile
 from typing import AsyncIterator
 
 import pytest
@@ -18,6 +21,10 @@ os.environ["GOOGLE_CLIENT_SECRET"] = "google-secret"
 os.environ["GOOGLE_CALLBACK_URL"] = "http://localhost:8000/auth/google/callback"
 os.environ["AUTOSTACK_DEPLOY_DIR"] = "./test_artifacts"
 os.makedirs(os.environ["AUTOSTACK_DEPLOY_DIR"], exist_ok=True)
+# Log segments written by tests go to a scratch dir, removed when the session ends
+os.environ["AUTOSTACK_LOG_DIR"] = tempfile.mkdtemp(prefix="autostack-test-logs-")
+atexit.register(shutil.rmtree, os.environ["AUTOSTACK_LOG_DIR"], ignore_errors=True)
+os.environ["PREFETCH_ENABLE"] = "false"
 
 from app.main import app  # noqa: E402
 from app.db import AsyncSessionLocal, Base, engine  # noqa: E402
@@ -33,13 +40,19 @@ async def _reset_db() -> AsyncIterator[None]:
 
 @pytest.fixture(autouse=True)
 def _mock_enqueue(monkeypatch):
-    async def _noop(_: object) -> None:
+    async def _noop(*_: object) -> None:
         return None
 
     monkeypatch.setattr("app.routers.deployments.enqueue_deployment", _noop)
     monkeypatch.setattr("app.routers.webhook.enqueue_deployment", _noop)
 
 
+@pytest.fixture(autouse=True)
+def _unthrottled_log_versions(monkeypatch):
+    # Trailing log version bumps would outlive the test's event loop
+    monkeypatch.setattr("app.services.versions.LOG_VERSION_INTERVAL_SECONDS", 0)
+
+
 @pytest_asyncio.fixture
 async def client() -> AsyncIterator[AsyncClient]:
     async with AsyncClient(app=app, base_url="http://test") as async_client:
@@ -51,3 +64,25 @@ async def session() -> AsyncIterator[AsyncSessionLocal]:
     async with AsyncSessionLocal() as db:
         yield db
 
+
+
+@pytest_asyncio.fixture
+async def docker_engine(monkeypatch):
+    """A fake Docker Engine API on a Unix socket, with ``DOCKER_HOST`` pointed at it."""
+    from app.config import settings
+    from app.services.docker_api import client as docker_client
+    from fake_docker_engine import FakeDockerEngine
+
+    # Unix socket paths are limited to about 100 bytes, which pytest's tmp_path can exceed
+    socket_dir = tempfile.mkdtemp(prefix="docker-")
+    engine = FakeDockerEngine(os.path.join(socket_dir, "docker.sock"))
+    await engine.start()
+    await docker_client.aclose()
+    monkeypatch.setattr(settings, "docker_enable", True)
+    monkeypatch.setattr(settings, "docker_host", f"unix://{engine.socket_path}")
+    try:
+        yield engine
+    finally:
+        await docker_client.aclose()
+        await engine.close()
+        shutil.rmtree(socket_dir, ignore_errors=True)
@@ -0,0 +1,396 @@
+"""A small in-process stand-in for the Docker Engine API, served on a Unix socket.
+
+It keeps containers and images in memory and answers the endpoints used by
+``app.services.docker_api`` with the status codes and payloads of the real
+daemon, including multiplexed log streams and streamed build/pull progress.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import secrets
+import struct
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, AsyncIterator, Awaitable, Callable
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+
+@dataclass
+class FakeContainer:
+    id: str
+    name: str
+    image: str
+    port_bindings: dict[int, int]
+    binds: list[str]
+    state: str = "created"
+    memory_usage: int = 48 * 1024**2
+    # (unix time in ns, stream: 1 stdout / 2 stderr, text)
+    logs: list[tuple[int, int, str]] = field(default_factory=list)
+    followers: list[asyncio.Queue] = field(default_factory=list)
+
+
+@dataclass
+class Reply:
+    status: int
+    body: Any = None
+    content_type: str = "application/json"
+    chunks: AsyncIterator[bytes] | None = None
+
+
+def log_frame(stream: int, data: bytes) -> bytes:
+    return struct.pack(">BxxxL", stream, len(data)) + data
+
+
+def rfc3339_nano(ns: int) -> str:
+    seconds, fraction = divmod(ns, 1_000_000_000)
+    return datetime.utcfromtimestamp(seconds).strftime("%Y-%m-%dT%H:%M:%S") + f".{fraction:09d}Z"
+
+
+class FakeDockerEngine:
+    def __init__(self, socket_path: str) -> None:
+        self.socket_path = socket_path
+        self.containers: dict[str, FakeContainer] = {}
+        self.images: dict[str, dict[str, Any]] = {}
+        self.requests: list[tuple[str, str, dict[str, str]]] = []
+        self.connections = 0
+        # Host ports something outside AutoStack holds; starting a container on one fails
+        self.blocked_ports: set[int] = set()
+        # Images that a container still uses, so removing them conflicts
+        self.images_in_use: set[str] = set()
+        self.on_start: Callable[[FakeContainer], Awaitable[None]] | None = None
+        self._server: asyncio.AbstractServer | None = None
+        self._last_log_ns = 0
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_unix_server(self._handle, path=self.socket_path)
+
+    async def close(self) -> None:
+        for container in self.containers.values():
+            for queue in container.followers:
+                queue.put_nowait(None)
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    # -- helpers for tests -------------------------------------------------
+
+    def add_image(self, reference: str, created: int | None = None) -> None:
+        if ":" not in reference.rsplit("/", 1)[-1]:
+            reference += ":latest"
+        self.images[reference] = {
+            "Id": "sha256:" + secrets.token_hex(32),
+            "RepoTags": [reference],
+            "Created": created if created is not None else int(time.time()),
+        }
+
+    def add_container(
+        self, image: str = "nginx:alpine", *, state: str = "running", port: int | None = None, id: str | None = None
+    ) -> FakeContainer:
+        container = FakeContainer(
+            id=id or secrets.token_hex(32),
+            name=f"fake-{secrets.token_hex(3)}",
+            image=image,
+            port_bindings={80: port} if port else {},
+            binds=[],
+            state=state,
+        )
+        self.containers[container.id] = container
+        return container
+
+    def emit(self, container_id: str, text: str, stream: int = 1, at_ns: int | None = None) -> None:
+        """Append a log line and deliver it to followers of the container's logs."""
+        ns = at_ns if at_ns is not None else max(time.time_ns(), self._last_log_ns + 1)
+        self._last_log_ns = max(self._last_log_ns, ns)
+        container = self.containers[container_id]
+        container.logs.append((ns, stream, text))
+        for queue in container.followers:
+            queue.put_nowait((ns, stream, text))
+
+    def end_logs(self, container_id: str) -> None:
+        """End follow-mode log streams of the container, as when it exits."""
+        for queue in self.containers[container_id].followers:
+            queue.put_nowait(None)
+
+    def calls(self, method: str | None = None, prefix: str = "") -> list[tuple[str, str, dict[str, str]]]:
+        return [r for r in self.requests if (method is None or r[0] == method) and r[1].startswith(prefix)]
+
+    # -- HTTP ----------------------------------------------------------------
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                lines = head.decode("latin-1").split("\r\n")
+                method, target, _version = lines[0].split(" ", 2)
+                headers = {}
+                for line in lines[1:]:
+                    if line:
+                        key, _, value = line.partition(":")
+                        headers[key.strip().lower()] = value.strip()
+                body = b""
+                if "content-length" in headers:
+                    body = await reader.readexactly(int(headers["content-length"]))
+                elif headers.get("transfer-encoding", "").lower() == "chunked":
+                    body = await self._read_chunked(reader)
+                url = urlsplit(target)
+                query = dict(parse_qsl(url.query, keep_blank_values=True))
+                path = unquote(url.path)
+                self.requests.append((method, path, query))
+                reply = await self._route(method, path, query, body)
+                await self._write(writer, reply)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_chunked(reader: asyncio.StreamReader) -> bytes:
+        body = b""
+        while True:
+            size = int((await reader.readuntil(b"\r\n")).strip(), 16)
+            if size == 0:
+                await reader.readuntil(b"\r\n")
+                return body
+            body += await reader.readexactly(size)
+            await reader.readexactly(2)
+
+    @staticmethod
+    async def _write(writer: asyncio.StreamWriter, reply: Reply) -> None:
+        reason = {200: "OK", 201: "Created", 204: "No Content", 304: "Not Modified"}.get(reply.status, "Error")
+        head = f"HTTP/1.1 {reply.status} {reason}\r\nContent-Type: {reply.content_type}\r\n"
+        if reply.chunks is not None:
+            writer.write((head + "Transfer-Encoding: chunked\r\n\r\n").encode())
+            await writer.drain()
+            async for chunk in reply.chunks:
+                writer.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+                await writer.drain()
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+            return
+        if reply.body is None or reply.status in (204, 304):
+            payload = b""
+        elif isinstance(reply.body, bytes):
+            payload = reply.body
+        else:
+            payload = json.dumps(reply.body).encode()
+        writer.write((head + f"Content-Length: {len(payload)}\r\n\r\n").encode() + payload)
+        await writer.drain()
+
+    # -- Engine API ----------------------------------------------------------
+
+    def _find(self, ref: str) -> FakeContainer | None:
+        for container in self.containers.values():
+            if container.id.startswith(ref) or container.name == ref.lstrip("/"):
+                return container
+        return None
+
+    @staticmethod
+    def _error(status: int, message: str) -> Reply:
+        return Reply(status, {"message": message})
+
+    async def _route(self, method: str, path: str, query: dict[str, str], body: bytes) -> Reply:
+        if path == "/_ping":
+            return Reply(200, b"OK", "text/plain")
+        if method == "POST" and path == "/containers/create":
+            return self._create(query, json.loads(body or b"{}"))
+        if method == "GET" and path == "/containers/json":
+            return self._list_containers(query)
+        if path.startswith("/containers/"):
+            ref, _, action = path[len("/containers/"):].partition("/")
+            container = self._find(ref)
+            if container is None:
+                return self._error(404, f"No such container: {ref}")
+            return await self._container_action(method, action, container, query)
+        if method == "POST" and path == "/images/create":
+            return self._pull(query)
+        if method == "GET" and path == "/images/json":
+            return self._list_images(query)
+        if method == "POST" and path == "/build":
+            return self._build(query, body)
+        if path.startswith("/images/"):
+            name = path[len("/images/"):]
+            if method == "GET" and name.endswith("/json"):
+                image = self.images.get(self._normalize(name[: -len("/json")]))
+                return Reply(200, image) if image else self._error(404, f"No such image: {name}")
+            if method == "DELETE":
+                return self._remove_image(name)
+        return self._error(404, f"page not found: {method} {path}")
+
+    @staticmethod
+    def _normalize(reference: str) -> str:
+        return reference if ":" in reference.rsplit("/", 1)[-1] else f"{reference}:latest"
+
+    def _create(self, query: dict[str, str], spec: dict[str, Any]) -> Reply:
+        image = spec.get("Image", "")
+        if self._normalize(image) not in self.images:
+            return self._error(404, f"No such image: {image}")
+        name = query.get("name", "")
+        if name and self._find(name) is not None:
+            return self._error(409, f'Conflict. The container name "/{name}" is already in use')
+        host_config = spec.get("HostConfig") or {}
+        bindings = {
+            int(key.split("/")[0]): int(value[0]["HostPort"])
+            for key, value in (host_config.get("PortBindings") or {}).items()
+        }
+        container = FakeContainer(
+            id=secrets.token_hex(32),
+            name=name or secrets.token_hex(4),
+            image=image,
+            port_bindings=bindings,
+            binds=host_config.get("Binds") or [],
+        )
+        self.containers[container.id] = container
+        return Reply(201, {"Id": container.id, "Warnings": []})
+
+    def _list_containers(self, query: dict[str, str]) -> Reply:
+        include_all = query.get("all") in ("1", "true")
+        return Reply(
+            200,
+            [
+                {
+                    "Id": c.id,
+                    "Names": [f"/{c.name}"],
+                    "Image": c.image,
+                    "State": c.state,
+                    "Ports": [
+                        {"IP": "0.0.0.0", "PrivatePort": private, "PublicPort": public, "Type": "tcp"}
+                        for private, public in c.port_bindings.items()
+                    ],
+                }
+                for c in self.containers.values()
+                if include_all or c.state == "running"
+            ],
+        )
+
+    async def _container_action(
+        self, method: str, action: str, container: FakeContainer, query: dict[str, str]
+    ) -> Reply:
+        if method == "POST" and action == "start":
+            if container.state == "running":
+                return Reply(304)
+            for port in container.port_bindings.values():
+                if port in self.blocked_ports:
+                    return self._error(
+                        500,
+                        "driver failed programming external connectivity on endpoint "
+                        f"{container.name}: Bind for 0.0.0.0:{port} failed: port is already allocated",
+                    )
+            container.state = "running"
+            if self.on_start is not None:
+                await self.on_start(container)
+            return Reply(204)
+        if method == "POST" and action == "stop":
+            if container.state != "running":
+                return Reply(304)
+            container.state = "exited"
+            return Reply(204)
+        if method == "DELETE" and action == "":
+            if container.state == "running" and query.get("force") not in ("1", "true"):
+                return self._error(409, "You cannot remove a running container. Stop the container before attempting removal or force remove")
+            del self.containers[container.id]
+            return Reply(204)
+        if method == "GET" and action == "json":
+            return Reply(200, {"Id": container.id, "Name": f"/{container.name}", "State": {"Status": container.state}})
+        if method == "GET" and action == "stats":
+            usage = container.memory_usage if container.state == "running" else 0
+            return Reply(
+                200,
+                {
+                    "memory_stats": {"usage": usage + 1024**2, "limit": 2 * 1024**3, "stats": {"inactive_file": 1024**2}},
+                    "cpu_stats": {"cpu_usage": {"total_usage": 200, "percpu_usage": [100, 100]}, "system_cpu_usage": 2000},
+                    "precpu_stats": {"cpu_usage": {"total_usage": 100}, "system_cpu_usage": 1000},
+                    "networks": {"eth0": {"rx_bytes": 10, "tx_bytes": 20}},
+                },
+            )
+        if method == "GET" and action == "logs":
+            return self._logs(container, query)
+        return self._error(404, f"page not found: {method} {action}")
+
+    def _logs(self, container: FakeContainer, query: dict[str, str]) -> Reply:
+        streams = {1} if query.get("stdout") in ("1", "true") else set()
+        if query.get("stderr") in ("1", "true"):
+            streams.add(2)
+        since_ns = int(float(query["since"]) * 1_000_000_000) if query.get("since") else 0
+        timestamps = query.get("timestamps") in ("1", "true")
+        entries = [entry for entry in container.logs if entry[1] in streams and entry[0] >= since_ns]
+        tail = query.get("tail", "all")
+        if tail != "all":
+            entries = entries[-int(tail):] if int(tail) else []
+        follow = query.get("follow") in ("1", "true")
+        queue: asyncio.Queue | None = None
+        if follow and container.state == "running":
+            queue = asyncio.Queue()
+            container.followers.append(queue)
+
+        def frame(entry: tuple[int, int, str]) -> bytes:
+            ns, stream, text = entry
+            line = f"{rfc3339_nano(ns)} {text}\n" if timestamps else f"{text}\n"
+            return log_frame(stream, line.encode())
+
+        async def chunks() -> AsyncIterator[bytes]:
+            try:
+                if entries:
+                    yield b"".join(frame(entry) for entry in entries)
+                while queue is not None:
+                    entry = await queue.get()
+                    if entry is None:
+                        break
+                    if entry[1] in streams:
+                        yield frame(entry)
+            finally:
+                if queue is not None and queue in container.followers:
+                    container.followers.remove(queue)
+
+        return Reply(200, content_type="application/vnd.docker.multiplexed-stream", chunks=chunks())
+
+    def _pull(self, query: dict[str, str]) -> Reply:
+        reference = query.get("fromImage", "")
+        if query.get("tag"):
+            reference = f"{reference}:{query['tag']}"
+        messages = [{"status": f"Pulling from {reference}"}]
+        if reference.startswith("missing/"):
+            messages.append({"errorDetail": {"message": "manifest unknown"}, "error": "manifest unknown"})
+        else:
+            self.add_image(reference)
+            messages.append({"status": f"Downloaded newer image for {reference}"})
+        return Reply(200, chunks=_json_lines(messages))
+
+    def _list_images(self, query: dict[str, str]) -> Reply:
+        references = json.loads(query.get("filters") or "{}").get("reference") or []
+        images = [
+            image
+            for tag, image in self.images.items()
+            if not references or any(tag.startswith(f"{ref}:") or tag == ref for ref in references)
+        ]
+        return Reply(200, images)
+
+    def _remove_image(self, name: str) -> Reply:
+        reference = self._normalize(name)
+        if reference not in self.images:
+            return self._error(404, f"No such image: {name}")
+        if reference in self.images_in_use:
+            return self._error(409, f"conflict: unable to remove repository reference \"{name}\" (must force) - container is using its referenced image")
+        del self.images[reference]
+        return Reply(200, [{"Untagged": reference}])
+
+    def _build(self, query: dict[str, str], body: bytes) -> Reply:
+        messages: list[dict[str, Any]] = [{"stream": "Step 1/2 : FROM nginx:alpine\n"}, {"stream": f"Context: {len(body)} bytes\n"}]
+        if not body:
+            messages.append({"errorDetail": {"message": "empty build context"}, "error": "empty build context"})
+        else:
+            if query.get("t"):
+                self.add_image(query["t"])
+            messages.append({"stream": "Successfully built\n"})
+        return Reply(200, chunks=_json_lines(messages))
+
+
+async def _json_lines(messages: list[dict[str, Any]]) -> AsyncIterator[bytes]:
+    for message in messages:
+        yield (json.dumps(message) + "\r\n").encode()
@@ -0,0 +1,101 @@
+"""
+Log normalizer reduction report
+
+Replays captured build output through LogNormalizer and reports how many log
+records/WebSocket frames and bytes it saves. Capture real output with e.g.
+
+    script -q -c "npm install --progress=true" npm-install.log
+
+and pass the files as arguments. Without arguments, synthetic output shaped
+like npm install, a webpack build and a docker build is used.
+
+Usage: python tests/log_normalizer_benchmark.py [captured-output ...]
+"""
+
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+import benchmark_env  # noqa: F401  (puts the app on sys.path with placeholder settings)
+
+from app.services.log_normalizer import LogNormalizer
+
+
+def synthetic_npm_install() -> List[str]:
+    # On a terminal npm redraws its spinner line with \r and only ends it occasionally
+    lines = []
+    for batch in range(8):
+        redraws = [
+            f"\x1b[2K\r{'⠋⠙⠹⠸⠼⠴⠦⠧⠇⠏'[pkg % 10]} reify:pkg-{pkg}: \x1b[36mtiming\x1b[0m reifyNode:node_modules/pkg-{pkg}"
+            for pkg in range(batch * 50, (batch + 1) * 50)
+        ]
+        lines.append("".join(redraws) + "\n")
+        lines.append(f"npm http fetch GET 200 https://registry.npmjs.org/pkg-{batch} 120ms (cache miss)\n")
+    lines += ["npm WARN deprecated inflight@1.0.6: This module is not supported\n"] * 30
+    lines.append("added 400 packages, and audited 401 packages in 12s\n")
+    return lines
+
+
+def synthetic_webpack_build() -> List[str]:
+    lines = []
+    for pct in range(0, 101):
+        lines.append(f"<s> [webpack.Progress] {pct}% building {pct * 13}/{1300} modules {pct} active\n")
+    lines += [f"asset main.{idx}.js {idx * 3}.2 KiB [emitted] [minimized]\n" for idx in range(20)]
+    lines.append("webpack 5.90.0 compiled successfully in 8123 ms\n")
+    return lines
+
+
+def synthetic_docker_build() -> List[str]:
+    lines = []
+    for layer in range(6):
+        for done in range(0, 101, 2):
+            lines.append(f"{layer:02x}f3a1c9d: Downloading [{'=' * (done // 2)}>{' ' * (50 - done // 2)}] {done}MB/100MB\n")
+        lines.append(f"{layer:02x}f3a1c9d: Pull complete\n")
+    lines += [f"#{step} [stage-1 {step}/9] RUN step {step}\n#{step} DONE 0.{step}s\n" for step in range(9)]
+    return lines
+
+
+def replay(lines: Iterable[str]) -> Dict[str, float]:
+    # A frozen clock means progress is only emitted on state changes, like a fast build
+    normalizer = LogNormalizer(clock=lambda: 0.0)
+    started = time.perf_counter()
+    for line in lines:
+        normalizer.feed(line)
+    normalizer.end_command()
+    elapsed = time.perf_counter() - started
+    stats = normalizer.stats
+    return {
+        "lines_in": stats.raw_lines,
+        "lines_out": stats.emitted_lines,
+        "bytes_in": stats.raw_bytes,
+        "bytes_out": stats.emitted_bytes,
+        "frame_reduction": stats.frame_reduction,
+        "byte_reduction": stats.byte_reduction,
+        "lines_per_second": stats.raw_lines / elapsed if elapsed else 0.0,
+    }
+
+
+def main() -> None:
+    samples: Dict[str, List[str]] = {}
+    for path in sys.argv[1:]:
+        samples[Path(path).name] = Path(path).read_text(encoding="utf-8", errors="replace").splitlines(keepends=True)
+    if not samples:
+        samples = {
+            "npm install (synthetic)": synthetic_npm_install(),
+            "webpack build (synthetic)": synthetic_webpack_build(),
+            "docker build (synthetic)": synthetic_docker_build(),
+        }
+
+    print(f"{'sample':<28} {'lines':>13} {'bytes':>17} {'frames':>8} {'bytes':>8}")
+    for name, lines in samples.items():
+        result = replay(lines)
+        print(
+            f"{name:<28} {result['lines_in']:>6}→{result['lines_out']:<6} "
+            f"{result['bytes_in']:>8}→{result['bytes_out']:<8} "
+            f"{result['frame_reduction']:>7.0%} {result['byte_reduction']:>7.0%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Subprocess output throughput: readline() per line vs the chunked pipe reader
+
+Spawns a child process that writes a fixed amount of build-like output to
+stdout and measures how fast each strategy consumes it, in MB/s.
+
+Usage: python tests/pipe_reader_benchmark.py [megabytes] [line_length]
+"""
+
+import asyncio
+import sys
+import time
+from asyncio.subprocess import PIPE
+
+import benchmark_env  # noqa: F401  (puts the app on sys.path with placeholder settings)
+
+from app.services.pipe_reader import iter_pipe_lines
+
+PRODUCER = (
+    "import sys\n"
+    "line = (b'x' * {line_length}) + b'\\n'\n"
+    "block = line * max(1, 65536 // len(line))\n"
+    "remaining = {total}\n"
+    "while remaining > 0:\n"
+    "    sys.stdout.buffer.write(block[:remaining])\n"
+    "    remaining -= len(block)\n"
+)
+
+
+async def _spawn(total: int, line_length: int) -> asyncio.subprocess.Process:
+    code = PRODUCER.format(total=total, line_length=line_length)
+    return await asyncio.create_subprocess_exec(sys.executable, "-c", code, stdout=PIPE)
+
+
+async def consume_readline(total: int, line_length: int) -> tuple[float, int]:
+    process = await _spawn(total, line_length)
+    lines = 0
+    started = time.perf_counter()
+    while True:
+        line = await process.stdout.readline()
+        if not line:
+            break
+        line.decode(errors="ignore").rstrip()
+        lines += 1
+    await process.wait()
+    return time.perf_counter() - started, lines
+
+
+async def consume_chunked(total: int, line_length: int) -> tuple[float, int]:
+    process = await _spawn(total, line_length)
+    lines = 0
+    started = time.perf_counter()
+    async for _ in iter_pipe_lines(process.stdout):
+        lines += 1
+    await process.wait()
+    return time.perf_counter() - started, lines
+
+
+async def main() -> None:
+    megabytes = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    line_length = int(sys.argv[2]) if len(sys.argv) > 2 else 80
+    total = megabytes * 1024 * 1024
+
+    print(f"{megabytes} MiB of output, {line_length}-byte lines")
+    for name, consume in (("readline", consume_readline), ("chunked", consume_chunked)):
+        elapsed, lines = await consume(total, line_length)
+        print(f"  {name:<10} {megabytes / elapsed:8.1f} MB/s  {lines / elapsed:12,.0f} lines/s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
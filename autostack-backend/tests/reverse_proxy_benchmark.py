@@ -0,0 +1,122 @@
+"""
+Reverse proxy throughput: pooled keep-alive connections vs a new connection per request
+
+Starts a dummy HTTP/1.1 keep-alive upstream in a child process, like a
+runtime container, and sends requests through proxy_request() with concurrent
+clients, once with per-upstream connection pooling and once with keep-alive
+disabled. Reports requests/s, latency percentiles and how many upstream
+connections were opened.
+
+Usage: python tests/reverse_proxy_benchmark.py [requests] [concurrency] [body_bytes]
+"""
+
+import asyncio
+import sys
+import time
+import uuid
+from asyncio.subprocess import PIPE
+
+import httpx
+from starlette.applications import Starlette
+from starlette.routing import Route
+
+import benchmark_env  # noqa: F401  (puts the app on sys.path with placeholder settings)
+from app.services.reverse_proxy import UpstreamPools, proxy_request
+
+
+class Upstream:
+    """Dummy keep-alive server; ``GET /__connections`` returns how many connections it accepted."""
+
+    def __init__(self, body_bytes: int) -> None:
+        self.body = b"x" * body_bytes
+        self.connections = 0
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                keep_alive = b"connection: close" not in head.lower()
+                body = str(self.connections).encode() if head.startswith(b"GET /__connections ") else self.body
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\n"
+                    + f"Content-Length: {len(body)}\r\n".encode()
+                    + (b"" if keep_alive else b"Connection: close\r\n")
+                    + b"\r\n"
+                    + body
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve_upstream(body_bytes: int) -> None:
+    upstream = Upstream(body_bytes)
+    server = await asyncio.start_server(upstream.handle, "127.0.0.1", 0)
+    print(server.sockets[0].getsockname()[1], flush=True)
+    await server.serve_forever()
+
+
+async def start_upstream(body_bytes: int) -> tuple[asyncio.subprocess.Process, str]:
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, __file__, "--upstream", str(body_bytes), stdout=PIPE
+    )
+    port = int(await process.stdout.readline())
+    return process, f"http://127.0.0.1:{port}"
+
+
+async def run(upstream_pools: UpstreamPools, origin: str, requests: int, concurrency: int) -> tuple[float, list[float]]:
+    deployment_id = uuid.uuid4()
+
+    async def endpoint(request):
+        return await proxy_request(request, deployment_id, origin, request.path_params["path"], upstream_pools)
+
+    app = Starlette(routes=[Route("/{path:path}", endpoint)])
+    latencies: list[float] = []
+    remaining = iter(range(requests))
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+
+        async def worker() -> None:
+            for _ in remaining:
+                started = time.perf_counter()
+                response = await client.get("/index.html")
+                response.raise_for_status()
+                latencies.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    await upstream_pools.aclose()
+    return elapsed, sorted(latencies)
+
+
+async def main() -> None:
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    body_bytes = int(sys.argv[3]) if len(sys.argv) > 3 else 2048
+
+    print(f"{requests} requests, {concurrency} concurrent clients, {body_bytes}-byte responses")
+    for name, upstream_pools in (("pooled", UpstreamPools()), ("no-reuse", UpstreamPools(max_keepalive=0))):
+        process, origin = await start_upstream(body_bytes)
+        elapsed, latencies = await run(upstream_pools, origin, requests, concurrency)
+        async with httpx.AsyncClient() as client:
+            connections = int((await client.get(f"{origin}/__connections")).text) - 1
+        process.terminate()
+        await process.wait()
+        p50 = latencies[len(latencies) // 2]
+        p95 = latencies[int(len(latencies) * 0.95)]
+        print(
+            f"  {name:<10} {requests / elapsed:8.0f} req/s  p50 {p50:6.2f} ms  p95 {p95:6.2f} ms"
+            f"  {connections:6d} upstream connections"
+        )
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--upstream"]:
+        asyncio.run(serve_upstream(int(sys.argv[2])))
+    else:
+        asyncio.run(main())
@@ -0,0 +1,118 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import select
+
+from app.config import settings
+from app.models import Deployment, DeploymentContainer, Project, User
+from app.security import create_access_token
+from app.services import blue_green
+from app.services.container_runtime import wait_until_healthy
+from app.services.static_gateway import routing_table
+
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_health_gate_needs_consecutive_healthy_probes():
+    statuses = iter([200, 500, 200, 200, 200])
+    served: list[int] = []
+
+    async def handle(reader, writer):
+        await reader.readuntil(b"\r\n\r\n")
+        status = next(statuses, 200)
+        served.append(status)
+        writer.write(f"HTTP/1.1 {status} X\r\nContent-Length: 0\r\nConnection: close\r\n\r\n".encode())
+        await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    url = f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}/"
+    try:
+        assert await wait_until_healthy(url, probes=3, timeout=5, interval=0.01)
+        assert served == [200, 500, 200, 200, 200]
+        statuses = iter([503] * 1000)
+        assert not await wait_until_healthy(url, probes=3, timeout=0.2, interval=0.01)
+    finally:
+        server.close()
+        await server.wait_closed()
+
+
+@pytest.fixture
+def runtime(monkeypatch):
+    """Docker-free redeploy: new containers are rows on port 31500, health is controlled by the test."""
+    state = SimpleNamespace(healthy=True)
+
+    async def fake_start_container(session, deployment, artifacts_dir):
+        container = DeploymentContainer(
+            deployment_id=deployment.id, container_id="green", image="nginx:alpine", port=31500, status="starting"
+        )
+        session.add(container)
+        await session.flush()
+        return container
+
+    async def fake_wait_until_healthy(url):
+        return state.healthy
+
+    async def fake_health_check(session, deployment, url):
+        return SimpleNamespace(is_live=state.healthy)
+
+    monkeypatch.setattr(settings, "docker_enable", True)
+    monkeypatch.setattr(settings, "cutover_drain_seconds", 0)
+    monkeypatch.setattr("app.routers.deployments_runtime.is_docker_available", lambda: True)
+    monkeypatch.setattr("app.routers.deployments_runtime.start_container", fake_start_container)
+    monkeypatch.setattr("app.routers.deployments_runtime.wait_until_healthy", fake_wait_until_healthy)
+    monkeypatch.setattr("app.routers.deployments_runtime.record_health_check", fake_health_check)
+    yield state
+    routing_table.clear()
+
+
+async def _serving_deployment(session) -> tuple[Deployment, dict]:
+    user = User(name="Blue Green", email="bluegreen@example.com")
+    session.add(user)
+    await session.flush()
+    project = Project(user_id=user.id, name="bg", repository="octocat/bg", runtime="docker")
+    session.add(project)
+    await session.flush()
+    deployment = Deployment(
+        project_id=project.id, user_id=user.id, status="success", deployed_url="http://localhost:31400/"
+    )
+    session.add(deployment)
+    await session.flush()
+    session.add(
+        DeploymentContainer(deployment_id=deployment.id, container_id="blue", image="nginx:alpine", port=31400, status="running")
+    )
+    await session.commit()
+    return deployment, {"Authorization": f"Bearer {create_access_token(user)}"}
+
+
+async def _statuses(session) -> dict[str, str]:
+    session.expire_all()
+    rows = await session.execute(select(DeploymentContainer.container_id, DeploymentContainer.status))
+    return dict(rows.all())
+
+
+async def test_redeploy_switches_to_healthy_container_then_drains_the_old_one(client, session, runtime):
+    deployment, headers = await _serving_deployment(session)
+
+    response = await client.post(f"/api/deployments/{deployment.id}/runtime/redeploy", headers=headers)
+    assert response.status_code == 200
+    await asyncio.gather(*blue_green._retiring)
+
+    assert await _statuses(session) == {"blue": "stopped", "green": "running"}
+    await session.refresh(deployment)
+    assert deployment.deployed_url != "http://localhost:31400/"
+
+
+async def test_redeploy_rolls_back_when_new_container_never_becomes_healthy(client, session, runtime):
+    deployment, headers = await _serving_deployment(session)
+    runtime.healthy = False
+
+    response = await client.post(f"/api/deployments/{deployment.id}/runtime/redeploy", headers=headers)
+    assert response.status_code == 502
+    assert not blue_green._retiring
+
+    assert await _statuses(session) == {"blue": "running", "green": "stopped"}
+    await session.refresh(deployment)
+    assert deployment.deployed_url == "http://localhost:31400/"
@@ -0,0 +1,93 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from app import build_engine
+from app.build_engine import _run_command, _watch_cancellation, cancel_deployment_run
+from app.models import Deployment, Project, User
+
+
+pytestmark = [
+    pytest.mark.asyncio,
+    pytest.mark.skipif(os.name != "posix", reason="process groups are POSIX-only"),
+]
+
+
+async def _deployment(session) -> Deployment:
+    user = User(name="Cancel User", email="cancel@example.com")
+    session.add(user)
+    await session.flush()
+    project = Project(user_id=user.id, name="Cancel", repository="octocat/cancel")
+    session.add(project)
+    await session.flush()
+    deployment = Deployment(project_id=project.id, user_id=user.id, status="building")
+    session.add(deployment)
+    await session.commit()
+    return deployment
+
+
+async def test_silent_command_and_its_children_are_killed_promptly(session, tmp_path):
+    deployment = await _deployment(session)
+    cancel_flag = asyncio.Event()
+    marker = tmp_path / "child-survived"
+
+    async def _cancel_soon() -> None:
+        await asyncio.sleep(0.3)
+        cancel_flag.set()
+
+    canceller = asyncio.create_task(_cancel_soon())
+    started = time.monotonic()
+    # The background child prints nothing and would outlive a kill of the shell alone
+    code = await _run_command(
+        deployment.id,
+        session,
+        f"(sleep 1 && touch {marker}) & sleep 30",
+        tmp_path,
+        cancel_flag,
+    )
+    await canceller
+
+    assert code != 0
+    assert time.monotonic() - started < 1.0
+    await asyncio.sleep(1.2)
+    assert not marker.exists()
+
+
+async def test_cancellation_recorded_in_database_reaches_watcher(session):
+    deployment = await _deployment(session)
+    cancel_flag = asyncio.Event()
+    watcher = asyncio.create_task(_watch_cancellation(deployment.id, cancel_flag))
+
+    # No local flag is registered for this deployment, as in another API process
+    await cancel_deployment_run(deployment.id)
+
+    await asyncio.wait_for(cancel_flag.wait(), timeout=1)
+    await watcher
+
+
+async def test_one_poller_watches_every_build_of_the_process(session):
+    first = await _deployment(session)
+    deployments = [first]
+    for _ in range(2):
+        deployment = Deployment(project_id=first.project_id, user_id=first.user_id, status="building")
+        session.add(deployment)
+        deployments.append(deployment)
+    await session.commit()
+    flags = [asyncio.Event() for _ in deployments]
+    watchers = [asyncio.create_task(_watch_cancellation(d.id, flag)) for d, flag in zip(deployments, flags)]
+    await asyncio.sleep(0)
+    poller = build_engine._cancel_poller
+
+    started = time.monotonic()
+    await cancel_deployment_run(deployments[1].id)
+    await asyncio.wait_for(flags[1].wait(), timeout=1)
+    assert time.monotonic() - started < 0.5
+    assert [flag.is_set() for flag in flags] == [False, True, False]
+    assert build_engine._cancel_poller is poller
+
+    for watcher in watchers:
+        watcher.cancel()
+    await asyncio.gather(*watchers, return_exceptions=True)
+    assert not build_engine._watched_builds
@@ -0,0 +1,145 @@
+import asyncio
+import os
+import time
+
+import pytest
+from sqlalchemy import select
+
+from app.build_engine import _run_pipeline_spec
+from app.config import settings
+from app.models import Deployment, DeploymentStage, Project, User
+from app.services.log_store import read_log_range
+from app.services.pipeline_spec import PipelineSpecError, parse_pipeline_spec
+
+
+PIPELINE = """
+output: dist
+steps:
+  lint:
+    run: sleep 0.4 && echo linted
+    inputs: ["src/**"]
+  test:
+    run: sleep 0.4 && echo tested
+    inputs: ["src/**"]
+  build:
+    run: mkdir -p dist && cp src/index.html dist/ && echo built >> build-count
+    needs: [lint, test]
+    inputs: ["src/**"]
+    outputs: [dist]
+"""
+
+
+def test_pipeline_file_is_validated():
+    spec = parse_pipeline_spec(PIPELINE)
+    assert [step.name for step in spec.order()] == ["lint", "test", "build"]
+    assert spec.output_dir == "dist"
+
+    with pytest.raises(PipelineSpecError, match="cycle"):
+        parse_pipeline_spec("steps:\n  a: {run: x, needs: [b]}\n  b: {run: y, needs: [a]}\n")
+    with pytest.raises(PipelineSpecError, match="unknown step"):
+        parse_pipeline_spec("steps:\n  a: {run: x, needs: [missing]}\n")
+    with pytest.raises(PipelineSpecError, match="'run'"):
+        parse_pipeline_spec("steps:\n  a: {needs: []}\n")
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(os.name != "posix", reason="steps run through a POSIX shell")
+async def test_independent_steps_run_concurrently_and_unchanged_steps_are_cached(session, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "step_cache_dir", str(tmp_path / "cache"))
+    user = User(name="Pipeline", email="pipeline@example.com")
+    session.add(user)
+    await session.flush()
+    project = Project(user_id=user.id, name="Pipeline", repository="octocat/pipeline")
+    session.add(project)
+    await session.flush()
+    deployment = Deployment(project_id=project.id, user_id=user.id, status="building")
+    session.add(deployment)
+    await session.commit()
+
+    workdir = tmp_path / "repo"
+    (workdir / "src").mkdir(parents=True)
+    (workdir / "src" / "index.html").write_text("<h1>hi</h1>")
+    spec = parse_pipeline_spec(PIPELINE)
+
+    started = time.monotonic()
+    failure = await _run_pipeline_spec(deployment.id, project.id, spec, workdir, asyncio.Event(), dict(os.environ))
+    elapsed = time.monotonic() - started
+    assert failure is None
+    # lint and test sleep 0.4s each; run one after the other they would need 0.8s
+    assert elapsed < 0.75
+    assert (workdir / "dist" / "index.html").is_file()
+
+    stages = (await session.execute(select(DeploymentStage).where(DeploymentStage.deployment_id == deployment.id))).scalars()
+    assert {stage.stage_name: stage.status for stage in stages} == {
+        "Step: lint": "completed",
+        "Step: test": "completed",
+        "Step: build": "completed",
+    }
+
+    # Same inputs in a fresh checkout: every step is restored instead of run
+    (workdir / "dist" / "index.html").unlink()
+    failure = await _run_pipeline_spec(deployment.id, project.id, spec, workdir, asyncio.Event(), dict(os.environ))
+    assert failure is None
+    assert (workdir / "dist" / "index.html").is_file()
+    assert (workdir / "build-count").read_text().count("built") == 1
+
+    # A changed project variable misses the cache; the deployment id and cache tokens do not count
+    env = {**os.environ, "AUTOSTACK_DEPLOYMENT_ID": "other", "TURBO_TOKEN": "other"}
+    failure = await _run_pipeline_spec(deployment.id, project.id, spec, workdir, asyncio.Event(), env)
+    assert failure is None
+    assert (workdir / "build-count").read_text().count("built") == 1
+    env["VITE_API_URL"] = "https://api.example.test"
+    failure = await _run_pipeline_spec(deployment.id, project.id, spec, workdir, asyncio.Event(), env)
+    assert failure is None
+    assert (workdir / "build-count").read_text().count("built") == 2
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(os.name != "posix", reason="steps run through a POSIX shell")
+async def test_failed_step_stops_dependents(session, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "step_cache_dir", str(tmp_path / "cache"))
+    user = User(name="Pipeline Fail", email="pipeline-fail@example.com")
+    session.add(user)
+    await session.flush()
+    project = Project(user_id=user.id, name="Fail", repository="octocat/fail")
+    session.add(project)
+    await session.flush()
+    deployment = Deployment(project_id=project.id, user_id=user.id, status="building")
+    session.add(deployment)
+    await session.commit()
+
+    spec = parse_pipeline_spec("steps:\n  test: exit 3\n  build: {run: touch built, needs: [test]}\n")
+    failure = await _run_pipeline_spec(deployment.id, project.id, spec, tmp_path, asyncio.Event(), dict(os.environ))
+
+    assert failure == "Pipeline step 'test' failed (exit code 3)"
+    assert not (tmp_path / "built").exists()
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(os.name != "posix", reason="steps run through a POSIX shell")
+async def test_concurrent_steps_are_normalized_separately(session, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "step_cache_dir", str(tmp_path / "cache"))
+    user = User(name="Pipeline Logs", email="pipeline-logs@example.com")
+    session.add(user)
+    await session.flush()
+    project = Project(user_id=user.id, name="Logs", repository="octocat/pipeline-logs")
+    session.add(project)
+    await session.flush()
+    deployment = Deployment(project_id=project.id, user_id=user.id, status="building")
+    session.add(deployment)
+    await session.commit()
+
+    spec = parse_pipeline_spec(
+        "steps:\n"
+        "  a: echo same; sleep 0.2; echo same; echo same\n"
+        "  b: sleep 0.1; echo same; sleep 0.2; echo same\n"
+    )
+    failure = await _run_pipeline_spec(deployment.id, project.id, spec, tmp_path, asyncio.Event(), dict(os.environ))
+    assert failure is None
+
+    window = await read_log_range(session, deployment.id, limit=100)
+    messages = [line.message for line in window.lines]
+    # Identical lines of different steps are never folded into each other's repeat counts
+    for label, repeats in (("a", 2), ("b", 1)):
+        step_lines = [message for message in messages if message.startswith(f"[{label}] ") and "$" not in message]
+        assert step_lines == [f"[{label}] same", f"[{label}] (repeated {repeats} more times)"]
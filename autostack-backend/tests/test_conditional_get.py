@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+from app.db import AsyncSessionLocal
+from app.models import Deployment, Project, User
+from app.security import create_access_token
+from app.services import versions
+from app.services.stages import set_stage_status
+from app.services.versions import bump_log_version, fetch_deployment_version
+
+
+pytestmark = pytest.mark.asyncio
+
+
+async def _setup(session) -> tuple[Deployment, dict]:
+    user = User(name="Etag User", email="etag@example.com")
+    session.add(user)
+    await session.flush()
+    project = Project(user_id=user.id, name="Etag", repository="octocat/etag")
+    session.add(project)
+    await session.flush()
+    deployment = Deployment(project_id=project.id, user_id=user.id, status="queued")
+    session.add(deployment)
+    await session.commit()
+    return deployment, {"Authorization": f"Bearer {create_access_token(user)}"}
+
+
+async def _change_stage(deployment_id) -> None:
+    async with AsyncSessionLocal() as db:
+        await set_stage_status(db, deployment_id, "cloning", "in_progress")
+        await db.commit()
+
+
+async def test_detail_etag_returns_304_until_deployment_changes(client, session):
+    deployment, headers = await _setup(session)
+    url = f"/api/deployments/{deployment.id}"
+
+    first = await client.get(url, headers=headers)
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+
+    unchanged = await client.get(url, headers={**headers, "If-None-Match": etag})
+    assert unchanged.status_code == 304
+    assert unchanged.content == b""
+
+    await _change_stage(deployment.id)
+    changed = await client.get(url, headers={**headers, "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+
+
+async def test_long_poll_returns_when_version_changes(client, session):
+    deployment, headers = await _setup(session)
+    url = f"/api/deployments/{deployment.id}"
+    etag = (await client.get(url, headers=headers)).headers["ETag"]
+
+    async def _later() -> None:
+        await asyncio.sleep(0.2)
+        await _change_stage(deployment.id)
+
+    bump = asyncio.create_task(_later())
+    response = await client.get(f"{url}?wait=10", headers={**headers, "If-None-Match": etag})
+    await bump
+    assert response.status_code == 200
+    assert response.json()["stages"][0]["name"] == "Cloning"
+
+
+async def test_dashboard_etag_tracks_user_version(client, session):
+    deployment, headers = await _setup(session)
+
+    first = await client.get("/api/dashboard/stats", headers=headers)
+    etag = first.headers["ETag"]
+    assert (await client.get("/api/dashboard/stats", headers={**headers, "If-None-Match": etag})).status_code == 304
+
+    await _change_stage(deployment.id)
+    assert (await client.get("/api/dashboard/stats", headers={**headers, "If-None-Match": etag})).status_code == 200
+
+
+async def test_log_appends_bump_the_version_once_per_interval(session, monkeypatch):
+    deployment, _headers = await _setup(session)
+    monkeypatch.setattr(versions, "LOG_VERSION_INTERVAL_SECONDS", 0.2)
+    start = await fetch_deployment_version(deployment.id)
+
+    for _ in range(5):
+        await bump_log_version(session, deployment.id)
+        await session.commit()
+    assert await fetch_deployment_version(deployment.id) == start + 1
+
+    # The appends after the first are folded into one bump once the interval ends
+    await asyncio.sleep(0.3)
+    assert await fetch_deployment_version(deployment.id) == start + 2
+    assert not versions._log_bumps_pending
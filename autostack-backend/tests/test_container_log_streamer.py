@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+import pytest_asyncio
+
+from app.config import settings
+from app.models import Deployment, DeploymentContainer, Project, User
+from app.services import container_log_streamer
+from app.services.container_log_streamer import LogCursor, follow_container_logs, sync_followers
+from app.services.log_store import read_log_range
+
+
+pytestmark = pytest.mark.asyncio
+
+BASE_NS = 1_760_000_000_000_000_000
+
+
+@pytest_asyncio.fixture
+async def engine(docker_engine, monkeypatch):
+    monkeypatch.setattr(settings, "runtime_log_batch_lines", 20)
+    monkeypatch.setattr(settings, "runtime_log_flush_seconds", 0.01)
+    yield docker_engine
+    container_log_streamer.stop_log_streamer()
+
+
+async def _running_container(session, engine, status: str = "running") -> DeploymentContainer:
+    user = User(name="Logs", email=f"logs-{status}@example.com")
+    session.add(user)
+    await session.flush()
+    project = Project(user_id=user.id, name=f"logs-{status}", repository="octocat/logs", runtime="docker")
+    session.add(project)
+    await session.flush()
+    deployment = Deployment(project_id=project.id, user_id=user.id, status="success")
+    session.add(deployment)
+    await session.flush()
+    fake = engine.add_container(state="running" if status == "running" else "exited")
+    container = DeploymentContainer(
+        deployment_id=deployment.id, container_id=fake.id, image="nginx:alpine", port=30500, status=status
+    )
+    session.add(container)
+    await session.commit()
+    return container
+
+
+async def _follow_until_caught_up(engine, container: DeploymentContainer) -> None:
+    task = asyncio.create_task(follow_container_logs(container.id))
+    fake = engine.containers[container.container_id]
+    for _ in range(200):
+        if fake.followers:
+            break
+        await asyncio.sleep(0.01)
+    await asyncio.sleep(0.1)
+    engine.end_logs(container.container_id)
+    await asyncio.wait_for(task, 2)
+
+
+async def _runtime_messages(session, deployment_id) -> list[tuple[str, str]]:
+    window = await read_log_range(session, deployment_id, stream="runtime", limit=1000)
+    return [(line.message, line.level) for line in window.lines]
+
+
+async def test_bursts_and_repeated_lines_are_ingested_once_and_resumed_from_the_cursor(session, engine):
+    container = await _running_container(session, engine)
+    expected: list[tuple[str, str]] = []
+    for i in range(45):
+        text = "tick" if i % 10 == 0 else f"GET /page/{i} 200"
+        engine.emit(container.container_id, text, at_ns=BASE_NS + i * 1000)
+        expected.append((text, "info"))
+    # Two lines written in the same nanosecond, the last before the restart
+    engine.emit(container.container_id, "WARN cache cold", at_ns=BASE_NS + 99_000)
+    engine.emit(container.container_id, "boom", stream=2, at_ns=BASE_NS + 99_000)
+    expected += [("WARN cache cold", "warning"), ("boom", "error")]
+
+    await _follow_until_caught_up(engine, container)
+
+    assert await _runtime_messages(session, container.deployment_id) == expected
+    await session.refresh(container)
+    assert (container.log_cursor, container.log_cursor_lines) == ("2025-10-09T08:53:20.000099000Z", 2)
+
+    engine.emit(container.container_id, "same instant, after restart", at_ns=BASE_NS + 99_000)
+    engine.emit(container.container_id, "later", at_ns=BASE_NS + 200_000)
+    await _follow_until_caught_up(engine, container)
+
+    assert await _runtime_messages(session, container.deployment_id) == expected + [
+        ("same instant, after restart", "info"),
+        ("later", "info"),
+    ]
+    assert [query.get("since") for _m, path, query in engine.calls("GET", "/containers/") if path.endswith("/logs")] == [
+        None,
+        "1760000000.000099000",
+    ]
+
+
+async def test_a_batch_is_dropped_when_another_process_moved_the_cursor(session, engine):
+    container = await _running_container(session, engine)
+    container.log_cursor, container.log_cursor_lines = "2025-10-09T08:53:20.000001000Z", 1
+    await session.commit()
+
+    stale = LogCursor(None, 0)
+    entry = ("2025-10-09T08:53:20.000002000Z", ("hello", "info", None))
+    assert not await container_log_streamer._ingest(container.id, container.deployment_id, stale, [entry])
+    assert await _runtime_messages(session, container.deployment_id) == []
+
+
+async def test_followers_track_running_containers(session, engine):
+    running = await _running_container(session, engine)
+    await _running_container(session, engine, status="stopped")
+
+    await sync_followers()
+    assert set(container_log_streamer._followers) == {running.id}
+
+    running.status = "hibernated"
+    await session.commit()
+    await sync_followers()
+    assert container_log_streamer._followers == {}
@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models import Deployment, DeploymentLog, Project, User
+from app.security import create_access_token
+
+
+pytestmark = pytest.mark.asyncio
+
+
+async def _deployment_with_logs(session, count: int) -> tuple[Deployment, str]:
+    user = User(name="Log User", email="logs@example.com")
+    session.add(user)
+    await session.flush()
+
+    project = Project(user_id=user.id, name="Logs", repository="octocat/logs")
+    session.add(project)
+    await session.flush()
+
+    deployment = Deployment(project_id=project.id, user_id=user.id, status="building")
+    session.add(deployment)
+    await session.flush()
+
+    base = datetime.utcnow()
+    for idx in range(count):
+        session.add(
+            DeploymentLog(
+                deployment_id=deployment.id,
+                message=f"line-{idx + 1}",
+                timestamp=base + timedelta(milliseconds=idx),
+            )
+        )
+    await session.commit()
+    return deployment, create_access_token(user)
+
+
+async def test_detail_returns_only_log_tail(client, session, monkeypatch):
+    monkeypatch.setattr("app.routers.deployments.settings.log_tail_lines", 5)
+    deployment, token = await _deployment_with_logs(session, 12)
+
+    response = await client.get(f"/api/deployments/{deployment.id}", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["logs"] == [f"line-{idx}" for idx in range(8, 13)]
+    assert data["logsCursor"] == 12
+    assert data["logsTotal"] == 12
+    assert data["logsTruncated"] is True
+
+
+async def test_log_range_after_and_before(client, session):
+    deployment, token = await _deployment_with_logs(session, 12)
+    headers = {"Authorization": f"Bearer {token}"}
+
+    forward = await client.get(f"/api/deployments/{deployment.id}/logs/range?after=3&limit=4", headers=headers)
+    data = forward.json()
+    assert [item["message"] for item in data["lines"]] == ["line-4", "line-5", "line-6", "line-7"]
+    assert data["nextCursor"] == 7
+    assert data["hasMore"] is True
+
+    backward = await client.get(f"/api/deployments/{deployment.id}/logs/range?before=4&limit=10", headers=headers)
+    data = backward.json()
+    assert [item["line"] for item in data["lines"]] == [1, 2, 3]
+    assert data["hasMore"] is False
+
+    caught_up = await client.get(f"/api/deployments/{deployment.id}/logs/range?after=12", headers=headers)
+    data = caught_up.json()
+    assert data["lines"] == []
+    assert data["nextCursor"] == 12
+    assert data["hasMore"] is False
@@ -0,0 +1,109 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.services.docker_api import DockerApiError, _demux, client, split_image_reference
+from app.services.docker_builder import build_static_site_image
+from fake_docker_engine import log_frame
+
+
+pytestmark = pytest.mark.asyncio
+
+
+class Chunks(httpx.AsyncByteStream):
+    def __init__(self, chunks: list[bytes]) -> None:
+        self.chunks = chunks
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            yield chunk
+
+
+async def test_calls_share_one_pooled_connection(docker_engine):
+    docker_engine.add_image("nginx:alpine")
+
+    assert await client.ping()
+    container_id = await client.run_container("web", "nginx:alpine", ports={80: 30001}, binds=["/srv/site:/usr/share/nginx/html:ro"])
+    assert (await client.list_containers())[0]["Ports"][0]["PublicPort"] == 30001
+    await client.stop_container(container_id)
+    assert await client.remove_container(container_id)
+    assert not await client.remove_container(container_id)
+
+    assert docker_engine.connections == 1
+    assert docker_engine.calls("POST", "/containers/create")[0][2] == {"name": "web"}
+
+
+async def test_missing_image_is_pulled_before_the_container_is_created(docker_engine):
+    await client.run_container("api", "registry.local:5000/team/api:v2")
+
+    assert [path for _method, path, _query in docker_engine.calls("POST")] == [
+        "/containers/create",
+        "/images/create",
+        "/containers/create",
+        f"/containers/{next(iter(docker_engine.containers))}/start",
+    ]
+    assert docker_engine.calls("POST", "/images/create")[0][2] == {"fromImage": "registry.local:5000/team/api", "tag": "v2"}
+    with pytest.raises(DockerApiError) as excinfo:
+        await client.run_container("gone", "missing/image:1")
+    assert excinfo.value.message == "manifest unknown"
+
+
+async def test_logs_are_demultiplexed_into_lines_and_followed(docker_engine):
+    container = docker_engine.add_container()
+    docker_engine.emit(container.id, "listening on :80", at_ns=1_700_000_000_000_000_000)
+    docker_engine.emit(container.id, "warning: no config", stream=2, at_ns=1_700_000_001_500_000_000)
+
+    assert await client.logs(container.id) == ["listening on :80", "warning: no config"]
+    recent = [line async for line in client.log_lines(container.id, since="1700000001.000000000", timestamps=True)]
+    assert recent == [("stderr", "2023-11-14T22:13:21.500000000Z warning: no config")]
+
+    followed: list[str] = []
+
+    async def follow():
+        async for _stream, line in client.log_lines(container.id, tail=0, follow=True):
+            followed.append(line)
+
+    task = asyncio.create_task(follow())
+    await asyncio.sleep(0.05)
+    docker_engine.emit(container.id, "GET / 200")
+    docker_engine.emit(container.id, "GET /about 404")
+    await asyncio.sleep(0.05)
+    docker_engine.end_logs(container.id)
+    await asyncio.wait_for(task, 1)
+    assert followed == ["GET / 200", "GET /about 404"]
+
+
+async def test_frames_split_across_chunks_and_tty_streams_are_decoded():
+    frames = log_frame(1, b"hello wor") + log_frame(2, b"oops\n") + log_frame(1, b"ld\n")
+    response = httpx.Response(200, stream=Chunks([frames[:5], frames[5:20], frames[20:]]))
+    assert [frame async for frame in _demux(response)] == [
+        ("stdout", b"hello wor"),
+        ("stderr", b"oops\n"),
+        ("stdout", b"ld\n"),
+    ]
+
+    raw = httpx.Response(200, stream=Chunks([b"plain tty ", b"output\n"]))
+    assert b"".join([data async for _stream, data in _demux(raw)]) == b"plain tty output\n"
+
+
+async def test_static_site_image_is_built_through_the_engine_api(docker_engine, tmp_path):
+    (tmp_path / "index.html").write_text("<h1>hi</h1>")
+
+    tag = await build_static_site_image(tmp_path, "0f0e0d0c-0000-0000-0000-000000000001")
+
+    assert tag == "autostack-deployment-0f0e0d0c-0000-0000-0000-000000000001"
+    assert f"{tag}:latest" in docker_engine.images
+    assert docker_engine.calls("POST", "/build")[0][2]["dockerfile"] == ".autostack.Dockerfile"
+    # The generated Dockerfile only exists inside the build context
+    assert [p.name for p in tmp_path.iterdir()] == ["index.html"]
+    with pytest.raises(DockerApiError, match="empty build context"):
+        async for _line in client.build(b"", "broken"):
+            pass
+
+
+async def test_image_references_are_split_into_repository_and_tag():
+    assert split_image_reference("nginx:alpine") == ("nginx", "alpine")
+    assert split_image_reference("nginx") == ("nginx", "latest")
+    assert split_image_reference("localhost:5000/app") == ("localhost:5000/app", "latest")
+    assert split_image_reference("app@sha256:abc") == ("app@sha256:abc", None)
@@ -0,0 +1,82 @@
+import uuid
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.config import settings
+from app.services import container_runtime
+from app.services.container_runtime import build_project_image, project_image_repository, prune_project_images
+
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture(autouse=True)
+def _cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "docker_build_cache_dir", str(tmp_path / "docker-cache"))
+    monkeypatch.setattr(settings, "docker_buildx_builder", None)
+    monkeypatch.setattr(container_runtime, "_local_cache_supported", True)
+
+
+def _deployment() -> SimpleNamespace:
+    return SimpleNamespace(id=uuid.uuid4(), project_id=uuid.uuid4())
+
+
+async def test_build_reuses_previous_image_and_rotates_local_cache(tmp_path):
+    deployment = _deployment()
+    repository = project_image_repository(deployment.project_id)
+    cache_dir = tmp_path / "docker-cache" / str(deployment.project_id)
+
+    async def fake_build(args, timeout=60, env=None):
+        # Simulate BuildKit writing the exported cache
+        Path(args[args.index("--cache-to") + 1].split("dest=")[1].split(",")[0]).mkdir(parents=True)
+        return 0, "", ""
+
+    with patch.object(container_runtime, "_run_docker", side_effect=fake_build) as run:
+        image = await build_project_image(deployment, tmp_path)
+
+    args, kwargs = run.call_args.args[0], run.call_args.kwargs
+    assert image == f"{repository}:{deployment.id}"
+    assert args[0] == "build"
+    assert args[args.index("--cache-from") + 1] == f"{repository}:latest"
+    assert f"{repository}:latest" in args and "BUILDKIT_INLINE_CACHE=1" in args
+    assert kwargs["env"]["DOCKER_BUILDKIT"] == "1"
+    assert cache_dir.is_dir() and not Path(f"{cache_dir}.next").exists()
+
+    with patch.object(container_runtime, "_run_docker", side_effect=fake_build) as run:
+        await build_project_image(deployment, tmp_path)
+    assert f"type=local,src={cache_dir}" in run.call_args.args[0]
+
+
+async def test_unsupported_cache_export_falls_back_to_inline_cache(tmp_path):
+    run = AsyncMock(side_effect=[(1, "", "ERROR: Cache export is not supported for the docker driver."), (0, "", "")])
+    with patch.object(container_runtime, "_run_docker", run):
+        await build_project_image(_deployment(), tmp_path)
+
+    assert run.await_count == 2
+    assert "--cache-to" not in run.call_args_list[1].args[0]
+    assert container_runtime._local_cache_supported is False
+
+
+async def test_prune_keeps_newest_images_per_project(docker_engine):
+    project_id = uuid.uuid4()
+    repository = project_image_repository(project_id)
+    docker_engine.add_image(f"{repository}:latest", created=100)
+    for age, tag in enumerate(["d5", "d4", "d3", "d2", "d1"]):
+        docker_engine.add_image(f"{repository}:{tag}", created=100 - age)
+    docker_engine.add_image("autostack/other:d0", created=1)
+    docker_engine.images_in_use.add(f"{repository}:d2")
+
+    removed = await prune_project_images(project_id, keep=2)
+
+    assert [path for _method, path, _query in docker_engine.calls("DELETE", "/images/")] == [
+        f"/images/{repository}:d3",
+        f"/images/{repository}:d2",
+        f"/images/{repository}:d1",
+    ]
+    assert removed == ["d3", "d1"]
+    assert sorted(docker_engine.images) == sorted(
+        [f"{repository}:latest", f"{repository}:d5", f"{repository}:d4", f"{repository}:d2", "autostack/other:d0"]
+    )
@@ -0,0 +1,150 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import select
+
+from app.models import Deployment, DeploymentContainer, Project, User
+from app.security import create_access_token
+from app.services import hibernation
+from app.services.reverse_proxy import metrics, pools
+from app.services.static_gateway import deployment_site_name, routing_table
+
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest_asyncio.fixture
+async def docker(docker_engine, monkeypatch):
+    monkeypatch.setattr(hibernation, "stats", hibernation.HibernationStats())
+    monkeypatch.setattr(hibernation, "_activity_flushed_at", 0.0)
+    yield docker_engine
+    routing_table.clear()
+    await pools.aclose()
+
+
+async def _container(
+    session, docker, port: int, *, idle_for: timedelta, status: str = "running"
+) -> tuple[Project, DeploymentContainer]:
+    user = User(name="Sleepy", email=f"sleepy-{port}@example.com")
+    session.add(user)
+    await session.flush()
+    project = Project(user_id=user.id, name=f"preview-{port}", repository="octocat/app", runtime="docker")
+    session.add(project)
+    await session.flush()
+    deployment = Deployment(project_id=project.id, user_id=user.id, status="success", is_production=False)
+    session.add(deployment)
+    await session.flush()
+    container = DeploymentContainer(
+        deployment_id=deployment.id,
+        container_id=f"c-{port}",
+        image="autostack/app:1",
+        port=port,
+        status=status,
+        created_at=datetime.utcnow() - idle_for,
+    )
+    session.add(container)
+    await session.commit()
+    fake = docker.add_container("autostack/app:1", id=f"c-{port}", port=port, state="running" if status == "running" else "exited")
+    fake.memory_usage = int(48.5 * 1024**2)
+    return project, container
+
+
+async def test_idle_containers_hibernate_and_recently_requested_ones_stay_up(session, docker):
+    _, idle = await _container(session, docker, 31001, idle_for=timedelta(hours=2))
+    _, busy = await _container(session, docker, 31002, idle_for=timedelta(hours=2))
+    metrics.for_deployment(busy.deployment_id).last_request_at = time.time()
+
+    assert await hibernation.hibernate_idle_containers() == 1
+
+    rows = {c.container_id: c for c in (await session.execute(select(DeploymentContainer))).scalars()}
+    await session.refresh(rows["c-31001"])
+    await session.refresh(rows["c-31002"])
+    assert rows["c-31001"].status == "hibernated"
+    assert rows["c-31002"].status == "running"
+    assert rows["c-31002"].last_request_at is not None
+    assert [path for _method, path, _query in docker.calls("POST", "/containers/c-")] == ["/containers/c-31001/stop"]
+    assert docker.containers["c-31001"].state == "exited"
+    snapshot = hibernation.stats.snapshot()
+    assert snapshot["hibernated"] == 1
+    assert snapshot["memory_reclaimed_bytes"] == int(48.5 * 1024**2)
+
+
+async def test_request_wakes_hibernated_container_and_is_held_until_ready(client, session, docker):
+    async def handle(reader, writer):
+        await reader.readuntil(b"\r\n\r\n")
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 5\r\nConnection: close\r\n\r\nawake")
+        await writer.drain()
+        writer.close()
+
+    probe = await asyncio.start_server(handle, "127.0.0.1", 0)
+    port = probe.sockets[0].getsockname()[1]
+    probe.close()
+    await probe.wait_closed()
+    servers = []
+
+    async def start_upstream(_container):
+        servers.append(await asyncio.start_server(handle, "127.0.0.1", port))
+
+    docker.on_start = start_upstream
+    project, container = await _container(session, docker, port, idle_for=timedelta(hours=2), status="hibernated")
+    site = deployment_site_name(project.id, project.name, container.deployment_id)
+
+    try:
+        responses = await asyncio.gather(*(client.get(f"/sites/{site}/") for _ in range(3)))
+    finally:
+        for server in servers:
+            server.close()
+
+    assert [r.status_code for r in responses] == [200, 200, 200]
+    assert responses[0].text == "awake"
+    assert [path for _method, path, _query in docker.calls("POST", "/containers/c-")] == [f"/containers/c-{port}/start"]
+    await session.refresh(container)
+    assert container.status == "running"
+    snapshot = hibernation.stats.snapshot()
+    assert snapshot["woken"] == 1 and snapshot["cold_start_p50_ms"] is not None
+
+
+async def test_only_new_request_activity_is_flushed(session, docker):
+    _, container = await _container(session, docker, 31003, idle_for=timedelta(minutes=1))
+    metrics.for_deployment(container.deployment_id).last_request_at = time.time() - 5
+    await hibernation.record_request_activity(session)
+    await session.commit()
+    await session.refresh(container)
+    assert container.last_request_at is not None
+
+    # Unchanged timestamps are not written again on the next sweep
+    container.last_request_at = None
+    await session.commit()
+    await hibernation.record_request_activity(session)
+    await session.commit()
+    await session.refresh(container)
+    assert container.last_request_at is None
+
+    metrics.for_deployment(container.deployment_id).last_request_at = time.time()
+    await hibernation.record_request_activity(session)
+    await session.commit()
+    await session.refresh(container)
+    assert container.last_request_at is not None
+
+
+async def test_status_page_does_not_wake_hibernated_containers(client, session, docker):
+    project, container = await _container(session, docker, 31004, idle_for=timedelta(hours=2), status="hibernated")
+    deployment = await session.get(Deployment, container.deployment_id)
+    deployment.deployed_url = "http://localhost:8000/sites/preview-31004/"
+    await session.commit()
+    headers = {"Authorization": f"Bearer {create_access_token(await session.get(User, project.user_id))}"}
+
+    response = await client.get(f"/api/deployments/{deployment.id}/status-page", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["hibernated"] is True
+    assert docker.calls("POST", "/containers/c-") == []
+
+    # A running container is probed directly rather than through the gateway
+    container.status = "running"
+    await session.commit()
+    response = await client.get(f"/api/deployments/{deployment.id}/status-page", headers=headers)
+    assert response.json()["url"] == "http://localhost:31004/"
+    assert response.json()["hibernated"] is False
@@ -0,0 +1,151 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select, update
+
+from app.config import settings
+from app.db import AsyncSessionLocal
+from app.models import BuildJob, Deployment, Project, User
+from app.services.job_queue import (
+    claim_next_job,
+    enqueue_build_job,
+    enqueue_orphaned_deployments,
+    job_available,
+    renew_lease,
+    requeue_expired_jobs,
+)
+from app.worker import BuildWorker
+
+
+pytestmark = pytest.mark.asyncio
+
+
+async def _deployment(session) -> Deployment:
+    user = User(name="Queue User", email="queue@example.com")
+    session.add(user)
+    await session.flush()
+    project = Project(user_id=user.id, name="Queue", repository="octocat/queue")
+    session.add(project)
+    await session.flush()
+    deployment = Deployment(project_id=project.id, user_id=user.id, status="queued")
+    session.add(deployment)
+    await session.commit()
+    return deployment
+
+
+async def _expire_lease(job: BuildJob) -> None:
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            update(BuildJob)
+            .where(BuildJob.id == job.id)
+            .values(lease_expires_at=datetime.utcnow() - timedelta(seconds=1))
+        )
+        await db.commit()
+
+
+async def test_job_is_claimed_by_one_worker_only(session):
+    deployment = await _deployment(session)
+    await enqueue_build_job(session, deployment.id)
+    await session.commit()
+
+    job = await claim_next_job("worker-a")
+    assert job is not None
+    assert job.deployment_id == deployment.id
+    assert job.status == "running"
+    assert job.attempts == 1
+    assert await claim_next_job("worker-b") is None
+    assert await renew_lease(job)
+
+
+async def test_expired_lease_requeues_until_attempts_run_out(session, monkeypatch):
+    monkeypatch.setattr(settings, "build_job_max_attempts", 2)
+    deployment = await _deployment(session)
+    await enqueue_build_job(session, deployment.id)
+    await session.commit()
+
+    first = await claim_next_job("worker-a")
+    await _expire_lease(first)
+    assert await requeue_expired_jobs() == (1, 0)
+    # The dead worker's lease is gone, so it can no longer renew
+    assert not await renew_lease(first)
+
+    second = await claim_next_job("worker-b")
+    assert second is not None and second.attempts == 2
+    await _expire_lease(second)
+    assert await requeue_expired_jobs() == (0, 1)
+
+    async with AsyncSessionLocal() as db:
+        job = await db.scalar(select(BuildJob).where(BuildJob.id == first.id))
+        failed = await db.scalar(select(Deployment).where(Deployment.id == deployment.id))
+    assert job.status == "failed"
+    assert failed.status == "failed"
+    assert await claim_next_job("worker-c") is None
+
+
+async def test_queued_deployments_without_job_are_recovered(session):
+    deployment = await _deployment(session)
+
+    assert await enqueue_orphaned_deployments() == 1
+    assert await enqueue_orphaned_deployments() == 0
+    job = await claim_next_job("worker-a")
+    assert job is not None and job.deployment_id == deployment.id
+
+
+async def test_build_that_lost_its_lease_leaves_the_job_to_its_new_owner(session, monkeypatch):
+    deployment = await _deployment(session)
+    await enqueue_build_job(session, deployment.id)
+    await session.commit()
+    job = await claim_next_job("worker-a")
+    cleanups: list[tuple[int, bool]] = []
+
+    async def build(deployment_id, attempt, owns_build):
+        try:
+            await asyncio.sleep(30)
+        finally:
+            cleanups.append((attempt, owns_build()))
+
+    async def lease_taken(_job):
+        return False
+
+    monkeypatch.setattr("app.worker.run_deployment_job", build)
+    monkeypatch.setattr("app.worker.renew_lease", lease_taken)
+    monkeypatch.setattr(settings, "build_job_lease_seconds", 1)
+
+    await asyncio.wait_for(BuildWorker(name="worker-a")._run(job), 5)
+
+    # The build saw it no longer owned the deployment, and the job was not finished by it
+    assert cleanups == [(1, False)]
+    async with AsyncSessionLocal() as db:
+        assert (await db.scalar(select(BuildJob).where(BuildJob.id == job.id))).status == "running"
+
+
+async def test_recorded_cancellation_is_consumed_and_cleared_on_redeploy(session):
+    deployment = await _deployment(session)
+    await enqueue_build_job(session, deployment.id)
+    deployment.cancel_requested_at = datetime.utcnow()
+    await session.commit()
+
+    # Claimed after the cancellation was recorded: the job ends without building
+    job = await claim_next_job("worker-a")
+    await BuildWorker(name="worker-a")._run(job)
+    async with AsyncSessionLocal() as db:
+        assert (await db.scalar(select(BuildJob.status).where(BuildJob.id == job.id))) == "cancelled"
+        assert (await db.scalar(select(Deployment.cancel_requested_at).where(Deployment.id == deployment.id))) is None
+
+    # A cancellation left over from an earlier build does not stop a redeploy
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(Deployment).where(Deployment.id == deployment.id).values(cancel_requested_at=datetime.utcnow()))
+        await enqueue_build_job(db, deployment.id)
+        await db.commit()
+        assert (await db.scalar(select(Deployment.cancel_requested_at).where(Deployment.id == deployment.id))) is None
+
+
+async def test_workers_are_woken_only_once_the_job_is_committed(session):
+    deployment = await _deployment(session)
+    job_available.clear()
+
+    await enqueue_build_job(session, deployment.id)
+    assert not job_available.is_set()
+    await session.commit()
+    assert job_available.is_set()
@@ -7,6 +7,11 @@ from app.build_engine import run_deployment_job
 from app.services.container_runtime import start_dockerfile_runtime
 from app.models import Deployment, Project
 
+
+async def _lease_port_12345(session, container):
+    container.port = 12345
+    return 12345
+
 @pytest.mark.asyncio
 async def test_detect_lambda_base_image():
     """Verify that Lambda base images are correctly detected from Dockerfile content."""
@@ -47,15 +52,14 @@ async def test_start_dockerfile_runtime_lambda_mode():
     
     # Mock dependencies
     with patch("app.services.container_runtime.is_docker_available", return_value=True), \
-         patch("app.services.container_runtime.find_free_port", return_value=12345), \
+         patch("app.services.container_runtime.lease_port", new=_lease_port_12345), \
          patch("app.services.container_runtime._run_docker", new_callable=AsyncMock) as mock_run_docker, \
+         patch("app.services.container_runtime.docker_client.run_container", new_callable=AsyncMock) as mock_run, \
          patch("app.services.container_runtime.record_health_check", new_callable=AsyncMock) as mock_health_check:
         
         # Mock docker build success
-        mock_run_docker.side_effect = [
-            (0, "build_success", ""), # build
-            (0, "container_id_123\n", "")  # run
-        ]
+        mock_run_docker.return_value = (0, "build_success", "")
+        mock_run.return_value = "container_id_123"
         
         container = await start_dockerfile_runtime(
             mock_session, 
@@ -65,16 +69,15 @@ async def test_start_dockerfile_runtime_lambda_mode():
         )
         
         # Verify build called
-        assert mock_run_docker.call_count == 2
+        assert mock_run_docker.call_count == 1
         build_call = mock_run_docker.call_args_list[0]
         assert build_call[0][0][0] == "build"
         
         # Verify run called with port 8080 mapping
-        run_call = mock_run_docker.call_args_list[1]
-        run_args = run_call[0][0]
-        assert "run" in run_args
-        # Check for port mapping: host_port:8080
-        assert any("12345:8080" in arg for arg in run_args)
+        mock_run.assert_awaited_once()
+        # Check for port mapping: container 8080 -> host 12345
+        assert mock_run.call_args.kwargs["ports"] == {8080: 12345}
+        assert container.container_id == "container_id_123"
         
         # Verify health check was SKIPPED
         mock_health_check.assert_not_called()
@@ -92,14 +95,14 @@ async def test_start_dockerfile_runtime_standard_mode():
     mock_repo_dir = Path("/tmp/test_repo")
     
     with patch("app.services.container_runtime.is_docker_available", return_value=True), \
-         patch("app.services.container_runtime.find_free_port", return_value=12345), \
+         patch("app.services.container_runtime.lease_port", new=_lease_port_12345), \
          patch("app.services.container_runtime._run_docker", new_callable=AsyncMock) as mock_run_docker, \
-         patch("app.services.container_runtime.record_health_check", new_callable=AsyncMock) as mock_health_check:
+         patch("app.services.container_runtime.docker_client.run_container", new_callable=AsyncMock) as mock_run, \
+         patch("app.services.container_runtime.record_health_check", new_callable=AsyncMock) as mock_health_check, \
+         patch("app.services.container_runtime.wait_until_healthy", new_callable=AsyncMock, return_value=True) as mock_wait:
         
-        mock_run_docker.side_effect = [
-            (0, "build_success", ""), 
-            (0, "container_id_456\n", "")
-        ]
+        mock_run_docker.return_value = (0, "build_success", "")
+        mock_run.return_value = "container_id_456"
         
         # Mock health check success
         mock_hc = MagicMock()
@@ -114,11 +117,10 @@ async def test_start_dockerfile_runtime_standard_mode():
         )
         
         # Verify run called with port 80 mapping
-        run_call = mock_run_docker.call_args_list[1]
-        run_args = run_call[0][0]
-        assert any("12345:80" in arg for arg in run_args)
+        assert mock_run.call_args.kwargs["ports"] == {80: 12345}
         
-        # Verify health check WAS called
+        # Verify health check WAS called, after the consecutive-probe gate
+        mock_wait.assert_awaited_once_with("http://localhost:12345/")
         mock_health_check.assert_called_once()
         
         assert container.status == "running"
@@ -134,7 +136,7 @@ async def test_start_dockerfile_runtime_api_error_handling():
     mock_repo_dir = Path("/tmp/test_repo")
     
     with patch("app.services.container_runtime.is_docker_available", return_value=True), \
-         patch("app.services.container_runtime.find_free_port", return_value=12345), \
+         patch("app.services.container_runtime.lease_port", new=_lease_port_12345), \
          patch("app.services.container_runtime._run_docker", new_callable=AsyncMock) as mock_run_docker:
         
         # Mock docker build failure to trigger ApiError
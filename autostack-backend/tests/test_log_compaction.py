@@ -0,0 +1,116 @@
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+from sqlalchemy import func, select
+
+from app.models import Deployment, DeploymentLog, LogSegment, Project, User
+from app.config import settings
+from app.services import log_compaction
+from app.services.log_compaction import compact_deployment_logs, enforce_log_retention, run_log_compaction
+from app.services.log_store import append_log_lines, close_log_stream, tail_log
+
+
+pytestmark = pytest.mark.asyncio
+
+
+async def _project(session) -> Project:
+    user = User(name="Compact User", email="compact@example.com")
+    session.add(user)
+    await session.flush()
+    project = Project(user_id=user.id, name="Compact", repository="octocat/compact")
+    session.add(project)
+    await session.commit()
+    return project
+
+
+async def _finished_deployment(session, project: Project, created_at: datetime, lines: int) -> Deployment:
+    deployment = Deployment(project_id=project.id, user_id=project.user_id, status="failed", created_at=created_at)
+    session.add(deployment)
+    await session.flush()
+    for idx in range(lines):
+        session.add(
+            DeploymentLog(
+                deployment_id=deployment.id,
+                message=f"legacy-{idx + 1}",
+                log_level="error" if idx == 20 else "info",
+                timestamp=created_at + timedelta(milliseconds=idx),
+            )
+        )
+    await session.commit()
+    return deployment
+
+
+async def test_compaction_packs_rows_and_segments_into_one_segment(session, monkeypatch):
+    monkeypatch.setattr("app.services.log_store.settings.log_segment_max_bytes", 512)
+    project = await _project(session)
+    deployment = await _finished_deployment(session, project, datetime.utcnow(), 30)
+    await append_log_lines(deployment.id, [(f"store-{idx}", "info") for idx in range(40)])
+    await close_log_stream(deployment.id)
+    before = [line.message for line in (await tail_log(session, deployment.id, 100)).lines]
+
+    report = await compact_deployment_logs(deployment.id)
+
+    assert report.mode == "compacted"
+    assert report.rows_deleted == 30
+    assert report.lines_after == 70
+    assert report.bytes_reclaimed > 0
+    assert (await session.execute(select(func.count()).select_from(DeploymentLog))).scalar_one() == 0
+    segments = (await session.execute(select(LogSegment).where(LogSegment.deployment_id == deployment.id))).scalars().all()
+    assert len(segments) == 1 and segments[0].kind == "compacted"
+    assert [line.message for line in (await tail_log(session, deployment.id, 100)).lines] == before
+
+    assert (await compact_deployment_logs(deployment.id)).mode == "skipped"
+
+
+async def test_retention_summarizes_older_deployments(session, monkeypatch):
+    monkeypatch.setattr("app.services.log_compaction.settings.log_retention_full_deployments", 1)
+    monkeypatch.setattr("app.services.log_compaction.settings.log_summary_head_lines", 3)
+    monkeypatch.setattr("app.services.log_compaction.settings.log_summary_tail_lines", 2)
+    project = await _project(session)
+    now = datetime.utcnow()
+    old = await _finished_deployment(session, project, now - timedelta(days=1), 50)
+    new = await _finished_deployment(session, project, now, 50)
+
+    reports = await run_log_compaction(new.id)
+
+    assert {report.mode for report in reports} == {"compacted", "summarized"}
+    summary = [line.message for line in (await tail_log(session, old.id, 100)).lines]
+    assert summary == [
+        "legacy-1",
+        "legacy-2",
+        "legacy-3",
+        "... 17 lines omitted by log retention ...",
+        "legacy-21",
+        "... 27 lines omitted by log retention ...",
+        "legacy-49",
+        "legacy-50",
+    ]
+    assert (await tail_log(session, new.id, 100)).total_lines == 50
+
+
+async def test_retention_only_visits_deployments_with_full_logs(session, monkeypatch):
+    monkeypatch.setattr("app.services.log_compaction.settings.log_retention_full_deployments", 1)
+    project = await _project(session)
+    now = datetime.utcnow()
+    empty = await _finished_deployment(session, project, now - timedelta(days=3), 0)
+    summarized = await _finished_deployment(session, project, now - timedelta(days=2), 10)
+    await compact_deployment_logs(summarized.id, summarize=True)
+    full = await _finished_deployment(session, project, now - timedelta(days=1), 10)
+    await _finished_deployment(session, project, now, 10)
+
+    visited = []
+    compact = log_compaction.compact_deployment_logs
+
+    async def recording_compact(deployment_id, **kwargs):
+        visited.append(deployment_id)
+        return await compact(deployment_id, **kwargs)
+
+    monkeypatch.setattr(log_compaction, "compact_deployment_logs", recording_compact)
+    reports = await enforce_log_retention(project.id)
+
+    assert visited == [full.id]
+    assert [report.deployment_id for report in reports] == [full.id]
+    assert not (Path(settings.log_store_dir) / str(empty.id)).exists()
+    assert await enforce_log_retention(project.id) == []
+    assert visited == [full.id]
@@ -0,0 +1,77 @@
+import pytest
+
+from app.services.log_normalizer import LogNormalizer, collapse_carriage_returns, compact_ansi
+
+
+def _run(normalizer: LogNormalizer, lines: list[str]) -> list[str]:
+    out = []
+    for line in lines:
+        out.extend(text for _, text in normalizer.feed(line))
+    out.extend(text for _, text in normalizer.end_command())
+    return out
+
+
+class _FrozenClock:
+    def __init__(self) -> None:
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_carriage_return_rewrites_keep_final_state():
+    assert collapse_carriage_returns("fetching 10%\rfetching 55%\rfetching 100%") == "fetching 100%"
+    assert collapse_carriage_returns("abcdef\rXY") == "XYcdef"
+
+
+def test_progress_lines_are_coalesced_and_repeats_folded():
+    clock = _FrozenClock()
+    normalizer = LogNormalizer(max_bytes=1 << 20, tail_bytes=1024, ansi="strip", clock=clock)
+    lines = [f"\r\x1b[32mDownloading layer {pct}%\x1b[0m\n" for pct in range(0, 101, 5)]
+    lines += ["warning: deprecated package\n"] * 4 + ["done\n"]
+
+    out = _run(normalizer, lines)
+
+    assert out == [
+        "Downloading layer 0%",
+        "Downloading layer 100%",
+        "warning: deprecated package",
+        "(repeated 3 more times)",
+        "done",
+    ]
+    assert normalizer.stats.raw_lines == 26
+    assert normalizer.stats.emitted_lines == 5
+    assert normalizer.stats.frame_reduction > 0.8
+
+
+def test_distinct_lines_with_percentages_are_all_kept():
+    normalizer = LogNormalizer(max_bytes=1 << 20, tail_bytes=1024, ansi="strip", clock=_FrozenClock())
+    report = ["chunk1.js 95%\n", "chunk2.js 80%\n", "chunk3.js 12%\n", "Compiled 100% of modules\n"]
+
+    assert _run(normalizer, report) == [line.rstrip("\n") for line in report]
+
+    # Updates of one bar are coalesced, keeping the final state of each bar
+    bars = [f"{name} [{'=' * step}>{' ' * (9 - step)}] {step * 10}%\n" for name in ("vendor", "app") for step in range(1, 10)]
+    assert _run(normalizer, bars) == [bars[index].rstrip("\n") for index in (0, 8, 17)]
+
+
+def test_byte_budget_keeps_head_and_tail_of_step():
+    normalizer = LogNormalizer(max_bytes=60, tail_bytes=20, ansi="strip")
+
+    out = _run(normalizer, [f"line {idx:03d}\n" for idx in range(50)])
+
+    assert out[:4] == ["line 000", "line 001", "line 002", "line 003"]
+    assert out[4].startswith("... 44 lines")
+    assert out[5:] == ["line 048", "line 049"]
+    assert normalizer.stats.budget_dropped_lines == 44
+
+
+@pytest.mark.parametrize(
+    "raw, expected",
+    [
+        ("\x1b[1m\x1b[31mERR\x1b[0m\x1b[2K", "\x1b[1;31mERR\x1b[0m"),
+        ("\x1b[?25lplain\x1b[?25h", "plain"),
+    ],
+)
+def test_keep_mode_compacts_ansi(raw, expected):
+    assert compact_ansi(raw) == expected
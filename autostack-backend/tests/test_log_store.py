@@ -0,0 +1,107 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func, select
+
+from app.models import Deployment, DeploymentLog, LogSegment, Project, User
+from app.services.log_store import (
+    LogStore,
+    append_log_lines,
+    close_log_stream,
+    count_log_lines,
+    migrate_legacy_logs,
+    read_log_range,
+    tail_log,
+)
+
+
+pytestmark = pytest.mark.asyncio
+
+
+async def _deployment(session) -> Deployment:
+    user = User(name="Store User", email="store@example.com")
+    session.add(user)
+    await session.flush()
+    project = Project(user_id=user.id, name="Store", repository="octocat/store")
+    session.add(project)
+    await session.flush()
+    deployment = Deployment(project_id=project.id, user_id=user.id, status="building")
+    session.add(deployment)
+    await session.commit()
+    return deployment
+
+
+async def test_segments_rotate_compress_and_support_random_access(session, monkeypatch):
+    monkeypatch.setattr("app.services.log_store.settings.log_segment_max_bytes", 2048)
+    monkeypatch.setattr("app.services.log_store.settings.log_index_interval", 16)
+    monkeypatch.setattr("app.services.log_store.settings.log_compression", "gzip")
+    deployment = await _deployment(session)
+
+    for start in range(0, 300, 50):
+        await append_log_lines(deployment.id, [(f"line-{idx + 1}\twith tab\nand newline", "info") for idx in range(start, start + 50)])
+
+    # The active segment is readable before it is sealed
+    assert await count_log_lines(session, deployment.id) == 300
+    await close_log_stream(deployment.id)
+
+    segments = (await session.execute(select(LogSegment).order_by(LogSegment.sequence))).scalars().all()
+    assert len(segments) > 1
+    assert all(segment.is_closed and segment.codec == "gzip" for segment in segments)
+    assert sum(segment.line_count for segment in segments) == 300
+    assert all(segment.path.endswith(".log.gz") for segment in segments)
+
+    window = await read_log_range(session, deployment.id, after=137, limit=3)
+    assert [line.line for line in window.lines] == [138, 139, 140]
+    assert window.lines[0].message == "line-138\twith tab\nand newline"
+    assert window.lines[0].level == "info"
+
+    tail = await tail_log(session, deployment.id, 2)
+    assert [line.line for line in tail.lines] == [299, 300]
+
+
+async def test_migration_moves_legacy_rows_in_front_of_store_lines(session):
+    deployment = await _deployment(session)
+    base = datetime.utcnow()
+    for idx in range(5):
+        session.add(
+            DeploymentLog(deployment_id=deployment.id, message=f"old-{idx + 1}", timestamp=base + timedelta(milliseconds=idx))
+        )
+    await session.commit()
+    await append_log_lines(deployment.id, [("new-1", "info"), ("new-2", "info")])
+    await close_log_stream(deployment.id)
+
+    before = await tail_log(session, deployment.id, 10)
+    assert [line.message for line in before.lines] == ["old-1", "old-2", "old-3", "old-4", "old-5", "new-1", "new-2"]
+
+    assert await migrate_legacy_logs(deployment.id) == 5
+
+    rows = await session.execute(select(func.count()).select_from(DeploymentLog))
+    assert rows.scalar_one() == 0
+    after = await tail_log(session, deployment.id, 10)
+    assert [line.message for line in after.lines] == [line.message for line in before.lines]
+    assert [line.line for line in after.lines] == list(range(1, 8))
+
+
+@pytest.mark.parametrize("codec", ["gzip", "none"])
+async def test_writers_in_separate_processes_keep_the_stream_contiguous(session, monkeypatch, codec):
+    monkeypatch.setattr("app.services.log_store.settings.log_compression", codec)
+    deployment = await _deployment(session)
+    # Each store keeps its own cached writers, like the API and a worker process do
+    api, worker = LogStore(), LogStore()
+
+    await worker.append(deployment.id, [(f"w{idx}", "info") for idx in range(3)])
+    await api.append(deployment.id, [(f"a{idx}", "info") for idx in range(3)])
+    await worker.append(deployment.id, [(f"w{idx}", "info") for idx in range(3, 5)])
+    await api.close(deployment.id)
+    await worker.append(deployment.id, [("after close", "info")])
+    await worker.close(deployment.id)
+
+    window = await read_log_range(session, deployment.id, limit=100)
+    assert [(line.line, line.message) for line in window.lines] == list(
+        enumerate(["w0", "w1", "w2", "a0", "a1", "a2", "w3", "w4", "after close"], start=1)
+    )
+    segments = (await session.execute(select(LogSegment).order_by(LogSegment.sequence))).scalars().all()
+    assert [(segment.first_line, segment.line_count, segment.is_closed) for segment in segments] == [
+        (1, 8, True),
+        (9, 1, True),
+    ]
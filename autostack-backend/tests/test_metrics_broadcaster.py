@@ -0,0 +1,57 @@
+import asyncio
+
+import pytest
+
+from app.services.monitoring import MetricsBroadcaster, diff_summary_sections
+
+
+pytestmark = pytest.mark.asyncio
+
+
+def _summary(tick: int, cpu: float) -> dict:
+    return {
+        "timestamp": f"2025-01-01T00:00:{tick:02d}",
+        "uptime_seconds": tick,
+        "system": {"cpu": {"percent": cpu}},
+        "docker": {"timestamp": f"t{tick}", "containers": []},
+        "application": {"deployments": {"total": 3}},
+    }
+
+
+async def test_diff_only_reports_changed_sections():
+    previous = _summary(0, 10.0)
+    current = _summary(1, 55.0)
+
+    delta = diff_summary_sections(previous, current)
+
+    assert delta["system"] == {"cpu": {"percent": 55.0}}
+    # Nested timestamps alone do not make a section "changed"
+    assert "docker" not in delta
+    assert "application" not in delta
+    assert delta["uptime_seconds"] == 1
+
+
+async def test_single_collection_per_tick_fans_out_to_all_subscribers():
+    calls = 0
+
+    async def collect() -> dict:
+        nonlocal calls
+        calls += 1
+        return _summary(calls, float(calls))
+
+    broadcaster = MetricsBroadcaster(collect, interval=0.01)
+    queues = [await broadcaster.subscribe() for _ in range(5)]
+
+    for queue in queues:
+        first = await asyncio.wait_for(queue.get(), timeout=1)
+        assert first["type"] == "metrics_update"
+
+    deltas = [await asyncio.wait_for(queue.get(), timeout=1) for queue in queues]
+    assert all(delta["type"] == "metrics_delta" for delta in deltas)
+    assert all("system" in delta["data"] for delta in deltas)
+    # One initial snapshot plus at most a couple of ticks, never one per client
+    assert calls < 5
+
+    for queue in queues:
+        await broadcaster.unsubscribe(queue)
+    assert broadcaster.subscriber_count == 0
@@ -0,0 +1,191 @@
+import gzip
+import hashlib
+import io
+import json
+import os
+import tarfile
+import time
+import uuid
+
+import httpx
+import pytest
+
+from app.config import settings
+from app.services import npm_proxy
+
+
+pytestmark = pytest.mark.asyncio
+
+UPSTREAM = "https://registry.example.test"
+
+
+def _tarball(content: bytes) -> bytes:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as tar:
+        info = tarfile.TarInfo("package/index.js")
+        info.size = len(content)
+        tar.addfile(info, io.BytesIO(content))
+    return gzip.compress(buffer.getvalue())
+
+
+class FakeRegistry:
+    def __init__(self) -> None:
+        self.tarball = _tarball(b"module.exports = 1;\n")
+        self.requests: list[str] = []
+        self.available = True
+
+    def packument(self, name: str) -> dict:
+        return {
+            "name": name,
+            "dist-tags": {"latest": "1.0.0"},
+            "versions": {
+                "1.0.0": {
+                    "name": name,
+                    "version": "1.0.0",
+                    "dist": {
+                        "tarball": f"{UPSTREAM}/{name}/-/{name.split('/')[-1]}-1.0.0.tgz",
+                        "shasum": hashlib.sha1(self.tarball).hexdigest(),
+                    },
+                }
+            },
+        }
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.raw_path.decode()
+        self.requests.append(path)
+        if not self.available:
+            return httpx.Response(503)
+        if path.endswith(".tgz"):
+            return httpx.Response(200, content=self.tarball)
+        name = path.lstrip("/").replace("%2F", "/").replace("%2f", "/")
+        if name == "missing":
+            return httpx.Response(404, json={"error": "Not found"})
+        if request.headers.get("if-none-match") == '"v1"':
+            return httpx.Response(304)
+        return httpx.Response(200, json=self.packument(name), headers={"ETag": '"v1"'})
+
+
+@pytest.fixture
+def headers():
+    return {"Authorization": f"Bearer {npm_proxy.create_registry_token(uuid.uuid4())}"}
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    fake = FakeRegistry()
+    monkeypatch.setattr(settings, "npm_proxy_upstream", UPSTREAM)
+    monkeypatch.setattr(settings, "npm_proxy_cache_dir", str(tmp_path / "npm"))
+    monkeypatch.setattr(settings, "npm_proxy_offline", False)
+    monkeypatch.setattr(npm_proxy, "stats", npm_proxy.ProxyStats())
+    monkeypatch.setattr(npm_proxy, "_http_client", httpx.AsyncClient(transport=httpx.MockTransport(fake)))
+    return fake
+
+
+async def test_metadata_is_cached_and_tarball_urls_point_at_proxy(client, registry, headers, monkeypatch):
+    first = await client.get("/npm/@scope%2fwidget", headers=headers)
+    assert first.status_code == 200
+    tarball_url = first.json()["versions"]["1.0.0"]["dist"]["tarball"]
+    assert tarball_url == "http://test/npm/@scope/widget/-/widget-1.0.0.tgz"
+
+    await client.get("/npm/@scope%2fwidget", headers=headers)
+    assert len(registry.requests) == 1
+
+    # Once the TTL passes the entry is revalidated with its ETag rather than refetched
+    monkeypatch.setattr(settings, "npm_proxy_metadata_ttl_seconds", 0)
+    assert (await client.get("/npm/@scope%2fwidget", headers=headers)).status_code == 200
+    assert len(registry.requests) == 2
+
+    stats = (await client.get("/npm/-/autostack/stats")).json()
+    assert stats["metadata_hits"] == 1
+    assert stats["metadata_revalidated"] == 1
+    assert stats["metadata_misses"] == 1
+    assert (await client.get("/npm/missing", headers=headers)).status_code == 404
+
+
+async def test_tarballs_are_fetched_once(client, registry, headers, tmp_path):
+    for _ in range(3):
+        response = await client.get("/npm/left-pad/-/left-pad-1.0.0.tgz", headers=headers)
+        assert response.status_code == 200
+        assert response.content == registry.tarball
+
+    assert registry.requests == ["/left-pad/-/left-pad-1.0.0.tgz"]
+    stats = (await client.get("/npm/-/autostack/stats")).json()
+    assert stats["tarball_hit_ratio"] == pytest.approx(2 / 3, abs=1e-3)
+    digest = hashlib.sha256(registry.tarball).hexdigest()
+    assert list((tmp_path / "npm" / "blobs").glob(f"*/{digest}.tgz"))
+
+
+async def test_offline_mode_serves_only_from_cache(client, registry, headers, monkeypatch):
+    await client.get("/npm/left-pad", headers=headers)
+    await client.get("/npm/left-pad/-/left-pad-1.0.0.tgz", headers=headers)
+    monkeypatch.setattr(settings, "npm_proxy_offline", True)
+    monkeypatch.setattr(settings, "npm_proxy_metadata_ttl_seconds", 0)
+    registry.requests.clear()
+
+    assert (await client.get("/npm/left-pad", headers=headers)).status_code == 200
+    assert (await client.get("/npm/left-pad/-/left-pad-1.0.0.tgz", headers=headers)).content == registry.tarball
+    assert (await client.get("/npm/react", headers=headers)).status_code == 404
+    assert registry.requests == []
+
+
+async def test_stale_metadata_is_served_when_upstream_fails(client, registry, headers, monkeypatch):
+    await client.get("/npm/left-pad", headers=headers)
+    monkeypatch.setattr(settings, "npm_proxy_metadata_ttl_seconds", 0)
+    registry.available = False
+
+    response = await client.get("/npm/left-pad", headers=headers)
+    assert response.status_code == 200
+    assert json.loads(response.content)["name"] == "left-pad"
+    assert (await client.get("/npm/react", headers=headers)).status_code == 502
+    stats = (await client.get("/npm/-/autostack/stats")).json()
+    assert stats["metadata_stale"] == 1
+
+
+async def test_registry_requires_a_build_token(client, registry, monkeypatch):
+    assert (await client.get("/npm/left-pad")).status_code == 401
+    forged = {"Authorization": f"Bearer {uuid.uuid4()}.{int(time.time()) + 60}.{'0' * 64}"}
+    assert (await client.get("/npm/left-pad", headers=forged)).status_code == 403
+    monkeypatch.setattr(settings, "build_timeout_seconds", -3600)
+    expired = {"Authorization": f"Bearer {npm_proxy.create_registry_token(uuid.uuid4())}"}
+    assert (await client.get("/npm/left-pad", headers=expired)).status_code == 403
+    assert registry.requests == []
+
+
+async def test_least_recently_used_entries_are_evicted(client, registry, headers, tmp_path):
+    await client.get("/npm/left-pad", headers=headers)
+    await client.get("/npm/left-pad/-/left-pad-1.0.0.tgz", headers=headers)
+    blob = next((tmp_path / "npm" / "blobs").glob("*/*.tgz"))
+    metadata = next((tmp_path / "npm" / "metadata").glob("*/*.json"))
+    os.utime(metadata, (time.time() - 100, time.time() - 100))
+    freed = npm_proxy.evict_cache(blob.stat().st_size)
+    assert freed > 0
+    assert not metadata.exists() and not metadata.with_suffix(".meta").exists()
+    assert blob.exists()
+
+    # An evicted tarball is fetched again instead of failing
+    npm_proxy.evict_cache(0)
+    assert (await client.get("/npm/left-pad/-/left-pad-1.0.0.tgz", headers=headers)).content == registry.tarball
+    assert registry.requests.count("/left-pad/-/left-pad-1.0.0.tgz") == 2
+
+
+async def test_build_env_respects_repository_registry(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "npm_proxy_url", "http://backend:8000/npm")
+    deployment_id = uuid.uuid4()
+    env = npm_proxy.registry_env(deployment_id)
+    assert env["npm_config_registry"] == "http://backend:8000/npm/"
+    token = env["npm_config_//backend:8000/npm/:_authToken"]
+    assert npm_proxy.verify_registry_token(token) == deployment_id
+    assert env["YARN_NPM_AUTH_TOKEN"] == token
+
+    assert not npm_proxy.repo_configures_registry(tmp_path)
+    (tmp_path / ".npmrc").write_text("@acme:registry=https://npm.acme.test/\nsave-exact=true\n")
+    assert not npm_proxy.repo_configures_registry(tmp_path)
+    for config in (
+        "registry=https://npm.acme.test/\n",
+        "//registry.npmjs.org/:_authToken=${NPM_TOKEN}\n",
+    ):
+        (tmp_path / ".npmrc").write_text(config)
+        assert npm_proxy.repo_configures_registry(tmp_path)
+    (tmp_path / ".npmrc").unlink()
+    (tmp_path / ".yarnrc.yml").write_text('npmRegistryServer: "https://npm.acme.test"\n')
+    assert npm_proxy.repo_configures_registry(tmp_path / "missing", tmp_path)
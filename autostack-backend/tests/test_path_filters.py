@@ -0,0 +1,80 @@
+import hmac
+import json
+from hashlib import sha256
+
+import pytest
+from sqlalchemy import select
+
+from app.models import Deployment, Project, User, WebhookPayload
+from app.services.path_filters import GITHUB_PUSH_COMMIT_LIMIT, matches_any, path_filter_skip_reason
+
+
+def _push(*file_lists: list[str]) -> dict:
+    return {
+        "ref": "refs/heads/main",
+        "repository": {"full_name": "octocat/monorepo"},
+        "head_commit": {"id": "c" * 40, "message": "Update", "author": {"name": "CI"}},
+        "commits": [{"added": [], "modified": files, "removed": []} for files in file_lists],
+    }
+
+
+def test_glob_semantics():
+    assert matches_any("README.md", ["*.md"])
+    assert matches_any("docs/guide/intro.md", ["*.md"])
+    assert matches_any("docs/guide/intro.png", ["docs"])
+    assert matches_any("docs/guide/intro.png", ["docs/**"])
+    assert matches_any("apps/web/src/index.ts", ["apps/web/**"])
+    assert matches_any("apps/web/package.json", ["apps/*/package.json"])
+    assert not matches_any("apps/api/main.py", ["apps/web/**"])
+    assert not matches_any("src/docs.ts", ["docs"])
+
+
+def test_skip_reason_uses_union_of_changed_files():
+    include = ["apps/web/**", "package.json"]
+    exclude = ["*.md"]
+
+    assert path_filter_skip_reason(_push(["apps/api/main.py"], ["README.md"]), include, exclude)
+    assert path_filter_skip_reason(_push(["apps/web/README.md"]), include, exclude)
+    assert path_filter_skip_reason(_push(["apps/api/main.py"], ["apps/web/app.tsx"]), include, exclude) is None
+    assert path_filter_skip_reason(_push(["docs/intro.md"]), None, ["docs/"])
+    assert path_filter_skip_reason(_push(["docs/intro.md"]), None, None) is None
+
+
+def test_truncated_or_missing_file_lists_fall_back_to_building():
+    include = ["apps/web/**"]
+    truncated = _push(*[["apps/api/main.py"]] * GITHUB_PUSH_COMMIT_LIMIT)
+
+    assert path_filter_skip_reason(truncated, include, None) is None
+    assert path_filter_skip_reason({"commits": []}, include, None) is None
+    assert path_filter_skip_reason({"commits": [{"id": "x"}]}, include, None) is None
+
+
+@pytest.mark.asyncio
+async def test_webhook_records_skip_for_irrelevant_push(client, session):
+    user = User(name="Mono Owner", email="mono@example.com")
+    session.add(user)
+    await session.flush()
+    project = Project(
+        user_id=user.id,
+        name="Monorepo",
+        repository="octocat/monorepo",
+        auto_deploy_enabled=True,
+        auto_deploy_branch="main",
+        deploy_include_paths=["apps/web/**"],
+    )
+    session.add(project)
+    await session.commit()
+
+    body = json.dumps(_push(["apps/api/main.py"])).encode()
+    signature = "sha256=" + hmac.new(b"webhook-secret", body, sha256).hexdigest()
+    response = await client.post(
+        "/webhook/github",
+        content=body,
+        headers={"X-Hub-Signature-256": signature, "X-GitHub-Event": "push"},
+    )
+
+    assert response.status_code == 200
+    assert response.json()["reason"] == "paths_filtered"
+    stored = await session.scalar(select(WebhookPayload))
+    assert stored.skip_reason.startswith("paths_filtered")
+    assert await session.scalar(select(Deployment)) is None
@@ -0,0 +1,29 @@
+import asyncio
+
+import pytest
+
+from app.services.pipe_reader import iter_pipe_lines
+
+
+pytestmark = pytest.mark.asyncio
+
+
+async def _collect(chunks: list[bytes], **kwargs) -> list[str]:
+    reader = asyncio.StreamReader()
+    for chunk in chunks:
+        reader.feed_data(chunk)
+    reader.feed_eof()
+    return [line async for line in iter_pipe_lines(reader, **kwargs)]
+
+
+async def test_lines_split_across_chunks_and_multibyte_characters():
+    data = "first\nsécond line\r\nthird ✓\nno newline at end".encode()
+    lines = await _collect([data], chunk_size=3, max_line_bytes=1024)
+    assert lines == ["first", "sécond line\r", "third ✓", "no newline at end"]
+
+
+async def test_long_lines_are_truncated_without_failing():
+    long_line = b"x" * 200_000
+    lines = await _collect([long_line + b"\nafter\n"], chunk_size=4096, max_line_bytes=100)
+    assert lines[0] == "x" * 100 + " … [line truncated, 199900 more bytes]"
+    assert lines[1] == "after"
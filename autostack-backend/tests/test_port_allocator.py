@@ -0,0 +1,147 @@
+from pathlib import Path
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import select
+
+from app.db import AsyncSessionLocal
+from app.errors import ApiError
+from app.models import Deployment, DeploymentContainer, Project, User
+from app.services import container_runtime, port_allocator
+from app.services.port_allocator import PortAllocator, lease_port
+
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest_asyncio.fixture
+async def ports(monkeypatch):
+    allocator = PortAllocator(40000, 40003)
+    monkeypatch.setattr(port_allocator, "allocator", allocator)
+    monkeypatch.setattr(container_runtime, "port_allocator", allocator)
+    return allocator
+
+
+async def _deployment(session) -> Deployment:
+    user = User(name="Ports", email="ports@example.com")
+    session.add(user)
+    await session.flush()
+    project = Project(user_id=user.id, name="ports", repository="octocat/ports")
+    session.add(project)
+    await session.flush()
+    deployment = Deployment(project_id=project.id, user_id=user.id, status="success")
+    session.add(deployment)
+    await session.commit()
+    return deployment
+
+
+def _container(
+    deployment: Deployment, container_id: str = "", status: str = "starting", port: int | None = None
+) -> DeploymentContainer:
+    return DeploymentContainer(
+        deployment_id=deployment.id, container_id=container_id, image="nginx:alpine", status=status, port=port
+    )
+
+
+async def test_free_list_allocates_in_order_and_reuses_released_ports_last():
+    allocator = PortAllocator(100, 103)
+    allocator.reset(used=[101])
+
+    assert [allocator.allocate(), allocator.allocate()] == [100, 102]
+    allocator.release(100)
+    allocator.release(100)
+    assert [allocator.allocate(), allocator.allocate(), allocator.allocate()] == [103, 100, None]
+
+
+async def test_free_list_starts_at_the_process_offset():
+    allocator = PortAllocator(100, 103, offset=6)
+    allocator.reset(used=[103])
+
+    assert [allocator.allocate() for _ in range(4)] == [102, 100, 101, None]
+
+
+async def test_lease_skips_ports_taken_by_another_process_and_frees_on_stop(session, ports):
+    deployment = await _deployment(session)
+    await ports.load()
+    # Leased elsewhere after this process built its free list
+    session.add(_container(deployment, "other", "running", port=40000))
+    await session.commit()
+
+    first = _container(deployment)
+    assert await lease_port(session, first) == 40001
+    second = _container(deployment)
+    assert await lease_port(session, second) == 40002
+    await session.commit()
+
+    await container_runtime.stop_container(session, first)
+    await session.commit()
+    assert await lease_port(session, _container(deployment)) == 40003
+    assert await lease_port(session, _container(deployment)) == 40001
+
+
+async def test_exhausted_range_reloads_once_then_fails(session, ports):
+    deployment = await _deployment(session)
+    for _ in range(4):
+        await lease_port(session, _container(deployment))
+    with pytest.raises(ApiError) as excinfo:
+        await lease_port(session, _container(deployment))
+    assert excinfo.value.code == "NO_FREE_PORT"
+
+
+async def test_startup_reconcile_ends_leases_of_vanished_containers(session, ports, docker_engine):
+    deployment = await _deployment(session)
+    docker_engine.add_container(id="alive", port=40000)
+    docker_engine.add_container(id="unknown", state="exited", port=40002)
+    session.add(_container(deployment, "alive", "running", port=40000))
+    session.add(_container(deployment, "gone", "hibernated", port=40001))
+    await session.commit()
+
+    await container_runtime.reconcile_port_leases()
+
+    session.expire_all()
+    statuses = dict((await session.execute(select(DeploymentContainer.container_id, DeploymentContainer.status))).all())
+    assert statuses == {"alive": "running", "gone": "stopped"}
+    assert [ports.allocate(), ports.allocate(), ports.allocate()] == [40001, 40003, None]
+
+
+async def test_port_held_outside_autostack_is_skipped_on_container_start(session, ports, docker_engine):
+    deployment = await _deployment(session)
+    docker_engine.add_image("nginx:alpine")
+    docker_engine.blocked_ports.add(40000)
+
+    container = await container_runtime.start_container(session, deployment, Path("/tmp/site"))
+    await session.commit()
+
+    creates = docker_engine.calls("POST", "/containers/create")
+    assert len(creates) == 2
+    assert docker_engine.calls("DELETE", "/containers/") == [("DELETE", f"/containers/{creates[0][2]['name']}", {"force": "1"})]
+    assert list(docker_engine.containers) == [container.container_id]
+    assert docker_engine.containers[container.container_id].port_bindings == {80: 40001}
+    assert container.port == 40001
+    assert [ports.allocate(), ports.allocate(), ports.allocate()] == [40002, 40003, None]
+
+
+async def test_lease_is_committed_before_the_container_starts(session, ports, docker_engine, monkeypatch):
+    monkeypatch.setattr(port_allocator, "_commits_leases_separately", lambda: True)
+    deployment = await _deployment(session)
+    docker_engine.add_image("nginx:alpine")
+    docker_engine.blocked_ports.add(40000)
+    committed: list[list[int]] = []
+    run_container = container_runtime.docker_client.run_container
+
+    async def observing_run(*args, **kwargs):
+        # What other processes see while docker run is in progress
+        async with AsyncSessionLocal() as other:
+            committed.append(list((await other.execute(select(DeploymentContainer.port))).scalars()))
+        return await run_container(*args, **kwargs)
+
+    monkeypatch.setattr(container_runtime.docker_client, "run_container", observing_run)
+    container = await container_runtime.start_container(session, deployment, Path("/tmp/site"))
+    container.status = "running"
+    await session.commit()
+
+    # The lease on the port held outside AutoStack was dropped before the next attempt
+    assert committed == [[40000], [40001]]
+    async with AsyncSessionLocal() as other:
+        rows = (await other.execute(select(DeploymentContainer.port, DeploymentContainer.status))).all()
+    assert rows == [(40001, "running")]
@@ -0,0 +1,73 @@
+import asyncio
+import fcntl
+import os
+import subprocess
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+from app.config import settings
+from app.services import prefetch
+from app.services.prefetch import mirror_path, parse_base_images, schedule_prefetch, wait_for_git_prefetch
+
+
+def test_parse_base_images_skips_stages_scratch_and_args():
+    dockerfile = "\n".join(
+        [
+            "ARG NODE=20",
+            "FROM --platform=linux/amd64 node:20-alpine AS deps",
+            "FROM deps AS build",
+            "from node:${NODE} as tooling",
+            "FROM scratch",
+            "FROM nginx:1.27-alpine",
+            "COPY --from=build /app/dist /usr/share/nginx/html",
+        ]
+    )
+    assert parse_base_images(dockerfile) == ["node:20-alpine", "nginx:1.27-alpine"]
+
+
+def _git(*args: str, cwd=None) -> str:
+    return subprocess.run(["git", *args], cwd=cwd, check=True, capture_output=True, text=True).stdout.strip()
+
+
+@pytest.mark.asyncio
+async def test_queued_deployment_fetches_branch_into_mirror(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "prefetch_enable", True)
+    monkeypatch.setattr(settings, "git_mirror_dir", str(tmp_path / "mirrors"))
+    upstream = tmp_path / "upstream.git"
+    upstream.mkdir()
+    _git("init", "--quiet", "--initial-branch=main", cwd=upstream)
+    (upstream / "index.html").write_text("<h1>hi</h1>")
+    _git("add", ".", cwd=upstream)
+    _git("-c", "user.name=t", "-c", "user.email=t@example.com", "commit", "--quiet", "-m", "init", cwd=upstream)
+    head = _git("rev-parse", "HEAD", cwd=upstream)
+
+    project = SimpleNamespace(id=uuid.uuid4(), repository=str(upstream), branch="main", docker_base_images=None)
+    schedule_prefetch(project)
+    await wait_for_git_prefetch(project.id, "main")
+
+    mirror = mirror_path(project.id)
+    assert _git("rev-parse", "refs/heads/main", cwd=mirror) == head
+
+    # The build clone borrows the mirrored objects
+    checkout = tmp_path / "checkout"
+    _git("clone", "--quiet", "--reference-if-able", str(mirror), "--dissociate", str(upstream), str(checkout))
+    assert (checkout / "index.html").read_text() == "<h1>hi</h1>"
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(os.name != "posix", reason="the fetch lock is an flock")
+async def test_build_waits_for_a_fetch_running_in_another_process(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "git_mirror_dir", str(tmp_path))
+    monkeypatch.setattr(prefetch, "FETCH_WAIT_POLL_SECONDS", 0.01)
+    project_id = uuid.uuid4()
+    # A separate open file description conflicts like another process's lock would
+    fetching = os.open(tmp_path / f"{project_id}.fetch.lock", os.O_RDWR | os.O_CREAT)
+    fcntl.flock(fetching, fcntl.LOCK_EX)
+
+    waiter = asyncio.create_task(wait_for_git_prefetch(project_id, "main"))
+    await asyncio.sleep(0.1)
+    assert not waiter.done()
+    os.close(fetching)
+    await asyncio.wait_for(waiter, 1)
@@ -0,0 +1,100 @@
+import os
+import time
+import uuid
+
+import pytest
+
+from app.config import settings
+from app.services.remote_cache import artifact_path, create_cache_token, evict_artifacts
+
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture(autouse=True)
+def _cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "remote_cache_dir", str(tmp_path / "remote-cache"))
+
+
+def _auth(project_id: uuid.UUID) -> dict[str, str]:
+    return {"Authorization": f"Bearer {create_cache_token(project_id)}"}
+
+
+async def test_turbo_artifact_round_trip(client):
+    project_id = uuid.uuid4()
+    headers = _auth(project_id)
+    blob = os.urandom(256 * 1024)
+
+    assert (await client.head("/v8/artifacts/abc123", headers=headers)).status_code == 404
+    response = await client.put(
+        "/v8/artifacts/abc123",
+        content=blob,
+        headers={**headers, "x-artifact-duration": "1500", "Content-Type": "application/octet-stream"},
+    )
+    assert response.status_code == 202
+
+    assert (await client.head("/v8/artifacts/abc123", headers=headers)).status_code == 200
+    response = await client.get("/v8/artifacts/abc123", headers=headers)
+    assert response.status_code == 200
+    assert response.content == blob
+    assert response.headers["x-artifact-duration"] == "1500"
+
+    response = await client.post("/v8/artifacts", json={"hashes": ["abc123", "missing"]}, headers=headers)
+    assert response.json()["abc123"]["taskDurationMs"] == 1500
+    assert response.json()["missing"] is None
+
+
+async def test_artifact_metadata_is_validated_and_replaced_on_reupload(client):
+    project_id = uuid.uuid4()
+    headers = _auth(project_id)
+
+    invalid = await client.put("/v8/artifacts/meta1", content=b"x", headers={**headers, "x-artifact-duration": "fast"})
+    assert invalid.status_code == 400
+    assert not artifact_path(project_id, "meta1").exists()
+
+    await client.put("/v8/artifacts/meta1", content=b"v1", headers={**headers, "x-artifact-duration": "900"})
+    await client.put("/v8/artifacts/meta1", content=b"v2", headers=headers)
+    response = await client.get("/v8/artifacts/meta1", headers=headers)
+    assert response.content == b"v2"
+    assert "x-artifact-duration" not in response.headers
+
+    # A sidecar with a bad duration (written by an older version) does not break queries
+    path = artifact_path(project_id, "meta1")
+    path.with_name(f"{path.name}.json").write_text('{"duration": "1.5s"}')
+    response = await client.post("/v8/artifacts", json={"hashes": ["meta1"]}, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["meta1"]["taskDurationMs"] == 0
+
+
+async def test_tokens_are_scoped_to_one_project(client):
+    owner, other = uuid.uuid4(), uuid.uuid4()
+    await client.put("/v8/artifacts/shared", content=b"secret", headers=_auth(owner))
+
+    assert (await client.get("/v8/artifacts/shared", headers=_auth(other))).status_code == 404
+    forged = {"Authorization": f"Bearer {owner}.{'0' * 64}"}
+    assert (await client.get("/v8/artifacts/shared", headers=forged)).status_code == 403
+    assert (await client.get("/v8/artifacts/shared")).status_code == 401
+
+
+async def test_nx_entries_are_immutable(client):
+    headers = _auth(uuid.uuid4())
+
+    assert (await client.put("/v1/cache/nxhash", content=b"first", headers=headers)).status_code == 200
+    assert (await client.put("/v1/cache/nxhash", content=b"second", headers=headers)).status_code == 409
+    assert (await client.get("/v1/cache/nxhash", headers=headers)).content == b"first"
+
+
+async def test_least_recently_used_artifacts_are_evicted(client):
+    project_id = uuid.uuid4()
+    headers = _auth(project_id)
+    for index, name in enumerate(("old", "used", "new")):
+        await client.put(f"/v8/artifacts/{name}", content=b"x" * 1000, headers=headers)
+        past = time.time() - 100 + index
+        os.utime(artifact_path(project_id, name), (past, past))
+    # Reading refreshes the entry
+    await client.get("/v8/artifacts/used", headers=headers)
+
+    assert evict_artifacts(max_bytes=2000) == 1000
+    assert not artifact_path(project_id, "old").exists()
+    assert artifact_path(project_id, "used").exists()
+    assert artifact_path(project_id, "new").exists()
@@ -0,0 +1,127 @@
+import asyncio
+import json
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import select
+
+from app.models import Deployment, DeploymentContainer, Project, User
+from app.services.reverse_proxy import metrics, pools
+from app.services.static_gateway import publish_container_deployment, routing_table, site_name
+
+
+pytestmark = pytest.mark.asyncio
+
+
+class DummyUpstream:
+    """Minimal HTTP/1.1 keep-alive server that echoes what it received."""
+
+    def __init__(self) -> None:
+        self.connections = 0
+        self.server: asyncio.base_events.Server | None = None
+
+    async def start(self) -> int:
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                lines = head.decode().split("\r\n")
+                method, target, _ = lines[0].split(" ", 2)
+                headers = {k.lower(): v.strip() for k, v in (line.split(":", 1) for line in lines[1:] if line)}
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                payload = json.dumps(
+                    {"method": method, "target": target, "body": body.decode(), "forwarded": headers.get("x-forwarded-for")}
+                ).encode()
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    b"Set-Cookie: a=1\r\nSet-Cookie: b=2\r\n"
+                    + f"Content-Length: {len(payload)}\r\n\r\n".encode()
+                    + payload
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+@pytest_asyncio.fixture
+async def upstream():
+    server = DummyUpstream()
+    port = await server.start()
+    server.port = port
+    yield server
+    await pools.aclose()
+    routing_table.clear()
+    await server.stop()
+
+
+async def _live_container(session, port: int) -> tuple[Project, Deployment]:
+    user = User(name="Proxy Owner", email="proxy@example.com")
+    session.add(user)
+    await session.flush()
+    project = Project(user_id=user.id, name="api", repository="octocat/api", runtime="docker")
+    session.add(project)
+    await session.flush()
+    deployment = Deployment(project_id=project.id, user_id=user.id, status="success", is_production=True)
+    session.add(deployment)
+    await session.flush()
+    container = DeploymentContainer(
+        deployment_id=deployment.id, container_id="c1", image="autostack/api:1", port=port, status="running"
+    )
+    session.add(container)
+    await session.flush()
+    await publish_container_deployment(session, project, deployment, container)
+    await session.commit()
+    return project, deployment
+
+
+async def test_requests_reuse_pooled_connections_and_are_metered(client, session, upstream):
+    project, deployment = await _live_container(session, upstream.port)
+    base = f"/sites/{site_name(project.id, project.name)}"
+
+    for _ in range(10):
+        response = await client.get(f"{base}/items?page=2")
+        assert response.status_code == 200
+        assert response.json()["target"] == "/items?page=2"
+    response = await client.post(f"{base}/items", content=b"hello")
+    assert response.json() == {"method": "POST", "target": "/items", "body": "hello", "forwarded": "127.0.0.1"}
+    assert response.headers.get_list("set-cookie") == ["a=1", "b=2"]
+
+    assert upstream.connections == 1
+    traffic = metrics.snapshot(deployment.id)
+    assert traffic["requests"] == 11
+    assert traffic["errors"] == 0
+    assert traffic["bytes_in"] == 5
+    assert traffic["bytes_out"] > 0 and traffic["latency_p50_ms"] is not None
+
+
+async def test_unreachable_upstream_returns_bad_gateway(client, session, upstream):
+    project, deployment = await _live_container(session, upstream.port)
+    await upstream.stop()
+
+    response = await client.get(f"/sites/{site_name(project.id, project.name)}/")
+    assert response.status_code == 502
+    assert metrics.snapshot(deployment.id)["errors"] == 1
+
+
+async def test_pools_of_stopped_containers_are_closed_on_reload(client, session, upstream):
+    project, _deployment = await _live_container(session, upstream.port)
+    assert (await client.get(f"/sites/{site_name(project.id, project.name)}/")).status_code == 200
+    origin = f"http://localhost:{upstream.port}"
+    assert origin in pools._shards
+
+    # Another process (a build worker retiring it after a cutover) stops the container
+    container = (await session.execute(select(DeploymentContainer))).scalar_one()
+    container.status = "stopped"
+    await session.commit()
+    await routing_table.reload()
+    assert origin not in pools._shards
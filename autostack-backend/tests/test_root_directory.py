@@ -0,0 +1,40 @@
+import pytest
+
+from app.build_engine import normalize_root_directory
+from app.models import Project, User
+from app.security import create_access_token
+
+
+def test_root_directory_is_normalized_and_kept_inside_repo():
+    assert normalize_root_directory(None) is None
+    assert normalize_root_directory("") is None
+    assert normalize_root_directory("./") is None
+    assert normalize_root_directory("/apps/web/") == "apps/web"
+    assert normalize_root_directory("apps\\web") == "apps/web"
+    with pytest.raises(ValueError):
+        normalize_root_directory("apps/../../etc")
+
+
+@pytest.mark.asyncio
+async def test_project_settings_update_root_directory(client, session):
+    user = User(name="Mono", email="root-dir@example.com")
+    session.add(user)
+    await session.flush()
+    project = Project(user_id=user.id, name="Mono", repository="octocat/mono")
+    session.add(project)
+    await session.commit()
+    headers = {"Authorization": f"Bearer {create_access_token(user)}"}
+
+    response = await client.post(
+        f"/api/projects/{project.id}/settings", json={"rootDirectory": "apps/web/"}, headers=headers
+    )
+    assert response.status_code == 200
+    assert response.json()["rootDirectory"] == "apps/web"
+
+    response = await client.post(
+        f"/api/projects/{project.id}/settings", json={"rootDirectory": "../outside"}, headers=headers
+    )
+    assert response.status_code == 400
+
+    response = await client.post(f"/api/projects/{project.id}/settings", json={"rootDirectory": ""}, headers=headers)
+    assert response.json()["rootDirectory"] is None
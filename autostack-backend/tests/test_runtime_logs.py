@@ -0,0 +1,114 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func, select
+
+from app.models import Deployment, DeploymentRuntimeLog, Project, User
+from app.routers import deployments_runtime
+from app.security import create_access_token
+from app.services.log_store import append_log_lines
+
+
+pytestmark = pytest.mark.asyncio
+
+
+async def _deployment_with_runtime_logs(session, count: int) -> tuple[Deployment, dict]:
+    user = User(name="Runtime Logs", email="runtime-logs@example.com")
+    session.add(user)
+    await session.flush()
+    project = Project(user_id=user.id, name="runtime-logs", repository="octocat/runtime-logs", runtime="docker")
+    session.add(project)
+    await session.flush()
+    deployment = Deployment(project_id=project.id, user_id=user.id, status="success")
+    session.add(deployment)
+    await session.commit()
+
+    base = datetime(2025, 10, 9, 8, 0, 0)
+    levels = ["info", "info", "warning", "info", "error"]  # lines 3, 8, ... warn and 5, 10, ... fail
+    entries = []
+    for i in range(1, count + 1):
+        level = levels[(i - 1) % 5]
+        entries.append((f"GET /page/{i} {level}", level, base + timedelta(seconds=i)))
+    await append_log_lines(deployment.id, entries, stream="runtime")
+    return deployment, {"Authorization": f"Bearer {create_access_token(user)}"}
+
+
+async def test_runtime_logs_are_read_from_the_store_without_writing(client, session, monkeypatch):
+    deployment, headers = await _deployment_with_runtime_logs(session, 30)
+
+    async def no_docker(*_args, **_kwargs):
+        raise AssertionError("runtime logs must not be read from Docker")
+
+    monkeypatch.setattr("app.services.container_runtime.docker_client.logs", no_docker)
+
+    response = await client.get(f"/api/deployments/{deployment.id}/logs/runtime?limit=5", headers=headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert [item["line"] for item in data["lines"]] == [26, 27, 28, 29, 30]
+    assert (data["prevCursor"], data["nextCursor"], data["totalLines"], data["hasMore"]) == (26, 30, 30, True)
+
+    older = await client.get(f"/api/deployments/{deployment.id}/logs/runtime?before=26&limit=3", headers=headers)
+    assert [item["message"] for item in older.json()["lines"]] == ["GET /page/23 warning", "GET /page/24 info", "GET /page/25 error"]
+
+    # Reading twice leaves the store and the legacy table as they were
+    again = await client.get(f"/api/deployments/{deployment.id}/logs/runtime?limit=5", headers=headers)
+    assert again.json()["totalLines"] == 30
+    assert await session.scalar(select(func.count()).select_from(DeploymentRuntimeLog)) == 0
+
+
+async def test_level_and_text_filters_page_through_the_scanned_lines(client, session, monkeypatch):
+    monkeypatch.setattr("app.services.log_store.settings.log_search_max_scan_lines", 12)
+    deployment, headers = await _deployment_with_runtime_logs(session, 30)
+    url = f"/api/deployments/{deployment.id}/logs/runtime"
+
+    errors = (await client.get(f"{url}?after=0&level=error", headers=headers)).json()
+    # Only the first 12 lines are examined; the cursor resumes after them
+    assert [item["line"] for item in errors["lines"]] == [5, 10]
+    assert (errors["nextCursor"], errors["hasMore"]) == (12, True)
+    rest = (await client.get(f"{url}?after=12&level=error", headers=headers)).json()
+    assert [item["line"] for item in rest["lines"]] == [15, 20]
+
+    warnings = (await client.get(f"{url}?level=warning&limit=3", headers=headers)).json()
+    assert [(item["line"], item["level"]) for item in warnings["lines"]] == [(25, "error"), (28, "warning"), (30, "error")]
+    assert warnings["prevCursor"] == 25
+
+    text = (await client.get(f"{url}?after=0&q=PAGE/1", headers=headers)).json()
+    assert [item["line"] for item in text["lines"]] == [1, 10, 11, 12]
+
+    invalid = await client.get(f"{url}?level=verbose", headers=headers)
+    assert invalid.status_code == 422
+
+
+class RecordingSocket:
+    def __init__(self) -> None:
+        self.sent: list[dict] = []
+
+    async def send_json(self, data: dict) -> None:
+        self.sent.append(data)
+
+
+async def test_tail_sends_recent_lines_then_follows_new_ones(session, monkeypatch):
+    monkeypatch.setattr(deployments_runtime.settings, "log_tail_lines", 2)
+    monkeypatch.setattr(deployments_runtime, "LOG_FOLLOW_INTERVAL_SECONDS", 0.01)
+    deployment, _headers = await _deployment_with_runtime_logs(session, 10)
+    socket = RecordingSocket()
+
+    follower = asyncio.create_task(deployments_runtime._follow_runtime_logs(deployment.id, socket, None, "warning", None))
+    await asyncio.sleep(0.05)
+    await append_log_lines(deployment.id, [("boom", "error", datetime(2025, 10, 9, 9)), ("ok", "info", None)], stream="runtime")
+    await asyncio.sleep(0.05)
+    follower.cancel()
+
+    assert [(item["line"], item["message"]) for item in socket.sent] == [
+        (8, "GET /page/8 warning"),
+        (10, "GET /page/10 error"),
+        (11, "boom"),
+    ]
+    assert socket.sent[-1] == {
+        "type": "log",
+        "line": 11,
+        "message": "boom",
+        "level": "error",
+        "timestamp": "2025-10-09T09:00:00",
+    }
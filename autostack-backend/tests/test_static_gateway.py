@@ -0,0 +1,81 @@
+import shutil
+from pathlib import Path
+
+import pytest
+
+from app.config import settings
+from app.models import Deployment, Project, User
+from app.services.static_gateway import publish_static_deployment, routing_table, site_name
+
+
+pytestmark = pytest.mark.asyncio
+
+
+_site_dirs: list[Path] = []
+
+
+@pytest.fixture(autouse=True)
+def _fresh_table():
+    routing_table.clear()
+    yield
+    routing_table.clear()
+    while _site_dirs:
+        shutil.rmtree(_site_dirs.pop(), ignore_errors=True)
+
+
+async def _deployment_with_site(session, files: dict[str, str]) -> tuple[Project, Deployment]:
+    user = User(name="Site Owner", email="site@example.com")
+    session.add(user)
+    await session.flush()
+    project = Project(user_id=user.id, name="My Blog!", repository="octocat/blog")
+    session.add(project)
+    await session.flush()
+    deployment = Deployment(project_id=project.id, user_id=user.id, status="success", is_production=True)
+    session.add(deployment)
+    await session.flush()
+    root = Path(settings.autostack_deploy_dir) / str(deployment.id)
+    _site_dirs.append(root)
+    for name, content in files.items():
+        (root / name).parent.mkdir(parents=True, exist_ok=True)
+        (root / name).write_text(content)
+    return project, deployment
+
+
+async def test_site_serves_live_deployment_with_spa_fallback(client, session):
+    project, deployment = await _deployment_with_site(
+        session, {"index.html": "<h1>home</h1>", "assets/app.1234.js": "console.log(1)"}
+    )
+    url = await publish_static_deployment(session, project, deployment)
+    await session.commit()
+    site = site_name(project.id, project.name)
+    assert site.startswith("my-blog-")
+    assert url.endswith(f"/sites/{site}/")
+
+    home = await client.get(f"/sites/{site}/")
+    assert home.status_code == 200 and home.text == "<h1>home</h1>"
+    assert "must-revalidate" in home.headers["cache-control"]
+    assert (await client.get(f"/sites/{site}/", headers={"If-None-Match": home.headers["etag"]})).status_code == 304
+
+    asset = await client.get(f"/sites/{site}/assets/app.1234.js")
+    assert "immutable" in asset.headers["cache-control"]
+    assert (await client.get(f"/sites/{site}/blog/post-1")).text == "<h1>home</h1>"
+    assert (await client.get(f"/sites/{site}/missing.png")).status_code == 404
+    assert (await client.get(f"/sites/{site}")).status_code == 308
+    assert (await client.get("/sites/unknown-site/")).status_code == 404
+
+
+async def test_host_routing_picks_up_deployments_from_other_processes(client, session, monkeypatch):
+    monkeypatch.setattr(settings, "static_gateway_domain", "apps.example.test")
+    monkeypatch.setattr(settings, "static_gateway_reload_seconds", 0)
+    project, deployment = await _deployment_with_site(session, {"index.html": "v1"})
+    # As a separate worker would: only the database changes
+    project.live_deployment_id = deployment.id
+    await session.commit()
+
+    host = f"{site_name(project.id, project.name)}.apps.example.test"
+    response = await client.get("/", headers={"Host": host})
+    assert response.status_code == 200 and response.text == "v1"
+    assert (await client.get("/", headers={"Host": "unknown.apps.example.test"})).status_code == 404
+    # Other hosts still reach the API routes
+    path_response = await client.get(f"/sites/{site_name(project.id, project.name)}/", headers={"Host": "localhost"})
+    assert path_response.text == "v1"
@@ -0,0 +1,113 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+
+from app.models import BuildJob, Deployment, Project, User
+from app.services.job_queue import claim_next_job, enqueue_build_job
+from app.services.supersede import supersede_older_deployments
+
+
+pytestmark = pytest.mark.asyncio
+
+
+async def _project(session, policy: str) -> Project:
+    user = User(name="Push User", email="push@example.com")
+    session.add(user)
+    await session.flush()
+    project = Project(user_id=user.id, name="Push", repository="octocat/push", supersede_policy=policy)
+    session.add(project)
+    await session.flush()
+    return project
+
+
+def _deployment(project: Project, status: str, branch: str = "main", **fields) -> Deployment:
+    return Deployment(
+        project_id=project.id,
+        user_id=project.user_id,
+        status=status,
+        branch=branch,
+        is_production=True,
+        **fields,
+    )
+
+
+async def test_queued_deployments_of_same_branch_are_superseded(session):
+    project = await _project(session, "queued")
+    session.add(_deployment(project, "success", build_duration_seconds=120))
+    older = _deployment(project, "queued", commit_hash="a" * 40)
+    other_branch = _deployment(project, "queued", branch="feature")
+    running = _deployment(project, "building", started_at=datetime.utcnow())
+    session.add_all([older, other_branch, running])
+    await session.flush()
+    await enqueue_build_job(session, older.id)
+    newest = _deployment(project, "queued", commit_hash="b" * 40)
+    session.add(newest)
+    await session.flush()
+
+    outcome = await supersede_older_deployments(session, project, newest)
+    await session.commit()
+
+    assert outcome.superseded == [older.id]
+    assert outcome.running == []
+    assert outcome.seconds_saved == 120
+    assert older.status == "superseded"
+    assert older.superseded_by_id == newest.id
+    assert older.failed_reason == "Superseded by commit bbbbbbb"
+    assert other_branch.status == "queued"
+    assert running.status == "building"
+    job = await session.scalar(select(BuildJob).where(BuildJob.deployment_id == older.id))
+    assert job.status == "cancelled"
+
+
+async def test_running_policy_marks_in_progress_build_for_cancellation(session):
+    project = await _project(session, "running")
+    session.add(_deployment(project, "success", build_duration_seconds=300))
+    running = _deployment(project, "building", started_at=datetime.utcnow() - timedelta(seconds=100))
+    session.add(running)
+    newest = _deployment(project, "queued")
+    session.add(newest)
+    await session.flush()
+
+    outcome = await supersede_older_deployments(session, project, newest)
+
+    assert outcome.running == [running.id]
+    # The build engine flips the status once it has stopped the build
+    assert running.status == "building"
+    assert running.superseded_by_id == newest.id
+    assert 190 <= running.build_seconds_saved <= 200
+
+
+async def test_queued_deployment_already_claimed_by_a_worker_is_stopped_as_running(session):
+    project = await _project(session, "queued")
+    claimed = _deployment(project, "queued")
+    session.add(claimed)
+    await session.flush()
+    await enqueue_build_job(session, claimed.id)
+    await session.commit()
+    job = await claim_next_job("worker-a")
+    newest = _deployment(project, "queued")
+    session.add(newest)
+    await session.flush()
+
+    outcome = await supersede_older_deployments(session, project, newest)
+    await session.commit()
+
+    assert outcome.superseded == []
+    assert outcome.running == [claimed.id]
+    assert claimed.status == "queued"
+    assert claimed.superseded_by_id == newest.id
+    assert await session.scalar(select(BuildJob.status).where(BuildJob.id == job.id)) == "running"
+
+
+async def test_policy_off_keeps_every_deployment(session):
+    project = await _project(session, "off")
+    older = _deployment(project, "queued")
+    newest = _deployment(project, "queued")
+    session.add_all([older, newest])
+    await session.flush()
+
+    outcome = await supersede_older_deployments(session, project, newest)
+
+    assert outcome.superseded == [] and outcome.running == []
+    assert older.status == "queued"